@@ -0,0 +1,250 @@
+import csv
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Any, Iterable, Iterator
+
+from utilities import STREAM_COPY_CHUNK_SIZE, get_base_file_name, sanitize_file_name_string
+
+BLOB_STORE_DIRECTORY_NAME = 'blobs'
+BLOB_MANIFEST_EXTENSION = '.manifest.tsv'
+BLOB_MANIFEST_HEADER = ('file name', 'sha256', 'size')
+# Length of a SHA-256 digest in hexadecimal, which also tells complete manifest rows from one cut short by an interrupted search
+BLOB_DIGEST_LENGTH = 64
+
+
+def get_blob_path(blob_store_directory: str, digest: str) -> str:
+    """Returns the path of the blob with the given digest, in a subdirectory named by the digest's first two characters."""
+    return os.path.join(blob_store_directory, digest[:2], digest)
+
+
+def get_blob_manifest_file_path(directory: str, results_file_path: str) -> str:
+    """Returns the path of the blob manifest of a results file's definition in the directory."""
+    return os.path.join(directory, f"{get_base_file_name(results_file_path)}{BLOB_MANIFEST_EXTENSION}")
+
+
+def create_blob_manifest_writer(manifest_file):
+    """Returns a CSV writer of tab separated blob manifest rows to the open manifest file."""
+    return csv.writer(manifest_file, delimiter='\t', lineterminator='\n')
+
+
+def read_blob_manifest(manifest_file_path: str) -> Iterator[tuple[str, str, int]]:
+    """
+    Yields the file name, digest and size of each row of a blob manifest. The header row is skipped, and so is any incomplete row
+    written by a search worker process that was interrupted.
+    """
+    with open(manifest_file_path, 'r', encoding='utf-8', newline='') as manifest_file:
+        for row in csv.reader(manifest_file, delimiter='\t'):
+            if len(row) != len(BLOB_MANIFEST_HEADER) or len(row[1]) != BLOB_DIGEST_LENGTH or not row[2].isdigit():
+                continue
+            yield row[0], row[1], int(row[2])
+
+
+def merge_blob_manifests(parent_dir: str, output_dir: str, manifest_name: str):
+    """
+    Merges identically named blob manifests in subdirectories of the parent directory into a single blob manifest in the output directory.
+    Manifests are merged in order of their paths, after the rows of the output manifest if it already exists, and the first row of each file name is kept.
+    """
+    manifest_file_paths = [
+        manifest_file_path
+        for subdir, _, _ in sorted(os.walk(parent_dir))
+        for manifest_file_path in sorted(glob.glob(os.path.join(subdir, f"{manifest_name}{BLOB_MANIFEST_EXTENSION}")))
+    ]
+    if not manifest_file_paths:
+        return
+
+    output_manifest_file_path = os.path.join(output_dir, f"{manifest_name}{BLOB_MANIFEST_EXTENSION}")
+    if os.path.exists(output_manifest_file_path):
+        manifest_file_paths.insert(0, output_manifest_file_path)
+
+    merging_manifest_file_path = f"{output_manifest_file_path}.merging"
+    file_names = set()
+    with open(merging_manifest_file_path, 'w', encoding='utf-8', newline='') as merging_manifest_file:
+        manifest_writer = create_blob_manifest_writer(merging_manifest_file)
+        manifest_writer.writerow(BLOB_MANIFEST_HEADER)
+        for manifest_file_path in manifest_file_paths:
+            for file_name, digest, size in read_blob_manifest(manifest_file_path):
+                if file_name not in file_names:
+                    manifest_writer.writerow((file_name, digest, size))
+                    file_names.add(file_name)
+
+    os.replace(merging_manifest_file_path, output_manifest_file_path)
+
+
+def copy_blob_manifest_entries(source_manifest_file_path: str, target_manifest_file_path: str, file_names: list[str]):
+    """
+    Copies the rows of the files with the given names, as they were named before being sanitized, from one blob manifest to another,
+    together with their blobs, from the blob store next to the source manifest to the one next to the target manifest.
+    Files missing from the source manifest or its blob store, or already listed in the target manifest, are skipped.
+    Blobs are hard linked if both blob stores are on the same file system, and copied otherwise.
+    """
+    source_blob_store_directory = os.path.join(os.path.dirname(source_manifest_file_path), BLOB_STORE_DIRECTORY_NAME)
+    target_blob_store_directory = os.path.join(os.path.dirname(target_manifest_file_path), BLOB_STORE_DIRECTORY_NAME)
+    source_rows = {file_name: (digest, size) for file_name, digest, size in read_blob_manifest(source_manifest_file_path)}
+    added_file_names = {file_name for file_name, _, _ in read_blob_manifest(target_manifest_file_path)} if os.path.exists(target_manifest_file_path) else set()
+
+    with open(target_manifest_file_path, 'a', encoding='utf-8', newline='') as target_manifest_file:
+        manifest_writer = create_blob_manifest_writer(target_manifest_file)
+        if target_manifest_file.tell() == 0:
+            manifest_writer.writerow(BLOB_MANIFEST_HEADER)
+
+        for file_name in map(sanitize_file_name_string, file_names):
+            if file_name not in source_rows or file_name in added_file_names:
+                continue
+
+            digest, size = source_rows[file_name]
+            source_blob_path = get_blob_path(source_blob_store_directory, digest)
+            target_blob_path = get_blob_path(target_blob_store_directory, digest)
+            if not os.path.exists(target_blob_path):
+                if not os.path.exists(source_blob_path):
+                    continue
+                os.makedirs(os.path.dirname(target_blob_path), exist_ok=True)
+                try:
+                    os.link(source_blob_path, target_blob_path)
+                except OSError:
+                    shutil.copyfile(source_blob_path, target_blob_path)
+
+            manifest_writer.writerow((file_name, digest, size))
+            added_file_names.add(file_name)
+
+
+class BlobStore:
+    """
+    Content-addressed store of the files with matches, shared by every definition. The contents of each file are written once,
+    to a blob named by their SHA-256 digest, however many definitions they matched, and each definition lists the files it matched
+    with the digest of their blob in its blob manifest, instead of compressing another copy of them into its own zip archive.
+    Each search worker process writes its own manifests, which are merged into one per definition once the search finishes.
+    Blobs are written to a temporary file first and then renamed, so worker processes writing the same blob never see a partial one.
+    """
+    def __init__(self, blob_store_directory: str):
+        self.blob_store_directory = blob_store_directory
+        # Digests of the blobs this worker process knows to be in the store, so they are not looked up on disk again
+        self.digests: set[str] = set()
+        self.unsynced_blob_paths: list[str] = []
+        self.manifest_files: dict[str, Any] = {}
+        self.manifest_writers: dict = {}
+        # File names listed in each definition's manifest by this worker process, since a file name is only listed once
+        self.manifest_file_names: dict[str, set[str]] = {}
+        os.makedirs(blob_store_directory, exist_ok=True)
+
+
+    def start_worker(self, results_file_paths: Iterable[str], manifest_directory: str):
+        """Opens the blob manifest of each definition a search worker process searches with, in its own manifest directory."""
+        self.unsynced_blob_paths = []
+        for results_file_path in results_file_paths:
+            manifest_file = open(get_blob_manifest_file_path(manifest_directory, results_file_path), 'a', encoding='utf-8', newline='')
+            self.manifest_files[results_file_path] = manifest_file
+            self.manifest_writers[results_file_path] = create_blob_manifest_writer(manifest_file)
+            self.manifest_file_names[results_file_path] = set()
+
+
+    def get_unlisted_results_file_paths(self, file_name: str, results_file_paths: Iterable[str]) -> list[str]:
+        """Returns the results file paths of the definitions whose manifest does not list the file yet."""
+        return [results_file_path for results_file_path in results_file_paths if file_name not in self.manifest_file_names[results_file_path]]
+
+
+    def add_file(self, file_name: str, file_data: bytes, results_file_paths: Iterable[str]) -> tuple[int, bool]:
+        """
+        Writes the file's contents to the store unless a blob with their digest is already in it, and lists the file in the manifest
+        of each definition that matched it. Returns the number of manifests the file was listed in, and whether its blob was written.
+        """
+        sanitized_file_name = sanitize_file_name_string(file_name)
+        unlisted_results_file_paths = self.get_unlisted_results_file_paths(sanitized_file_name, results_file_paths)
+        if not unlisted_results_file_paths:
+            return 0, False
+
+        digest = hashlib.sha256(file_data).hexdigest()
+        written = False
+        if not self.has_blob(digest):
+            with self.create_blob_temporary_file() as blob_temporary_file:
+                blob_temporary_file.write(file_data)
+            self.store_blob(blob_temporary_file.name, digest)
+            written = True
+
+        self.list_file(sanitized_file_name, digest, len(file_data), unlisted_results_file_paths)
+        return len(unlisted_results_file_paths), written
+
+
+    def add_stream(self, file_name: str, file_stream, results_file_paths: Iterable[str]) -> tuple[int, bool, int]:
+        """
+        Adds a file read from the start of a seekable stream like add_file, copying it in chunks so it is never held in memory whole.
+        Returns the number of manifests the file was listed in, whether its blob was written, and its size.
+        """
+        sanitized_file_name = sanitize_file_name_string(file_name)
+        unlisted_results_file_paths = self.get_unlisted_results_file_paths(sanitized_file_name, results_file_paths)
+        if not unlisted_results_file_paths:
+            return 0, False, 0
+
+        # The digest is only known once the whole file is read, so it is copied to a temporary file while it is hashed
+        file_stream.seek(0)
+        file_hash = hashlib.sha256()
+        size = 0
+        with self.create_blob_temporary_file() as blob_temporary_file:
+            while chunk := file_stream.read(STREAM_COPY_CHUNK_SIZE):
+                file_hash.update(chunk)
+                blob_temporary_file.write(chunk)
+                size += len(chunk)
+
+        digest = file_hash.hexdigest()
+        written = not self.has_blob(digest)
+        if written:
+            self.store_blob(blob_temporary_file.name, digest)
+        else:
+            os.remove(blob_temporary_file.name)
+
+        self.list_file(sanitized_file_name, digest, size, unlisted_results_file_paths)
+        return len(unlisted_results_file_paths), written, size
+
+
+    def has_blob(self, digest: str) -> bool:
+        """Returns True if the store holds a blob with the digest, written by this worker process or any other."""
+        if digest in self.digests:
+            return True
+        if os.path.exists(get_blob_path(self.blob_store_directory, digest)):
+            self.digests.add(digest)
+            return True
+        return False
+
+
+    def create_blob_temporary_file(self):
+        """Returns a temporary file in the store that a blob is written to before it is renamed to its digest."""
+        return tempfile.NamedTemporaryFile(dir=self.blob_store_directory, prefix='.', suffix='.tmp', delete=False)
+
+
+    def store_blob(self, blob_temporary_file_path: str, digest: str):
+        """Renames a blob's temporary file to the blob's path in the store."""
+        blob_path = get_blob_path(self.blob_store_directory, digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.replace(blob_temporary_file_path, blob_path)
+        self.digests.add(digest)
+        self.unsynced_blob_paths.append(blob_path)
+
+
+    def list_file(self, file_name: str, digest: str, size: int, results_file_paths: list[str]):
+        """Lists the file with the digest of its blob in the manifest of each definition."""
+        for results_file_path in results_file_paths:
+            self.manifest_writers[results_file_path].writerow((file_name, digest, size))
+            self.manifest_file_names[results_file_path].add(file_name)
+
+
+    def sync(self):
+        """Makes sure the blobs written since the last sync and the manifests of this worker process are on disk."""
+        for blob_path in self.unsynced_blob_paths:
+            with open(blob_path, 'rb') as blob_file:
+                os.fsync(blob_file.fileno())
+        self.unsynced_blob_paths = []
+
+        for manifest_file in self.manifest_files.values():
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+
+
+    def finish_worker(self):
+        """Closes the blob manifests of a search worker process."""
+        for manifest_file in self.manifest_files.values():
+            manifest_file.close()
+        self.manifest_files = {}
+        self.manifest_writers = {}
+        self.manifest_file_names = {}
@@ -0,0 +1,403 @@
+import glob
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import Iterable
+
+import config
+from literal_prefilter import lowercase_haystack
+from logger import *
+from results import get_definition_scope
+from search_manifest import get_definition_name
+from streaming_search import StreamedWarcRecord
+from trigram_index import (NgramQuery, StreamedContentsNgrams, create_ngram_query, get_contents_haystack, get_headers_haystack,
+                           get_index_settings_fingerprint)
+from utilities import is_file_binary
+from warc_record import WarcRecord
+
+BLOOM_SIDECAR_EXTENSION = '.bloom'
+BLOOM_SIDECAR_VERSION = 1
+# A WARC.gz file holds far more distinct n-grams than a single record, so the filters use longer n-grams than the trigram index
+# to stay selective for the rare literal text they are meant to rule out
+BLOOM_NGRAM_LENGTH = 4
+BLOOM_HASH_FUNCTIONS = 4
+# N-grams of the HTTP headers are kept apart from those of the URI and contents, for the definitions limited to the headers
+HEADERS_NGRAM_OFFSET = 1 << (8 * BLOOM_NGRAM_LENGTH)
+# Set in the key of an n-gram containing a non-ASCII byte, which no query asks for
+NON_ASCII_KEY_MASK = 0x80808080
+# Odd 64-bit constants whose products with a key give the two hashes the bits of the key are derived from
+FIRST_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+SECOND_HASH_MULTIPLIER = 0xC2B2AE3D27D4EB4F
+HASH_MASK = (1 << 64) - 1
+# The n-gram keys of the records a search worker process searches are collected until there are this many,
+# so the n-grams the records share are only hashed into the filters once
+MAX_PENDING_KEYS = 500000
+# Filters a search worker process holds in memory before writing the least recently used one to disk
+MAX_WORKER_FILTERS = 8
+# Filters with more bits set than this rule out few WARC.gz files
+MAX_USEFUL_FILL_RATIO = 0.5
+
+
+class BloomFilter:
+    """
+    Bloom filter over the n-gram keys of a WARC.gz file. A key that was added is always found, while a key that was not
+    is only found if other keys happen to have set all of its bits. Filters of the same size built from different records
+    of the same file combine into the filter of all of those records by setting the bits set in either.
+    """
+    def __init__(self, size_bytes: int = 0, bits: bytes | None = None):
+        self.bits = bytearray(bits) if bits is not None else bytearray(size_bytes)
+        self.size_bits = len(self.bits) * 8
+
+
+    def get_bit_positions(self, key: int) -> list[int]:
+        """Returns the positions of the bits of a key, by double hashing."""
+        first_hash = ((key * FIRST_HASH_MULTIPLIER) & HASH_MASK) >> 32
+        second_hash = ((key * SECOND_HASH_MULTIPLIER) & HASH_MASK) >> 32 | 1
+        return [(first_hash + i * second_hash) % self.size_bits for i in range(BLOOM_HASH_FUNCTIONS)]
+
+
+    def add_keys(self, keys: Iterable[int]):
+        """Sets the bits of each key. The bit positions are computed inline, as a filter is built from millions of keys."""
+        bits = self.bits
+        size_bits = self.size_bits
+        for key in keys:
+            position = ((key * FIRST_HASH_MULTIPLIER) & HASH_MASK) >> 32
+            step = ((key * SECOND_HASH_MULTIPLIER) & HASH_MASK) >> 32 | 1
+            for _ in range(BLOOM_HASH_FUNCTIONS):
+                position %= size_bits
+                bits[position >> 3] |= 1 << (position & 7)
+                position += step
+
+
+    def contains_key(self, key: int) -> bool:
+        """Returns True if every bit of the key is set, meaning it was probably added, or False if it was certainly not added."""
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.get_bit_positions(key))
+
+
+    def may_match(self, ngram_query: NgramQuery) -> bool:
+        """Returns False if the filter rules out every record of its WARC.gz file meeting the query's requirements, or True otherwise."""
+        return all(
+            any(all(self.contains_key(key) for key in literal_keys) for literal_keys in alternatives)
+            for alternatives in ngram_query.requirements
+        )
+
+
+    def merge(self, other: 'BloomFilter'):
+        """Sets the bits set in another filter of the same size."""
+        self.bits = bytearray((int.from_bytes(self.bits, 'little') | int.from_bytes(other.bits, 'little')).to_bytes(len(self.bits), 'little'))
+
+
+    def get_fill_ratio(self) -> float:
+        """Returns the fraction of the bits that are set."""
+        return int.from_bytes(self.bits, 'little').bit_count() / self.size_bits if self.size_bits else 0.0
+
+
+def get_haystack_ngram_keys(haystack: bytes | str) -> set[int]:
+    """
+    Returns the keys of every n-gram in a lowercased haystack, as trigram_index.get_ngram_keys returns them. The haystack is read
+    as 4-byte words at each of the 4 offsets rather than sliced byte by byte, which would take most of the time of a first scan.
+    The keys of n-grams that are not ASCII are included, and left out when they are hashed into a filter.
+    """
+    if isinstance(haystack, str):
+        haystack = haystack.encode('utf-8')
+
+    keys = set()
+    for start in range(BLOOM_NGRAM_LENGTH):
+        words_length = (len(haystack) - start) // BLOOM_NGRAM_LENGTH * BLOOM_NGRAM_LENGTH
+        if words_length <= 0:
+            break
+        words = array('I', haystack[start:start + words_length])
+        if sys.byteorder == 'little':
+            words.byteswap()
+        keys.update(words)
+
+    return keys
+
+
+def get_bloom_sidecar_path(warc_gz_file_path: str) -> str:
+    """Returns the path of the Bloom filter sidecar of a WARC.gz file, which is kept next to it."""
+    return f"{warc_gz_file_path}{BLOOM_SIDECAR_EXTENSION}"
+
+
+def get_bloom_sidecar_header(archive_stat: os.stat_result, settings_fingerprint: str, filter_size_bytes: int) -> dict:
+    """Returns the header of a sidecar, identifying the version of the WARC.gz file, the settings and the filter size it was built for."""
+    return {
+        "version": BLOOM_SIDECAR_VERSION,
+        "size": archive_stat.st_size,
+        "mtime_ns": archive_stat.st_mtime_ns,
+        "settings_fingerprint": settings_fingerprint,
+        "filter_size_bytes": filter_size_bytes,
+        "ngram_length": BLOOM_NGRAM_LENGTH,
+        "hash_functions": BLOOM_HASH_FUNCTIONS,
+        # Revisit records are only searched when the payload digest cache is enabled
+        "revisit_records_read": config.settings["PAYLOAD_DIGEST_CACHE_ENTRIES"] is not None,
+    }
+
+
+def write_bloom_sidecar(warc_gz_file_path: str, bloom_filter: BloomFilter, archive_stat: os.stat_result, settings_fingerprint: str):
+    """Writes the sidecar of a WARC.gz file: a line holding its header, followed by the compressed filter. An existing sidecar is only replaced once the new one is written."""
+    sidecar_path = get_bloom_sidecar_path(warc_gz_file_path)
+    header = get_bloom_sidecar_header(archive_stat, settings_fingerprint, len(bloom_filter.bits))
+
+    temp_sidecar_path = f"{sidecar_path}.tmp"
+    with open(temp_sidecar_path, 'wb') as sidecar_file:
+        sidecar_file.write(json.dumps(header).encode('utf-8') + b'\n')
+        sidecar_file.write(zlib.compress(bloom_filter.bits))
+    os.replace(temp_sidecar_path, sidecar_path)
+
+
+def is_bloom_sidecar_header_current(header_line: bytes, warc_gz_file_path: str, settings_fingerprint: str, filter_size_bytes: int) -> bool:
+    """Returns True if a sidecar's header matches the WARC.gz file as it is now, the current settings and the filter size."""
+    return json.loads(header_line) == get_bloom_sidecar_header(os.stat(warc_gz_file_path), settings_fingerprint, filter_size_bytes)
+
+
+def is_bloom_sidecar_current(warc_gz_file_path: str, settings_fingerprint: str, filter_size_bytes: int) -> bool:
+    """Returns True if the WARC.gz file has a sidecar built since it last changed, with the current settings and filter size."""
+    try:
+        with open(get_bloom_sidecar_path(warc_gz_file_path), 'rb') as sidecar_file:
+            return is_bloom_sidecar_header_current(sidecar_file.readline(), warc_gz_file_path, settings_fingerprint, filter_size_bytes)
+    except (OSError, ValueError):
+        return False
+
+
+def load_bloom_sidecar(warc_gz_file_path: str, settings_fingerprint: str, filter_size_bytes: int) -> BloomFilter | None:
+    """
+    Returns the filter of a WARC.gz file's sidecar, or None if the file has no sidecar, changed since its sidecar was built,
+    or its sidecar was built with other settings or another filter size, or cannot be read.
+    """
+    try:
+        with open(get_bloom_sidecar_path(warc_gz_file_path), 'rb') as sidecar_file:
+            if not is_bloom_sidecar_header_current(sidecar_file.readline(), warc_gz_file_path, settings_fingerprint, filter_size_bytes):
+                return None
+            return BloomFilter(bits=zlib.decompress(sidecar_file.read()))
+    except (OSError, ValueError, zlib.error):
+        return None
+
+
+def skip_warc_gz_files_without_matches(warc_gz_files_list: list[str], results_and_regexes_dict: dict[str, re.Pattern],
+                                       filter_size_bytes: int) -> list[str]:
+    """
+    Returns the WARC.gz files that can contain a match of any of the definitions, leaving out those whose Bloom filter sidecar shows
+    that, for every definition, they lack the n-grams of literal text that each of its matches must contain. Files without a current
+    sidecar are kept. If any definition has no such literal text, every record could match it, so no file is left out.
+    """
+    ngram_queries = []
+    for results_file_path, regex in results_and_regexes_dict.items():
+        ngram_query = create_ngram_query(regex, get_definition_scope(results_file_path), BLOOM_NGRAM_LENGTH)
+        if ngram_query.is_unconstrained:
+            log_info(
+                f"The {get_definition_name(results_file_path)} definition has no literal text of at least {BLOOM_NGRAM_LENGTH} characters "
+                "that every match must contain, so the Bloom filter sidecars cannot rule out any WARC.gz file."
+            )
+            return warc_gz_files_list
+        ngram_queries.append(ngram_query)
+
+    settings_fingerprint = get_index_settings_fingerprint()
+    remaining_warc_gz_files_list = []
+    files_without_sidecar = 0
+
+    for warc_gz_file_path in warc_gz_files_list:
+        bloom_filter = load_bloom_sidecar(warc_gz_file_path, settings_fingerprint, filter_size_bytes)
+        if bloom_filter is None:
+            files_without_sidecar += 1
+            remaining_warc_gz_files_list.append(warc_gz_file_path)
+        elif any(bloom_filter.may_match(ngram_query) for ngram_query in ngram_queries):
+            remaining_warc_gz_files_list.append(warc_gz_file_path)
+
+    log_info(
+        f"Bloom filter sidecars: skipping {len(warc_gz_files_list) - len(remaining_warc_gz_files_list)} of {len(warc_gz_files_list)} "
+        "WARC.gz files, which cannot contain a match of any definition."
+    )
+    if files_without_sidecar > 0:
+        log_info(f"{files_without_sidecar} WARC.gz files have no Bloom filter sidecar built with the current settings and will be read in full.")
+
+    return remaining_warc_gz_files_list
+
+
+class BloomSidecarBuilder:
+    """
+    Builds the Bloom filter sidecars of the WARC.gz files that a search reads in full and that have no current sidecar,
+    from the n-grams of their records as the search worker processes search them, so the files are only read once.
+
+    The builder is created in the main process and handed to the search worker processes as they start. Each worker process
+    hashes the n-grams of the records it searches into a filter per WARC.gz file, writing a filter to the scratch directory
+    once it holds too many and when it finishes. Once the search has finished, the main process combines the filters
+    written for each WARC.gz file into its sidecar. No sidecar is written if an error was logged during the search,
+    since records that could not be read would be missing from the filters.
+
+    A revisit record can be given the matches of a payload stored in another WARC.gz file, so a file holding revisit records
+    gets a filter with every bit set, which never rules it out.
+    """
+    def __init__(self, warc_gz_files_list: list[str], filter_size_bytes: int):
+        self.filter_size_bytes = filter_size_bytes
+        self.settings_fingerprint = get_index_settings_fingerprint()
+        # The state of each file is taken before it is read, so a file that changes during the search gets a sidecar that is not current
+        self.archive_stats = {warc_gz_file_path: os.stat(warc_gz_file_path) for warc_gz_file_path in warc_gz_files_list}
+        self.archive_numbers = {warc_gz_file_path: archive_number for archive_number, warc_gz_file_path in enumerate(warc_gz_files_list)}
+        self.scratch_directory = tempfile.mkdtemp(prefix='warcsearcher_bloom_')
+        self.initial_error_count = logger.error_count
+
+        # State of the search worker process the builder is used in
+        self.filters: OrderedDict[str, BloomFilter] = OrderedDict()
+        self.pending_keys: dict[str, tuple[set[int], set[int]]] = {}
+        self.pending_keys_count = 0
+        self.revisit_archives: set[str] = set()
+
+
+    def exclude_archives(self, warc_gz_files_list: Iterable[str]):
+        """Stops building the sidecars of WARC.gz files that will not be read in full. Must be called before the search worker processes are started."""
+        for warc_gz_file_path in warc_gz_files_list:
+            self.archive_stats.pop(warc_gz_file_path, None)
+
+
+    def start_worker(self):
+        """Prepares the builder for use in a newly started search worker process."""
+        self.filters = OrderedDict()
+        self.pending_keys = {}
+        self.pending_keys_count = 0
+        self.revisit_archives = set()
+        self.initial_error_count = logger.error_count
+
+
+    def add_record(self, warc_record: WarcRecord):
+        """Adds the n-grams of a record that has been searched, whose HTTP payload has already been decoded if DECODE_HTTP_PAYLOADS is enabled."""
+        if warc_record.parent_warc_gz_file not in self.archive_stats:
+            return
+
+        keys = get_haystack_ngram_keys(lowercase_haystack(warc_record.name))
+        if config.settings["SEARCH_BINARY_FILES"] or not is_file_binary(warc_record.contents):
+            keys |= get_haystack_ngram_keys(get_contents_haystack(warc_record.contents, warc_record.charset))
+        self.add_keys(warc_record, keys)
+
+
+    def add_revisit_record(self, warc_record: WarcRecord):
+        """Records that the WARC.gz file of a revisit record holds revisit records, so its filter must never rule it out."""
+        if warc_record.parent_warc_gz_file in self.archive_stats:
+            self.revisit_archives.add(warc_record.parent_warc_gz_file)
+
+
+    def create_streamed_contents_keys(self, warc_record: StreamedWarcRecord) -> 'StreamedContentsKeys | None':
+        """Returns the collector for the n-gram keys of a streamed record's contents as they are searched, or None if its sidecar is not being built."""
+        if warc_record.parent_warc_gz_file not in self.archive_stats:
+            return None
+        return StreamedContentsKeys(warc_record.charset, BLOOM_NGRAM_LENGTH)
+
+
+    def add_streamed_record(self, warc_record: StreamedWarcRecord, streamed_contents_keys: 'StreamedContentsKeys'):
+        """Adds the n-grams of a streamed record that has been searched, with those of its contents collected while it was read."""
+        self.add_keys(warc_record, get_haystack_ngram_keys(lowercase_haystack(warc_record.name)) | streamed_contents_keys.ngrams)
+
+
+    def add_keys(self, warc_record: WarcRecord | StreamedWarcRecord, keys: set[int]):
+        """Collects the n-gram keys of a record and of its HTTP headers, hashing the collected keys into the filters once there are too many."""
+        headers_keys = get_haystack_ngram_keys(get_headers_haystack(warc_record.http_headers)) if warc_record.http_headers else set()
+
+        pending_keys, pending_headers_keys = self.pending_keys.setdefault(warc_record.parent_warc_gz_file, (set(), set()))
+        pending_keys |= keys
+        pending_headers_keys |= headers_keys
+
+        self.pending_keys_count += len(keys) + len(headers_keys)
+        if self.pending_keys_count >= MAX_PENDING_KEYS:
+            self.flush_pending_keys()
+
+
+    def flush_pending_keys(self):
+        """Hashes the collected keys of ASCII n-grams into the filters of their WARC.gz files."""
+        for warc_gz_file_path, (pending_keys, pending_headers_keys) in self.pending_keys.items():
+            bloom_filter = self.get_filter(warc_gz_file_path)
+            bloom_filter.add_keys(key for key in pending_keys if not key & NON_ASCII_KEY_MASK)
+            bloom_filter.add_keys(HEADERS_NGRAM_OFFSET + key for key in pending_headers_keys if not key & NON_ASCII_KEY_MASK)
+
+        self.pending_keys = {}
+        self.pending_keys_count = 0
+
+
+    def get_filter(self, warc_gz_file_path: str) -> BloomFilter:
+        """Returns the worker process' filter of the WARC.gz file, writing out the least recently used filter if too many are held."""
+        if warc_gz_file_path in self.filters:
+            self.filters.move_to_end(warc_gz_file_path)
+            return self.filters[warc_gz_file_path]
+
+        if len(self.filters) >= MAX_WORKER_FILTERS:
+            self.write_partial_filter(*self.filters.popitem(last=False))
+
+        bloom_filter = self.filters[warc_gz_file_path] = BloomFilter(self.filter_size_bytes)
+        return bloom_filter
+
+
+    def write_partial_filter(self, warc_gz_file_path: str, bloom_filter: BloomFilter):
+        """Writes a filter built from part of the records of the WARC.gz file to the file's folder in the scratch directory."""
+        archive_directory = os.path.join(self.scratch_directory, str(self.archive_numbers[warc_gz_file_path]))
+        os.makedirs(archive_directory, exist_ok=True)
+
+        partial_filter_descriptor, _ = tempfile.mkstemp(suffix=BLOOM_SIDECAR_EXTENSION, dir=archive_directory)
+        with os.fdopen(partial_filter_descriptor, 'wb') as partial_filter_file:
+            partial_filter_file.write(bloom_filter.bits)
+
+
+    def finish_worker(self):
+        """Writes out every filter of the search worker process, and records whether it logged an error while searching."""
+        self.flush_pending_keys()
+        while self.filters:
+            self.write_partial_filter(*self.filters.popitem(last=False))
+
+        for warc_gz_file_path in self.revisit_archives:
+            open(os.path.join(self.scratch_directory, f"{self.archive_numbers[warc_gz_file_path]}.revisits"), 'w').close()
+
+        if logger.error_count > self.initial_error_count:
+            open(os.path.join(self.scratch_directory, f"{os.getpid()}.errors"), 'w').close()
+
+
+    def write_sidecars(self, search_succeeded: bool):
+        """
+        Combines the filters the search worker processes wrote for each WARC.gz file and writes its sidecar, unless a search worker process
+        failed or an error was logged during the search. A file without any filter had no records to search, and gets an empty one.
+        The scratch directory is removed afterwards.
+        """
+        try:
+            if not search_succeeded or logger.error_count > self.initial_error_count or glob.glob(os.path.join(self.scratch_directory, '*.errors')):
+                log_warning("Errors occurred during the search, so no Bloom filter sidecars were written. They will be built by the next search.")
+                return
+
+            sidecars_written = 0
+            saturated_sidecars = 0
+            for warc_gz_file_path, archive_stat in self.archive_stats.items():
+                archive_directory = os.path.join(self.scratch_directory, str(self.archive_numbers[warc_gz_file_path]))
+                if os.path.exists(f"{archive_directory}.revisits"):
+                    bloom_filter = BloomFilter(bits=b'\xff' * self.filter_size_bytes)
+                else:
+                    bloom_filter = BloomFilter(self.filter_size_bytes)
+                    for partial_filter_path in glob.glob(os.path.join(archive_directory, f"*{BLOOM_SIDECAR_EXTENSION}")):
+                        with open(partial_filter_path, 'rb') as partial_filter_file:
+                            bloom_filter.merge(BloomFilter(bits=partial_filter_file.read()))
+
+                try:
+                    write_bloom_sidecar(warc_gz_file_path, bloom_filter, archive_stat, self.settings_fingerprint)
+                except OSError as e:
+                    log_warning(f"The Bloom filter sidecar of {os.path.basename(warc_gz_file_path)} could not be written: {e}")
+                    continue
+
+                sidecars_written += 1
+                if bloom_filter.get_fill_ratio() > MAX_USEFUL_FILL_RATIO and not os.path.exists(f"{archive_directory}.revisits"):
+                    saturated_sidecars += 1
+
+            log_info(f"Wrote Bloom filter sidecars for {sidecars_written} WARC.gz files.")
+            if saturated_sidecars > 0:
+                log_warning(
+                    f"{saturated_sidecars} Bloom filter sidecars have more than half of their bits set, so they can rarely rule out their WARC.gz files. "
+                    "Consider increasing BLOOM_FILTER_SIDECAR_KB."
+                )
+        finally:
+            shutil.rmtree(self.scratch_directory, ignore_errors=True)
+
+
+class StreamedContentsKeys(StreamedContentsNgrams):
+    """Collects the n-gram keys of the contents of a streamed record, rather than the n-grams themselves."""
+    def get_haystack_ngrams(self, haystack: bytes | str) -> set[int]:
+        return get_haystack_ngram_keys(haystack)
@@ -0,0 +1,171 @@
+import re
+from re import _constants as regex_constants
+from re import _parser as regex_parser
+
+from utilities import find_regex_matches
+
+GROUP_REFERENCE_OPCODES = (regex_constants.GROUPREF, regex_constants.GROUPREF_EXISTS)
+
+
+class CombinedMatcher:
+    """
+    Finds the matches of every regex definition with a single scan of the input string.
+
+    The definition regexes are combined into one regex made of a lookahead per definition, each capturing into its own group.
+    At every position where at least one definition matches, the group of each definition holds exactly the match its own
+    regex would find at that position. Keeping only the matches that start after the previous match of the same definition
+    reproduces the non-overlapping matches of running finditer() with each regex separately, so the results are identical.
+
+    Positions where no definition can match are skipped by a leading lookahead. The literal text each definition starts with
+    is merged into a trie shaped alternation, so most positions are rejected after comparing a single character instead of
+    trying every definition in turn. Definitions that do not start with literal text are tried in full by that lookahead.
+
+    Regexes that cannot be combined without changing their matches are searched separately: regexes with backreferences or
+    named groups, whose group numbers or names would clash, regexes that can match an empty string, and regexes whose flags
+    differ from the combined regex.
+    """
+    def __init__(self, results_and_regexes_dict: dict[str, re.Pattern]):
+        self.results_file_paths = list(results_and_regexes_dict.keys())
+        self.combined_results_file_paths: list[str] = []
+        self.separate_regexes_dict: dict[str, re.Pattern] = {}
+
+        combined_flags = None
+        for results_file_path, regex in results_and_regexes_dict.items():
+            if combined_flags is None and can_combine_regex(regex):
+                combined_flags = regex.flags
+
+            if regex.flags == combined_flags and can_combine_regex(regex):
+                self.combined_results_file_paths.append(results_file_path)
+            else:
+                self.separate_regexes_dict[results_file_path] = regex
+
+        self.combined_regex = None
+        self.combined_group_indexes: list[int] = []
+        if self.combined_results_file_paths:
+            combined_regexes = [results_and_regexes_dict[path] for path in self.combined_results_file_paths]
+            self.combined_regex = compile_combined_regex(combined_regexes, combined_flags)
+            self.combined_group_indexes = [
+                self.combined_regex.groupindex[f"definition{index}"] for index in range(len(combined_regexes))
+            ]
+
+
+    def find_matches(self, input_string: str) -> dict[str, list[str]]:
+        """Returns the list of matches of each regex definition in the input string, keyed by results file path."""
+        matches_dict = {results_file_path: [] for results_file_path in self.results_file_paths}
+
+        if self.combined_regex is not None:
+            self.find_combined_matches(input_string, matches_dict)
+
+        for results_file_path, regex in self.separate_regexes_dict.items():
+            matches_dict[results_file_path] = find_regex_matches(input_string, regex)
+
+        return matches_dict
+
+
+    def find_combined_matches(self, input_string: str, matches_dict: dict[str, list[str]]):
+        """Scans the input string once with the combined regex and adds the matches of each combined definition to the matches dictionary."""
+        definitions = list(zip(self.combined_results_file_paths, self.combined_group_indexes))
+        last_match_ends = [0] * len(definitions)
+
+        for match in self.combined_regex.finditer(input_string):
+            group_spans = match.regs
+            for definition_index, (results_file_path, group_index) in enumerate(definitions):
+                match_start, match_end = group_spans[group_index]
+                # A match starting inside the previous match of the same definition would not be found by finditer()
+                if match_start != -1 and match_start >= last_match_ends[definition_index]:
+                    matches_dict[results_file_path].append(input_string[match_start:match_end])
+                    last_match_ends[definition_index] = match_end
+
+
+def can_combine_regex(regex: re.Pattern) -> bool:
+    """Returns True if the regex can be part of a combined regex while still finding exactly the same matches."""
+    if regex.groupindex:
+        return False
+
+    try:
+        parsed_regex = regex_parser.parse(regex.pattern, regex.flags)
+        # Global inline flags, such as (?s), are only valid at the start of a regex and fail to compile once wrapped
+        compile_combined_regex([regex], regex.flags)
+    except (re.error, TypeError, ValueError):
+        return False
+
+    # After an empty match finditer() moves forward differently than a lookahead can, so empty matches must be impossible
+    return parsed_regex.getwidth()[0] > 0 and not contains_group_reference(parsed_regex)
+
+
+def contains_group_reference(parsed_node) -> bool:
+    """Returns True if the parsed regex, or any regex nested in it, refers back to a group by its number."""
+    if isinstance(parsed_node, regex_parser.SubPattern):
+        parsed_node = parsed_node.data
+
+    if not isinstance(parsed_node, (list, tuple)):
+        return False
+
+    if len(parsed_node) == 2 and parsed_node[0] in GROUP_REFERENCE_OPCODES:
+        return True
+
+    return any(contains_group_reference(child_node) for child_node in parsed_node)
+
+
+def compile_combined_regex(regexes: list[re.Pattern], flags: int) -> re.Pattern:
+    """
+    Compiles the regexes into a single regex that only matches, with an empty match, at positions where any of them may match.
+    The match of each regex at that position is captured by a group named definition<index>, or left unset if it does not match there.
+    """
+    literal_prefixes = []
+    regexes_without_prefix = []
+    for regex in regexes:
+        literal_prefix = get_literal_prefix(regex_parser.parse(regex.pattern, flags))
+        if literal_prefix:
+            literal_prefixes.append(literal_prefix)
+        else:
+            regexes_without_prefix.append(regex)
+
+    candidate_alternatives = [f"(?:{regex.pattern})" for regex in regexes_without_prefix]
+    if literal_prefixes:
+        candidate_alternatives.insert(0, compile_literal_prefixes_trie(literal_prefixes, bool(flags & re.IGNORECASE)))
+
+    candidate_lookahead = "(?=" + "|".join(candidate_alternatives) + ")"
+    definition_lookaheads = "".join(
+        f"(?:(?=(?P<definition{index}>(?:{regex.pattern}))))?" for index, regex in enumerate(regexes)
+    )
+    return re.compile(candidate_lookahead + definition_lookaheads, flags)
+
+
+def get_literal_prefix(parsed_regex: regex_parser.SubPattern) -> str:
+    """Returns the literal text that every match of the parsed regex starts with, or an empty string if there is none."""
+    literal_prefix = []
+    for opcode, argument in parsed_regex.data:
+        if opcode is not regex_constants.LITERAL:
+            break
+        literal_prefix.append(chr(argument))
+
+    return "".join(literal_prefix)
+
+
+def compile_literal_prefixes_trie(literal_prefixes: list[str], ignore_case: bool) -> str:
+    """
+    Returns a regex matching any of the literal prefixes, with common leading characters merged so each character is only compared once.
+    A prefix that starts another prefix is enough on its own, so the longer one is dropped. ASCII letters are lowercased
+    when the combined regex ignores case, which merges their branches without changing what they match.
+    """
+    trie = {}
+    for literal_prefix in literal_prefixes:
+        node = trie
+        for character in literal_prefix:
+            if ignore_case and character.isascii():
+                character = character.lower()
+            node = node.setdefault(character, {})
+        node[None] = True
+
+    return compile_trie_node(trie)
+
+
+def compile_trie_node(node: dict) -> str:
+    """Returns the regex alternation matching the branches below a trie node."""
+    if None in node:
+        # A prefix ends at this node, so nothing more needs to be matched.
+        return ""
+
+    alternatives = [re.escape(character) + compile_trie_node(child_node) for character, child_node in sorted(node.items())]
+    return alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
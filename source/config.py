@@ -1,9 +1,12 @@
 import configparser
+import datetime
 import glob
 import os
+import re
 import sys
 
 from logger import *
+from zip_compression import parse_zip_compression
 
 settings = {
     "WARC_GZ_ARCHIVES_DIRECTORY": '',
@@ -13,6 +16,46 @@ settings = {
     "MAX_CONCURRENT_SEARCH_PROCESSES": None,
     "MAX_RAM_USAGE_PERCENT": 90,
     "SEARCH_BINARY_FILES": False,
+    "SEARCH_PIPELINE_MODE": 'queue',
+    "SEARCH_QUEUE_TRANSPORT": 'manager',
+    "SHARED_MEMORY_SLOT_COUNT": 256,
+    "SHARED_MEMORY_SLOT_SIZE_KB": 256,
+    "SEARCH_BATCH_MAX_RECORDS": 1,
+    "SEARCH_BATCH_MAX_KB": 1024,
+    "SEARCH_BATCH_FLUSH_TIMEOUT_SECONDS": 1.0,
+    "SEARCH_QUEUE_MAX_IN_FLIGHT_KB": None,
+    "SEARCH_QUEUE_SPILL_DIRECTORY": None,
+    "SEARCH_QUEUE_SPILL_SEGMENT_KB": 65536,
+    "IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT": None,
+    "SEARCH_PROCESS_AUTOSCALING": False,
+    "SEARCH_PROCESS_AUTOSCALING_MIN_PROCESSES": 1,
+    "REGEX_MATCHING_MODE": 'separate',
+    "LITERAL_PREFILTER": False,
+    "CONTENTS_SEARCH_MODE": 'text',
+    "DETECT_CONTENTS_CHARSET": False,
+    "DECODE_HTTP_PAYLOADS": False,
+    "STREAMING_SEARCH_THRESHOLD_KB": None,
+    "STREAMING_CHUNK_SIZE_KB": 4096,
+    "STREAMING_OVERLAP_KB": 64,
+    "INCREMENTAL_SEARCH": False,
+    "CHECKPOINT_INTERVAL_SECONDS": None,
+    "TRIGRAM_INDEX_DIRECTORY": None,
+    "BLOOM_FILTER_SIDECAR_KB": None,
+    "PAYLOAD_DIGEST_CACHE_ENTRIES": None,
+    "MATCH_MEMO": False,
+    "ZIP_COMPRESSION": 'deflate',
+    "ZIP_COMPRESSION_BY_DEFINITION": None,
+    "ZIP_STORE_COMPRESSED_FORMATS": False,
+    "EXTRACTION_MODE": 'zip',
+    "FILTER_HTTP_STATUS_CODES": None,
+    "FILTER_CONTENT_TYPES_ALLOWED": None,
+    "FILTER_CONTENT_TYPES_DENIED": None,
+    "FILTER_MIN_CONTENT_LENGTH_KB": None,
+    "FILTER_MAX_CONTENT_LENGTH_KB": None,
+    "FILTER_WARC_DATE_FROM": None,
+    "FILTER_WARC_DATE_TO": None,
+    "FILTER_URI_INCLUDE_REGEX": None,
+    "FILTER_URI_EXCLUDE_REGEX": None,
 }
 
 
@@ -26,7 +69,9 @@ def read_config_ini_variables():
     try:
         read_required_config_ini_variables(parser)
         read_optional_config_ini_variables(parser)
-        
+        read_performance_config_ini_variables(parser)
+        read_filters_config_ini_variables(parser)
+
     except Exception as e:
         log_error(f"Error reading the contents of the config.ini file: \n{e}")
         sys.exit()
@@ -57,6 +102,191 @@ def read_optional_config_ini_variables(parser: configparser.ConfigParser):
     settings["SEARCH_BINARY_FILES"] = parser.getboolean('OPTIONAL', 'SEARCH_BINARY_FILES')
 
 
+def read_performance_config_ini_variables(parser: configparser.ConfigParser):
+    """
+    Reads the performance tuning variables from the config.ini file and sets them in the global config settings dictionary.
+    The PERFORMANCE section and every variable in it may be omitted, in which case the defaults are kept.
+    """
+    parsed_search_pipeline_mode = get_performance_config_ini_variable(parser, 'SEARCH_PIPELINE_MODE').lower()
+    settings["SEARCH_PIPELINE_MODE"] = validate_and_get_option(
+        parsed_search_pipeline_mode, 'SEARCH_PIPELINE_MODE', ('queue', 'fused', 'offset'), 'queue'
+    )
+
+    parsed_search_queue_transport = get_performance_config_ini_variable(parser, 'SEARCH_QUEUE_TRANSPORT').lower()
+    settings["SEARCH_QUEUE_TRANSPORT"] = validate_and_get_option(
+        parsed_search_queue_transport, 'SEARCH_QUEUE_TRANSPORT', ('manager', 'shared_memory'), 'manager'
+    )
+
+    parsed_shared_memory_slot_count = get_performance_config_ini_variable(parser, 'SHARED_MEMORY_SLOT_COUNT')
+    settings["SHARED_MEMORY_SLOT_COUNT"] = validate_and_get_positive_integer(
+        parsed_shared_memory_slot_count, 'SHARED_MEMORY_SLOT_COUNT', 256
+    )
+
+    parsed_shared_memory_slot_size_kb = get_performance_config_ini_variable(parser, 'SHARED_MEMORY_SLOT_SIZE_KB')
+    settings["SHARED_MEMORY_SLOT_SIZE_KB"] = validate_and_get_positive_integer(
+        parsed_shared_memory_slot_size_kb, 'SHARED_MEMORY_SLOT_SIZE_KB', 256
+    )
+
+    parsed_search_batch_max_records = get_performance_config_ini_variable(parser, 'SEARCH_BATCH_MAX_RECORDS')
+    settings["SEARCH_BATCH_MAX_RECORDS"] = validate_and_get_positive_integer(
+        parsed_search_batch_max_records, 'SEARCH_BATCH_MAX_RECORDS', 1
+    )
+
+    parsed_search_batch_max_kb = get_performance_config_ini_variable(parser, 'SEARCH_BATCH_MAX_KB')
+    settings["SEARCH_BATCH_MAX_KB"] = validate_and_get_positive_integer(
+        parsed_search_batch_max_kb, 'SEARCH_BATCH_MAX_KB', 1024
+    )
+
+    parsed_search_batch_flush_timeout_seconds = get_performance_config_ini_variable(parser, 'SEARCH_BATCH_FLUSH_TIMEOUT_SECONDS')
+    settings["SEARCH_BATCH_FLUSH_TIMEOUT_SECONDS"] = validate_and_get_positive_float(
+        parsed_search_batch_flush_timeout_seconds, 'SEARCH_BATCH_FLUSH_TIMEOUT_SECONDS', 1.0
+    )
+
+    parsed_search_queue_max_in_flight_kb = get_performance_config_ini_variable(parser, 'SEARCH_QUEUE_MAX_IN_FLIGHT_KB')
+    settings["SEARCH_QUEUE_MAX_IN_FLIGHT_KB"] = (
+        None if parsed_search_queue_max_in_flight_kb.lower() in ("none", "", "0")
+        else validate_and_get_positive_integer(parsed_search_queue_max_in_flight_kb, 'SEARCH_QUEUE_MAX_IN_FLIGHT_KB', None)
+    )
+
+    parsed_search_queue_spill_directory = get_performance_config_ini_variable(parser, 'SEARCH_QUEUE_SPILL_DIRECTORY')
+    settings["SEARCH_QUEUE_SPILL_DIRECTORY"] = (
+        None if parsed_search_queue_spill_directory.lower() == "none" else parsed_search_queue_spill_directory
+    )
+
+    parsed_search_queue_spill_segment_kb = get_performance_config_ini_variable(parser, 'SEARCH_QUEUE_SPILL_SEGMENT_KB')
+    settings["SEARCH_QUEUE_SPILL_SEGMENT_KB"] = validate_and_get_positive_integer(
+        parsed_search_queue_spill_segment_kb, 'SEARCH_QUEUE_SPILL_SEGMENT_KB', 65536
+    )
+
+    parsed_in_flight_compression_threshold_percent = get_performance_config_ini_variable(parser, 'IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT')
+    settings["IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT"] = (
+        None if parsed_in_flight_compression_threshold_percent.lower() == "none"
+        else validate_and_get_percent(parsed_in_flight_compression_threshold_percent, 'IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT', None)
+    )
+
+    parsed_search_process_autoscaling = get_performance_config_ini_variable(parser, 'SEARCH_PROCESS_AUTOSCALING')
+    settings["SEARCH_PROCESS_AUTOSCALING"] = validate_and_get_boolean(parsed_search_process_autoscaling, 'SEARCH_PROCESS_AUTOSCALING', False)
+
+    parsed_search_process_autoscaling_min_processes = get_performance_config_ini_variable(parser, 'SEARCH_PROCESS_AUTOSCALING_MIN_PROCESSES')
+    settings["SEARCH_PROCESS_AUTOSCALING_MIN_PROCESSES"] = validate_and_get_positive_integer(
+        parsed_search_process_autoscaling_min_processes, 'SEARCH_PROCESS_AUTOSCALING_MIN_PROCESSES', 1
+    )
+
+    parsed_regex_matching_mode = get_performance_config_ini_variable(parser, 'REGEX_MATCHING_MODE').lower()
+    settings["REGEX_MATCHING_MODE"] = validate_and_get_option(
+        parsed_regex_matching_mode, 'REGEX_MATCHING_MODE', ('separate', 'combined'), 'separate'
+    )
+
+    parsed_literal_prefilter = get_performance_config_ini_variable(parser, 'LITERAL_PREFILTER')
+    settings["LITERAL_PREFILTER"] = validate_and_get_boolean(parsed_literal_prefilter, 'LITERAL_PREFILTER', False)
+
+    parsed_contents_search_mode = get_performance_config_ini_variable(parser, 'CONTENTS_SEARCH_MODE').lower()
+    settings["CONTENTS_SEARCH_MODE"] = validate_and_get_option(
+        parsed_contents_search_mode, 'CONTENTS_SEARCH_MODE', ('text', 'bytes'), 'text'
+    )
+
+    parsed_detect_contents_charset = get_performance_config_ini_variable(parser, 'DETECT_CONTENTS_CHARSET')
+    settings["DETECT_CONTENTS_CHARSET"] = validate_and_get_boolean(parsed_detect_contents_charset, 'DETECT_CONTENTS_CHARSET', False)
+
+    parsed_decode_http_payloads = get_performance_config_ini_variable(parser, 'DECODE_HTTP_PAYLOADS')
+    settings["DECODE_HTTP_PAYLOADS"] = validate_and_get_boolean(parsed_decode_http_payloads, 'DECODE_HTTP_PAYLOADS', False)
+
+    parsed_streaming_search_threshold_kb = get_performance_config_ini_variable(parser, 'STREAMING_SEARCH_THRESHOLD_KB')
+    settings["STREAMING_SEARCH_THRESHOLD_KB"] = (
+        None if parsed_streaming_search_threshold_kb.lower() == "none"
+        else validate_and_get_positive_integer(parsed_streaming_search_threshold_kb, 'STREAMING_SEARCH_THRESHOLD_KB', None)
+    )
+
+    parsed_streaming_chunk_size_kb = get_performance_config_ini_variable(parser, 'STREAMING_CHUNK_SIZE_KB')
+    settings["STREAMING_CHUNK_SIZE_KB"] = validate_and_get_positive_integer(
+        parsed_streaming_chunk_size_kb, 'STREAMING_CHUNK_SIZE_KB', 4096
+    )
+
+    parsed_streaming_overlap_kb = get_performance_config_ini_variable(parser, 'STREAMING_OVERLAP_KB')
+    settings["STREAMING_OVERLAP_KB"] = validate_and_get_positive_integer(
+        parsed_streaming_overlap_kb, 'STREAMING_OVERLAP_KB', 64
+    )
+
+    parsed_incremental_search = get_performance_config_ini_variable(parser, 'INCREMENTAL_SEARCH')
+    settings["INCREMENTAL_SEARCH"] = validate_and_get_boolean(parsed_incremental_search, 'INCREMENTAL_SEARCH', False)
+
+    parsed_checkpoint_interval_seconds = get_performance_config_ini_variable(parser, 'CHECKPOINT_INTERVAL_SECONDS')
+    settings["CHECKPOINT_INTERVAL_SECONDS"] = (
+        None if parsed_checkpoint_interval_seconds.lower() == "none"
+        else validate_and_get_positive_float(parsed_checkpoint_interval_seconds, 'CHECKPOINT_INTERVAL_SECONDS', None)
+    )
+
+    parsed_trigram_index_directory = get_performance_config_ini_variable(parser, 'TRIGRAM_INDEX_DIRECTORY')
+    settings["TRIGRAM_INDEX_DIRECTORY"] = None if parsed_trigram_index_directory.lower() == "none" else parsed_trigram_index_directory
+
+    parsed_bloom_filter_sidecar_kb = get_performance_config_ini_variable(parser, 'BLOOM_FILTER_SIDECAR_KB')
+    settings["BLOOM_FILTER_SIDECAR_KB"] = (
+        None if parsed_bloom_filter_sidecar_kb.lower() == "none"
+        else validate_and_get_positive_integer(parsed_bloom_filter_sidecar_kb, 'BLOOM_FILTER_SIDECAR_KB', None)
+    )
+
+    parsed_payload_digest_cache_entries = get_performance_config_ini_variable(parser, 'PAYLOAD_DIGEST_CACHE_ENTRIES')
+    settings["PAYLOAD_DIGEST_CACHE_ENTRIES"] = (
+        None if parsed_payload_digest_cache_entries.lower() == "none"
+        else validate_and_get_positive_integer(parsed_payload_digest_cache_entries, 'PAYLOAD_DIGEST_CACHE_ENTRIES', None)
+    )
+
+    parsed_match_memo = get_performance_config_ini_variable(parser, 'MATCH_MEMO')
+    settings["MATCH_MEMO"] = validate_and_get_boolean(parsed_match_memo, 'MATCH_MEMO', False)
+
+    parsed_zip_compression = get_performance_config_ini_variable(parser, 'ZIP_COMPRESSION')
+    settings["ZIP_COMPRESSION"] = validate_and_get_zip_compression(parsed_zip_compression, 'ZIP_COMPRESSION', 'deflate')
+
+    parsed_zip_compression_by_definition = get_performance_config_ini_variable(parser, 'ZIP_COMPRESSION_BY_DEFINITION')
+    settings["ZIP_COMPRESSION_BY_DEFINITION"] = validate_and_get_zip_compression_by_definition(parsed_zip_compression_by_definition)
+
+    parsed_zip_store_compressed_formats = get_performance_config_ini_variable(parser, 'ZIP_STORE_COMPRESSED_FORMATS')
+    settings["ZIP_STORE_COMPRESSED_FORMATS"] = validate_and_get_boolean(parsed_zip_store_compressed_formats, 'ZIP_STORE_COMPRESSED_FORMATS', False)
+
+    parsed_extraction_mode = get_performance_config_ini_variable(parser, 'EXTRACTION_MODE').lower()
+    settings["EXTRACTION_MODE"] = validate_and_get_option(parsed_extraction_mode, 'EXTRACTION_MODE', ('zip', 'blob_store', 'warc_gz', 'deferred'), 'zip')
+
+
+def read_filters_config_ini_variables(parser: configparser.ConfigParser):
+    """
+    Reads the record filter variables from the config.ini file and sets them in the global config settings dictionary.
+    The FILTERS section and every variable in it may be omitted, and a variable set to None does not filter records.
+    """
+    settings["FILTER_HTTP_STATUS_CODES"] = validate_and_get_status_code_ranges(
+        get_filters_config_ini_variable(parser, 'FILTER_HTTP_STATUS_CODES'), 'FILTER_HTTP_STATUS_CODES'
+    )
+
+    for variable_name in ('FILTER_CONTENT_TYPES_ALLOWED', 'FILTER_CONTENT_TYPES_DENIED'):
+        settings[variable_name] = validate_and_get_content_types(get_filters_config_ini_variable(parser, variable_name))
+
+    for variable_name in ('FILTER_MIN_CONTENT_LENGTH_KB', 'FILTER_MAX_CONTENT_LENGTH_KB'):
+        parsed_content_length_kb = get_filters_config_ini_variable(parser, variable_name)
+        settings[variable_name] = (
+            None if parsed_content_length_kb.lower() == "none" 
+            else validate_and_get_positive_integer(parsed_content_length_kb, variable_name, None)
+        )
+
+    settings["FILTER_WARC_DATE_FROM"] = validate_and_get_date(
+        get_filters_config_ini_variable(parser, 'FILTER_WARC_DATE_FROM'), 'FILTER_WARC_DATE_FROM', end_of_day=False
+    )
+    settings["FILTER_WARC_DATE_TO"] = validate_and_get_date(
+        get_filters_config_ini_variable(parser, 'FILTER_WARC_DATE_TO'), 'FILTER_WARC_DATE_TO', end_of_day=True
+    )
+
+    for variable_name in ('FILTER_URI_INCLUDE_REGEX', 'FILTER_URI_EXCLUDE_REGEX'):
+        settings[variable_name] = validate_and_get_regex(get_filters_config_ini_variable(parser, variable_name), variable_name)
+
+
+def get_filters_config_ini_variable(parser: configparser.ConfigParser, variable_name: str) -> str:
+    """Returns the raw value of a variable in the FILTERS section, or None as a string if it is not present."""
+    return parser.get('FILTERS', variable_name, fallback='None').strip()
+
+
+def get_performance_config_ini_variable(parser: configparser.ConfigParser, variable_name: str) -> str:
+    """Returns the raw value of a variable in the PERFORMANCE section, or the current setting as a string if it is not present."""
+    return parser.get('PERFORMANCE', variable_name, fallback=str(settings[variable_name]))
+
+
 def validate_and_get_config_ini_path() -> str:
     """Validates and returns the path to the config.ini file. It must exist in the current working directory or its parent."""
     if os.path.isfile('config.ini'):
@@ -158,4 +388,198 @@ def validate_and_get_max_ram_usage_percent(parsed_max_ram_usage_percent: str) ->
         )
         max_ram_usage_percent = 90
 
-    return max_ram_usage_percent
\ No newline at end of file
+    return max_ram_usage_percent
+
+
+def validate_and_get_option(parsed_value: str, variable_name: str, options: tuple[str, ...], default: str) -> str:
+    """
+    Validates and returns a config.ini value that must be one of a fixed set of options.
+    If invalid, it defaults to the provided default option.
+    """
+    if parsed_value in options:
+        return parsed_value
+
+    log_warning(
+        f"Invalid value for {variable_name} in config.ini: {parsed_value}. "
+        f"Expected one of: {', '.join(options)}. Defaulting to {default}."
+    )
+    return default
+
+
+def validate_and_get_positive_integer(parsed_value: str, variable_name: str, default: int) -> int:
+    """
+    Validates and returns a config.ini value that must be a positive integer.
+    If invalid, it defaults to the provided default value.
+    """
+    try:
+        value = int(parsed_value)
+
+        if value <= 0:
+            raise ValueError()
+
+    except ValueError:
+        log_warning(f"Invalid value for {variable_name} in config.ini: {parsed_value}. Defaulting to {default}.")
+        value = default
+
+    return value
+
+
+def validate_and_get_positive_float(parsed_value: str, variable_name: str, default: float) -> float:
+    """
+    Validates and returns a config.ini value that must be a positive number.
+    If invalid, it defaults to the provided default value.
+    """
+    try:
+        value = float(parsed_value)
+
+        if value <= 0:
+            raise ValueError()
+
+    except ValueError:
+        log_warning(f"Invalid value for {variable_name} in config.ini: {parsed_value}. Defaulting to {default}.")
+        value = default
+
+    return value
+
+
+def validate_and_get_percent(parsed_value: str, variable_name: str, default: int) -> int:
+    """
+    Validates and returns a config.ini value that must be a whole percentage from 0 to 100.
+    If invalid, it defaults to the provided default value.
+    """
+    try:
+        value = int(parsed_value)
+
+        if value < 0 or value > 100:
+            raise ValueError()
+
+    except ValueError:
+        log_warning(f"Invalid value for {variable_name} in config.ini: {parsed_value}. Defaulting to {default}.")
+        value = default
+
+    return value
+
+
+def validate_and_get_boolean(parsed_value: str, variable_name: str, default: bool) -> bool:
+    """
+    Validates and returns a config.ini value that must be a boolean, accepting the same values as ConfigParser.getboolean.
+    If invalid, it defaults to the provided default value.
+    """
+    boolean_states = configparser.ConfigParser.BOOLEAN_STATES
+    if parsed_value.lower() in boolean_states:
+        return boolean_states[parsed_value.lower()]
+
+    log_warning(f"Invalid value for {variable_name} in config.ini: {parsed_value}. Defaulting to {default}.")
+    return default
+
+
+def validate_and_get_zip_compression(parsed_value: str, variable_name: str, default: str) -> str:
+    """
+    Validates and returns a config.ini value naming a zip compression method, optionally followed by a compression level, such as deflate:9.
+    If invalid, it defaults to the provided default value.
+    """
+    try:
+        parse_zip_compression(parsed_value)
+    except ValueError:
+        log_warning(
+            f"Invalid value for {variable_name} in config.ini: {parsed_value}. "
+            f"Expected one of stored, deflate, bzip2 or lzma, optionally followed by a level such as deflate:9. Defaulting to {default}."
+        )
+        return default
+
+    return parsed_value.strip().lower()
+
+
+def validate_and_get_zip_compression_by_definition(parsed_value: str) -> dict[str, str] | None:
+    """
+    Validates and returns a config.ini value listing definitions and the zip compression to use for them, such as secrets=lzma, pages=deflate:9,
+    as a dictionary of lowercase definition names. Returns None if the value is None. Invalid entries are left out, so their definitions use ZIP_COMPRESSION.
+    """
+    if parsed_value.lower() == "none":
+        return None
+
+    compression_by_definition = {}
+    for entry in parsed_value.split(','):
+        definition_name, _, compression = entry.partition('=')
+        try:
+            if not definition_name.strip():
+                raise ValueError()
+            parse_zip_compression(compression)
+        except ValueError:
+            log_warning(f"Invalid entry for ZIP_COMPRESSION_BY_DEFINITION in config.ini: {entry.strip()}. Its definition will use ZIP_COMPRESSION.")
+            continue
+
+        compression_by_definition[definition_name.strip().lower()] = compression.strip().lower()
+
+    return compression_by_definition
+
+
+def validate_and_get_status_code_ranges(parsed_value: str, variable_name: str) -> list[tuple[int, int]] | None:
+    """
+    Validates and returns a config.ini value listing HTTP status codes and inclusive ranges of them, such as 200, 300-399.
+    Returns None if the value is None, or if it is invalid, in which case records are not filtered by their status code.
+    """
+    if parsed_value.lower() == "none":
+        return None
+
+    try:
+        status_code_ranges = []
+        for status_codes in parsed_value.split(','):
+            low, _, high = status_codes.strip().partition('-')
+            status_code_range = (int(low), int(high) if high else int(low))
+
+            if status_code_range[0] > status_code_range[1]:
+                raise ValueError()
+            status_code_ranges.append(status_code_range)
+
+    except ValueError:
+        log_warning(f"Invalid value for {variable_name} in config.ini: {parsed_value}. Records will not be filtered by this variable.")
+        return None
+
+    return status_code_ranges
+
+
+def validate_and_get_content_types(parsed_value: str) -> list[str] | None:
+    """Returns a config.ini value listing MIME types, such as text/html or image/*, as a lowercase list, or None if the value is None."""
+    if parsed_value.lower() == "none":
+        return None
+
+    return [content_type.strip().lower() for content_type in parsed_value.split(',') if content_type.strip()]
+
+
+def validate_and_get_date(parsed_value: str, variable_name: str, end_of_day: bool) -> datetime.datetime | None:
+    """
+    Validates and returns a config.ini value that must be an ISO 8601 date or date and time, assumed to be in UTC if it has no time zone.
+    A date without a time is the start of that day, or its end if end_of_day is True, so a range of dates includes both days.
+    Returns None if the value is None, or if it is invalid, in which case records are not filtered by this date.
+    """
+    if parsed_value.lower() == "none":
+        return None
+
+    try:
+        date = datetime.datetime.fromisoformat(parsed_value)
+    except ValueError:
+        log_warning(f"Invalid value for {variable_name} in config.ini: {parsed_value}. Records will not be filtered by this variable.")
+        return None
+
+    if end_of_day and 'T' not in parsed_value and ' ' not in parsed_value:
+        date = date.replace(hour=23, minute=59, second=59, microsecond=999999)
+
+    return date if date.tzinfo is not None else date.replace(tzinfo=datetime.timezone.utc)
+
+
+def validate_and_get_regex(parsed_value: str, variable_name: str) -> str | None:
+    """
+    Validates and returns a config.ini value that must be a valid regex.
+    Returns None if the value is None, or if it is invalid, in which case records are not filtered by this regex.
+    """
+    if parsed_value.lower() == "none":
+        return None
+
+    try:
+        re.compile(parsed_value)
+    except re.error as e:
+        log_warning(f"Invalid regex for {variable_name} in config.ini: {parsed_value} ({e}). Records will not be filtered by this variable.")
+        return None
+
+    return parsed_value
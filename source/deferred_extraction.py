@@ -0,0 +1,160 @@
+import csv
+import os
+from typing import Any, Iterable, Iterator
+
+from utilities import get_base_file_name
+from warc_record import WarcMember
+
+MATCH_LOCATIONS_FILE_NAME = 'match_locations.tsv'
+MATCH_LOCATIONS_HEADER = ('warc.gz file', 'offset', 'length', 'definition')
+
+
+def get_match_locations_file_path(directory: str) -> str:
+    """Returns the path of the match locations file in the directory."""
+    return os.path.join(directory, MATCH_LOCATIONS_FILE_NAME)
+
+
+def create_match_locations_writer(match_locations_file):
+    """Returns a CSV writer of tab separated match location rows to the open match locations file."""
+    return csv.writer(match_locations_file, delimiter='\t', lineterminator='\n')
+
+
+def read_match_locations(match_locations_file_path: str) -> Iterator[tuple[WarcMember, str]]:
+    """
+    Yields the gzip member location of each row of a match locations file, with the name of the definition its record matched.
+    The header row is skipped, and so is the last row if it was cut short by a search worker process that was interrupted,
+    which is the only row not ending with a line break.
+    """
+    with open(match_locations_file_path, 'r', encoding='utf-8', newline='') as match_locations_file:
+        complete_lines = (line for line in match_locations_file if line.endswith('\n'))
+        for row in csv.reader(complete_lines, delimiter='\t'):
+            if len(row) != len(MATCH_LOCATIONS_HEADER) or not row[1].isdigit() or not row[2].isdigit():
+                continue
+            yield WarcMember(row[0], int(row[1]), int(row[2])), row[3]
+
+
+def merge_match_locations(parent_dir: str, output_dir: str):
+    """
+    Merges the match locations files in subdirectories of the parent directory into a single match locations file in the output directory,
+    after the rows of the output file if it already exists. Rows recorded again by a search resumed from a checkpoint are only kept once.
+    """
+    match_locations_file_paths = [
+        get_match_locations_file_path(subdir)
+        for subdir, _, _ in sorted(os.walk(parent_dir))
+        if os.path.isfile(get_match_locations_file_path(subdir))
+    ]
+    if not match_locations_file_paths:
+        return
+
+    output_match_locations_file_path = get_match_locations_file_path(output_dir)
+    if os.path.exists(output_match_locations_file_path):
+        match_locations_file_paths.insert(0, output_match_locations_file_path)
+
+    merging_match_locations_file_path = f"{output_match_locations_file_path}.merging"
+    match_locations = set()
+    with open(merging_match_locations_file_path, 'w', encoding='utf-8', newline='') as merging_match_locations_file:
+        match_locations_writer = create_match_locations_writer(merging_match_locations_file)
+        match_locations_writer.writerow(MATCH_LOCATIONS_HEADER)
+        for match_locations_file_path in match_locations_file_paths:
+            for warc_member, definition_name in read_match_locations(match_locations_file_path):
+                if (warc_member, definition_name) not in match_locations:
+                    match_locations_writer.writerow((*warc_member, definition_name))
+                    match_locations.add((warc_member, definition_name))
+
+    os.replace(merging_match_locations_file_path, output_match_locations_file_path)
+
+
+def get_definition_results_file_path(results_directory: str, definition_name: str) -> str:
+    """Returns the path of the results file in the results directory of a definition named in a match locations file."""
+    return os.path.join(results_directory, f"{definition_name}.txt")
+
+
+def group_match_locations(match_locations_file_path: str) -> dict[str, list[tuple[WarcMember, list[str]]]]:
+    """
+    Returns the gzip members listed in a match locations file grouped by the WARC.gz file they are in, each with the results file paths,
+    in the directory of the match locations file, of the definitions its record matched. The members of each WARC.gz file are sorted
+    by their offset, so reading them in order reads the file from start to end.
+    """
+    results_directory = os.path.dirname(match_locations_file_path)
+    results_file_paths_by_member: dict[WarcMember, list[str]] = {}
+    for warc_member, definition_name in read_match_locations(match_locations_file_path):
+        results_file_paths = results_file_paths_by_member.setdefault(warc_member, [])
+        results_file_path = get_definition_results_file_path(results_directory, definition_name)
+        if results_file_path not in results_file_paths:
+            results_file_paths.append(results_file_path)
+
+    grouped_match_locations: dict[str, list[tuple[WarcMember, list[str]]]] = {}
+    for warc_member in sorted(results_file_paths_by_member, key=lambda warc_member: (warc_member.parent_warc_gz_file, warc_member.offset)):
+        grouped_match_locations.setdefault(warc_member.parent_warc_gz_file, []).append((warc_member, results_file_paths_by_member[warc_member]))
+    return grouped_match_locations
+
+
+def copy_match_locations(source_match_locations_file_path: str, target_match_locations_file_path: str, warc_gz_files: Iterable[str], 
+                         definition_name: str):
+    """
+    Copies the rows of a definition's matches in the given WARC.gz files from one match locations file to the end of another,
+    skipping any already in the target file.
+    """
+    warc_gz_files = set(map(os.path.abspath, warc_gz_files))
+    copied_match_locations = set(read_match_locations(target_match_locations_file_path)) if os.path.exists(target_match_locations_file_path) else set()
+
+    with open(target_match_locations_file_path, 'a', encoding='utf-8', newline='') as target_match_locations_file:
+        match_locations_writer = create_match_locations_writer(target_match_locations_file)
+        if target_match_locations_file.tell() == 0:
+            match_locations_writer.writerow(MATCH_LOCATIONS_HEADER)
+
+        for warc_member, row_definition_name in read_match_locations(source_match_locations_file_path):
+            match_location = (warc_member, row_definition_name)
+            if row_definition_name == definition_name and warc_member.parent_warc_gz_file in warc_gz_files and match_location not in copied_match_locations:
+                match_locations_writer.writerow((*warc_member, definition_name))
+                copied_match_locations.add(match_location)
+
+
+class MatchLocationRecorder:
+    """
+    Records the gzip member location of each record with matches, with the definitions it matched, instead of extracting it while searching.
+    The records are extracted into the zip archives once the search finishes, reading each WARC.gz file in order of offset,
+    or later from the match locations file kept in the results folder. Each search worker process writes its own match locations file,
+    which are merged into one once the search finishes. Only records read by the offset of their gzip member know where it is.
+    """
+    def __init__(self):
+        self.match_locations_file: Any = None
+        self.match_locations_writer = None
+        # Rows this worker process recorded, so a record matched again, such as a duplicate read after a checkpoint, is not recorded twice
+        self.recorded_match_locations: set[tuple[WarcMember, str]] = set()
+
+
+    def start_worker(self, output_directory: str):
+        """Opens the match locations file of a search worker process in its own output directory."""
+        self.match_locations_file = open(get_match_locations_file_path(output_directory), 'a', encoding='utf-8', newline='')
+        self.match_locations_writer = create_match_locations_writer(self.match_locations_file)
+        self.recorded_match_locations = set()
+
+
+    def add_record(self, warc_member: WarcMember, results_file_paths: Iterable[str]) -> int:
+        """Records the record's gzip member location for each definition it matched, and returns the number of rows recorded."""
+        # Absolute paths let the records be extracted from any working directory later on
+        warc_member = warc_member._replace(parent_warc_gz_file=os.path.abspath(warc_member.parent_warc_gz_file))
+        recorded_rows = 0
+        for definition_name in map(get_base_file_name, results_file_paths):
+            if (warc_member, definition_name) in self.recorded_match_locations:
+                continue
+
+            self.match_locations_writer.writerow((*warc_member, definition_name))
+            self.recorded_match_locations.add((warc_member, definition_name))
+            recorded_rows += 1
+        return recorded_rows
+
+
+    def sync(self):
+        """Makes sure the match locations recorded by this worker process are on disk."""
+        self.match_locations_file.flush()
+        os.fsync(self.match_locations_file.fileno())
+
+
+    def finish_worker(self):
+        """Closes the match locations file of a search worker process."""
+        self.match_locations_file.close()
+        self.match_locations_file = None
+        self.match_locations_writer = None
+        self.recorded_match_locations = set()
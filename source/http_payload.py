@@ -0,0 +1,311 @@
+import itertools
+import zlib
+from typing import Iterator
+
+# Brotli is an optional dependency. Without it, brotli encoded payloads are searched as they are stored.
+try:
+    import brotli
+    DECOMPRESSION_ERRORS = (zlib.error, brotli.error)
+except ImportError:
+    brotli = None
+    DECOMPRESSION_ERRORS = (zlib.error,)
+
+# Decoded payloads are cut off at this size, so a small compressed body cannot inflate into an unbounded amount of memory
+MAX_DECODED_PAYLOAD_SIZE = 256 * 1024 * 1024
+# A payload that arrives in chunks is not chunked if no valid chunk size line ends within this many bytes of its start
+MAX_CHUNK_SIZE_LINE_LENGTH = 4096
+
+
+def serialize_http_headers(http_headers) -> bytes | None:
+    """Returns the status line and headers of a FastWARC HTTP header map as the raw header block, or None if the record has no HTTP headers."""
+    if http_headers is None:
+        return None
+
+    header_lines = [http_headers.status_line_bytes]
+    header_lines += [name + b': ' + value for name, value in http_headers.items_bytes()]
+    return b'\r\n'.join(header_lines) + b'\r\n'
+
+
+def get_http_header_values(http_headers_block: bytes, header_name: bytes) -> list[str]:
+    """Returns the comma separated values of every header with the given name in a raw header block, lowercased, in the order they appear."""
+    header_values = []
+    lowercased_header_name = header_name.lower()
+
+    for header_line in http_headers_block.split(b'\r\n')[1:]:
+        name, separator, value = header_line.partition(b':')
+        if separator and name.strip().lower() == lowercased_header_name:
+            header_values += [
+                str(item, 'latin-1').strip().lower() for item in value.split(b',') if item.strip()
+            ]
+
+    return header_values
+
+
+def decode_http_payload(payload: bytes | memoryview, http_headers_block: bytes | None) -> bytes | memoryview:
+    """
+    Returns the HTTP payload with its transfer encoding and content encodings removed, as declared by the raw header block.
+    Each decoding step that fails, or uses an encoding that cannot be decoded, keeps the payload as it was before that step,
+    so a malformed record is searched as it is stored instead of being dropped.
+    """
+    if not http_headers_block:
+        return payload
+
+    if 'chunked' in get_http_header_values(http_headers_block, b'Transfer-Encoding'):
+        payload = decode_chunked_payload(payload)
+
+    # Content encodings are listed in the order they were applied, so they are removed in reverse
+    for content_encoding in reversed(get_http_header_values(http_headers_block, b'Content-Encoding')):
+        decoded_payload = decompress_payload(payload, content_encoding)
+        if decoded_payload is None:
+            break
+        payload = decoded_payload
+
+    return payload
+
+
+def decode_http_payload_chunks(payload_chunks: Iterator[bytes], http_headers_block: bytes | None, chunk_size: int) -> Iterator[bytes]:
+    """
+    Returns the chunks of an HTTP payload too large to be held in memory with its transfer encoding and content encodings removed,
+    as decode_http_payload does for a whole payload, decompressing at most chunk_size bytes at a time.
+    Whether each decoding step applies is decided from the start of the payload. A step that fails further on keeps
+    what it decoded until then, where decode_http_payload keeps the whole payload as it was before that step.
+    """
+    if not http_headers_block:
+        return payload_chunks
+
+    if 'chunked' in get_http_header_values(http_headers_block, b'Transfer-Encoding'):
+        payload_chunks = decode_chunked_payload_chunks(payload_chunks)
+
+    for content_encoding in reversed(get_http_header_values(http_headers_block, b'Content-Encoding')):
+        # The first two bytes are enough to tell the zlib wrapper of deflate payloads apart from raw deflate
+        first_chunk = b''
+        while len(first_chunk) < 2 and (payload_chunk := next(payload_chunks, None)) is not None:
+            first_chunk += payload_chunk
+        decompressed_chunks = decompress_payload_chunks(first_chunk, payload_chunks, content_encoding, chunk_size)
+        if decompressed_chunks is None:
+            return itertools.chain([first_chunk], payload_chunks)
+        payload_chunks = decompressed_chunks
+
+    return payload_chunks
+
+
+def decode_chunked_payload(payload: bytes | memoryview) -> bytes | memoryview:
+    """Returns the payload joined from its chunks, or the payload as it is if it is not validly chunked."""
+    payload = bytes(payload)
+    chunks = []
+    position = 0
+
+    while True:
+        line_end = payload.find(b'\r\n', position)
+        if line_end == -1:
+            return payload
+
+        try:
+            # Chunk extensions after a semicolon are ignored
+            chunk_size = int(payload[position:line_end].split(b';', 1)[0].strip(), 16)
+        except ValueError:
+            return payload
+
+        if chunk_size == 0:
+            return b''.join(chunks)
+
+        chunk_start = line_end + 2
+        chunks.append(payload[chunk_start:chunk_start + chunk_size])
+        position = chunk_start + chunk_size + 2
+
+        if chunk_start + chunk_size > len(payload):
+            # A truncated capture keeps the chunks it has
+            return b''.join(chunks)
+
+
+def decode_chunked_payload_chunks(payload_chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """
+    Yields the data of each chunk of a payload with chunked transfer encoding, as the payload arrives in chunks of its own.
+    The payload is passed on as it is if it does not start with a valid chunk size line, and ends at any later line that is not valid.
+    """
+    buffer = b''
+    chunk_data_left = 0
+    line_break_left = 0
+    is_first_chunk = True
+
+    for payload_chunk in payload_chunks:
+        buffer += payload_chunk
+
+        while buffer:
+            if chunk_data_left > 0:
+                chunk_data = buffer[:chunk_data_left]
+                yield chunk_data
+                buffer = buffer[len(chunk_data):]
+                chunk_data_left -= len(chunk_data)
+                # The line break after the data of a chunk is skipped
+                line_break_left = 2 if chunk_data_left == 0 else 0
+                continue
+
+            if line_break_left > 0:
+                skipped = buffer[:line_break_left]
+                buffer = buffer[len(skipped):]
+                line_break_left -= len(skipped)
+                continue
+
+            line_end = buffer.find(b'\r\n')
+            if line_end == -1 and len(buffer) <= MAX_CHUNK_SIZE_LINE_LENGTH:
+                break
+
+            try:
+                if line_end == -1:
+                    raise ValueError()
+                # Chunk extensions after a semicolon are ignored
+                chunk_size = int(buffer[:line_end].split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                if is_first_chunk:
+                    yield buffer
+                    yield from payload_chunks
+                return
+
+            if chunk_size == 0:
+                return
+
+            is_first_chunk = False
+            buffer = buffer[line_end + 2:]
+            chunk_data_left = chunk_size
+
+    if is_first_chunk and buffer:
+        yield buffer
+
+
+def decompress_payload(payload: bytes | memoryview, content_encoding: str) -> bytes | memoryview | None:
+    """Returns the payload decompressed from the content encoding, or None if it cannot be decompressed."""
+    if content_encoding == 'identity':
+        return payload
+
+    try:
+        if content_encoding in ('gzip', 'x-gzip'):
+            return decompress_zlib_payload(payload, zlib.MAX_WBITS | 16)
+
+        if content_encoding == 'deflate':
+            # Servers send deflate both with and without the zlib wrapper the standard requires
+            try:
+                return decompress_zlib_payload(payload, zlib.MAX_WBITS)
+            except zlib.error:
+                return decompress_zlib_payload(payload, -zlib.MAX_WBITS)
+
+        if content_encoding == 'br' and brotli is not None:
+            return decompress_brotli_payload(payload)
+
+    except DECOMPRESSION_ERRORS:
+        return None
+
+    return None
+
+
+def decompress_payload_chunks(first_chunk: bytes, payload_chunks: Iterator[bytes], content_encoding: str, 
+                              chunk_size: int) -> Iterator[bytes] | None:
+    """
+    Returns the chunks of a payload decompressed from the content encoding, as the first chunk and the chunks following it arrive,
+    or None if the first chunk cannot be decompressed.
+    """
+    if content_encoding == 'identity':
+        return itertools.chain([first_chunk], payload_chunks)
+
+    if content_encoding in ('gzip', 'x-gzip'):
+        wbits_options = (zlib.MAX_WBITS | 16,)
+    elif content_encoding == 'deflate':
+        # Servers send deflate both with and without the zlib wrapper the standard requires
+        wbits_options = (zlib.MAX_WBITS, -zlib.MAX_WBITS)
+    elif content_encoding == 'br' and brotli is not None:
+        decompressor = brotli.Decompressor()
+        try:
+            decompressed_chunk = decompress_brotli_chunk(decompressor, first_chunk, chunk_size)
+        except brotli.error:
+            return None
+        return iterate_brotli_decompressed_chunks(decompressor, decompressed_chunk, payload_chunks, chunk_size)
+    else:
+        return None
+
+    for wbits in wbits_options:
+        decompressor = zlib.decompressobj(wbits)
+        try:
+            decompressed_chunk = decompressor.decompress(first_chunk, chunk_size)
+        except zlib.error:
+            continue
+        return iterate_zlib_decompressed_chunks(decompressor, decompressed_chunk, payload_chunks, chunk_size)
+
+    return None
+
+
+def iterate_zlib_decompressed_chunks(decompressor, decompressed_chunk: bytes, payload_chunks: Iterator[bytes], chunk_size: int) -> Iterator[bytes]:
+    """
+    Yields the chunks of a gzip, zlib or raw deflate payload decompressed by the decompressor, starting with the chunk it already decompressed,
+    until the end of the compressed data, MAX_DECODED_PAYLOAD_SIZE, or data that cannot be decompressed.
+    """
+    decoded_size_left = MAX_DECODED_PAYLOAD_SIZE
+    try:
+        while True:
+            decompressed_chunk = decompressed_chunk[:decoded_size_left]
+            decoded_size_left -= len(decompressed_chunk)
+            if decompressed_chunk:
+                yield decompressed_chunk
+
+            if decoded_size_left == 0 or decompressor.eof:
+                return
+
+            compressed_chunk = decompressor.unconsumed_tail or next(payload_chunks, None)
+            # Once the payload ends, the decompressor may still hold output that did not fit in the last chunk
+            decompressed_chunk = decompressor.decompress(compressed_chunk or b'', min(chunk_size, decoded_size_left))
+            if compressed_chunk is None and not decompressed_chunk:
+                return
+    except zlib.error:
+        return
+
+
+def iterate_brotli_decompressed_chunks(decompressor, decompressed_chunk: bytes, payload_chunks: Iterator[bytes], chunk_size: int) -> Iterator[bytes]:
+    """
+    Yields the chunks of a brotli payload decompressed by the decompressor, starting with the chunk it already decompressed,
+    until the end of the compressed data, MAX_DECODED_PAYLOAD_SIZE, or data that cannot be decompressed.
+    """
+    decoded_size_left = MAX_DECODED_PAYLOAD_SIZE
+    try:
+        while True:
+            decompressed_chunk = decompressed_chunk[:decoded_size_left]
+            decoded_size_left -= len(decompressed_chunk)
+            # The output size limit of brotli is not exact, so the output is cut into chunks of at most chunk_size bytes
+            for offset in range(0, len(decompressed_chunk), chunk_size):
+                yield decompressed_chunk[offset:offset + chunk_size]
+
+            if decoded_size_left == 0 or decompressor.is_finished():
+                return
+
+            # The input already passed in may have more output than the last chunk held
+            decompressed_chunk = decompress_brotli_chunk(decompressor, b'', chunk_size) if hasattr(decompressor, 'can_accept_more_data') else b''
+            if decompressed_chunk:
+                continue
+
+            compressed_chunk = next(payload_chunks, None)
+            if compressed_chunk is None:
+                return
+            decompressed_chunk = decompress_brotli_chunk(decompressor, compressed_chunk, chunk_size)
+    except brotli.error:
+        return
+
+
+def decompress_brotli_chunk(decompressor, compressed_chunk: bytes, chunk_size: int) -> bytes:
+    """Decompresses the next chunk of a brotli payload, into at most chunk_size bytes if the brotli version can limit the output size."""
+    if hasattr(decompressor, 'can_accept_more_data'):
+        return decompressor.process(compressed_chunk, output_buffer_limit=chunk_size)
+    return decompressor.process(compressed_chunk)
+
+
+def decompress_zlib_payload(payload: bytes | memoryview, wbits: int) -> bytes:
+    """Decompresses a gzip, zlib or raw deflate payload, stopping at MAX_DECODED_PAYLOAD_SIZE."""
+    decompressor = zlib.decompressobj(wbits)
+    return decompressor.decompress(payload, MAX_DECODED_PAYLOAD_SIZE)
+
+
+def decompress_brotli_payload(payload: bytes | memoryview) -> bytes:
+    """Decompresses a brotli payload, stopping at MAX_DECODED_PAYLOAD_SIZE."""
+    decompressor = brotli.Decompressor()
+    if hasattr(decompressor, 'can_accept_more_data'):
+        return decompressor.process(bytes(payload), output_buffer_limit=MAX_DECODED_PAYLOAD_SIZE)
+
+    # Versions of brotli before 1.2 cannot limit the output size
+    return brotli.decompress(bytes(payload))[:MAX_DECODED_PAYLOAD_SIZE]
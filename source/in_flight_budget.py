@@ -0,0 +1,77 @@
+import multiprocessing
+import time
+
+from logger import *
+
+
+class InFlightBytesBudget:
+    """
+    Limits the total size of the records that have been put into the search queue but not yet searched.
+    The read threads reserve the size of each record before queueing it, and block until the search worker processes
+    have released enough bytes by searching earlier records, so memory use stays flat however far reading gets ahead of searching.
+
+    The counter and condition are handed to the search worker processes as they start, which release the bytes of each
+    queue item once they have searched it. A record larger than the whole budget is let through once nothing else is in flight,
+    so it can never block forever. Only the read threads of the main process reserve bytes, so the time they spend blocked
+    is tracked in plain attributes of the main process' budget.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.condition = multiprocessing.Condition()
+        self.in_flight_bytes = multiprocessing.RawValue('q', 0)
+
+        self.peak_in_flight_bytes = 0
+        self.blocked_seconds = 0.0
+        self.blocked_reservations = 0
+
+
+    def has_room_for(self, size: int) -> bool:
+        """Returns True if size bytes can be reserved without exceeding the budget. The condition must be held by the caller."""
+        return self.in_flight_bytes.value == 0 or self.in_flight_bytes.value + size <= self.max_bytes
+
+
+    def try_reserve(self, size: int) -> bool:
+        """Reserves size bytes if the budget has room for them, without blocking. Returns True if they were reserved."""
+        with self.condition:
+            if size > 0 and not self.has_room_for(size):
+                return False
+
+            self.add_in_flight_bytes(size)
+            return True
+
+
+    def reserve(self, size: int):
+        """Reserves size bytes, blocking until the search worker processes have released enough bytes for them to fit."""
+        with self.condition:
+            if size > 0 and not self.has_room_for(size):
+                blocked_start_time = time.monotonic()
+                self.condition.wait_for(lambda: self.has_room_for(size))
+                self.blocked_seconds += time.monotonic() - blocked_start_time
+                self.blocked_reservations += 1
+
+            self.add_in_flight_bytes(size)
+
+
+    def release(self, size: int):
+        """Releases size bytes once the records they were reserved for have been searched, waking any blocked read threads."""
+        if size == 0:
+            return
+
+        with self.condition:
+            self.in_flight_bytes.value -= size
+            self.condition.notify_all()
+
+
+    def add_in_flight_bytes(self, size: int):
+        """Adds size bytes to the in-flight total and updates the peak. The condition must be held by the caller."""
+        self.in_flight_bytes.value += size
+        self.peak_in_flight_bytes = max(self.peak_in_flight_bytes, self.in_flight_bytes.value)
+
+
+    def log_summary(self):
+        """Logs the peak number of bytes in flight, and how long the read threads spent blocked waiting for the budget."""
+        log_info(
+            f"In-flight records peaked at {round(self.peak_in_flight_bytes / 1024)} KB "
+            f"of the {round(self.max_bytes / 1024)} KB budget. The read threads were blocked "
+            f"{self.blocked_reservations} times, for {round(self.blocked_seconds, 2)} seconds in total."
+        )
@@ -0,0 +1,104 @@
+import zlib
+from threading import Lock
+from typing import NamedTuple
+
+from logger import *
+from warc_record import PayloadIdentity, WarcRecord
+
+# LZ4 is an optional dependency. Without it, records in flight are compressed with zlib at its fastest level.
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Compressing smaller records saves too little memory to be worth the work of the read threads and search worker processes
+MIN_COMPRESSED_RECORD_SIZE = 4096
+
+
+class CompressedWarcRecord(NamedTuple):
+    """A record whose contents were compressed before being put into the search queue, decompressed by the search worker process that retrieves it."""
+    parent_warc_gz_file: str
+    name: str
+    compressed_contents: bytes
+    codec: str
+    charset: str | None = None
+    http_headers: bytes | None = None
+    payload_identity: PayloadIdentity | None = None
+
+
+class InFlightCompressor:
+    """
+    Compresses the contents of records before they are put into the search queue whenever the records in flight exceed a threshold,
+    so the in-flight budget holds several times as many text records before the read threads have to wait or spill them to disk.
+    Records below the threshold are queued as they are, so no CPU time is spent on compression while the search worker processes keep up.
+    LZ4 is used if it is installed, and zlib at its fastest level otherwise. Records that do not get smaller, such as images,
+    are queued uncompressed.
+    """
+    def __init__(self, threshold_bytes: int):
+        self.threshold_bytes = threshold_bytes
+        self.codec = 'lz4' if lz4 is not None else 'zlib'
+
+        self.lock = Lock()
+        self.compressed_records = 0
+        self.original_bytes = 0
+        self.compressed_bytes = 0
+
+
+    def compress_if_over_threshold(self, warc_record: WarcRecord, in_flight_bytes: int) -> WarcRecord | CompressedWarcRecord:
+        """Returns the record with its contents compressed if the bytes in flight exceed the threshold and compressing makes it smaller, or the record as is otherwise."""
+        if in_flight_bytes < self.threshold_bytes or len(warc_record.contents) < MIN_COMPRESSED_RECORD_SIZE:
+            return warc_record
+
+        compressed_contents = compress_contents(warc_record.contents, self.codec)
+        if len(compressed_contents) >= len(warc_record.contents):
+            return warc_record
+
+        with self.lock:
+            self.compressed_records += 1
+            self.original_bytes += len(warc_record.contents)
+            self.compressed_bytes += len(compressed_contents)
+
+        return CompressedWarcRecord(
+            parent_warc_gz_file=warc_record.parent_warc_gz_file,
+            name=warc_record.name,
+            compressed_contents=compressed_contents,
+            codec=self.codec,
+            charset=warc_record.charset,
+            http_headers=warc_record.http_headers,
+            payload_identity=warc_record.payload_identity
+        )
+
+
+    def log_summary(self):
+        """Logs how many records were compressed while in flight and how much smaller they were, if any were compressed."""
+        if self.compressed_records == 0:
+            return
+
+        log_info(
+            f"Compressed {self.compressed_records} records in flight with {self.codec}, "
+            f"from {round(self.original_bytes / 1024)} KB to {round(self.compressed_bytes / 1024)} KB."
+        )
+
+
+def compress_contents(contents: bytes, codec: str) -> bytes:
+    """Compresses record contents with the given codec, at its fastest level."""
+    if codec == 'lz4':
+        return lz4.frame.compress(contents)
+    return zlib.compress(contents, 1)
+
+
+def decompress_warc_record(compressed_warc_record: CompressedWarcRecord) -> WarcRecord:
+    """Returns the record with the contents decompressed, as it was read from its WARC.gz file."""
+    if compressed_warc_record.codec == 'lz4':
+        contents = lz4.frame.decompress(compressed_warc_record.compressed_contents)
+    else:
+        contents = zlib.decompress(compressed_warc_record.compressed_contents)
+
+    return WarcRecord(
+        parent_warc_gz_file=compressed_warc_record.parent_warc_gz_file,
+        name=compressed_warc_record.name,
+        contents=contents,
+        charset=compressed_warc_record.charset,
+        http_headers=compressed_warc_record.http_headers,
+        payload_identity=compressed_warc_record.payload_identity
+    )
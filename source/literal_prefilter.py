@@ -0,0 +1,157 @@
+import re
+from re import _constants as regex_constants
+from re import _parser as regex_parser
+
+from record_text import RecordText
+
+REPEAT_OPCODES = (regex_constants.MAX_REPEAT, regex_constants.MIN_REPEAT, regex_constants.POSSESSIVE_REPEAT)
+
+# Non-ASCII characters that re.IGNORECASE matches to an ASCII letter, but that str.lower() does not turn into that letter.
+# 'İ' is lowercased to 'i' followed by a combining dot, so the dot is removed as well.
+LOWERCASED_ASCII_LETTER_EQUIVALENTS = {'ſ': 's', 'ı': 'i', 'i\u0307': 'i'}
+
+
+class LiteralPrefilter:
+    """
+    Rejects records that cannot match a definition regex, by checking that they contain a literal that every match must contain.
+    A record passes if it contains any one of the required literals, which are alternatives when the regex is an alternation.
+    Only ASCII literals are used, so they can be searched for directly in the raw bytes of ASCII records.
+    """
+    def __init__(self, required_literals: list[str], ignore_case: bool):
+        self.ignore_case = ignore_case
+        self.required_literals = [literal.lower() if ignore_case else literal for literal in required_literals]
+        self.required_literals_bytes = [literal.encode('ascii') for literal in self.required_literals]
+
+
+    def may_match(self, prefilter_text: "PrefilterText") -> bool:
+        """Returns True if the record contains one of the required literals, so the regex has to be run to find out if it matches."""
+        haystack = prefilter_text.get_haystack(self.ignore_case)
+        required_literals = self.required_literals_bytes if isinstance(haystack, bytes) else self.required_literals
+        return any(literal in haystack for literal in required_literals)
+
+
+class PrefilterText:
+    """
+    The text of a record prepared once for the literal prefilters of every definition.
+    ASCII contents are checked as raw bytes without being decoded. Other contents are checked in the decoded text the regexes
+    search, which the record text keeps so it is only decoded once.
+    """
+    def __init__(self, record_text: RecordText):
+        self.record_text = record_text
+        self.haystacks: dict[bool, bytes | str] = {}
+
+
+    def get_haystack(self, ignore_case: bool) -> bytes | str:
+        """Returns the contents to search the required literals in, lowercased if the literals are matched regardless of case."""
+        if ignore_case not in self.haystacks:
+            haystack = self.record_text.get_ascii_contents()
+            if haystack is None:
+                haystack = self.record_text.get_decoded_text()
+            if ignore_case:
+                haystack = lowercase_haystack(haystack)
+            self.haystacks[ignore_case] = haystack
+
+        return self.haystacks[ignore_case]
+
+
+def lowercase_haystack(haystack: bytes | str) -> bytes | str:
+    """Lowercases the haystack, also replacing the characters that re.IGNORECASE treats as an ASCII letter with that letter."""
+    haystack = haystack.lower()
+    if isinstance(haystack, str):
+        for character, ascii_letter in LOWERCASED_ASCII_LETTER_EQUIVALENTS.items():
+            if character in haystack:
+                haystack = haystack.replace(character, ascii_letter)
+    return haystack
+
+
+def create_literal_prefilters_dict(results_and_regexes_dict: dict[str, re.Pattern]) -> dict[str, LiteralPrefilter]:
+    """Returns the literal prefilter of each definition that has one, keyed by results file path."""
+    literal_prefilters_dict = {}
+    for results_file_path, regex in results_and_regexes_dict.items():
+        literal_prefilter = create_literal_prefilter(regex)
+        if literal_prefilter is not None:
+            literal_prefilters_dict[results_file_path] = literal_prefilter
+    return literal_prefilters_dict
+
+
+def create_literal_prefilter(regex: re.Pattern) -> LiteralPrefilter | None:
+    """Returns a literal prefilter for the regex, or None if there is no literal that every match must contain."""
+    required_literals = extract_required_literals(regex)
+    if not required_literals:
+        return None
+
+    return LiteralPrefilter(required_literals, bool(regex.flags & re.IGNORECASE))
+
+
+def extract_required_literals(regex: re.Pattern) -> list[str]:
+    """
+    Returns the literals of which every match of the regex must contain at least one, choosing the most selective
+    requirement when there are several. Returns an empty list if no such literals exist.
+    """
+    return choose_most_selective_literals(extract_required_literal_alternatives(regex))
+
+
+def extract_required_literal_alternatives(regex: re.Pattern) -> list[list[str]]:
+    """
+    Returns every requirement that every match of the regex must meet, each a list of literals of which a match must contain at least one.
+    Returns an empty list if the regex has no such requirement or cannot be parsed.
+    """
+    try:
+        parsed_regex = regex_parser.parse(regex.pattern, regex.flags)
+    except (re.error, TypeError, ValueError):
+        return []
+
+    return get_required_literal_alternatives(parsed_regex, bool(regex.flags & re.IGNORECASE))
+
+
+def get_required_literal_alternatives(parsed_regex, ignore_case: bool) -> list[list[str]]:
+    """
+    Returns every requirement found in the parsed regex, each a list of literals of which a match must contain at least one.
+    Consecutive ASCII literal characters form a single literal. Groups and repeats of at least one are searched recursively,
+    and an alternation is a requirement if every one of its branches has one.
+    """
+    required_alternatives = []
+    literal_characters = []
+
+    for opcode, argument in parsed_regex:
+        if opcode is regex_constants.LITERAL and chr(argument).isascii():
+            literal_characters.append(chr(argument))
+            continue
+
+        if literal_characters:
+            required_alternatives.append(["".join(literal_characters)])
+            literal_characters = []
+
+        if opcode is regex_constants.SUBPATTERN:
+            _, added_flags, _, group_regex = argument
+            # Literals in a group that ignores case while the regex does not would be matched regardless of case
+            if not (added_flags & re.IGNORECASE and not ignore_case):
+                required_alternatives += get_required_literal_alternatives(group_regex, ignore_case)
+        elif opcode is regex_constants.ATOMIC_GROUP:
+            required_alternatives += get_required_literal_alternatives(argument, ignore_case)
+        elif opcode in REPEAT_OPCODES and argument[0] >= 1:
+            required_alternatives += get_required_literal_alternatives(argument[2], ignore_case)
+        elif opcode is regex_constants.BRANCH:
+            branch_literals = []
+            for branch_regex in argument[1]:
+                most_selective_literals = choose_most_selective_literals(
+                    get_required_literal_alternatives(branch_regex, ignore_case)
+                )
+                if not most_selective_literals:
+                    break
+                branch_literals += most_selective_literals
+            else:
+                required_alternatives.append(branch_literals)
+
+    if literal_characters:
+        required_alternatives.append(["".join(literal_characters)])
+
+    return required_alternatives
+
+
+def choose_most_selective_literals(required_alternatives: list[list[str]]) -> list[str]:
+    """Returns the requirement whose shortest literal is the longest, preferring fewer alternatives, or an empty list if there are none."""
+    if not required_alternatives:
+        return []
+
+    return max(required_alternatives, key=lambda literals: (min(len(literal) for literal in literals), -len(literals)))
@@ -1,28 +1,66 @@
+import argparse
 import atexit
 
 from config import read_config_ini_variables
 from results import *
-from search import perform_search
+from search import extract_recorded_matches, perform_search
 from search_timer import SearchTimer
+from trigram_index import build_trigram_index
 
 searchTimer = SearchTimer()
 
 
-def setup():
-    """Initializes logging, registers exit handler, reads configuration variables, and creates the results directory."""
+def parse_arguments(argv: list[str]) -> argparse.Namespace:
+    """Parses the command line arguments."""
+    parser = argparse.ArgumentParser(description="Searches the records of WARC.gz files with the regex definitions set in config.ini.")
+    parser.add_argument(
+        '--resume', 
+        metavar='RESULTS_FOLDER', 
+        help="Resumes an interrupted search from the last checkpoint in its results folder, instead of starting a new search."
+    )
+
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser(
+        'build-index', 
+        help="Builds or updates the trigram index in TRIGRAM_INDEX_DIRECTORY over the WARC.gz files, instead of searching them."
+    )
+    extract_parser = subparsers.add_parser(
+        'extract', 
+        help="Extracts the records with matches of an earlier search with EXTRACTION_MODE set to deferred into the zip archives of its results folder, "
+             "from the match locations it recorded, instead of searching."
+    )
+    extract_parser.add_argument('results_folder', metavar='RESULTS_FOLDER', help="The results folder of the earlier search.")
+    return parser.parse_args(argv)
+
+
+def setup(resume_results_directory: str | None = None, create_results_directory: bool = True, extract_results_directory: str | None = None):
+    """
+    Initializes logging, registers exit handler, reads configuration variables, and creates the results directory,
+    or uses the results directory of the interrupted search being resumed, or of the earlier search whose records with matches are extracted.
+    No results directory is needed to build the trigram index.
+    """
     searchTimer.start_timer()
     initialize_logging()
-    atexit.register(lambda: on_exit())
+    atexit.register(lambda: on_exit(create_results_directory))
     read_config_ini_variables()
-    initialize_results_output_subdirectory()
+    if not create_results_directory:
+        return
+
+    if extract_results_directory is not None:
+        use_extracted_results_output_subdirectory(extract_results_directory)
+    elif resume_results_directory is not None:
+        use_resumed_results_output_subdirectory(resume_results_directory)
+    else:
+        initialize_results_output_subdirectory()
 
 
-def on_exit():
+def on_exit(log_results_path: bool = True):
     """
-    Function to be called on program exit. Logs the results path, the execution time, and the total errors/warnings.
-    Logging is then closed and the log file is moved to the results directory if one exists.
+    Function to be called on program exit. Logs the results path, unless no results directory was needed, the execution time, 
+    and the total errors/warnings. Logging is then closed and the log file is moved to the results directory if one exists.
     """
-    log_results_output_path()
+    if log_results_path:
+        log_results_output_path()
     searchTimer.end_timer()
     searchTimer.log_execution_time()
     log_total_errors_and_warnings()
@@ -30,13 +68,24 @@ def on_exit():
     move_log_file_to_results_subdirectory()
 
 
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
     """Program entry point."""
-    setup()
-    perform_search()
+    arguments = parse_arguments(argv or [])
+    if arguments.command == 'build-index':
+        setup(create_results_directory=False)
+        build_trigram_index()
+        return 0
+
+    if arguments.command == 'extract':
+        setup(extract_results_directory=arguments.results_folder)
+        extract_recorded_matches()
+        return 0
+
+    setup(arguments.resume)
+    perform_search(resume=arguments.resume is not None)
 
     return 0
 
 
 if __name__ == '__main__':
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from typing import Iterable
+
+import config
+from logger import *
+
+MATCH_MEMO_FILE_NAME = 'warcsearcher_match_memo.sqlite3'
+# Rows a search worker process holds before writing them to the memo in a single transaction
+MAX_PENDING_ROWS = 10000
+# Seconds a search worker process waits for another one writing to the memo
+MATCH_MEMO_TIMEOUT_SECONDS = 60
+
+MATCH_MEMO_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS definitions (
+    definition_id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS matches (
+    payload_key BLOB NOT NULL,
+    definition_id INTEGER NOT NULL,
+    matches TEXT,
+    PRIMARY KEY (payload_key, definition_id)
+) WITHOUT ROWID;
+'''
+
+
+def get_match_memo_file_path() -> str:
+    """Returns the path to the match memo in the results output directory."""
+    return os.path.join(config.settings["RESULTS_OUTPUT_DIRECTORY"], MATCH_MEMO_FILE_NAME)
+
+
+def get_memo_definition_fingerprint(regex: re.Pattern) -> str:
+    """
+    Returns a hash of a definition's compiled regex pattern and flags. Unlike the fingerprint in the search manifest, it leaves out the settings,
+    since the matches in a payload's contents only depend on the regex and on the decoding, which is part of the payload key.
+    """
+    return hashlib.sha256(json.dumps({"pattern": regex.pattern, "flags": regex.flags}, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_memo_payload_key(payload_key: tuple[str, tuple]) -> bytes:
+    """Returns the compact key a payload's matches are stored under, a hash of its digest and of what changes how its contents are decoded."""
+    return hashlib.blake2b(json.dumps(payload_key).encode('utf-8'), digest_size=16).digest()
+
+
+class MatchMemo:
+    """
+    Persistent memo of the matches found in the contents of the payloads searched, kept in an SQLite database in the results output directory
+    and shared by every search. For each payload key and definition it holds the matches found, or NULL if there were none,
+    so payloads already searched with a definition, in this search or an earlier one, are not searched with it again.
+    No match is stored exactly as a NULL value rather than in a Bloom filter, since a false positive would lose matches.
+
+    The main process creates the database and the definitions, and each search worker process opens its own connection,
+    holding the rows it adds until MAX_PENDING_ROWS are pending or it finishes.
+    """
+    def __init__(self, memo_file_path: str, results_and_regexes_dict: dict):
+        self.memo_file_path = memo_file_path
+        self.definition_ids: dict[str, int] = {}
+        self.connection: sqlite3.Connection | None = None
+        self.pending_rows: dict[tuple[bytes, int], str | None] = {}
+
+        connection = sqlite3.connect(memo_file_path, timeout=MATCH_MEMO_TIMEOUT_SECONDS)
+        try:
+            # Lets the search worker processes read while another one writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(MATCH_MEMO_SCHEMA)
+            with connection:
+                for results_file_path, regex in results_and_regexes_dict.items():
+                    fingerprint = get_memo_definition_fingerprint(regex)
+                    connection.execute("INSERT OR IGNORE INTO definitions (fingerprint) VALUES (?)", (fingerprint,))
+                    (definition_id,) = connection.execute("SELECT definition_id FROM definitions WHERE fingerprint = ?", (fingerprint,)).fetchone()
+                    self.definition_ids[results_file_path] = definition_id
+        finally:
+            # The connection must not be handed to the search worker processes
+            connection.close()
+
+
+    def start_worker(self):
+        """Opens the connection of a search worker process and drops any rows inherited from the main process."""
+        self.connection = sqlite3.connect(self.memo_file_path, timeout=MATCH_MEMO_TIMEOUT_SECONDS)
+        self.pending_rows = {}
+
+
+    def get_matches(self, payload_key: tuple[str, tuple], results_file_paths: Iterable[str]) -> dict[str, list]:
+        """Returns the matches stored for the payload for each of the definitions that it was already searched with."""
+        memo_payload_key = get_memo_payload_key(payload_key)
+        stored_matches = {}
+        try:
+            stored_matches = dict(self.connection.execute("SELECT definition_id, matches FROM matches WHERE payload_key = ?", (memo_payload_key,)))
+        except sqlite3.Error as e:
+            log_warning(f"Could not read the match memo {self.memo_file_path}: {e}")
+
+        matches_in_contents_dict = {}
+        for results_file_path in results_file_paths:
+            definition_id = self.definition_ids[results_file_path]
+            if (memo_payload_key, definition_id) in self.pending_rows:
+                matches = self.pending_rows[(memo_payload_key, definition_id)]
+            elif definition_id in stored_matches:
+                matches = stored_matches[definition_id]
+            else:
+                continue
+            matches_in_contents_dict[results_file_path] = json.loads(matches) if matches is not None else []
+
+        return matches_in_contents_dict
+
+
+    def add_matches(self, payload_key: tuple[str, tuple], matches_in_contents_dict: dict[str, list]):
+        """Adds the matches the payload's contents were searched for with each definition, writing the pending rows if too many are held."""
+        memo_payload_key = get_memo_payload_key(payload_key)
+        for results_file_path, matches in matches_in_contents_dict.items():
+            self.pending_rows[(memo_payload_key, self.definition_ids[results_file_path])] = json.dumps(matches) if matches else None
+
+        if len(self.pending_rows) >= MAX_PENDING_ROWS:
+            self.write_pending_rows()
+
+
+    def write_pending_rows(self):
+        """Writes the pending rows to the memo in a single transaction. Rows another search worker process already wrote are kept."""
+        if not self.pending_rows:
+            return
+
+        try:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO matches (payload_key, definition_id, matches) VALUES (?, ?, ?)",
+                    ((memo_payload_key, definition_id, matches) for (memo_payload_key, definition_id), matches in self.pending_rows.items())
+                )
+        except sqlite3.Error as e:
+            log_warning(f"Could not write {len(self.pending_rows)} rows to the match memo {self.memo_file_path}: {e}")
+
+        self.pending_rows = {}
+
+
+    def finish_worker(self):
+        """Writes the pending rows of a search worker process and closes its connection."""
+        self.write_pending_rows()
+        self.connection.close()
+        self.connection = None
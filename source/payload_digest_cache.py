@@ -0,0 +1,114 @@
+import hashlib
+from collections import OrderedDict
+
+from fastwarc.warc import WarcRecordType
+
+import config
+from http_payload import get_http_header_values
+from warc_record import PayloadIdentity, WarcRecord
+
+# Prefix of the digests computed for payloads whose record has no WARC-Payload-Digest header
+COMPUTED_DIGEST_PREFIX = 'blake2b:'
+
+
+def get_payload_identity(record) -> PayloadIdentity:
+    """Returns the headers of a FastWARC record that identify its payload, and whether it is a revisit record holding no payload of its own."""
+    return PayloadIdentity(
+        payload_digest=record.headers.get('WARC-Payload-Digest'),
+        record_id=record.headers.get('WARC-Record-ID'),
+        refers_to=record.headers.get('WARC-Refers-To'),
+        is_revisit=record.record_type == WarcRecordType.revisit
+    )
+
+
+def get_payload_digest(warc_record: WarcRecord) -> str:
+    """Returns the record's WARC-Payload-Digest, or a hash of its contents as they are stored if the header is missing or was not read."""
+    if warc_record.payload_identity is not None and warc_record.payload_identity.payload_digest:
+        return warc_record.payload_identity.payload_digest
+    return COMPUTED_DIGEST_PREFIX + hashlib.blake2b(warc_record.contents, digest_size=16).hexdigest()
+
+
+def get_payload_context(warc_record: WarcRecord) -> tuple:
+    """
+    Returns what, besides the stored payload, changes the text the definitions search: the charset the contents are decoded with
+    if DETECT_CONTENTS_CHARSET is enabled, and the transfer and content encodings removed if DECODE_HTTP_PAYLOADS is enabled.
+    """
+    charset = warc_record.charset if config.settings["DETECT_CONTENTS_CHARSET"] else None
+    if not config.settings["DECODE_HTTP_PAYLOADS"] or not warc_record.http_headers:
+        return (charset,)
+
+    return (
+        charset,
+        tuple(get_http_header_values(warc_record.http_headers, b'Transfer-Encoding')),
+        tuple(get_http_header_values(warc_record.http_headers, b'Content-Encoding'))
+    )
+
+
+def get_payload_key(warc_record: WarcRecord) -> tuple[str, tuple]:
+    """Returns the key the matches in the record's contents are cached under. Must be called before its HTTP payload is decoded."""
+    return get_payload_digest(warc_record), get_payload_context(warc_record)
+
+
+class PayloadDigestCache:
+    """
+    Holds the matches found in the contents of the payloads a search worker process searched, by payload digest,
+    so a record whose payload was already searched reuses its matches instead of being searched by every definition again.
+    Only the matches in the contents are cached: the matches in each record's URI and HTTP headers are still searched.
+    Revisit records, which hold no payload, are given the matches of the payload they refer to by digest or by WARC-Refers-To.
+    The least recently used payloads are dropped once max_entries are held.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[tuple, dict[str, list]]] = OrderedDict()
+        self.payload_digests_by_record_id: OrderedDict[str, str] = OrderedDict()
+
+
+    def clear(self):
+        """Drops every cached payload."""
+        self.entries.clear()
+        self.payload_digests_by_record_id.clear()
+
+
+    def get_matches(self, warc_record: WarcRecord, payload_key: tuple[str, tuple]) -> dict[str, list] | None:
+        """Returns a copy of the matches cached for the record's payload, or None if it was not searched yet with the same decoding."""
+        payload_digest, payload_context = payload_key
+        entry = self.entries.get(payload_digest)
+        if entry is None or entry[0] != payload_context:
+            return None
+
+        self.entries.move_to_end(payload_digest)
+        self.add_record_id(warc_record, payload_digest)
+        return dict(entry[1])
+
+
+    def add_matches(self, warc_record: WarcRecord, payload_key: tuple[str, tuple], matches_in_contents_dict: dict[str, list]):
+        """Caches the matches found in the record's contents, dropping the least recently used payload if too many are held."""
+        payload_digest, payload_context = payload_key
+        self.entries[payload_digest] = (payload_context, dict(matches_in_contents_dict))
+        self.entries.move_to_end(payload_digest)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+        self.add_record_id(warc_record, payload_digest)
+
+
+    def add_record_id(self, warc_record: WarcRecord, payload_digest: str):
+        """Remembers the payload of the record by its WARC-Record-ID, for the revisit records referring to it by WARC-Refers-To."""
+        if warc_record.payload_identity is not None and warc_record.payload_identity.record_id:
+            self.payload_digests_by_record_id[warc_record.payload_identity.record_id] = payload_digest
+            self.payload_digests_by_record_id.move_to_end(warc_record.payload_identity.record_id)
+            if len(self.payload_digests_by_record_id) > self.max_entries:
+                self.payload_digests_by_record_id.popitem(last=False)
+
+
+    def get_revisit_matches(self, payload_identity: PayloadIdentity) -> dict[str, list] | None:
+        """
+        Returns a copy of the matches cached for the payload a revisit record refers to, found by its WARC-Payload-Digest
+        or, for a payload whose digest was computed, by the WARC-Record-ID in its WARC-Refers-To header. Returns None if it is not cached.
+        """
+        for payload_digest in (payload_identity.payload_digest, self.payload_digests_by_record_id.get(payload_identity.refers_to)):
+            if payload_digest in self.entries:
+                self.entries.move_to_end(payload_digest)
+                return dict(self.entries[payload_digest][1])
+
+        return None
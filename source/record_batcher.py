@@ -0,0 +1,107 @@
+import time
+from threading import Event, Lock, Thread
+
+from in_flight_compression import CompressedWarcRecord
+from spill_queue import SpillSegment
+from streaming_search import SpooledWarcRecord
+from warc_members import WarcMember
+from warc_record import WarcRecord
+
+
+class RecordBatcher:
+    """
+    Groups WARC records read by the read threads into batches before putting them into the search queue,
+    so a search worker process retrieves many small records with a single get() instead of one at a time.
+    In offset mode the batched items are record locations, which are sized by the length of their compressed gzip member.
+
+    A batch is put into the search queue as a list once it reaches the maximum number of records or the maximum
+    total size of its records' contents. A background thread also flushes any batch that has been waiting for longer
+    than the flush timeout, so records at the tail of the read are not held back.
+    """
+    def __init__(self, search_queue, max_records: int, max_bytes: int, flush_timeout_seconds: float):
+        self.search_queue = search_queue
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.flush_timeout_seconds = flush_timeout_seconds
+
+        self.lock = Lock()
+        self.batch: list[WarcRecord | WarcMember] = []
+        self.batch_bytes = 0
+        self.batch_started_time = 0.0
+
+        self.stop_event = Event()
+        self.flush_thread = Thread(target=self.flush_stale_batches, daemon=True)
+
+
+    def start(self):
+        """Starts the background thread that flushes batches older than the flush timeout."""
+        self.flush_thread.start()
+
+
+    def add(self, warc_record: WarcRecord | WarcMember):
+        """Adds a record to the current batch, putting the batch into the search queue if it is full."""
+        with self.lock:
+            if not self.batch:
+                self.batch_started_time = time.monotonic()
+
+            self.batch.append(warc_record)
+            self.batch_bytes += get_batch_item_size(warc_record)
+
+            if len(self.batch) >= self.max_records or self.batch_bytes >= self.max_bytes:
+                full_batch = self.take_batch()
+            else:
+                full_batch = None
+
+        # The batch is put outside of the lock, so other read threads can keep batching while the queue is blocked.
+        if full_batch:
+            self.search_queue.put(full_batch)
+
+
+    def flush(self):
+        """Puts the current batch into the search queue if it contains any records."""
+        with self.lock:
+            batch = self.take_batch()
+
+        if batch:
+            self.search_queue.put(batch)
+
+
+    def take_batch(self) -> list[WarcRecord | WarcMember]:
+        """Returns the current batch and starts a new empty one. The lock must be held by the caller."""
+        batch = self.batch
+        self.batch = []
+        self.batch_bytes = 0
+        return batch
+
+
+    def flush_stale_batches(self):
+        """Periodically flushes the current batch if it has been waiting for longer than the flush timeout."""
+        while not self.stop_event.wait(self.flush_timeout_seconds / 2):
+            with self.lock:
+                is_stale = self.batch and time.monotonic() - self.batch_started_time >= self.flush_timeout_seconds
+
+            if is_stale:
+                self.flush()
+
+
+    def close(self):
+        """Stops the background flush thread and puts any remaining records into the search queue."""
+        self.stop_event.set()
+        if self.flush_thread.is_alive():
+            self.flush_thread.join()
+        self.flush()
+
+
+def get_batch_item_size(warc_record: WarcRecord | WarcMember | SpooledWarcRecord | SpillSegment | CompressedWarcRecord) -> int:
+    """
+    Returns the size counted towards the maximum batch size: the length of a record's contents, compressed if it was compressed in flight,
+    or of a record location's gzip member.
+    Spooled records and spill segments only carry the path to their contents on disk, so they count for nothing.
+    """
+    if isinstance(warc_record, WarcMember):
+        return warc_record.length
+    if isinstance(warc_record, CompressedWarcRecord):
+        return len(warc_record.compressed_contents)
+    if isinstance(warc_record, (SpooledWarcRecord, SpillSegment)):
+        return 0
+    return len(warc_record.contents)
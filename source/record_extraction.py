@@ -0,0 +1,377 @@
+import os
+import time
+import zipfile
+from typing import Iterable
+
+from blob_store import BlobStore
+from deferred_extraction import MatchLocationRecorder
+from results import (finalize_results_blob_manifests, finalize_results_match_locations, finalize_results_warc_gz_files, finalize_results_zip_archives,
+                     get_results_zip_archive_file_path)
+from search_checkpoint import get_zip_archive_segment_path
+from search_statistics import SearchStatistics
+from streaming_search import StreamedWarcRecord
+from utilities import add_file_to_zip_archive, add_stream_to_zip_archive, get_base_file_name
+from warc_gz_extraction import WarcGzExtractor
+from warc_record import WarcRecord
+from zip_compression import MAGIC_NUMBER_PREFIX_SIZE, ZipCompressionPolicy
+from logger import *
+
+
+class RecordExtraction:
+    """
+    Extracts the records with matches when ZIP_FILES_WITH_MATCHES is enabled, in the way EXTRACTION_MODE selects.
+    The search selects one once and hands it to each search worker process, which starts it, adds every record it searched to it,
+    and finishes it once it is done searching. Each subclass extracts the records in the way of one extraction mode.
+    """
+    def __init__(self):
+        self.search_statistics: SearchStatistics | None = None
+
+
+    @property
+    def needs_http_headers(self) -> bool:
+        """Returns True if the HTTP headers of the records have to be read to extract them."""
+        return False
+
+
+    def start_worker(self, results_file_paths: Iterable[str], zip_temp_dir_for_process: str, generation: int, search_statistics: SearchStatistics):
+        """Starts extracting in a search worker process, into its own temporary directory, counting what it extracts in its search statistics."""
+        self.search_statistics = search_statistics
+
+
+    def get_streamed_contents_directory(self) -> str | None:
+        """
+        Returns the directory the contents of a streamed record are copied to while they are read, so they can be added once it is searched,
+        or None if they are not needed to extract it.
+        """
+        return None
+
+
+    def add_record(self, warc_record: WarcRecord | StreamedWarcRecord, matched_results_file_paths: list[str]):
+        """Extracts a record held in memory for each definition it matched."""
+        raise NotImplementedError
+
+
+    def add_streamed_record(self, warc_record: StreamedWarcRecord, contents_file, matched_results_file_paths: list[str]):
+        """Extracts a streamed record for each definition it matched, reading its contents from the start of the seekable contents file if needed."""
+        self.add_record(warc_record, matched_results_file_paths)
+
+
+    def checkpoint(self, generation: int):
+        """Makes sure what the search worker process extracted so far is on disk and intact, continuing in the segments of the checkpoint generation."""
+
+
+    def finish_worker(self):
+        """Finishes extracting in a search worker process, closing the files it extracted into."""
+
+
+    def log_summary(self, search_statistics: SearchStatistics):
+        """Logs a summary of what the search worker processes extracted."""
+
+
+    def finalize(self, results_file_paths: Iterable[str]):
+        """Merges what the search worker processes extracted for each definition into the results output subdirectory, once the search finishes."""
+
+
+class ZipArchiveExtraction(RecordExtraction):
+    """
+    Adds the contents of each record with matches to a zip archive of each definition it matched, compressed as the zip compression policy decides.
+    Each search worker process adds them to zip archives of its own, which are merged once the search finishes.
+    """
+    def __init__(self, zip_compression_policy: ZipCompressionPolicy | None):
+        super().__init__()
+        self.zip_compression_policy = zip_compression_policy
+        self.zip_temp_dir_for_process: str | None = None
+        self.zip_archives_dict: dict[str, zipfile.ZipFile] = {}
+
+
+    @property
+    def needs_http_headers(self) -> bool:
+        """Returns True if the zip compression policy stores compressed formats, which it tells apart by their HTTP Content-Type."""
+        return self.zip_compression_policy is not None and self.zip_compression_policy.store_compressed_formats
+
+
+    def start_worker(self, results_file_paths: Iterable[str], zip_temp_dir_for_process: str, generation: int, search_statistics: SearchStatistics):
+        """Opens the zip archive segment of each definition for the checkpoint generation in the temporary directory of a search worker process."""
+        super().start_worker(results_file_paths, zip_temp_dir_for_process, generation, search_statistics)
+        self.zip_temp_dir_for_process = zip_temp_dir_for_process
+        self.zip_archives_dict = {}
+        for results_file_path in results_file_paths:
+            zip_results_archive_path = os.path.join(zip_temp_dir_for_process, f"{get_base_file_name(results_file_path)}.zip")
+            self.zip_archives_dict[zip_results_archive_path] = zipfile.ZipFile(
+                get_zip_archive_segment_path(zip_results_archive_path, generation), 'a', zipfile.ZIP_DEFLATED
+            )
+
+
+    def get_streamed_contents_directory(self) -> str | None:
+        """Returns the temporary directory of the search worker process, since the contents of streamed records are added to its zip archives."""
+        return self.zip_temp_dir_for_process
+
+
+    def add_record(self, warc_record: WarcRecord, matched_results_file_paths: list[str]):
+        """Adds the record's contents to the zip archive of each definition it matched."""
+        for results_file_path in matched_results_file_paths:
+            zip_archive_path = get_results_zip_archive_file_path(self.zip_archives_dict, results_file_path)
+
+            try:
+                add_record_to_zip_archive(warc_record, results_file_path, self.zip_archives_dict[zip_archive_path],
+                                          self.zip_compression_policy, self.search_statistics)
+            except Exception as e:
+                log_error(f"Error adding file to zip archive {zip_archive_path}: {e}")
+                continue
+
+
+    def add_streamed_record(self, warc_record: StreamedWarcRecord, contents_file, matched_results_file_paths: list[str]):
+        """Adds the contents of a streamed record, read from the start of the seekable contents file, to the zip archive of each definition it matched."""
+        for results_file_path in matched_results_file_paths:
+            zip_archive_path = get_results_zip_archive_file_path(self.zip_archives_dict, results_file_path)
+
+            try:
+                add_streamed_record_to_zip_archive(warc_record, contents_file, results_file_path, self.zip_archives_dict[zip_archive_path],
+                                                   self.zip_compression_policy, self.search_statistics)
+            except Exception as e:
+                log_error(f"Error adding file to zip archive {zip_archive_path}: {e}")
+                continue
+
+
+    def checkpoint(self, generation: int):
+        """
+        Closes the zip archive segments of the search worker process, making sure they are on disk, and starts new ones for the checkpoint generation,
+        since a zip archive that is appended to and not closed cannot be read, and the segments closed here must remain intact if the search is interrupted.
+        """
+        for zip_archive_path, zip_archive in self.zip_archives_dict.items():
+            zip_archive.close()
+            with open(zip_archive.filename, 'rb') as zip_archive_file:
+                os.fsync(zip_archive_file.fileno())
+
+            self.zip_archives_dict[zip_archive_path] = zipfile.ZipFile(
+                get_zip_archive_segment_path(zip_archive_path, generation), 'a', zipfile.ZIP_DEFLATED
+            )
+
+
+    def finish_worker(self):
+        """Closes the zip archives of the search worker process."""
+        for zip_archive in self.zip_archives_dict.values():
+            zip_archive.close()
+        self.zip_archives_dict = {}
+
+
+    def log_summary(self, search_statistics: SearchStatistics):
+        """Logs how much the zip archives of each definition were compressed."""
+        if self.zip_compression_policy is not None:
+            search_statistics.log_zip_compression_summary()
+
+
+    def finalize(self, results_file_paths: Iterable[str]):
+        """Merges the zip archives of the search worker processes into one for each definition."""
+        finalize_results_zip_archives(results_file_paths)
+
+
+class BlobStoreExtraction(RecordExtraction):
+    """Adds the contents of each record with matches to the blob store once, listing them in the blob manifest of each definition it matched."""
+    def __init__(self, blob_store: BlobStore):
+        super().__init__()
+        self.blob_store = blob_store
+
+
+    def start_worker(self, results_file_paths: Iterable[str], zip_temp_dir_for_process: str, generation: int, search_statistics: SearchStatistics):
+        """Opens the blob manifests of the search worker process in its temporary directory."""
+        super().start_worker(results_file_paths, zip_temp_dir_for_process, generation, search_statistics)
+        self.blob_store.start_worker(results_file_paths, zip_temp_dir_for_process)
+
+
+    def get_streamed_contents_directory(self) -> str | None:
+        """Returns the blob store directory, so the copied contents of a streamed record can be moved into it as a blob."""
+        return self.blob_store.blob_store_directory
+
+
+    def add_record(self, warc_record: WarcRecord, matched_results_file_paths: list[str]):
+        """Adds the record's contents to the blob store once, and lists them in the blob manifest of each definition it matched."""
+        if not matched_results_file_paths:
+            return
+
+        try:
+            listed_manifests, written = self.blob_store.add_file(warc_record.name, warc_record.contents, matched_results_file_paths)
+        except Exception as e:
+            log_error(f"Error adding file to the blob store {self.blob_store.blob_store_directory}: {e}")
+            return
+        self.search_statistics.count_blob_store(listed_manifests, written, len(warc_record.contents))
+
+
+    def add_streamed_record(self, warc_record: StreamedWarcRecord, contents_file, matched_results_file_paths: list[str]):
+        """Adds the contents of a streamed record, read from the start of the seekable contents file, to the blob store like add_record."""
+        if not matched_results_file_paths:
+            return
+
+        try:
+            listed_manifests, written, size = self.blob_store.add_stream(warc_record.name, contents_file, matched_results_file_paths)
+        except Exception as e:
+            log_error(f"Error adding file to the blob store {self.blob_store.blob_store_directory}: {e}")
+            return
+        self.search_statistics.count_blob_store(listed_manifests, written, size)
+
+
+    def checkpoint(self, generation: int):
+        """Makes sure the blobs and blob manifest rows of the search worker process are on disk."""
+        self.blob_store.sync()
+
+
+    def finish_worker(self):
+        """Closes the blob manifests of the search worker process."""
+        self.blob_store.finish_worker()
+
+
+    def log_summary(self, search_statistics: SearchStatistics):
+        """Logs how many files were listed in the blob manifests and written to the blob store."""
+        search_statistics.log_blob_store_summary()
+
+
+    def finalize(self, results_file_paths: Iterable[str]):
+        """Merges the blob manifests of the search worker processes into one for each definition."""
+        finalize_results_blob_manifests(results_file_paths)
+
+
+class WarcGzExtraction(RecordExtraction):
+    """
+    Copies the gzip member of each record with matches to the WARC.gz file of each definition it matched,
+    or counts it as not extracted if it was not read by the offset of its gzip member.
+    """
+    def __init__(self, warc_gz_extractor: WarcGzExtractor):
+        super().__init__()
+        self.warc_gz_extractor = warc_gz_extractor
+
+
+    def start_worker(self, results_file_paths: Iterable[str], zip_temp_dir_for_process: str, generation: int, search_statistics: SearchStatistics):
+        """Opens the WARC.gz file segment of each definition for the checkpoint generation in the temporary directory of a search worker process."""
+        super().start_worker(results_file_paths, zip_temp_dir_for_process, generation, search_statistics)
+        self.warc_gz_extractor.start_worker(results_file_paths, zip_temp_dir_for_process, generation)
+
+
+    def add_record(self, warc_record: WarcRecord | StreamedWarcRecord, matched_results_file_paths: list[str]):
+        """Copies the record's gzip member to the WARC.gz file of each definition it matched."""
+        if not matched_results_file_paths:
+            return
+
+        if warc_record.warc_member is None:
+            self.search_statistics.count_warc_gz_extraction(0, 0, located=False)
+            return
+
+        try:
+            copies = self.warc_gz_extractor.add_member(warc_record.warc_member, matched_results_file_paths)
+        except Exception as e:
+            log_error(f"Error copying the record {warc_record.name} of {os.path.basename(warc_record.parent_warc_gz_file)} to the WARC.gz files: {e}")
+            return
+        self.search_statistics.count_warc_gz_extraction(copies, copies * warc_record.warc_member.length)
+
+
+    def checkpoint(self, generation: int):
+        """Closes the WARC.gz file segments of the search worker process and starts new ones for the checkpoint generation."""
+        self.warc_gz_extractor.start_segments(generation)
+
+
+    def finish_worker(self):
+        """Closes the WARC.gz files of the search worker process."""
+        self.warc_gz_extractor.finish_worker()
+
+
+    def log_summary(self, search_statistics: SearchStatistics):
+        """Logs how many gzip members were copied to the WARC.gz files of the definitions."""
+        search_statistics.log_warc_gz_extraction_summary()
+
+
+    def finalize(self, results_file_paths: Iterable[str]):
+        """Concatenates the WARC.gz files of the search worker processes into one for each definition."""
+        finalize_results_warc_gz_files(results_file_paths)
+
+
+class DeferredExtraction(RecordExtraction):
+    """
+    Records the gzip member location of each record with matches for each definition it matched, to extract it once the search finishes,
+    or counts it as not recorded if it was not read by the offset of its gzip member.
+    """
+    def __init__(self, match_location_recorder: MatchLocationRecorder):
+        super().__init__()
+        self.match_location_recorder = match_location_recorder
+
+
+    def start_worker(self, results_file_paths: Iterable[str], zip_temp_dir_for_process: str, generation: int, search_statistics: SearchStatistics):
+        """Opens the match locations file of a search worker process in its temporary directory."""
+        super().start_worker(results_file_paths, zip_temp_dir_for_process, generation, search_statistics)
+        self.match_location_recorder.start_worker(zip_temp_dir_for_process)
+
+
+    def add_record(self, warc_record: WarcRecord | StreamedWarcRecord, matched_results_file_paths: list[str]):
+        """Records the location of the record's gzip member for each definition it matched."""
+        if not matched_results_file_paths:
+            return
+
+        if warc_record.warc_member is None:
+            self.search_statistics.count_match_locations(0, located=False)
+            return
+
+        try:
+            recorded_locations = self.match_location_recorder.add_record(warc_record.warc_member, matched_results_file_paths)
+        except Exception as e:
+            log_error(f"Error recording the location of the record {warc_record.name} of {os.path.basename(warc_record.parent_warc_gz_file)}: {e}")
+            return
+        self.search_statistics.count_match_locations(recorded_locations)
+
+
+    def checkpoint(self, generation: int):
+        """Makes sure the match locations recorded by the search worker process are on disk."""
+        self.match_location_recorder.sync()
+
+
+    def finish_worker(self):
+        """Closes the match locations file of the search worker process."""
+        self.match_location_recorder.finish_worker()
+
+
+    def log_summary(self, search_statistics: SearchStatistics):
+        """Logs how many match locations were recorded."""
+        search_statistics.log_match_locations_summary()
+
+
+    def finalize(self, results_file_paths: Iterable[str]):
+        """Merges the match locations files of the search worker processes into one, from which the records are then extracted."""
+        finalize_results_match_locations()
+
+
+def add_record_to_zip_archive(warc_record: WarcRecord, results_file_path: str, zip_archive: zipfile.ZipFile,
+                              zip_compression_policy: ZipCompressionPolicy | None, search_statistics: SearchStatistics):
+    """
+    Adds the record's contents to the zip archive of a definition it matched, compressed as the zip compression policy decides,
+    and counts the bytes saved and CPU time spent for the definition.
+    """
+    if zip_compression_policy is None:
+        add_file_to_zip_archive(warc_record.name, warc_record.contents, zip_archive)
+        return
+
+    compress_type, compresslevel = zip_compression_policy.get_compression(
+        results_file_path, warc_record.contents[:MAGIC_NUMBER_PREFIX_SIZE], warc_record.http_headers
+    )
+    start_cpu_time = time.process_time()
+    if add_file_to_zip_archive(warc_record.name, warc_record.contents, zip_archive, compress_type, compresslevel):
+        count_zip_compression(search_statistics, results_file_path, zip_archive.filelist[-1], time.process_time() - start_cpu_time)
+
+
+def add_streamed_record_to_zip_archive(warc_record: StreamedWarcRecord, contents_file, results_file_path: str, zip_archive: zipfile.ZipFile,
+                                       zip_compression_policy: ZipCompressionPolicy | None, search_statistics: SearchStatistics):
+    """Adds the contents of a streamed record, read from the start of the seekable contents file, to the zip archive of a definition it matched."""
+    if zip_compression_policy is None:
+        add_stream_to_zip_archive(warc_record.name, contents_file, zip_archive)
+        return
+
+    contents_file.seek(0)
+    compress_type, compresslevel = zip_compression_policy.get_compression(
+        results_file_path, contents_file.read(MAGIC_NUMBER_PREFIX_SIZE), warc_record.http_headers
+    )
+    start_cpu_time = time.process_time()
+    if add_stream_to_zip_archive(warc_record.name, contents_file, zip_archive, compress_type, compresslevel):
+        count_zip_compression(search_statistics, results_file_path, zip_archive.filelist[-1], time.process_time() - start_cpu_time)
+
+
+def count_zip_compression(search_statistics: SearchStatistics, results_file_path: str, zip_info: zipfile.ZipInfo, cpu_seconds: float):
+    """Counts a file added to the zip archive of a definition in the search statistics."""
+    search_statistics.count_zip_compression(
+        results_file_path, zip_info.file_size, zip_info.compress_size, zip_info.compress_type == zipfile.ZIP_STORED, cpu_seconds
+    )
@@ -0,0 +1,156 @@
+import datetime
+import re
+
+SKIP_REASONS = ('content length', 'WARC-Date', 'URI', 'HTTP status code', 'Content-Type')
+FILTER_VARIABLE_NAMES = (
+    'FILTER_HTTP_STATUS_CODES', 'FILTER_CONTENT_TYPES_ALLOWED', 'FILTER_CONTENT_TYPES_DENIED', 'FILTER_MIN_CONTENT_LENGTH_KB',
+    'FILTER_MAX_CONTENT_LENGTH_KB', 'FILTER_WARC_DATE_FROM', 'FILTER_WARC_DATE_TO', 'FILTER_URI_INCLUDE_REGEX',
+    'FILTER_URI_EXCLUDE_REGEX',
+)
+
+
+class RecordFilter:
+    """
+    Decides from the headers of a record whether it should be searched, before its contents are read.
+    It is passed to FastWARC's ArchiveIterator as func_filter, so the contents of skipped records are never read or queued.
+    Every predicate is optional, and a record must pass all of the configured predicates to be searched.
+    The number of records skipped for each reason is counted for the summary logged once the search finishes.
+    """
+    def __init__(self, status_code_ranges: list[tuple[int, int]] | None = None, allowed_content_types: list[str] | None = None,
+                 denied_content_types: list[str] | None = None, min_content_length: int | None = None,
+                 max_content_length: int | None = None, warc_date_from: datetime.datetime | None = None,
+                 warc_date_to: datetime.datetime | None = None, uri_include_regex: re.Pattern | None = None,
+                 uri_exclude_regex: re.Pattern | None = None):
+        self.status_code_ranges = status_code_ranges
+        self.allowed_content_types = allowed_content_types
+        self.denied_content_types = denied_content_types
+        self.min_content_length = min_content_length
+        self.max_content_length = max_content_length
+        self.warc_date_from = warc_date_from
+        self.warc_date_to = warc_date_to
+        self.uri_include_regex = uri_include_regex
+        self.uri_exclude_regex = uri_exclude_regex
+        self.skipped_records: dict[str, int] = {}
+        self.reset_skipped_records()
+
+
+    def __call__(self, record) -> bool:
+        """Returns True if the FastWARC record should be searched, counting the reason it is skipped otherwise."""
+        skip_reason = self.get_skip_reason(record)
+        if skip_reason is None:
+            return True
+
+        self.skipped_records[skip_reason] += 1
+        return False
+
+
+    @property
+    def needs_http_headers(self) -> bool:
+        """Returns True if any configured predicate checks the HTTP headers of a record."""
+        return self.status_code_ranges is not None or self.allowed_content_types is not None or self.denied_content_types is not None
+
+
+    def get_skip_reason(self, record) -> str | None:
+        """
+        Returns the reason the FastWARC record should be skipped, or None if it passes every predicate.
+        The cheapest predicates are checked first. Records missing a header that a predicate checks are skipped,
+        except by the denied content types, which only skip records that declare one of them.
+        """
+        if self.min_content_length is not None and record.content_length < self.min_content_length:
+            return 'content length'
+
+        if self.max_content_length is not None and record.content_length > self.max_content_length:
+            return 'content length'
+
+        if self.warc_date_from is not None or self.warc_date_to is not None:
+            if not is_within_date_range(record.record_date, self.warc_date_from, self.warc_date_to):
+                return 'WARC-Date'
+
+        if self.uri_include_regex is not None or self.uri_exclude_regex is not None:
+            uri = record.headers.get('WARC-Target-URI') or ''
+            if self.uri_include_regex is not None and not self.uri_include_regex.search(uri):
+                return 'URI'
+            if self.uri_exclude_regex is not None and self.uri_exclude_regex.search(uri):
+                return 'URI'
+
+        if self.status_code_ranges is not None:
+            status_code = record.http_headers.status_code if record.http_headers is not None else None
+            if not is_status_code_in_ranges(status_code, self.status_code_ranges):
+                return 'HTTP status code'
+
+        if self.allowed_content_types is not None or self.denied_content_types is not None:
+            content_type = (record.http_content_type or '').lower() if record.http_headers is not None else ''
+            if self.allowed_content_types is not None and not matches_content_type(content_type, self.allowed_content_types):
+                return 'Content-Type'
+            if self.denied_content_types is not None and content_type and matches_content_type(content_type, self.denied_content_types):
+                return 'Content-Type'
+
+        return None
+
+
+    def reset_skipped_records(self):
+        """Resets the skipped records counters, so a worker process does not report counts inherited from the main process."""
+        self.skipped_records = {reason: 0 for reason in SKIP_REASONS}
+
+
+def create_record_filter(settings: dict) -> RecordFilter | None:
+    """Returns the record filter configured by the FILTERS settings, or None if no filter is configured."""
+    if all(settings[variable_name] is None for variable_name in FILTER_VARIABLE_NAMES):
+        return None
+
+    return RecordFilter(
+        status_code_ranges=settings["FILTER_HTTP_STATUS_CODES"],
+        allowed_content_types=settings["FILTER_CONTENT_TYPES_ALLOWED"],
+        denied_content_types=settings["FILTER_CONTENT_TYPES_DENIED"],
+        min_content_length=kb_to_bytes(settings["FILTER_MIN_CONTENT_LENGTH_KB"]),
+        max_content_length=kb_to_bytes(settings["FILTER_MAX_CONTENT_LENGTH_KB"]),
+        warc_date_from=settings["FILTER_WARC_DATE_FROM"],
+        warc_date_to=settings["FILTER_WARC_DATE_TO"],
+        uri_include_regex=compile_uri_regex(settings["FILTER_URI_INCLUDE_REGEX"]),
+        uri_exclude_regex=compile_uri_regex(settings["FILTER_URI_EXCLUDE_REGEX"]),
+    )
+
+
+def kb_to_bytes(size_kb: int | None) -> int | None:
+    """Converts a size in kilobytes to bytes, keeping None as is."""
+    return size_kb * 1024 if size_kb is not None else None
+
+
+def compile_uri_regex(uri_regex: str | None) -> re.Pattern | None:
+    """Compiles a URI regex from the config.ini, matching regardless of case, keeping None as is."""
+    return re.compile(uri_regex, re.IGNORECASE) if uri_regex is not None else None
+
+
+def is_within_date_range(record_date: datetime.datetime | None, date_from: datetime.datetime | None,
+                         date_to: datetime.datetime | None) -> bool:
+    """Returns True if the record date is within the inclusive range. Records without a date are never within a range."""
+    if record_date is None:
+        return False
+
+    if record_date.tzinfo is None:
+        record_date = record_date.replace(tzinfo=datetime.timezone.utc)
+
+    return (date_from is None or record_date >= date_from) and (date_to is None or record_date <= date_to)
+
+
+def is_status_code_in_ranges(status_code: int | None, status_code_ranges: list[tuple[int, int]]) -> bool:
+    """Returns True if the HTTP status code is within any of the inclusive ranges."""
+    if status_code is None:
+        return False
+
+    return any(low <= status_code <= high for low, high in status_code_ranges)
+
+
+def matches_content_type(content_type: str, content_types: list[str]) -> bool:
+    """
+    Returns True if the MIME type matches any of the content types, which are either full MIME types, such as text/html,
+    or a type followed by /*, such as image/*, to match all of its subtypes.
+    """
+    for listed_content_type in content_types:
+        if listed_content_type.endswith('/*'):
+            if content_type.startswith(listed_content_type[:-1]):
+                return True
+        elif content_type == listed_content_type:
+            return True
+
+    return False
@@ -0,0 +1,142 @@
+import codecs
+import re
+from functools import lru_cache
+
+DEFAULT_ENCODING = 'utf-8'
+
+# Only the start of the contents is checked for an HTML meta tag, which the HTML standard requires within the first 1024 bytes
+HTML_META_CHARSET_SEARCH_LENGTH = 1024
+HTML_META_CHARSET_REGEX = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_.:-]+)', re.IGNORECASE)
+CONTENT_TYPE_CHARSET_REGEX = re.compile(r'charset\s*=\s*["\']?\s*([a-zA-Z0-9_.:-]+)', re.IGNORECASE)
+
+# Flags of a str regex that are also valid for a bytes regex. re.UNICODE, set on every str regex, is left out.
+BYTES_REGEX_FLAGS = re.IGNORECASE | re.MULTILINE | re.DOTALL | re.VERBOSE | re.ASCII
+# A \s or \S escape, not preceded by an escaped backslash. Without re.ASCII, \s also matches the ASCII separator characters \x1c to \x1f
+# in a str regex but not in a bytes regex, while \w, \d and \b match the same ASCII characters in both.
+WHITESPACE_ESCAPE_REGEX = re.compile(r'(?<!\\)(?:\\\\)*\\[sS]')
+
+
+class RecordText:
+    """
+    The contents of a record, decoded at most once no matter how many regex definitions search them.
+    Contents made only of ASCII bytes are identical once decoded with any ASCII compatible encoding,
+    so they can be searched directly as bytes without being decoded at all.
+
+    Contents in a shared memory slot are decoded straight from the slot's memoryview without being copied.
+    A memoryview cannot be checked for non-ASCII bytes, so they are only copied to bytes when that check is needed.
+    """
+    def __init__(self, contents: bytes | memoryview, encoding: str = DEFAULT_ENCODING):
+        self.contents = contents
+        self.encoding = encoding
+        self.is_ascii: bool | None = None
+        self.decoded_text: str | None = None
+
+
+    def get_ascii_contents(self) -> bytes | None:
+        """
+        Returns the contents as bytes if they are made only of ASCII bytes and the encoding is ASCII compatible, or None otherwise,
+        checking them on first use.
+        """
+        if self.is_ascii is None:
+            self.is_ascii = False
+            if is_ascii_compatible_encoding(self.encoding):
+                self.contents = bytes(self.contents)
+                self.is_ascii = self.contents.isascii()
+
+        return self.contents if self.is_ascii else None
+
+
+    def get_decoded_text(self) -> str:
+        """Returns the contents decoded with the record's encoding, ignoring invalid bytes, decoding them on first use."""
+        if self.decoded_text is None:
+            self.decoded_text = str(self.contents, self.encoding, 'ignore')
+        return self.decoded_text
+
+
+def get_contents_encoding(contents: bytes | memoryview, declared_charset: str | None) -> str:
+    """
+    Returns the encoding to decode the record contents with: the charset declared by the HTTP Content-Type header,
+    or else the charset of an HTML meta tag at the start of the contents, or else UTF-8. Unknown charsets are ignored.
+    """
+    for charset in (declared_charset, find_html_meta_charset(contents)):
+        if charset and (encoding := get_known_encoding(charset)) is not None:
+            return encoding
+
+    return DEFAULT_ENCODING
+
+
+def get_http_charset(record) -> str | None:
+    """Returns the charset declared by the HTTP Content-Type header of a FastWARC record, or None if it declares none."""
+    if record.http_headers is None:
+        return None
+
+    return get_charset_from_content_type(record.http_headers.get('Content-Type'))
+
+
+def get_charset_from_content_type(content_type: str | None) -> str | None:
+    """Returns the charset parameter of an HTTP Content-Type header value, or None if it has none."""
+    if not content_type:
+        return None
+
+    charset_match = CONTENT_TYPE_CHARSET_REGEX.search(content_type)
+    return charset_match.group(1) if charset_match else None
+
+
+def find_html_meta_charset(contents: bytes | memoryview) -> str | None:
+    """Returns the charset of the first HTML meta tag declaring one at the start of the contents, or None if there is none."""
+    charset_match = HTML_META_CHARSET_REGEX.search(bytes(contents[:HTML_META_CHARSET_SEARCH_LENGTH]))
+    return str(charset_match.group(1), 'ascii') if charset_match else None
+
+
+@lru_cache(maxsize=256)
+def get_known_encoding(charset: str) -> str | None:
+    """Returns the name Python knows the charset by, or None if Python cannot decode it."""
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return None
+
+
+@lru_cache(maxsize=256)
+def is_ascii_compatible_encoding(encoding: str) -> bool:
+    """Returns True if the encoding decodes every ASCII byte to the same ASCII character, as UTF-8 and the single byte charsets do."""
+    ascii_bytes = bytes(range(128))
+    try:
+        return str(ascii_bytes, encoding) == str(ascii_bytes, 'ascii')
+    except (UnicodeDecodeError, LookupError):
+        return False
+
+
+def create_bytes_regexes_dict(results_and_regexes_dict: dict) -> dict[str, re.Pattern]:
+    """Returns the bytes regex of each definition that has one, keyed by results file path."""
+    bytes_regexes_dict = {}
+    for results_file_path, regex in results_and_regexes_dict.items():
+        bytes_regex = compile_bytes_regex(regex)
+        if bytes_regex is not None:
+            bytes_regexes_dict[results_file_path] = bytes_regex
+    return bytes_regexes_dict
+
+
+def compile_bytes_regex(regex: re.Pattern) -> re.Pattern | None:
+    """
+    Returns a bytes regex finding exactly the same matches in ASCII contents as the str regex does in the same contents decoded,
+    or None if there is no such regex. Regexes with non-ASCII characters are not compiled, since with re.IGNORECASE
+    they can match ASCII letters, such as 'ſ' matching 's', while the bytes they encode to would not. Neither are regexes
+    with \\s or \\S escapes, unless re.ASCII is set, since \\s matches the separator characters \\x1c to \\x1f only in a str regex.
+    """
+    if not regex.pattern.isascii():
+        return None
+
+    if not regex.flags & re.ASCII and WHITESPACE_ESCAPE_REGEX.search(regex.pattern):
+        return None
+
+    try:
+        return re.compile(regex.pattern.encode('ascii'), regex.flags & BYTES_REGEX_FLAGS)
+    except (re.error, TypeError, ValueError):
+        # Escapes such as \u00e9 and the (?u) inline flag are only valid in str regexes
+        return None
+
+
+def find_bytes_regex_matches(contents: bytes, bytes_regex: re.Pattern) -> list:
+    """Finds all matches of the bytes regex in ASCII contents and returns them as a list of str."""
+    return [str(match.group(), 'ascii') for match in bytes_regex.finditer(contents)]
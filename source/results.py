@@ -5,13 +5,20 @@ from io import StringIO
 from multiprocessing.managers import SyncManager
 import re
 import shutil
-from typing import Iterable
+from typing import Iterable, Iterator
 
+from blob_store import BLOB_STORE_DIRECTORY_NAME, merge_blob_manifests
+from deferred_extraction import get_match_locations_file_path, merge_match_locations
+from literal_prefilter import LiteralPrefilter, create_literal_prefilter
 from utilities import get_base_file_name, merge_zip_archives
+from warc_gz_extraction import merge_warc_gz_files
 import config
 from logger import *
 
 results_output_subdirectory = ''
+literal_prefilters_dict: dict[str, LiteralPrefilter] = {}
+DEFINITION_SCOPES = ('headers', 'body')
+RESULT_ENTRY_SEPARATOR = '___________________________________________________________________\n\n'
 
 
 def create_result_files_associated_with_regexes_dict() -> dict[str, re.Pattern]:
@@ -19,16 +26,24 @@ def create_result_files_associated_with_regexes_dict() -> dict[str, re.Pattern]:
     Creates a dictionary with entries based on the definition files. 
     Each key is a results text file path with a similar file name as the definition, 
     and each value is a compiled regex pattern from the definition file.
+    If LITERAL_PREFILTER is enabled, the literal prefilter of each definition is built next to its regex pattern.
     """
     definition_files = get_definition_txt_files_list()
 
     results_file_regex_pattern_dict = {}
+    global literal_prefilters_dict
+    literal_prefilters_dict = {}
 
     for definition_file_path in definition_files:
         regex_pattern, success = compile_regex_pattern_from_definition_file(definition_file_path)
         if success:
             results_filepath = get_results_file_path(definition_file_path)
             results_file_regex_pattern_dict[results_filepath] = regex_pattern
+            if config.settings["LITERAL_PREFILTER"]:
+                literal_prefilter = create_literal_prefilter(regex_pattern)
+                log_required_literals(definition_file_path, literal_prefilter)
+                if literal_prefilter is not None:
+                    literal_prefilters_dict[results_filepath] = literal_prefilter
     
     if not results_file_regex_pattern_dict:
         log_error("No valid regex patterns were found in any of the definition files. Exiting.")
@@ -60,6 +75,22 @@ def compile_regex_pattern_from_definition_file(definition_file_path: str) -> tup
         return None, False
 
 
+def get_literal_prefilters_dict() -> dict[str, LiteralPrefilter]:
+    """Returns the literal prefilter of each definition that has one, keyed by results file path, as built with the regex patterns."""
+    return literal_prefilters_dict
+
+
+def log_required_literals(definition_file_path: str, literal_prefilter: LiteralPrefilter | None):
+    """Logs the literals the literal prefilter requires a record to contain before it is searched with the definition's regex."""
+    if literal_prefilter is not None:
+        log_info(
+            f"Records must contain {' or '.join(repr(literal) for literal in literal_prefilter.required_literals)} "
+            f"to be searched with {os.path.basename(definition_file_path)}."
+        )
+    else:
+        log_info(f"No literal that every match must contain was found in {os.path.basename(definition_file_path)}. Every record will be searched with it.")
+
+
 def initialize_results_output_subdirectory():
     """
     Creates and initializes a timestamped subdirectory in the results output directory 
@@ -79,12 +110,62 @@ def initialize_results_output_subdirectory():
         os.makedirs(os.path.join(results_output_subdirectory, "temp"))
 
 
+def use_resumed_results_output_subdirectory(results_subdirectory_path: str):
+    """Uses the results subdirectory of an interrupted search as the results output subdirectory, so the search is resumed in it."""
+    if not os.path.isdir(results_subdirectory_path):
+        log_error(f"The results folder {results_subdirectory_path} to resume the search in does not exist. Exiting.")
+        sys.exit()
+
+    log_info(f"Resuming the search in the results output folder: {results_subdirectory_path}")
+
+    global results_output_subdirectory
+    results_output_subdirectory = results_subdirectory_path
+
+
+def use_extracted_results_output_subdirectory(results_subdirectory_path: str):
+    """Uses the results subdirectory of an earlier search as the results output subdirectory, so the records with matches it recorded are extracted into it."""
+    if not os.path.isdir(results_subdirectory_path):
+        log_error(f"The results folder {results_subdirectory_path} to extract the records with matches into does not exist. Exiting.")
+        sys.exit()
+
+    log_info(f"Extracting the records with matches into the results output folder: {results_subdirectory_path}")
+
+    global results_output_subdirectory
+    results_output_subdirectory = results_subdirectory_path
+
+
 def get_results_file_path(definition_file_path: str) -> str:
     """Returns a file path for a results text file with a name similar to that of the corresponding definition file's name."""
     results_file_name = f"{get_base_file_name(definition_file_path)}_results.txt"
     return os.path.join(results_output_subdirectory, results_file_name)
 
 
+def get_definition_scope(results_file_path: str) -> str | None:
+    """
+    Returns the part of a record the definition of a results file is limited to searching: 'headers' for a definition file
+    named like name.headers.txt, 'body' for one named like name.body.txt, or None for any other definition, which searches
+    both the record's URI and its contents.
+    """
+    definition_name = get_base_file_name(results_file_path).removesuffix('_results')
+    scope = definition_name.rpartition('.')[2]
+    return scope if scope in DEFINITION_SCOPES else None
+
+
+def get_blob_store_directory() -> str:
+    """Returns the directory of the blob store the files with matches are written to when EXTRACTION_MODE is blob_store, within the results output subdirectory."""
+    return os.path.join(results_output_subdirectory, BLOB_STORE_DIRECTORY_NAME)
+
+
+def get_results_match_locations_file_path() -> str:
+    """Returns the path of the match locations file recorded when EXTRACTION_MODE is deferred, within the results output subdirectory."""
+    return get_match_locations_file_path(results_output_subdirectory)
+
+
+def get_spool_directory() -> str:
+    """Returns the directory that records too large to pass through the search queue are spooled to, within the results output subdirectory."""
+    return os.path.join(results_output_subdirectory, "spool")
+
+
 def create_result_files_write_locks_dict(manager: SyncManager, results_file_paths: Iterable[str]) -> dict:
     """Create write locks for the specified paths to the results files."""
     write_locks_dict = manager.dict()
@@ -101,18 +182,19 @@ def write_result_files_headers(results_and_regexes_dict: dict[str, re.Pattern]):
             results_file.write(f'[{os.path.basename(results_file_path)}]\n')
             results_file.write(f'[Created: {timestamp}]\n\n')
             results_file.write(f'[Regex used]\n{regex.pattern}\n\n')
-            results_file.write('___________________________________________________________________\n\n')
+            results_file.write(RESULT_ENTRY_SEPARATOR)
 
 
-def write_record_info_to_result_output_buffer(output_buffer: StringIO, matches_list_name: list, matches_list_contents: list, parent_warc_gz_file: str, file_name: str):
-    """Writes the matched record information to the output buffer."""
+def write_record_info_to_result_output_buffer(output_buffer: StringIO, matches_list_name: list, matches_list_contents: list, parent_warc_gz_file: str, file_name: str, 
+                                              contents_match_type: str = 'file contents'):
+    """Writes the matched record information to the output buffer. The contents matches are labeled with the part of the record they were found in."""
     output_buffer.write(f'[Archive: {parent_warc_gz_file}]\n')
     output_buffer.write(f'[File: {file_name}]\n\n')
 
     write_matches_to_result_output_buffer(output_buffer, matches_list_name, 'file name')
-    write_matches_to_result_output_buffer(output_buffer, matches_list_contents, 'file contents')
+    write_matches_to_result_output_buffer(output_buffer, matches_list_contents, contents_match_type)
 
-    output_buffer.write('___________________________________________________________________\n\n')
+    output_buffer.write(RESULT_ENTRY_SEPARATOR)
 
 
 def write_matches_to_result_output_buffer(output_buffer: StringIO, matches_list: list, match_type: str):
@@ -124,12 +206,43 @@ def write_matches_to_result_output_buffer(output_buffer: StringIO, matches_list:
             output_buffer.write(f'[Match #{i} in {match_type}]\n\n"{match}"\n\n')
 
 
+def get_previous_result_entries(previous_results_file_path: str, parent_warc_gz_files: Iterable[str]) -> Iterator[tuple[str, str]]:
+    """
+    Reads a results text file written by an earlier execution, and yields the name of the matching file and the complete entry
+    for each record it lists from one of the given WARC.gz files. The header of the results file is skipped.
+    """
+    archive_lines = {f'[Archive: {parent_warc_gz_file}]\n' for parent_warc_gz_file in parent_warc_gz_files}
+    separator_line = RESULT_ENTRY_SEPARATOR.splitlines(keepends=True)[0]
+
+    with open(previous_results_file_path, 'r', encoding='utf-8') as previous_results_file:
+        entry_lines = []
+        for line in previous_results_file:
+            entry_lines.append(line)
+            # Each entry, like the header, ends with the separator line followed by an empty line
+            if line != '\n' or len(entry_lines) < 2 or entry_lines[-2] != separator_line:
+                continue
+
+            if entry_lines[0] in archive_lines and entry_lines[1].startswith('[File: '):
+                yield entry_lines[1].removeprefix('[File: ').removesuffix(']\n'), ''.join(entry_lines)
+            entry_lines = []
+
+
 def move_log_file_to_results_subdirectory():
-    """Moves the log file to the results output subdirectory, or keeps it in the working directory if an output subdirectory was not created."""
+    """
+    Moves the log file to the results output subdirectory, or keeps it in the working directory if an output subdirectory was not created.
+    If the subdirectory already has a log file from the interrupted search that was resumed, the log file is appended to it.
+    """
     if os.path.exists(results_output_subdirectory):
         working_directory_log_path = os.path.join(os.getcwd(), 'log.log')
         results_output_subdirectory_log_path = os.path.join(results_output_subdirectory, 'log.log')
-        shutil.move(working_directory_log_path, results_output_subdirectory_log_path)
+
+        if os.path.exists(results_output_subdirectory_log_path):
+            # A resumed search adds its log to the log of the interrupted search
+            with open(working_directory_log_path, 'rb') as working_directory_log, open(results_output_subdirectory_log_path, 'ab') as results_log:
+                shutil.copyfileobj(working_directory_log, results_log)
+            os.remove(working_directory_log_path)
+        else:
+            shutil.move(working_directory_log_path, results_output_subdirectory_log_path)
 
 
 def log_results_output_path():
@@ -166,4 +279,36 @@ def finalize_results_zip_archives(results_file_paths: Iterable[str]):
         for future in as_completed(futures):
             future.result()
 
-    shutil.rmtree(tempdir)
\ No newline at end of file
+    shutil.rmtree(tempdir)
+
+
+def finalize_results_blob_manifests(results_file_paths: Iterable[str]):
+    """Merges the blob manifests output from the search worker processes into a single blob manifest for each definition."""
+    log_info("Finalizing the blob manifests, please wait...")
+    tempdir = os.path.join(results_output_subdirectory, "temp")
+    for results_file_path in results_file_paths:
+        merge_blob_manifests(tempdir, results_output_subdirectory, get_base_file_name(results_file_path))
+
+    shutil.rmtree(tempdir)
+
+
+def finalize_results_warc_gz_files(results_file_paths: Iterable[str]):
+    """Delegates multiple threads to concatenate all identically named WARC.gz files output from the search worker processes."""
+    log_info("Finalizing the WARC.gz files, please wait...")
+    tempdir = os.path.join(results_output_subdirectory, "temp")
+    with ThreadPoolExecutor() as executor:
+        futures = [executor.submit(merge_warc_gz_files, tempdir, results_output_subdirectory, get_base_file_name(results_path))
+                   for results_path in results_file_paths]
+        for future in as_completed(futures):
+            future.result()
+
+    shutil.rmtree(tempdir)
+
+
+def finalize_results_match_locations():
+    """Merges the match locations files output from the search worker processes into a single match locations file."""
+    log_info("Finalizing the match locations, please wait...")
+    tempdir = os.path.join(results_output_subdirectory, "temp")
+    merge_match_locations(tempdir, results_output_subdirectory)
+
+    shutil.rmtree(tempdir)
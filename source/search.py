@@ -1,61 +1,531 @@
 from asyncio import Future
 from threading import Event, Thread
+import pickle
+import tempfile
 import time
 from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
                                 as_completed, wait)
 from io import StringIO
 from multiprocessing import Manager
-from typing import Any
+from multiprocessing.managers import SyncManager
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Iterator
 
+from blob_store import BlobStore
+from bloom_sidecar import BloomSidecarBuilder, is_bloom_sidecar_current, skip_warc_gz_files_without_matches
+from combined_matcher import CombinedMatcher
+from deferred_extraction import MatchLocationRecorder, group_match_locations
 from config import *
 from fastwarc.stream_io import FileStream, GZipStream
 from fastwarc.warc import ArchiveIterator, WarcRecordType
+from http_payload import decode_http_payload, decode_http_payload_chunks, serialize_http_headers
+from in_flight_budget import InFlightBytesBudget
+from in_flight_compression import CompressedWarcRecord, InFlightCompressor, decompress_warc_record
+from literal_prefilter import LiteralPrefilter, PrefilterText
+from match_memo import MatchMemo, get_match_memo_file_path
+from payload_digest_cache import PayloadDigestCache, get_payload_identity, get_payload_key
+from record_extraction import (BlobStoreExtraction, DeferredExtraction, RecordExtraction, WarcGzExtraction, ZipArchiveExtraction, 
+                               add_record_to_zip_archive, add_streamed_record_to_zip_archive)
+from record_filters import RecordFilter, create_record_filter
+from record_text import (DEFAULT_ENCODING, RecordText, create_bytes_regexes_dict, find_bytes_regex_matches, get_contents_encoding,
+                         get_http_charset)
+from warc_gz_extraction import WarcGzExtractor
 from warc_record import WarcRecord
+from zip_compression import ZipCompressionPolicy
+from worker_autoscaler import SearchWorkerAutoscaler
 from results import *
+from record_batcher import RecordBatcher, get_batch_item_size
+from search_checkpoint import (CheckpointMarker, SearchCheckpointer, load_search_checkpoint,
+                               remove_unfinished_warc_gz_segments, remove_unfinished_zip_archive_segments, restore_results_files)
+from search_manifest import (IncrementalSearchPlan, SearchManifest, carry_forward_previous_results, get_definition_fingerprint,
+                             get_search_manifest_file_path, plan_incremental_search, record_incremental_search)
+from search_statistics import SearchStatistics
+from shared_memory_ring import SharedMemoryRing
+from spill_queue import SpillSegment, SpillWriter, read_spill_segment
+from trigram_index import find_candidate_warc_members, get_index_settings_fingerprint
+from streaming_search import (ChunkedMatchFinder, SpooledWarcRecord, StreamedWarcRecord, open_spooled_warc_record,
+                              spool_streamed_warc_record)
 from utilities import *
+from warc_members import (WarcMember, WarcMemberReader, is_warc_gz_compressed_per_record,
+                          scan_warc_gz_members)
 
 SEARCH_QUEUE = None
+RECORD_BATCHER: RecordBatcher | None = None
+IN_FLIGHT_BUDGET: InFlightBytesBudget | None = None
+SPILL_WRITER: SpillWriter | None = None
+IN_FLIGHT_COMPRESSOR: InFlightCompressor | None = None
+WORKER_AUTOSCALER: SearchWorkerAutoscaler | None = None
+SEARCH_CHECKPOINTER: SearchCheckpointer | None = None
+CANDIDATE_WARC_MEMBERS: dict[str, list[WarcMember]] = {}
+BLOOM_SIDECAR_BUILDER: BloomSidecarBuilder | None = None
+PAYLOAD_DIGEST_CACHE: PayloadDigestCache | None = None
+MATCH_MEMO: MatchMemo | None = None
+COMBINED_MATCHER: CombinedMatcher | None = None
+LITERAL_PREFILTERS: dict[str, LiteralPrefilter] | None = None
+BYTES_REGEXES: dict[str, re.Pattern] | None = None
+RECORD_FILTER: RecordFilter | None = None
+READ_HTTP_HEADERS: bool = False
+DEFINITION_SCOPES: dict[str, str] = {}
+SEARCH_STATISTICS = SearchStatistics()
 TOTAL_RECORDS_READ: int = 0
 PAUSE_READ_THREADS_EVENT = Event()
 
+# The globals above that the main process sets up before starting the worker processes and the worker processes use.
+# The spill writer and in-flight compressor are only used by the read threads of the main process.
+WORKER_PROCESS_GLOBALS = (
+    "SEARCH_QUEUE", "RECORD_FILTER", "READ_HTTP_HEADERS", "IN_FLIGHT_BUDGET", "WORKER_AUTOSCALER", "SEARCH_CHECKPOINTER", "BLOOM_SIDECAR_BUILDER",
+    "PAYLOAD_DIGEST_CACHE", "MATCH_MEMO", "LITERAL_PREFILTERS"
+)
 
-def perform_search():
+
+def perform_search(resume: bool = False):
     """
     Intiates the search by setting up resources and starting the search worker processes.
     Once the search worker processes complete, it finalizes the results zip archives if configured to do so.
+    If resume is True, an interrupted search is resumed from the last checkpoint in the results output subdirectory.
     """
     warc_gz_files_list = glob.glob(f"{config.settings["WARC_GZ_ARCHIVES_DIRECTORY"]}/*.gz")
 
+    global RECORD_FILTER
+    RECORD_FILTER = create_record_filter(config.settings)
+
     results_and_regexes_dict = create_result_files_associated_with_regexes_dict()
+
+    global LITERAL_PREFILTERS
+    LITERAL_PREFILTERS = get_literal_prefilters_dict() if config.settings["LITERAL_PREFILTER"] else None
+
+    record_extraction = create_record_extraction()
+
+    global READ_HTTP_HEADERS
+    READ_HTTP_HEADERS = config.settings["DECODE_HTTP_PAYLOADS"] or any(
+        get_definition_scope(results_file_path) == 'headers' for results_file_path in results_and_regexes_dict
+    ) or (record_extraction is not None and record_extraction.needs_http_headers)
+
+    if config.settings["STREAMING_SEARCH_THRESHOLD_KB"] is not None:
+        log_info(
+            f"Records larger than {config.settings["STREAMING_SEARCH_THRESHOLD_KB"]} KB will be searched in chunks of "
+            f"{config.settings["STREAMING_CHUNK_SIZE_KB"]} KB overlapping by {config.settings["STREAMING_OVERLAP_KB"]} KB."
+        )
+
     manager = Manager()
 
-    write_result_files_headers(results_and_regexes_dict)
+    global SEARCH_CHECKPOINTER
+    if resume:
+        SEARCH_CHECKPOINTER = resume_search_checkpointer(results_and_regexes_dict)
+        warc_gz_files_list = [
+            gz_file_path for gz_file_path in warc_gz_files_list 
+            if not SEARCH_CHECKPOINTER.get_archive_progress(gz_file_path)["completed"]
+        ]
+    else:
+        write_result_files_headers(results_and_regexes_dict)
+        SEARCH_CHECKPOINTER = create_search_checkpointer(results_and_regexes_dict)
+
+    if config.settings["BLOOM_FILTER_SIDECAR_KB"] is not None:
+        warc_gz_files_list = skip_warc_gz_files_without_matches(
+            warc_gz_files_list, 
+            results_and_regexes_dict, 
+            config.settings["BLOOM_FILTER_SIDECAR_KB"] * 1024
+        )
+
     result_files_write_locks_dict = create_result_files_write_locks_dict(manager, results_and_regexes_dict.keys())
 
-    global SEARCH_QUEUE
-    SEARCH_QUEUE = manager.Queue()
+    if config.settings["REGEX_MATCHING_MODE"] == 'combined':
+        log_combined_matcher_summary(results_and_regexes_dict)
+
+    if config.settings["INCREMENTAL_SEARCH"]:
+        search_manifest = SearchManifest(get_search_manifest_file_path())
+        incremental_search_plan = plan_incremental_search(search_manifest, warc_gz_files_list, results_and_regexes_dict)
+        search_groups = incremental_search_plan.search_groups
+    else:
+        search_groups = [(warc_gz_files_list, results_and_regexes_dict)]
+
+    global BLOOM_SIDECAR_BUILDER
+    BLOOM_SIDECAR_BUILDER = create_bloom_sidecar_builder(search_groups)
+
+    global PAYLOAD_DIGEST_CACHE
+    if config.settings["PAYLOAD_DIGEST_CACHE_ENTRIES"] is not None:
+        # Each search worker process fills its own copy
+        PAYLOAD_DIGEST_CACHE = PayloadDigestCache(config.settings["PAYLOAD_DIGEST_CACHE_ENTRIES"])
+
+    global MATCH_MEMO
+    if config.settings["MATCH_MEMO"]:
+        MATCH_MEMO = MatchMemo(get_match_memo_file_path(), results_and_regexes_dict)
+
+    futures = []
+    if config.settings["SEARCH_PIPELINE_MODE"] == 'fused':
+        if config.settings["TRIGRAM_INDEX_DIRECTORY"] is not None:
+            log_warning("The trigram index is not used when SEARCH_PIPELINE_MODE is set to fused, so every record will be searched.")
+
+        for gz_files_list, group_results_and_regexes_dict in search_groups:
+            futures += initiate_fused_search_worker_processes(manager, gz_files_list, group_results_and_regexes_dict, result_files_write_locks_dict, 
+                                                              record_extraction)
+    else:
+        global SEARCH_QUEUE, IN_FLIGHT_BUDGET, SPILL_WRITER, IN_FLIGHT_COMPRESSOR
+        SEARCH_QUEUE = create_search_queue(manager)
+        IN_FLIGHT_BUDGET = create_in_flight_budget()
+        SPILL_WRITER = create_spill_writer()
+        IN_FLIGHT_COMPRESSOR = create_in_flight_compressor()
+
+        for gz_files_list, group_results_and_regexes_dict in search_groups:
+            futures += initiate_search_worker_processes(gz_files_list, group_results_and_regexes_dict, result_files_write_locks_dict, record_extraction)
 
-    initiate_search_worker_processes(warc_gz_files_list, results_and_regexes_dict, result_files_write_locks_dict)
     log_info("Finished searching.")
 
+    if BLOOM_SIDECAR_BUILDER is not None:
+        BLOOM_SIDECAR_BUILDER.write_sidecars(all(future.exception() is None for future in futures))
+
+    if isinstance(SEARCH_QUEUE, SharedMemoryRing):
+        SEARCH_QUEUE.close()
+
+    if SPILL_WRITER is not None:
+        SPILL_WRITER.remove_spill_directory()
+
+    if config.settings["STREAMING_SEARCH_THRESHOLD_KB"] is not None:
+        shutil.rmtree(get_spool_directory(), ignore_errors=True)
+
+    if record_extraction is not None:
+        record_extraction.finalize(results_and_regexes_dict.keys())
+
+    if isinstance(record_extraction, DeferredExtraction):
+        perform_deferred_extraction(get_results_match_locations_file_path())
+
+    if config.settings["INCREMENTAL_SEARCH"]:
+        finish_incremental_search(search_manifest, incremental_search_plan, results_and_regexes_dict, futures)
+
+    if SEARCH_CHECKPOINTER is not None and all(future.exception() is None for future in futures):
+        SEARCH_CHECKPOINTER.remove_checkpoint()
+
+
+def create_record_extraction() -> RecordExtraction | None:
+    """Selects how the records with matches are extracted from EXTRACTION_MODE, or returns None if ZIP_FILES_WITH_MATCHES is disabled."""
+    if not config.settings["ZIP_FILES_WITH_MATCHES"]:
+        return None
+
+    if config.settings["EXTRACTION_MODE"] == 'blob_store':
+        return BlobStoreExtraction(BlobStore(get_blob_store_directory()))
+
+    if config.settings["EXTRACTION_MODE"] == 'warc_gz':
+        return WarcGzExtraction(create_warc_gz_extractor())
+
+    if config.settings["EXTRACTION_MODE"] == 'deferred':
+        # The zip compression policy is only needed once the search finishes and the records are extracted
+        return DeferredExtraction(create_match_location_recorder())
+
+    return ZipArchiveExtraction(create_zip_compression_policy())
+
+
+def create_warc_gz_extractor() -> WarcGzExtractor:
+    """
+    Creates the extractor that copies the gzip member of each record with matches into the WARC.gz file of each definition it matched.
+    Only records read by the offset of their gzip member can be copied, so a warning is logged unless they are read that way.
+    """
+    if config.settings["SEARCH_PIPELINE_MODE"] != 'offset':
+        log_warning(
+            "EXTRACTION_MODE is set to warc_gz, but SEARCH_PIPELINE_MODE is not set to offset. Only records read by the offset of their gzip member, "
+            "in offset mode or from a trigram index, can be copied to the definitions' WARC.gz files, so other records with matches will not be extracted."
+        )
+    return WarcGzExtractor()
+
+
+def create_match_location_recorder() -> MatchLocationRecorder:
+    """
+    Creates the recorder of the gzip member location of each record with matches, which are extracted once the search finishes.
+    Only records read by the offset of their gzip member can be recorded, so a warning is logged unless they are read that way.
+    """
+    if config.settings["SEARCH_PIPELINE_MODE"] != 'offset':
+        log_warning(
+            "EXTRACTION_MODE is set to deferred, but SEARCH_PIPELINE_MODE is not set to offset. Only records read by the offset of their gzip member, "
+            "in offset mode or from a trigram index, can be recorded to be extracted once the search finishes, so other records with matches will not be extracted."
+        )
+    return MatchLocationRecorder()
+
+
+def create_zip_compression_policy() -> ZipCompressionPolicy:
+    """Creates the policy deciding how the files added to the zip archives are compressed."""
+    return ZipCompressionPolicy(
+        config.settings["ZIP_COMPRESSION"], 
+        config.settings["ZIP_COMPRESSION_BY_DEFINITION"], 
+        config.settings["ZIP_STORE_COMPRESSED_FORMATS"]
+    )
+
+
+def create_search_checkpointer(results_and_regexes_dict: dict) -> SearchCheckpointer | None:
+    """
+    Creates the checkpointer that takes a checkpoint every CHECKPOINT_INTERVAL_SECONDS while the WARC.gz files are being read,
+    and writes the first checkpoint before any record is searched, or returns None if no checkpoint interval is set.
+    """
+    if config.settings["CHECKPOINT_INTERVAL_SECONDS"] is None:
+        return None
+
+    if config.settings["SEARCH_PIPELINE_MODE"] == 'fused':
+        log_warning(
+            "CHECKPOINT_INTERVAL_SECONDS is set, but SEARCH_PIPELINE_MODE is set to fused. "
+            "Checkpoints are only taken in queue and offset modes, so this search cannot be resumed if it is interrupted."
+        )
+        return None
+
+    search_checkpointer = SearchCheckpointer(
+        list(results_and_regexes_dict.keys()), 
+        get_definition_fingerprints(results_and_regexes_dict), 
+        config.settings["CHECKPOINT_INTERVAL_SECONDS"]
+    )
+    search_checkpointer.write_checkpoint(0)
+    log_info(
+        f"A checkpoint will be taken every {config.settings["CHECKPOINT_INTERVAL_SECONDS"]} seconds. "
+        "If the search is interrupted, it can be resumed by running WarcSearcher with --resume and the results folder."
+    )
+    return search_checkpointer
+
+
+def resume_search_checkpointer(results_and_regexes_dict: dict) -> SearchCheckpointer:
+    """
+    Restores the results files and zip archives of an interrupted search to its last checkpoint, and returns a checkpointer holding
+    the progress of each WARC.gz file at that checkpoint. Exits if the search cannot be resumed.
+    """
+    results_directory = os.path.dirname(next(iter(results_and_regexes_dict)))
+    checkpoint = load_search_checkpoint(results_directory)
+    if checkpoint is None:
+        log_error(f"No checkpoint was found in {results_directory}, so there is no search to resume. Exiting.")
+        sys.exit()
+
+    if config.settings["SEARCH_PIPELINE_MODE"] == 'fused':
+        log_error("A search cannot be resumed with SEARCH_PIPELINE_MODE set to fused. Set it to queue or offset instead. Exiting.")
+        sys.exit()
+
+    if checkpoint["definition_fingerprints"] != get_definition_fingerprints(results_and_regexes_dict):
+        log_error("The definitions or the settings affecting their results have changed since the checkpoint, so the search cannot be resumed. Exiting.")
+        sys.exit()
+
+    if not restore_results_files(checkpoint, list(results_and_regexes_dict.keys())):
+        sys.exit()
+
     if config.settings["ZIP_FILES_WITH_MATCHES"]:
-        finalize_results_zip_archives(results_and_regexes_dict.keys())
+        remove_unfinished_zip_archive_segments(os.path.join(results_directory, "temp"), checkpoint["generation"])
+        remove_unfinished_warc_gz_segments(os.path.join(results_directory, "temp"), checkpoint["generation"])
+
+    # Spooled records were searched before the checkpoint or will be read and spooled again
+    shutil.rmtree(get_spool_directory(), ignore_errors=True)
+
+    completed_archives = sum(1 for archive_progress in checkpoint["archives"].values() if archive_progress["completed"])
+    log_info(
+        f"Resuming the search from checkpoint {checkpoint["generation"]}. {completed_archives} WARC.gz files were already searched, "
+        f"and the records already searched will be skipped in the {len(checkpoint["archives"]) - completed_archives} that were partially searched."
+    )
+
+    return SearchCheckpointer(
+        list(results_and_regexes_dict.keys()), 
+        checkpoint["definition_fingerprints"], 
+        config.settings["CHECKPOINT_INTERVAL_SECONDS"], 
+        checkpoint["generation"], 
+        checkpoint["archives"]
+    )
+
+
+def create_bloom_sidecar_builder(search_groups: list) -> BloomSidecarBuilder | None:
+    """
+    Creates the builder of the Bloom filter sidecars of the WARC.gz files the search groups read that have no current sidecar,
+    or returns None if BLOOM_FILTER_SIDECAR_KB is not set or every file has one. When a search is resumed, the files partially read
+    before the checkpoint are left out, since the records read before it are not searched again.
+    """
+    if config.settings["BLOOM_FILTER_SIDECAR_KB"] is None:
+        return None
+
+    filter_size_bytes = config.settings["BLOOM_FILTER_SIDECAR_KB"] * 1024
+    settings_fingerprint = get_index_settings_fingerprint()
+    warc_gz_files_to_build = [
+        gz_file_path for gz_file_path in dict.fromkeys(gz_file_path for gz_files_list, _ in search_groups for gz_file_path in gz_files_list)
+        if not is_bloom_sidecar_current(gz_file_path, settings_fingerprint, filter_size_bytes) and get_records_already_read(gz_file_path) == 0
+    ]
+    if not warc_gz_files_to_build:
+        return None
+
+    log_info(f"Bloom filter sidecars will be built for {len(warc_gz_files_to_build)} WARC.gz files as they are searched.")
+    return BloomSidecarBuilder(warc_gz_files_to_build, filter_size_bytes)
+
+
+def get_definition_fingerprints(results_and_regexes_dict: dict) -> dict[str, str]:
+    """Returns the fingerprint of each definition's regex and the settings affecting its results, by the name of its results file."""
+    return {
+        os.path.basename(results_file_path): get_definition_fingerprint(regex) 
+        for results_file_path, regex in results_and_regexes_dict.items()
+    }
+
+
+def finish_incremental_search(search_manifest: SearchManifest, incremental_search_plan: IncrementalSearchPlan, 
+                              results_and_regexes_dict: dict, futures: list):
+    """
+    Carries the earlier results of the WARC.gz files that were not searched again forward into the results files,
+    then records this execution in the search manifest, unless a search worker process failed and its results may be incomplete.
+    """
+    carry_forward_previous_results(
+        incremental_search_plan.carried_forward_results, config.settings["ZIP_FILES_WITH_MATCHES"], config.settings["EXTRACTION_MODE"]
+    )
+
+    if any(future.exception() is not None for future in futures):
+        log_warning("A search worker process failed, so the search manifest was not updated. The next incremental search will search these WARC.gz files again.")
+        return
+
+    record_incremental_search(search_manifest, incremental_search_plan, os.path.dirname(next(iter(results_and_regexes_dict))))
+
+
+def log_combined_matcher_summary(results_and_regexes_dict: dict):
+    """Logs how many regex definitions are combined into a single regex, and which ones have to be searched separately."""
+    combined_matcher = CombinedMatcher(results_and_regexes_dict)
+    log_info(
+        f"Combining {len(combined_matcher.combined_results_file_paths)} of {len(results_and_regexes_dict)} regex definitions "
+        "into a single regex to search each record in one pass."
+    )
+
+    if combined_matcher.separate_regexes_dict:
+        separate_definitions = ", ".join(
+            get_base_file_name(results_file_path) for results_file_path in combined_matcher.separate_regexes_dict
+        )
+        log_info(f"These regex definitions cannot be combined and will be searched separately: {separate_definitions}")
+
+
+def create_search_queue(manager: SyncManager):
+    """Creates the queue used to pass WARC records to the search worker processes, based on the configured transport."""
+    if config.settings["SEARCH_QUEUE_TRANSPORT"] == 'shared_memory' and config.settings["SEARCH_PIPELINE_MODE"] == 'offset':
+        log_warning(
+            "SEARCH_QUEUE_TRANSPORT is set to shared_memory, but SEARCH_PIPELINE_MODE is set to offset. "
+            "Only record locations are queued in offset mode, so the manager transport will be used instead."
+        )
+    elif config.settings["SEARCH_QUEUE_TRANSPORT"] == 'shared_memory':
+        log_info(
+            f"Using a shared memory ring of {config.settings["SHARED_MEMORY_SLOT_COUNT"]} slots "
+            f"of {config.settings["SHARED_MEMORY_SLOT_SIZE_KB"]} KB to pass records to the search worker processes."
+        )
+        return SharedMemoryRing(
+            config.settings["SHARED_MEMORY_SLOT_COUNT"], 
+            config.settings["SHARED_MEMORY_SLOT_SIZE_KB"] * 1024
+        )
+
+    return manager.Queue()
+
+
+def create_in_flight_budget() -> InFlightBytesBudget | None:
+    """
+    Creates the budget limiting the size of the records in the search queue that have not been searched yet,
+    or returns None if SEARCH_QUEUE_MAX_IN_FLIGHT_KB is not set, in which case the read threads are paused based on RAM usage instead.
+    """
+    if config.settings["SEARCH_QUEUE_MAX_IN_FLIGHT_KB"] is None:
+        return None
+
+    log_info(
+        f"The read threads will wait whenever the records in the search queue that have not been searched yet "
+        f"reach {config.settings["SEARCH_QUEUE_MAX_IN_FLIGHT_KB"]} KB, instead of pausing based on MAX_RAM_USAGE_PERCENT."
+    )
+    return InFlightBytesBudget(config.settings["SEARCH_QUEUE_MAX_IN_FLIGHT_KB"] * 1024)
+
+
+def create_spill_writer() -> SpillWriter | None:
+    """
+    Creates the writer that spills records to segment files in SEARCH_QUEUE_SPILL_DIRECTORY once the in-flight budget is exhausted,
+    or returns None if no spill directory is set, in which case the read threads wait for the budget instead.
+    """
+    if config.settings["SEARCH_QUEUE_SPILL_DIRECTORY"] is None:
+        return None
+
+    if IN_FLIGHT_BUDGET is None:
+        log_warning(
+            "SEARCH_QUEUE_SPILL_DIRECTORY is set, but SEARCH_QUEUE_MAX_IN_FLIGHT_KB is set to None. "
+            "Records are only spilled to disk once the in-flight budget is exhausted, so no records will be spilled."
+        )
+        return None
+
+    spill_writer = SpillWriter(
+        SEARCH_QUEUE, 
+        config.settings["SEARCH_QUEUE_SPILL_DIRECTORY"], 
+        config.settings["SEARCH_QUEUE_SPILL_SEGMENT_KB"] * 1024
+    )
+    log_info(f"Records that do not fit into the in-flight budget will be spilled to {spill_writer.spill_directory}")
+    return spill_writer
+
+
+def create_in_flight_compressor() -> InFlightCompressor | None:
+    """
+    Creates the compressor that compresses records before they are queued once the records in flight exceed
+    IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT of the in-flight budget, or returns None if no threshold is set.
+    """
+    if config.settings["IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT"] is None:
+        return None
+
+    if IN_FLIGHT_BUDGET is None:
+        log_warning(
+            "IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT is set, but SEARCH_QUEUE_MAX_IN_FLIGHT_KB is set to None. "
+            "The threshold is a percentage of the in-flight budget, so no records will be compressed."
+        )
+        return None
+
+    in_flight_compressor = InFlightCompressor(
+        IN_FLIGHT_BUDGET.max_bytes * config.settings["IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT"] // 100
+    )
+    log_info(
+        f"Records will be compressed with {in_flight_compressor.codec} before they are queued whenever the records in flight "
+        f"exceed {config.settings["IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT"]}% of the in-flight budget."
+    )
+    return in_flight_compressor
+
+
+def create_worker_autoscaler(max_worker_processes: int) -> SearchWorkerAutoscaler | None:
+    """
+    Creates the autoscaler that adjusts how many of the worker processes search while the WARC.gz files are being read,
+    or returns None if SEARCH_PROCESS_AUTOSCALING is disabled, in which case every worker process searches throughout.
+    """
+    if not config.settings["SEARCH_PROCESS_AUTOSCALING"]:
+        return None
+
+    worker_autoscaler = SearchWorkerAutoscaler(config.settings["SEARCH_PROCESS_AUTOSCALING_MIN_PROCESSES"], max_worker_processes)
+    log_info(
+        f"Between {worker_autoscaler.min_workers} and {worker_autoscaler.max_workers} worker processes will search at a time, "
+        "adjusted to the search queue and how busy the worker processes are. "
+        f"One more read thread may read at a time for each worker process parked, up to {worker_autoscaler.max_read_threads}."
+    )
+    return worker_autoscaler
 
 
-def initiate_search_worker_processes(gz_files_list: list, results_and_regexes_dict: dict, result_files_write_locks_dict: dict):
-    """Initiates the search worker processes to search the WARC.gz records via multiprocessing."""
+def initiate_search_worker_processes(gz_files_list: list, results_and_regexes_dict: dict, result_files_write_locks_dict: dict, 
+                                     record_extraction: RecordExtraction | None) -> list:
+    """
+    Initiates the search worker processes to search the WARC.gz records via multiprocessing, each extracting the records with matches it finds
+    with its own copy of the record extraction. Returns the futures of the worker processes.
+    """
     max_worker_processes = calculate_max_search_worker_processes()
     log_info(f"Starting {max_worker_processes} worker processes to search the WARC.gz records, plus 1 to read them in.")
 
-    with ProcessPoolExecutor(max_workers = max_worker_processes) as executor:
+    global WORKER_AUTOSCALER
+    WORKER_AUTOSCALER = create_worker_autoscaler(max_worker_processes)
+
+    global CANDIDATE_WARC_MEMBERS
+    if config.settings["TRIGRAM_INDEX_DIRECTORY"] is not None:
+        CANDIDATE_WARC_MEMBERS = find_candidate_warc_members(gz_files_list, results_and_regexes_dict)
+
+    if BLOOM_SIDECAR_BUILDER is not None:
+        # Only the candidate records of the indexed WARC.gz files are read
+        BLOOM_SIDECAR_BUILDER.exclude_archives(CANDIDATE_WARC_MEMBERS)
+
+    if SEARCH_CHECKPOINTER is not None:
+        SEARCH_CHECKPOINTER.create_barrier(max_worker_processes)
+
+    with ProcessPoolExecutor(max_workers = max_worker_processes, initializer = initialize_worker_process_globals,
+                             initargs = (get_worker_process_globals(),)) as executor:
         futures = [executor.submit(search_worker_process, 
-                                   SEARCH_QUEUE, 
                                    results_and_regexes_dict, 
                                    result_files_write_locks_dict,
-                                   config.settings["ZIP_FILES_WITH_MATCHES"]) for _ in range(max_worker_processes)]
+                                   record_extraction,
+                                   worker_index) for worker_index in range(max_worker_processes)]
 
         # Main process execution: read the warc.gz files and put records into the search queue.
+        start_record_batcher()
         initiate_warc_gz_read_threads(gz_files_list)
+        stop_record_batcher()
+
+        if WORKER_AUTOSCALER is not None:
+            # Every worker process searches the remaining records and has to take its stop signal from the search queue
+            WORKER_AUTOSCALER.activate_all_workers()
+
+        if SPILL_WRITER is not None:
+            SPILL_WRITER.flush()
         
         print("\n")
         log_info("All records read from the WARC.gz files. Waiting on search worker processes to finish...\n")
@@ -64,6 +534,116 @@ def initiate_search_worker_processes(gz_files_list: list, results_and_regexes_di
         print_remaining_search_queue_items()
 
         wait(futures)
+        log_search_statistics(futures, record_extraction)
+
+        if IN_FLIGHT_BUDGET is not None:
+            IN_FLIGHT_BUDGET.log_summary()
+
+        if SPILL_WRITER is not None:
+            SPILL_WRITER.log_summary()
+
+        if IN_FLIGHT_COMPRESSOR is not None:
+            IN_FLIGHT_COMPRESSOR.log_summary()
+
+        if WORKER_AUTOSCALER is not None:
+            WORKER_AUTOSCALER.log_summary()
+
+        if SEARCH_CHECKPOINTER is not None and SEARCH_CHECKPOINTER.checkpoints_taken > 0:
+            log_info(f"Took {SEARCH_CHECKPOINTER.checkpoints_taken} checkpoints while reading the WARC.gz files.")
+
+    return futures
+
+
+def initiate_fused_search_worker_processes(manager: SyncManager, gz_files_list: list, results_and_regexes_dict: dict, 
+                                           result_files_write_locks_dict: dict, record_extraction: RecordExtraction | None) -> list:
+    """
+    Initiates search worker processes that each read and search whole WARC.gz files, taken from a shared list of files.
+    There is no separate read process, so every configured process searches. Once the list of files is exhausted,
+    idle worker processes help the ones still busy by searching records that those offload to a shared records queue.
+    Returns the futures of the worker processes.
+    """
+    max_worker_processes = config.settings["MAX_CONCURRENT_SEARCH_PROCESSES"]
+    log_info(f"Starting {max_worker_processes} worker processes to read and search {len(gz_files_list)} WARC.gz files.")
+
+    if len(gz_files_list) < max_worker_processes:
+        log_info(
+            "There are fewer WARC.gz files than worker processes. "
+            "Worker processes without a file to read will search records offloaded by the others.\n"
+        )
+
+    warc_gz_files_queue = create_warc_gz_files_queue(manager, gz_files_list, max_worker_processes)
+    offloaded_records_queue = manager.Queue()
+    busy_workers_counter = manager.Value('i', max_worker_processes)
+    busy_workers_lock = manager.Lock()
+
+    with ProcessPoolExecutor(max_workers = max_worker_processes, initializer = initialize_worker_process_globals,
+                             initargs = (get_worker_process_globals(),)) as executor:
+        futures = [executor.submit(fused_search_worker_process, 
+                                   warc_gz_files_queue, 
+                                   offloaded_records_queue,
+                                   busy_workers_counter,
+                                   busy_workers_lock,
+                                   max_worker_processes,
+                                   results_and_regexes_dict, 
+                                   result_files_write_locks_dict,
+                                   record_extraction) for _ in range(max_worker_processes)]
+
+        print_remaining_warc_gz_files(futures, warc_gz_files_queue, max_worker_processes)
+
+        wait(futures)
+        log_search_statistics(futures, record_extraction)
+
+    return futures
+
+
+def create_warc_gz_files_queue(manager: SyncManager, gz_files_list: list, max_worker_processes: int):
+    """
+    Creates the shared list of WARC.gz files for the fused worker processes, largest files first so that
+    the longest running files start early, followed by one None per worker process to signal there are no files left.
+    """
+    warc_gz_files_queue = manager.Queue()
+    for gz_file_path in sorted(gz_files_list, key=os.path.getsize, reverse=True):
+        warc_gz_files_queue.put(gz_file_path)
+
+    for _ in range(max_worker_processes):
+        warc_gz_files_queue.put(None)
+
+    return warc_gz_files_queue
+
+
+def print_remaining_warc_gz_files(futures: list, warc_gz_files_queue, max_worker_processes: int):
+    """Prints the number of WARC.gz files not yet taken by a worker process at half second intervals, until all worker processes finish."""
+    while not all(future.done() for future in futures):
+        # The queue also holds one None per worker process that has not yet run out of files
+        remaining_files = max(warc_gz_files_queue.qsize() - max_worker_processes, 0)
+        print(f"\rWARC.gz files waiting to be searched: {remaining_files}            ", end='', flush=True)
+        time.sleep(0.5)
+
+    print(f"\rWARC.gz files waiting to be searched: 0            \n\n", end='', flush=True)
+
+
+def log_search_statistics(futures: list, record_extraction: RecordExtraction | None):
+    """Merges the search statistics returned by the worker processes and logs a summary of them."""
+    search_statistics = SearchStatistics()
+    for future in futures:
+        if future.exception() is None and future.result() is not None:
+            search_statistics.merge(future.result())
+
+    search_statistics.log_prefilter_summary()
+
+    if PAYLOAD_DIGEST_CACHE is not None:
+        search_statistics.log_duplicate_payloads_summary()
+
+    if MATCH_MEMO is not None:
+        search_statistics.log_match_memo_summary()
+
+    if record_extraction is not None:
+        record_extraction.log_summary(search_statistics)
+
+    if RECORD_FILTER is not None:
+        # Records read by the main process' read threads were filtered there rather than in a worker process
+        search_statistics.count_skipped_records(RECORD_FILTER.skipped_records)
+        search_statistics.log_skipped_records_summary()
 
 
 def calculate_max_search_worker_processes() -> int:
@@ -71,13 +651,39 @@ def calculate_max_search_worker_processes() -> int:
     return config.settings["MAX_CONCURRENT_SEARCH_PROCESSES"]-1 if config.settings["MAX_CONCURRENT_SEARCH_PROCESSES"] > 1 else 1
 
 
+def start_record_batcher():
+    """Starts a record batcher for the read threads if batching is enabled by a SEARCH_BATCH_MAX_RECORDS value greater than 1."""
+    if config.settings["SEARCH_BATCH_MAX_RECORDS"] <= 1:
+        return
+
+    global RECORD_BATCHER
+    RECORD_BATCHER = RecordBatcher(
+        SEARCH_QUEUE,
+        config.settings["SEARCH_BATCH_MAX_RECORDS"],
+        config.settings["SEARCH_BATCH_MAX_KB"] * 1024,
+        config.settings["SEARCH_BATCH_FLUSH_TIMEOUT_SECONDS"]
+    )
+    RECORD_BATCHER.start()
+
+
+def stop_record_batcher():
+    """Puts the last partial batch into the search queue and stops the record batcher, if one was started."""
+    global RECORD_BATCHER
+    if RECORD_BATCHER is not None:
+        RECORD_BATCHER.close()
+        RECORD_BATCHER = None
+
+
 def initiate_warc_gz_read_threads(warc_gz_files: list):
-    """Sets up threads to read up to 4 WARC.gz files simultaneously, as well as a thread to monitor the progress."""
+    """
+    Sets up threads to read up to 4 WARC.gz files simultaneously, as well as a thread to monitor the progress.
+    With autoscaling enabled, a read thread is started for every file that may be read while worker processes are parked.
+    """
     log_info(f"Reading records from {len(warc_gz_files)} WARC.gz files...\n")
 
     PAUSE_READ_THREADS_EVENT.set()
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        tasks = {executor.submit(read_warc_gz_records, gz_file_path) for gz_file_path in warc_gz_files}
+    with ThreadPoolExecutor(max_workers=4 if WORKER_AUTOSCALER is None else WORKER_AUTOSCALER.max_read_threads) as executor:
+        tasks = {executor.submit(get_read_function(gz_file_path), gz_file_path) for gz_file_path in warc_gz_files}
 
         monitor_thread = Thread(target=monitoring_thread, args=(tasks, config.settings["MAX_RAM_USAGE_PERCENT"]))
         monitor_thread.start()
@@ -88,18 +694,102 @@ def initiate_warc_gz_read_threads(warc_gz_files: list):
         monitor_thread.join()
 
 
+def get_read_function(warc_gz_file_path: str) -> Callable[[str], None]:
+    """
+    Returns the function that reads the WARC.gz file into the search queue: the trigram index candidates if the file is indexed,
+    the locations of its records in offset mode, or else its records themselves.
+    """
+    if warc_gz_file_path in CANDIDATE_WARC_MEMBERS:
+        return read_candidate_warc_gz_members
+    if config.settings["SEARCH_PIPELINE_MODE"] == 'offset':
+        return read_warc_gz_members
+    return read_warc_gz_records
+
+
 def monitoring_thread(tasks: set[Future[None]], max_ram_usage_percent_target: int):
     """
     Prints the total number of records and the current queue size at half second intervals while the WARC.gz files are being read.
-    Also performs a check at each interval to check the percentage of total RAM in use on the machine.
+    Without an in-flight budget, also performs a check at each interval to check the percentage of total RAM in use on the machine.
+    With autoscaling enabled, the number of active search worker processes is also adjusted at each interval.
+    With checkpoints enabled, a checkpoint is taken once the checkpoint interval has passed.
     """
     while not all(future.done() for future in tasks):
+        if SEARCH_CHECKPOINTER is not None and SEARCH_CHECKPOINTER.is_checkpoint_due():
+            take_search_checkpoint()
+
         ram_in_use_percent = get_total_ram_used_percent()
-        print(f"\rTotal WARC records read: {TOTAL_RECORDS_READ} | Records in the search queue: {SEARCH_QUEUE.qsize()} | RAM used: {ram_in_use_percent}%           ", end='', flush=True)
-        monitor_ram_usage(ram_in_use_percent, max_ram_usage_percent_target)
+        if IN_FLIGHT_BUDGET is not None:
+            in_flight_status = f" | In flight: {round(IN_FLIGHT_BUDGET.in_flight_bytes.value / 1024 / 1024, 1)} MB"
+        else:
+            in_flight_status = ""
+
+        if WORKER_AUTOSCALER is not None:
+            WORKER_AUTOSCALER.adjust(SEARCH_QUEUE.qsize(), TOTAL_RECORDS_READ)
+            in_flight_status += (
+                f" | Search processes: {WORKER_AUTOSCALER.active_workers.value}/{WORKER_AUTOSCALER.max_workers}"
+                f" | Read threads: {WORKER_AUTOSCALER.active_read_threads}"
+            )
+
+        print(f"\rTotal WARC records read: {TOTAL_RECORDS_READ} | Records in the search queue: {SEARCH_QUEUE.qsize()}{in_flight_status} | RAM used: {ram_in_use_percent}%           ", end='', flush=True)
+        if IN_FLIGHT_BUDGET is None:
+            monitor_ram_usage(ram_in_use_percent, max_ram_usage_percent_target)
         time.sleep(0.5)
 
 
+def take_search_checkpoint():
+    """
+    Takes a checkpoint: pauses the read threads, queues the records held back in the record batcher and spill writer,
+    and puts a checkpoint marker into the search queue for each search worker process. Once every worker process has searched
+    the records queued before its marker and written out its results, the checkpoint file is written and the read threads resume.
+    """
+    SEARCH_CHECKPOINTER.pause_read_threads()
+
+    if RECORD_BATCHER is not None:
+        RECORD_BATCHER.flush()
+
+    if SPILL_WRITER is not None:
+        SPILL_WRITER.flush()
+
+    if WORKER_AUTOSCALER is not None:
+        # Parked worker processes have to take their marker from the search queue as well
+        WORKER_AUTOSCALER.activate_all_workers()
+
+    generation = SEARCH_CHECKPOINTER.generation + 1
+    for _ in range(SEARCH_CHECKPOINTER.worker_processes):
+        SEARCH_QUEUE.put(CheckpointMarker(generation))
+
+    SEARCH_CHECKPOINTER.barrier.wait()
+    SEARCH_CHECKPOINTER.write_checkpoint(generation)
+    SEARCH_CHECKPOINTER.resume_read_threads()
+
+
+def track_record_read(warc_gz_file_path: str, next_member_offset: int | None = None) -> ContextManager:
+    """Returns the context a read thread queues a record in, which counts it towards the checkpoint if checkpoints are enabled."""
+    if SEARCH_CHECKPOINTER is None:
+        return nullcontext()
+    return SEARCH_CHECKPOINTER.reading_record(warc_gz_file_path, next_member_offset)
+
+
+def throttle_read_thread(items: Iterator) -> Iterator:
+    """Returns the items a read thread reads, which it takes turns reading with the other read threads if autoscaling is enabled."""
+    if WORKER_AUTOSCALER is None:
+        return items
+    return WORKER_AUTOSCALER.iterate_as_read_thread(items)
+
+
+def get_records_already_read(warc_gz_file_path: str) -> int:
+    """Returns the number of records of the WARC.gz file read before the checkpoint a search was resumed from."""
+    if SEARCH_CHECKPOINTER is None:
+        return 0
+    return SEARCH_CHECKPOINTER.get_archive_progress(warc_gz_file_path)["records_read"]
+
+
+def complete_archive_read(warc_gz_file_path: str):
+    """Records that every record of the WARC.gz file has been queued, if checkpoints are enabled."""
+    if SEARCH_CHECKPOINTER is not None:
+        SEARCH_CHECKPOINTER.complete_archive(warc_gz_file_path)
+
+
 def monitor_ram_usage(ram_in_use_percent: int, max_ram_usage_percent_target: int):
     """
     Monitors the RAM usage of the machine to ensure it does not exceed the maximum percentage specified in the config.ini. 
@@ -120,7 +810,121 @@ def monitor_ram_usage(ram_in_use_percent: int, max_ram_usage_percent_target: int
 
 
 def read_warc_gz_records(warc_gz_file_path: str):
-    """Reads the records from the WARC.gz file and puts response records into the search queue."""
+    """
+    Reads the records from the WARC.gz file and puts response records into the search queue.
+    Records too large to be held in memory are written to a spool file in chunks, and only their location is queued.
+    When a search is resumed, the records read before the checkpoint are skipped.
+    """
+    for warc_record in throttle_read_thread(iterate_warc_gz_records(warc_gz_file_path, get_records_already_read(warc_gz_file_path))):
+        PAUSE_READ_THREADS_EVENT.wait() # If the read threads are paused, wait until they are resumed
+
+        with track_record_read(warc_gz_file_path):
+            global TOTAL_RECORDS_READ
+            TOTAL_RECORDS_READ += 1
+
+            if isinstance(warc_record, StreamedWarcRecord):
+                try:
+                    warc_record = spool_streamed_warc_record(
+                        warc_record, 
+                        get_spool_directory(), 
+                        config.settings["STREAMING_CHUNK_SIZE_KB"] * 1024
+                    )
+                except OSError as e:
+                    log_error(f"Error ocurred when spooling the record {warc_record.name} of {os.path.basename(warc_gz_file_path)}: \n{e}")
+                    continue
+
+            enqueue_warc_record(warc_record)
+
+    complete_archive_read(warc_gz_file_path)
+
+
+def read_warc_gz_members(warc_gz_file_path: str):
+    """
+    Scans the WARC.gz file for the gzip member of each response record and puts the member locations into the search queue,
+    leaving the search worker processes to read and inflate the records themselves.
+    Files that are not compressed per record cannot be read by offset, so their records are read and queued as a whole instead.
+    When a search is resumed, scanning starts at the gzip member following the last one read before the checkpoint.
+    """
+    if not is_warc_gz_compressed_per_record(warc_gz_file_path):
+        log_warning(
+            f"{os.path.basename(warc_gz_file_path)} is not compressed per record, so its records cannot be read by offset. "
+            "Reading the records in the main process instead."
+        )
+        read_warc_gz_records(warc_gz_file_path)
+        return
+
+    start_offset, records_to_skip = get_members_already_read(warc_gz_file_path)
+
+    try:
+        members_found = records_to_skip > 0 or start_offset > 0
+        for warc_member in throttle_read_thread(scan_warc_gz_members(warc_gz_file_path, RECORD_FILTER, start_offset)):
+            members_found = True
+            if records_to_skip > 0:
+                records_to_skip -= 1
+                continue
+
+            PAUSE_READ_THREADS_EVENT.wait() # If the read threads are paused, wait until they are resumed
+
+            with track_record_read(warc_gz_file_path, warc_member.offset + warc_member.length):
+                global TOTAL_RECORDS_READ
+                TOTAL_RECORDS_READ += 1
+
+                enqueue_warc_record(warc_member)
+
+        if not members_found:
+            log_warning(f"No WARC records found in {os.path.basename(warc_gz_file_path)}")
+
+    except Exception as e:
+        log_error(f"Error ocurred when reading {os.path.basename(warc_gz_file_path)}: \n{e}")
+
+    complete_archive_read(warc_gz_file_path)
+
+
+def read_candidate_warc_gz_members(warc_gz_file_path: str):
+    """
+    Puts the locations of the records of an indexed WARC.gz file that the trigram index found can match the definitions into the search queue,
+    without reading the rest of the file. When a search is resumed, the candidates before the next member recorded at the checkpoint are skipped.
+    """
+    start_offset, records_to_skip = get_members_already_read(warc_gz_file_path)
+    candidate_warc_members = [warc_member for warc_member in CANDIDATE_WARC_MEMBERS[warc_gz_file_path] if warc_member.offset >= start_offset]
+
+    for warc_member in candidate_warc_members[records_to_skip:]:
+        PAUSE_READ_THREADS_EVENT.wait() # If the read threads are paused, wait until they are resumed
+
+        with track_record_read(warc_gz_file_path, warc_member.offset + warc_member.length):
+            global TOTAL_RECORDS_READ
+            TOTAL_RECORDS_READ += 1
+
+            enqueue_warc_record(warc_member)
+
+    complete_archive_read(warc_gz_file_path)
+
+
+def get_members_already_read(warc_gz_file_path: str) -> tuple[int, int]:
+    """
+    Returns the offset to start scanning the WARC.gz file for gzip members at, and the number of members to skip from there,
+    so the members read before the checkpoint a search was resumed from are not queued again. Members are only skipped
+    by count if the checkpoint was taken while the file was read whole, since no member offsets were recorded then.
+    """
+    if SEARCH_CHECKPOINTER is None:
+        return 0, 0
+
+    archive_progress = SEARCH_CHECKPOINTER.get_archive_progress(warc_gz_file_path)
+    if archive_progress["next_member_offset"] is not None:
+        return archive_progress["next_member_offset"], 0
+    return 0, archive_progress["records_read"]
+
+
+def iterate_warc_gz_records(warc_gz_file_path: str, records_to_skip: int = 0) -> Iterator[WarcRecord | StreamedWarcRecord]:
+    """
+    Yields the response records of the WARC.gz file. Errors are logged and end the iteration for that file.
+    Records larger than STREAMING_SEARCH_THRESHOLD_KB are yielded as streamed records, whose contents must be read before the next record is requested.
+    If the payload digest cache is enabled, revisit records are yielded too, and every record carries the headers identifying its payload.
+    The first records_to_skip records are skipped without their contents being read.
+    """
+    streaming_threshold = get_streaming_threshold()
+    read_payload_identities = PAYLOAD_DIGEST_CACHE is not None
+
     # FastWARC optimization by using a FileStream + GZipStream like this: 
     # https://resiliparse.chatnoir.eu/en/stable/man/fastwarc.html#iterating-warc-files
     with FileStream(warc_gz_file_path, 'rb') as file_stream:
@@ -129,112 +933,598 @@ def read_warc_gz_records(warc_gz_file_path: str):
                 records = ArchiveIterator(
                     gz_file_stream, 
                     strict_mode=False, 
-                    record_types=WarcRecordType.response
+                    record_types=WarcRecordType.response | WarcRecordType.revisit if read_payload_identities else WarcRecordType.response,
+                    func_filter=RECORD_FILTER
                 )
-                
-                if not any(records):
-                    log_warning(f"No WARC records found in {os.path.basename(warc_gz_file_path)}")
-                    return
 
+                records_found = False
                 for record in records:
-                    PAUSE_READ_THREADS_EVENT.wait() # If the read threads are paused, wait until they are resumed
+                    records_found = True
+
+                    if records_to_skip > 0:
+                        records_to_skip -= 1
+                        continue
 
                     record_name = record.headers['WARC-Target-URI']
-                    record_content = record.reader.read()
-                    
-                    global TOTAL_RECORDS_READ
-                    TOTAL_RECORDS_READ += 1
+                    payload_identity = get_payload_identity(record) if read_payload_identities else None
 
-                    SEARCH_QUEUE.put(
-                        WarcRecord(
+                    # Revisit records hold no payload, so they are never streamed
+                    is_revisit = payload_identity is not None and payload_identity.is_revisit
+                    if streaming_threshold is not None and record.content_length > streaming_threshold and not is_revisit:
+                        yield StreamedWarcRecord(
                             parent_warc_gz_file=warc_gz_file_path, 
                             name=record_name, 
-                            contents=record_content
+                            contents_stream=record.reader,
+                            charset=get_http_charset(record),
+                            http_headers=serialize_http_headers(record.http_headers) if READ_HTTP_HEADERS else None
                         )
+                        continue
+
+                    record_content = record.reader.read()
+
+                    yield WarcRecord(
+                        parent_warc_gz_file=warc_gz_file_path, 
+                        name=record_name, 
+                        contents=record_content,
+                        charset=get_http_charset(record),
+                        http_headers=serialize_http_headers(record.http_headers) if READ_HTTP_HEADERS else None,
+                        payload_identity=payload_identity
                     )
 
+                if not records_found:
+                    log_warning(f"No WARC records found in {os.path.basename(warc_gz_file_path)}")
+
             except Exception as e:
                 log_error(f"Error ocurred when reading {os.path.basename(warc_gz_file_path)}: \n{e}")
 
 
-def search_worker_process(search_queue, results_and_regexes_dict: dict, 
-                         results_files_locks_dict: dict, zip_files_with_matches: bool):
+def get_streaming_threshold() -> int | None:
+    """Returns the size in bytes above which records are searched in chunks, or None if STREAMING_SEARCH_THRESHOLD_KB is not set."""
+    if config.settings["STREAMING_SEARCH_THRESHOLD_KB"] is None:
+        return None
+    return config.settings["STREAMING_SEARCH_THRESHOLD_KB"] * 1024
+
+
+def enqueue_warc_record(warc_record: WarcRecord | WarcMember | SpooledWarcRecord):
     """
-    Worker process that awaits and retrieves records from the search queue. 
+    Puts a record, or the location of a record in offset mode, into the search queue,
+    either directly or through the record batcher if batching is enabled.
+    If an in-flight budget is set, its size is reserved first, blocking until the search worker processes have released enough bytes,
+    unless a spill directory is set, in which case a record that does not fit is spilled to disk instead.
+    Records are compressed before being reserved if the in-flight compressor is set and the records in flight exceed its threshold.
+    """
+    if IN_FLIGHT_COMPRESSOR is not None and isinstance(warc_record, WarcRecord):
+        warc_record = IN_FLIGHT_COMPRESSOR.compress_if_over_threshold(warc_record, IN_FLIGHT_BUDGET.in_flight_bytes.value)
+
+    if IN_FLIGHT_BUDGET is not None:
+        if not reserve_in_flight_bytes(get_batch_item_size(warc_record)):
+            SPILL_WRITER.spill(warc_record)
+            return
+
+        if SPILL_WRITER is not None:
+            # Records fit into the budget again, so the records spilled before this one are queued ahead of it
+            SPILL_WRITER.flush()
+
+    if RECORD_BATCHER is not None:
+        RECORD_BATCHER.add(warc_record)
+    else:
+        SEARCH_QUEUE.put(warc_record)
+
+
+def reserve_in_flight_bytes(size: int) -> bool:
+    """
+    Reserves size bytes of the in-flight budget for a record about to be queued. Before blocking, the current batch is flushed,
+    since the bytes of records held back in a partial batch can only be released once it is put into the search queue and searched.
+    If a spill directory is set, returns False instead of blocking when the bytes cannot be reserved, so the record can be spilled.
+    """
+    if IN_FLIGHT_BUDGET.try_reserve(size):
+        return True
+
+    if RECORD_BATCHER is not None:
+        RECORD_BATCHER.flush()
+
+    if SPILL_WRITER is not None:
+        return IN_FLIGHT_BUDGET.try_reserve(size)
+
+    IN_FLIGHT_BUDGET.reserve(size)
+    return True
+
+
+def get_queue_item_size(queue_item: WarcRecord | WarcMember | SpooledWarcRecord | list[WarcRecord | WarcMember | SpooledWarcRecord]) -> int:
+    """Returns the size reserved in the in-flight budget for an item retrieved from the search queue, which is either a single item or a batch."""
+    return sum(get_batch_item_size(item) for item in (queue_item if isinstance(queue_item, list) else [queue_item]))
+
+
+def search_worker_process(results_and_regexes_dict: dict, results_files_locks_dict: dict, record_extraction: RecordExtraction | None, 
+                          worker_index: int = 0) -> SearchStatistics:
+    """
+    Worker process that awaits and retrieves records from the search queue, which it is handed as it starts along with the other globals,
+    since the multiprocessing queues of a shared memory ring cannot be sent to a process that is already running.
     It then searches the record name and contents against the regex definitions and writes any matches to the corresponding results output buffer.
+    With autoscaling enabled, the worker process parks before retrieving a record while the autoscaler has it inactive.
+    With checkpoints enabled, the worker process writes out its results when it retrieves a checkpoint marker.
+    Returns the statistics collected while searching.
     """
-    result_files_write_buffers, zip_archives_dict = initialize_worker_process_resources(
+    result_files_write_buffers = initialize_worker_process_resources(
         results_and_regexes_dict, 
-        zip_files_with_matches
+        record_extraction
     )
+    warc_member_reader = WarcMemberReader(READ_HTTP_HEADERS, get_streaming_threshold())
     
     # Primary loop to await and process records from the search queue
     while True:
-        # Get a record from the search queue. This will block execution until a record is available.
-        warc_record: WarcRecord = search_queue.get()
+        if WORKER_AUTOSCALER is not None and not WORKER_AUTOSCALER.is_active(worker_index):
+            park_search_worker_process(SEARCH_QUEUE, worker_index)
+
+        # Get a record, or a batch of records, from the search queue. This will block execution until one is available.
+        queue_item: WarcRecord | WarcMember | list[WarcRecord | WarcMember] = SEARCH_QUEUE.get()
         
-        if warc_record is None:
+        if queue_item is None:
             # If the record obtained from the search queue is None, the main process has signaled the worker processes to stop.
             finalize_worker_process_resources(
                 results_and_regexes_dict, 
                 results_files_locks_dict, 
                 result_files_write_buffers, 
-                zip_archives_dict
+                record_extraction
             )
+            warc_member_reader.close()
             break
+
+        if isinstance(queue_item, CheckpointMarker):
+            checkpoint_worker_process_resources(
+                results_and_regexes_dict, 
+                results_files_locks_dict, 
+                result_files_write_buffers, 
+                record_extraction, 
+                queue_item.generation
+            )
+            SEARCH_CHECKPOINTER.barrier.wait()
+            continue
+
+        queue_item_size = get_queue_item_size(queue_item) if IN_FLIGHT_BUDGET is not None else 0
+        search_start_time = time.monotonic()
         
+        for warc_record in get_records_from_queue_item(queue_item, warc_member_reader):
+            search_warc_record(
+                warc_record, 
+                results_and_regexes_dict, 
+                result_files_write_buffers, 
+                record_extraction
+            )
+
+        if IN_FLIGHT_BUDGET is not None:
+            IN_FLIGHT_BUDGET.release(queue_item_size)
+
+        if WORKER_AUTOSCALER is not None:
+            WORKER_AUTOSCALER.add_busy_seconds(worker_index, time.monotonic() - search_start_time)
+
+    return SEARCH_STATISTICS
+
+
+def park_search_worker_process(search_queue, worker_index: int):
+    """Blocks the worker process until the autoscaler activates it again, first releasing the shared memory slots it holds so they are not kept while parked."""
+    if isinstance(search_queue, SharedMemoryRing):
+        search_queue.release_held_slots()
+
+    WORKER_AUTOSCALER.wait_until_active(worker_index)
+
+
+def fused_search_worker_process(warc_gz_files_queue, offloaded_records_queue, busy_workers_counter, busy_workers_lock, 
+                                max_worker_processes: int, results_and_regexes_dict: dict, results_files_locks_dict: dict, 
+                                record_extraction: RecordExtraction | None) -> SearchStatistics:
+    """
+    Worker process that takes WARC.gz files from the shared files queue and reads and searches them itself.
+    While other worker processes are idle, part of the records are offloaded to them through the offloaded records queue.
+    Once no files are left, the worker process searches offloaded records until every worker process has finished its files.
+    Returns the statistics collected while searching.
+    """
+    result_files_write_buffers = initialize_worker_process_resources(
+        results_and_regexes_dict, 
+        record_extraction
+    )
+    offload_planner = RecordOffloadPlanner(offloaded_records_queue, busy_workers_counter, max_worker_processes)
+
+    while (warc_gz_file_path := warc_gz_files_queue.get()) is not None:
+        for warc_record in iterate_warc_gz_records(warc_gz_file_path):
+            # Streamed records are read from this process' open file, so they cannot be offloaded
+            if not isinstance(warc_record, StreamedWarcRecord) and offload_planner.should_offload():
+                offloaded_records_queue.put(warc_record)
+            else:
+                search_warc_record(
+                    warc_record, 
+                    results_and_regexes_dict, 
+                    result_files_write_buffers, 
+                    record_extraction
+                )
+
+    with busy_workers_lock:
+        busy_workers_counter.value -= 1
+        is_last_busy_worker = busy_workers_counter.value == 0
+
+    if is_last_busy_worker:
+        # No more records can be offloaded, so signal every worker process to stop once the offloaded records are searched.
+        for _ in range(max_worker_processes):
+            offloaded_records_queue.put(None)
+
+    while (warc_record := offloaded_records_queue.get()) is not None:
         search_warc_record(
             warc_record, 
             results_and_regexes_dict, 
             result_files_write_buffers, 
-            zip_archives_dict, 
-            zip_files_with_matches
+            record_extraction
         )
 
+    finalize_worker_process_resources(
+        results_and_regexes_dict, 
+        results_files_locks_dict, 
+        result_files_write_buffers, 
+        record_extraction
+    )
+
+    if RECORD_FILTER is not None:
+        SEARCH_STATISTICS.count_skipped_records(RECORD_FILTER.skipped_records)
+
+    return SEARCH_STATISTICS
+
+
+class RecordOffloadPlanner:
+    """
+    Decides whether a fused worker process should offload a record to the idle worker processes instead of searching it itself.
+    Keeps up to two records queued per idle worker process. The shared counters are only refreshed every half second,
+    since every access goes through the manager process.
+    """
+    REFRESH_INTERVAL_SECONDS = 0.5
+    QUEUED_RECORDS_PER_IDLE_WORKER = 2
+
+    def __init__(self, offloaded_records_queue, busy_workers_counter, max_worker_processes: int):
+        self.offloaded_records_queue = offloaded_records_queue
+        self.busy_workers_counter = busy_workers_counter
+        self.max_worker_processes = max_worker_processes
+        self.remaining_offloads = 0
+        self.last_refresh_time = 0.0
+
+
+    def should_offload(self) -> bool:
+        """Returns True if the next record should be put into the offloaded records queue."""
+        if time.monotonic() - self.last_refresh_time >= self.REFRESH_INTERVAL_SECONDS:
+            self.refresh()
+
+        if self.remaining_offloads > 0:
+            self.remaining_offloads -= 1
+            return True
+        return False
+
+
+    def refresh(self):
+        """Recalculates how many records can be offloaded from the number of idle worker processes and the records already queued for them."""
+        idle_workers = self.max_worker_processes - self.busy_workers_counter.value
+        queued_records = self.offloaded_records_queue.qsize() if idle_workers > 0 else 0
+
+        self.remaining_offloads = max(idle_workers * self.QUEUED_RECORDS_PER_IDLE_WORKER - queued_records, 0)
+        self.last_refresh_time = time.monotonic()
+
+
+def get_records_from_queue_item(queue_item: WarcRecord | WarcMember | SpooledWarcRecord | list[WarcRecord | WarcMember | SpooledWarcRecord], 
+                                warc_member_reader: WarcMemberReader) -> Iterator[WarcRecord | StreamedWarcRecord]:
+    """
+    Yields the records contained in an item retrieved from the search queue, which is either a single item or a batch.
+    Record locations queued in offset mode are read and inflated from their WARC.gz file, and spooled records are opened from their spool file. 
+    The items of a spill segment are read from disk in turn, and records compressed in flight are decompressed.
+    Records that cannot be read are logged and skipped. Streamed records are closed once they have been searched.
+    """
+    for item in queue_item if isinstance(queue_item, list) else [queue_item]:
+        if isinstance(item, SpillSegment):
+            yield from get_records_from_spill_segment(item, warc_member_reader)
+            continue
+
+        if isinstance(item, CompressedWarcRecord):
+            try:
+                yield decompress_warc_record(item)
+            except Exception as e:
+                log_error(f"Error ocurred when decompressing the record {item.name} of {os.path.basename(item.parent_warc_gz_file)}: \n{e}")
+            continue
+
+        if isinstance(item, SpooledWarcRecord):
+            try:
+                warc_record = open_spooled_warc_record(item)
+            except OSError as e:
+                log_error(f"Error ocurred when opening the spooled record {item.name} of {os.path.basename(item.parent_warc_gz_file)}: \n{e}")
+                continue
+
+        elif isinstance(item, WarcMember):
+            try:
+                warc_record = warc_member_reader.read_record(item)
+            except Exception as e:
+                log_error(f"Error ocurred when reading the record at offset {item.offset} of {os.path.basename(item.parent_warc_gz_file)}: \n{e}")
+                continue
+
+        else:
+            yield item
+            continue
+
+        if warc_record is None:
+            continue
+
+        try:
+            yield warc_record
+        finally:
+            if isinstance(warc_record, StreamedWarcRecord):
+                warc_record.close()
+
+
+def get_records_from_spill_segment(spill_segment: SpillSegment, warc_member_reader: WarcMemberReader) -> Iterator[WarcRecord | StreamedWarcRecord]:
+    """Yields the records of the items spilled to a segment file, logging and skipping the rest of the segment if it cannot be read."""
+    try:
+        for spilled_item in read_spill_segment(spill_segment):
+            yield from get_records_from_queue_item(spilled_item, warc_member_reader)
+    except (OSError, pickle.UnpicklingError, EOFError) as e:
+        log_error(f"Error ocurred when reading the spill segment {os.path.basename(spill_segment.segment_file_path)}: \n{e}")
+
+
+def get_worker_process_globals() -> dict:
+    """
+    Returns the settings and the globals set up by the main process that the worker processes use, to be handed to each worker process
+    as it starts. Worker processes started with spawn or forkserver do not inherit them, unlike forked ones.
+    """
+    return {"settings": config.settings, **{name: globals()[name] for name in WORKER_PROCESS_GLOBALS}}
+
+
+def initialize_worker_process_globals(worker_process_globals: dict):
+    """Initializer of the worker processes, setting the settings and the globals set up by the main process in the worker process."""
+    worker_process_globals = dict(worker_process_globals)
+    config.settings.update(worker_process_globals.pop("settings"))
+    globals().update(worker_process_globals)
+
+
+def initialize_worker_process_resources(results_and_regexes_dict: dict, record_extraction: RecordExtraction | None) -> dict[Any, StringIO]:
+    """Initialize resources used by a search worker process, starting the record extraction if records with matches are extracted."""
+    global SEARCH_STATISTICS
+    SEARCH_STATISTICS = SearchStatistics()
+
+    if RECORD_FILTER is not None:
+        RECORD_FILTER.reset_skipped_records()
+
+    if BLOOM_SIDECAR_BUILDER is not None:
+        BLOOM_SIDECAR_BUILDER.start_worker()
+
+    if PAYLOAD_DIGEST_CACHE is not None:
+        # Payloads cached for the definitions of an earlier search group cannot be reused
+        PAYLOAD_DIGEST_CACHE.clear()
+
+    if MATCH_MEMO is not None:
+        MATCH_MEMO.start_worker()
+
+    global DEFINITION_SCOPES
+    DEFINITION_SCOPES = {
+        results_file_path: scope for results_file_path in results_and_regexes_dict.keys()
+        if (scope := get_definition_scope(results_file_path)) is not None
+    }
+
+    if config.settings["REGEX_MATCHING_MODE"] == 'combined':
+        global COMBINED_MATCHER
+        COMBINED_MATCHER = CombinedMatcher(results_and_regexes_dict)
+
+    if config.settings["CONTENTS_SEARCH_MODE"] == 'bytes':
+        global BYTES_REGEXES
+        BYTES_REGEXES = create_bytes_regexes_dict(results_and_regexes_dict)
 
-def initialize_worker_process_resources(results_and_regexes_dict: dict, zip_files_with_matches: bool):
-    """Initialize resources used by a search worker process."""
     result_files_write_buffers = {
         results_file_path: StringIO() 
         for results_file_path in results_and_regexes_dict.keys()
     }
     
-    zip_archives_dict = {}
     # Immediately return if there are no result files, to avoid calling next() on an empty iterator.
     if not results_and_regexes_dict:
-        return result_files_write_buffers, zip_archives_dict
+        return result_files_write_buffers
 
-    if zip_files_with_matches:
+    if record_extraction is not None:
         results_dir = os.path.dirname(next(iter(results_and_regexes_dict.keys())))
         zip_temp_dir_for_process = os.path.join(f"{results_dir}/temp", str(os.getpid()))
-        os.makedirs(zip_temp_dir_for_process)
-        
-        for results_file_path in results_and_regexes_dict.keys():
-            zip_results_archive_path = os.path.join(
-                zip_temp_dir_for_process, 
-                f"{get_base_file_name(results_file_path)}.zip"
-            )
-            zip_archives_dict[zip_results_archive_path] = zipfile.ZipFile(
-                zip_results_archive_path, 'a', zipfile.ZIP_DEFLATED
-            )
+        # The directory may remain from an earlier search group whose worker process had the same process ID
+        os.makedirs(zip_temp_dir_for_process, exist_ok=True)
+        record_extraction.start_worker(
+            results_and_regexes_dict.keys(), 
+            zip_temp_dir_for_process, 
+            get_zip_archive_segment_generation(), 
+            SEARCH_STATISTICS
+        )
     
-    return result_files_write_buffers, zip_archives_dict
+    return result_files_write_buffers
 
 
+def search_warc_record(warc_record: WarcRecord | StreamedWarcRecord, results_and_regexes_dict: dict, result_files_write_buffers: dict[Any, StringIO], 
+                  record_extraction: RecordExtraction | None):
+    """
+    Processes a single WARC record, searching for regex matches. If matches are found, they are written to the corresponding result file,
+    and the record is extracted for the definitions it matched if records with matches are extracted.
+    If PAYLOAD_DIGEST_CACHE_ENTRIES is set, the matches in contents this worker process already searched are reused rather than searched again.
+    If MATCH_MEMO is enabled, so are the matches stored in the match memo by any search worker process of this search or an earlier one.
+    """
+    if isinstance(warc_record, StreamedWarcRecord):
+        search_streamed_warc_record(warc_record, results_and_regexes_dict, result_files_write_buffers, record_extraction)
+        return
 
-def search_warc_record(warc_record: WarcRecord, results_and_regexes_dict: dict, result_files_write_buffers: dict[Any, StringIO], 
-                  zip_archives_dict: dict[str, zipfile.ZipFile], zip_files_with_matches: bool):
-    """Processes a single WARC record, searching for regex matches. If matches are found, they are written to the corresponding result file."""
-    for results_file_path, regex in results_and_regexes_dict.items():
+    if PAYLOAD_DIGEST_CACHE is not None and warc_record.payload_identity is not None and warc_record.payload_identity.is_revisit:
+        search_revisit_record(warc_record, results_and_regexes_dict, result_files_write_buffers)
+        return
 
-        matches_in_name = find_regex_matches(warc_record.name, regex)
-        matches_in_contents = []
-        
-        if not config.settings["SEARCH_BINARY_FILES"] and is_file_binary(warc_record.contents):
-            # Skip binary files if configured to do so
-            matches_in_contents = ''
-        else:
-            matches_in_contents = find_regex_matches(warc_record.contents.decode('utf-8', 'ignore'), regex)
+    # The payload is identified as it is stored, before it is decoded
+    payload_key = get_payload_key(warc_record) if PAYLOAD_DIGEST_CACHE is not None or MATCH_MEMO is not None else None
+
+    if config.settings["DECODE_HTTP_PAYLOADS"]:
+        warc_record.contents = decode_http_payload(warc_record.contents, warc_record.http_headers)
+
+    matches_in_name_dict = find_regex_matches_for_each_definition(warc_record.name, results_and_regexes_dict)
+
+    matches_in_contents_dict = PAYLOAD_DIGEST_CACHE.get_matches(warc_record, payload_key) if PAYLOAD_DIGEST_CACHE is not None else None
+    if matches_in_contents_dict is not None:
+        SEARCH_STATISTICS.count_duplicate_payload('reused')
+    else:
+        matches_in_contents_dict = search_record_contents(warc_record, results_and_regexes_dict, payload_key)
+        if PAYLOAD_DIGEST_CACHE is not None:
+            PAYLOAD_DIGEST_CACHE.add_matches(warc_record, payload_key, matches_in_contents_dict)
+            SEARCH_STATISTICS.count_duplicate_payload('searched')
+
+    if DEFINITION_SCOPES:
+        apply_definition_scopes(warc_record, results_and_regexes_dict, matches_in_name_dict, matches_in_contents_dict)
+
+    matched_results_file_paths = write_record_matches_to_result_output_buffers(
+        warc_record, 
+        results_and_regexes_dict, 
+        matches_in_name_dict, 
+        matches_in_contents_dict, 
+        result_files_write_buffers
+    )
+
+    if record_extraction is not None:
+        record_extraction.add_record(warc_record, matched_results_file_paths)
+
+    if BLOOM_SIDECAR_BUILDER is not None:
+        BLOOM_SIDECAR_BUILDER.add_record(warc_record)
+
+
+def search_record_contents(warc_record: WarcRecord, results_and_regexes_dict: dict, payload_key: tuple[str, tuple] | None = None) -> dict[str, list]:
+    """
+    Returns the regex matches in the record contents for each definition that searches them, or none if the contents are binary and SEARCH_BINARY_FILES is disabled.
+    If MATCH_MEMO is enabled, the contents are only searched with the definitions the match memo holds no matches of the payload for, and the matches found are added to it.
+    """
+    if not config.settings["SEARCH_BINARY_FILES"] and is_file_binary(warc_record.contents):
+        # Skip binary files if configured to do so
+        return {}
+
+    contents_regexes_dict = get_contents_regexes_dict(results_and_regexes_dict)
+    if MATCH_MEMO is None:
+        return find_regex_matches_in_contents(warc_record, contents_regexes_dict)
+
+    matches_in_contents_dict = MATCH_MEMO.get_matches(payload_key, contents_regexes_dict.keys())
+    unsearched_regexes_dict = {
+        results_file_path: regex for results_file_path, regex in contents_regexes_dict.items()
+        if results_file_path not in matches_in_contents_dict
+    }
+    SEARCH_STATISTICS.count_match_memo_lookups(len(matches_in_contents_dict), len(unsearched_regexes_dict))
+    if not unsearched_regexes_dict:
+        return matches_in_contents_dict
+
+    # The combined matcher searches with every definition, so only the matches of the unsearched definitions are taken
+    found_matches_dict = find_regex_matches_in_contents(warc_record, unsearched_regexes_dict)
+    searched_matches_dict = {
+        results_file_path: found_matches_dict.get(results_file_path, []) for results_file_path in unsearched_regexes_dict.keys()
+    }
+    MATCH_MEMO.add_matches(payload_key, searched_matches_dict)
+    return matches_in_contents_dict | searched_matches_dict
+
+
+def search_revisit_record(warc_record: WarcRecord, results_and_regexes_dict: dict, result_files_write_buffers: dict[Any, StringIO]):
+    """
+    Processes a revisit record, which holds no payload of its own: the matches cached for the payload it refers to are written
+    along with those in its own URI and HTTP headers. Revisit records whose payload this worker process has not searched, or no longer
+    holds in its payload digest cache, are skipped. Their payload is not held, so it is never added to the zip archives.
+    """
+    if BLOOM_SIDECAR_BUILDER is not None:
+        BLOOM_SIDECAR_BUILDER.add_revisit_record(warc_record)
+
+    matches_in_contents_dict = PAYLOAD_DIGEST_CACHE.get_revisit_matches(warc_record.payload_identity)
+    if matches_in_contents_dict is None:
+        SEARCH_STATISTICS.count_duplicate_payload('unresolved revisits')
+        return
+
+    SEARCH_STATISTICS.count_duplicate_payload('resolved revisits')
+    matches_in_name_dict = find_regex_matches_for_each_definition(warc_record.name, results_and_regexes_dict)
+
+    if DEFINITION_SCOPES:
+        apply_definition_scopes(warc_record, results_and_regexes_dict, matches_in_name_dict, matches_in_contents_dict)
+
+    write_record_matches_to_result_output_buffers(
+        warc_record, 
+        results_and_regexes_dict, 
+        matches_in_name_dict, 
+        matches_in_contents_dict, 
+        result_files_write_buffers
+    )
+
+
+def search_streamed_warc_record(warc_record: StreamedWarcRecord, results_and_regexes_dict: dict, result_files_write_buffers: dict[Any, StringIO], 
+                                record_extraction: RecordExtraction | None):
+    """
+    Processes a single record too large to be held in memory, reading its contents in chunks of STREAMING_CHUNK_SIZE_KB 
+    and searching each chunk together with the STREAMING_OVERLAP_KB before it, so only about a chunk of it is held in memory at a time.
+    If DECODE_HTTP_PAYLOADS is enabled, the HTTP payload is decoded as it is read, so the chunks hold the same contents as a record searched whole.
+    Each definition is searched with its own regex, which finds the same matches as the combined matcher, literal prefilter and bytes mode,
+    since those only speed up searching a record held whole. If the record extraction needs its contents, they are copied to a temporary file
+    while they are read, unless the record is spooled to disk and searched as stored, so they can be streamed into the zip archives afterwards.
+    """
+    matches_in_name_dict = find_regex_matches_for_each_definition(warc_record.name, results_and_regexes_dict)
+    match_finder: ChunkedMatchFinder | None = None
+    is_first_chunk = True
+    zip_copy_file = None
+    streamed_contents_keys = BLOOM_SIDECAR_BUILDER.create_streamed_contents_keys(warc_record) if BLOOM_SIDECAR_BUILDER is not None else None
+
+    streamed_contents_directory = record_extraction.get_streamed_contents_directory() if record_extraction is not None else None
+    # The spool file of a record holds its contents as stored, so it can only be streamed into the zip archives if they are not decoded
+    if streamed_contents_directory is not None and (not warc_record.is_rewindable or config.settings["DECODE_HTTP_PAYLOADS"]):
+        zip_copy_file = tempfile.TemporaryFile(dir=streamed_contents_directory)
+
+    try:
+        chunks = warc_record.read_chunks(config.settings["STREAMING_CHUNK_SIZE_KB"] * 1024)
+        if config.settings["DECODE_HTTP_PAYLOADS"]:
+            chunks = decode_http_payload_chunks(chunks, warc_record.http_headers, config.settings["STREAMING_CHUNK_SIZE_KB"] * 1024)
+
+        for chunk in chunks:
+            if is_first_chunk:
+                is_first_chunk = False
+                # Binary files are skipped if configured to do so, in which case they are only read on to be copied for the zip archives
+                if config.settings["SEARCH_BINARY_FILES"] or not is_file_binary(chunk):
+                    match_finder = ChunkedMatchFinder(
+                        get_contents_regexes_dict(results_and_regexes_dict), 
+                        config.settings["STREAMING_OVERLAP_KB"] * 1024, 
+                        get_contents_encoding(chunk, warc_record.charset) if config.settings["DETECT_CONTENTS_CHARSET"] else DEFAULT_ENCODING
+                    )
+
+            if match_finder is not None:
+                match_finder.add_chunk(chunk)
+            elif zip_copy_file is None:
+                break
+
+            if zip_copy_file is not None:
+                zip_copy_file.write(chunk)
+
+            if streamed_contents_keys is not None:
+                streamed_contents_keys.add_chunk(chunk)
+
+        matches_in_contents_dict = match_finder.finish() if match_finder is not None else {}
+
+        if streamed_contents_keys is not None:
+            BLOOM_SIDECAR_BUILDER.add_streamed_record(warc_record, streamed_contents_keys)
+
+        if DEFINITION_SCOPES:
+            apply_definition_scopes(warc_record, results_and_regexes_dict, matches_in_name_dict, matches_in_contents_dict)
+
+        matched_results_file_paths = write_record_matches_to_result_output_buffers(
+            warc_record, 
+            results_and_regexes_dict, 
+            matches_in_name_dict, 
+            matches_in_contents_dict, 
+            result_files_write_buffers
+        )
+
+        if record_extraction is not None:
+            contents_file = zip_copy_file if zip_copy_file is not None else warc_record.contents_stream
+            record_extraction.add_streamed_record(warc_record, contents_file, matched_results_file_paths)
+
+    finally:
+        if zip_copy_file is not None:
+            zip_copy_file.close()
+
+
+def write_record_matches_to_result_output_buffers(warc_record: WarcRecord | StreamedWarcRecord, results_and_regexes_dict: dict, 
+                                                  matches_in_name_dict: dict[str, list], matches_in_contents_dict: dict[str, list], 
+                                                  result_files_write_buffers: dict[Any, StringIO]) -> list[str]:
+    """Writes the record's matches to the output buffer of each definition that found any, and returns the results file paths of those definitions."""
+    matched_results_file_paths = []
+    for results_file_path in results_and_regexes_dict.keys():
+
+        matches_in_name = matches_in_name_dict[results_file_path]
+        matches_in_contents = matches_in_contents_dict.get(results_file_path, '')
         
         if matches_in_name or matches_in_contents:
             write_record_info_to_result_output_buffer(
@@ -242,35 +1532,182 @@ def search_warc_record(warc_record: WarcRecord, results_and_regexes_dict: dict,
                 matches_in_name, 
                 matches_in_contents, 
                 warc_record.parent_warc_gz_file, 
-                warc_record.name
+                warc_record.name,
+                'HTTP headers' if DEFINITION_SCOPES.get(results_file_path) == 'headers' else 'file contents'
             )
-            
-            if zip_files_with_matches:
-                zip_archive_path = get_results_zip_archive_file_path(zip_archives_dict, results_file_path)
+            matched_results_file_paths.append(results_file_path)
 
-                try:
-                    add_file_to_zip_archive(
-                        warc_record.name, 
-                        warc_record.contents, 
-                        zip_archives_dict[zip_archive_path]
-                    )
-                except Exception as e:
-                    log_error(f"Error adding file to zip archive {zip_archive_path}: {e}")
-                    continue
+    return matched_results_file_paths
+
+
+def get_contents_regexes_dict(results_and_regexes_dict: dict) -> dict:
+    """Returns the regex definitions that search the record contents, leaving out those limited to the HTTP headers."""
+    if not DEFINITION_SCOPES:
+        return results_and_regexes_dict
+
+    return {
+        results_file_path: regex for results_file_path, regex in results_and_regexes_dict.items()
+        if DEFINITION_SCOPES.get(results_file_path) != 'headers'
+    }
+
+
+def apply_definition_scopes(warc_record: WarcRecord, results_and_regexes_dict: dict, matches_in_name_dict: dict[str, list], 
+                            matches_in_contents_dict: dict[str, list]):
+    """
+    Limits the matches of the definitions whose file names target only part of a record. Definitions limited to the body
+    drop their matches in the record's URI, and definitions limited to the headers search the HTTP headers instead of the contents.
+    """
+    http_headers_text = None
+    for results_file_path, scope in DEFINITION_SCOPES.items():
+        matches_in_name_dict[results_file_path] = []
+
+        if scope == 'headers':
+            if http_headers_text is None:
+                http_headers_text = str(warc_record.http_headers or b'', 'utf-8', 'ignore')
+            matches_in_contents_dict[results_file_path] = find_regex_matches(http_headers_text, results_and_regexes_dict[results_file_path])
+
+
+def find_regex_matches_in_contents(warc_record: WarcRecord, results_and_regexes_dict: dict) -> dict[str, list]:
+    """
+    Returns the regex matches in the record contents for each regex definition, keyed by results file path.
+    The contents are decoded at most once, however many definitions search them.
+    If LITERAL_PREFILTER is enabled, only the definitions whose literal prefilter the contents pass are searched, 
+    and the contents are not decoded at all if every definition's prefilter rejects them.
+    """
+    record_text = RecordText(warc_record.contents, get_record_encoding(warc_record))
+
+    if LITERAL_PREFILTERS is None:
+        return find_regex_matches_in_record_text(record_text, results_and_regexes_dict)
+
+    prefilter_text = PrefilterText(record_text)
+    candidate_regexes_dict = {
+        results_file_path: regex for results_file_path, regex in results_and_regexes_dict.items()
+        if passes_literal_prefilter(results_file_path, prefilter_text)
+    }
+    if not candidate_regexes_dict:
+        return {}
+
+    matches_in_contents_dict = find_regex_matches_in_record_text(record_text, candidate_regexes_dict)
+
+    for results_file_path in candidate_regexes_dict.keys():
+        if results_file_path in LITERAL_PREFILTERS:
+            SEARCH_STATISTICS.count_prefilter_result(results_file_path, True, bool(matches_in_contents_dict[results_file_path]))
+
+    return matches_in_contents_dict
+
+
+def get_record_encoding(warc_record: WarcRecord) -> str:
+    """
+    Returns the encoding to decode the record contents with. This is always UTF-8, unless DETECT_CONTENTS_CHARSET is enabled,
+    in which case the charset declared by the record's HTTP headers or HTML meta tag is used.
+    """
+    if not config.settings["DETECT_CONTENTS_CHARSET"]:
+        return DEFAULT_ENCODING
+
+    return get_contents_encoding(warc_record.contents, warc_record.charset)
+
+
+def find_regex_matches_in_record_text(record_text: RecordText, results_and_regexes_dict: dict) -> dict[str, list]:
+    """
+    Returns the regex matches in the record text for each regex definition, keyed by results file path.
+    If CONTENTS_SEARCH_MODE is set to bytes, ASCII contents are searched directly as bytes by the definitions that have a bytes regex,
+    and only decoded if a definition without one has to search them.
+    """
+    if BYTES_REGEXES is None or COMBINED_MATCHER is not None or (ascii_contents := record_text.get_ascii_contents()) is None:
+        return find_regex_matches_for_each_definition(record_text.get_decoded_text(), results_and_regexes_dict)
+
+    matches_in_contents_dict = {}
+    for results_file_path, regex in results_and_regexes_dict.items():
+        bytes_regex = BYTES_REGEXES.get(results_file_path)
+        if bytes_regex is not None:
+            matches_in_contents_dict[results_file_path] = find_bytes_regex_matches(ascii_contents, bytes_regex)
+        else:
+            matches_in_contents_dict[results_file_path] = find_regex_matches(record_text.get_decoded_text(), regex)
+
+    return matches_in_contents_dict
+
+
+def passes_literal_prefilter(results_file_path: str, prefilter_text: PrefilterText) -> bool:
+    """Returns True if the definition has no literal prefilter or the contents pass it. Rejected contents are counted in the search statistics."""
+    literal_prefilter = LITERAL_PREFILTERS.get(results_file_path)
+    if literal_prefilter is None or literal_prefilter.may_match(prefilter_text):
+        return True
+
+    SEARCH_STATISTICS.count_prefilter_result(results_file_path, False)
+    return False
+
+
+def find_regex_matches_for_each_definition(input_string: str, results_and_regexes_dict: dict) -> dict[str, list]:
+    """
+    Returns the regex matches in the input string for each regex definition, keyed by results file path.
+    Uses the combined matcher of the worker process to search all definitions in a single pass if REGEX_MATCHING_MODE is set to combined.
+    """
+    if COMBINED_MATCHER is not None:
+        return COMBINED_MATCHER.find_matches(input_string)
+
+    return {
+        results_file_path: find_regex_matches(input_string, regex) 
+        for results_file_path, regex in results_and_regexes_dict.items()
+    }
+
+
+def get_zip_archive_segment_generation() -> int:
+    """Returns the checkpoint generation of the zip archive segments a search worker process starts with, which is 0 if checkpoints are disabled."""
+    if SEARCH_CHECKPOINTER is None:
+        return 0
+    return SEARCH_CHECKPOINTER.generation
 
 
 def finalize_worker_process_resources(results_and_regexes_dict: dict, results_files_locks_dict: dict, 
-                    result_files_write_buffers: dict[Any, StringIO], zip_archives_dict: dict[str, zipfile.ZipFile]):
-    """Finalize a search worker process' resources by writing output buffers to result files and closing zip archives."""
+                    result_files_write_buffers: dict[Any, StringIO], record_extraction: RecordExtraction | None):
+    """
+    Finalize a search worker process' resources by writing output buffers to result files and finishing the record extraction,
+    write out the Bloom filters it built if sidecars are being built, and write the rows it added to the match memo if it is enabled.
+    """
+    write_result_output_buffers(results_and_regexes_dict, results_files_locks_dict, result_files_write_buffers)
+    
+    if record_extraction is not None:
+        record_extraction.finish_worker()
+
+    if BLOOM_SIDECAR_BUILDER is not None:
+        BLOOM_SIDECAR_BUILDER.finish_worker()
+
+    if MATCH_MEMO is not None:
+        MATCH_MEMO.finish_worker()
+
+
+def checkpoint_worker_process_resources(results_and_regexes_dict: dict, results_files_locks_dict: dict, 
+                                        result_files_write_buffers: dict[Any, StringIO], record_extraction: RecordExtraction | None, 
+                                        generation: int):
+    """
+    Writes a search worker process' output buffers to the result files and empties them, and checkpoints the record extraction,
+    making sure both are on disk. The record extraction starts new zip archive or WARC.gz file segments for the checkpoint generation,
+    so the segments closed here remain intact if the search is interrupted.
+    """
+    write_result_output_buffers(results_and_regexes_dict, results_files_locks_dict, result_files_write_buffers, sync=True)
+
+    if MATCH_MEMO is not None:
+        MATCH_MEMO.write_pending_rows()
+
+    if record_extraction is not None:
+        record_extraction.checkpoint(generation)
+
+
+def write_result_output_buffers(results_and_regexes_dict: dict, results_files_locks_dict: dict, 
+                                result_files_write_buffers: dict[Any, StringIO], sync: bool = False):
+    """Appends the output buffers to the result files and empties them. If sync is True, the result files are flushed to disk before their locks are released."""
     for results_file_path in results_and_regexes_dict.keys():
         buffer_contents = result_files_write_buffers[results_file_path].getvalue()
 
         with results_files_locks_dict[results_file_path]:
             with open(results_file_path, "a", encoding='utf-8') as output_file:
                 output_file.write(buffer_contents)
-    
-    for zip_file in zip_archives_dict:
-        zip_archives_dict[zip_file].close()
+                if sync:
+                    output_file.flush()
+                    os.fsync(output_file.fileno())
+
+        result_files_write_buffers[results_file_path].seek(0)
+        result_files_write_buffers[results_file_path].truncate()
 
 
 def signal_worker_processes_to_stop(max_worker_processes: int):
@@ -286,4 +1723,138 @@ def print_remaining_search_queue_items():
         print(f"\rRemaining records to search: {SEARCH_QUEUE.qsize()}            ", end='', flush=True)
         time.sleep(0.5)
         
-    print(f"\rRemaining records to search: 0            \n\n", end='', flush=True)
\ No newline at end of file
+    print(f"\rRemaining records to search: 0            \n\n", end='', flush=True)
+
+def extract_recorded_matches():
+    """
+    Extracts the records with matches of an earlier search with EXTRACTION_MODE set to deferred into the zip archives of its results output subdirectory,
+    from the match locations it recorded, without searching the WARC.gz files again.
+    """
+    match_locations_file_path = get_results_match_locations_file_path()
+    if not os.path.isfile(match_locations_file_path):
+        log_error(f"No match locations file was found at {match_locations_file_path}. Only searches with EXTRACTION_MODE set to deferred record one.")
+        return
+
+    perform_deferred_extraction(match_locations_file_path)
+
+
+def perform_deferred_extraction(match_locations_file_path: str):
+    """
+    Extracts the records at the recorded match locations into the zip archives of the definitions they matched.
+    The match locations are grouped by WARC.gz file and sorted by offset, and each WARC.gz file is read from start to end by one of a pool
+    of extraction processes, which add the records to zip archives of their own that are merged once every WARC.gz file has been read.
+    """
+    grouped_match_locations = group_match_locations(match_locations_file_path) if os.path.isfile(match_locations_file_path) else {}
+    if not grouped_match_locations:
+        log_info("No match locations were recorded, so there are no records to extract.")
+        return
+
+    zip_compression_policy = create_zip_compression_policy()
+
+    log_info(f"Extracting the records with matches from {len(grouped_match_locations)} WARC.gz files, please wait...")
+    extraction_temp_dir = os.path.join(os.path.dirname(match_locations_file_path), "temp")
+    with ProcessPoolExecutor(max_workers=calculate_max_search_worker_processes(), initializer=initialize_worker_process_globals,
+                             initargs=(get_worker_process_globals(),)) as executor:
+        futures = {
+            executor.submit(deferred_extraction_process, located_warc_members, extraction_temp_dir, zip_compression_policy): warc_gz_file_path
+            for warc_gz_file_path, located_warc_members in grouped_match_locations.items()
+        }
+
+    extraction_statistics = SearchStatistics()
+    for future, warc_gz_file_path in futures.items():
+        if future.exception() is not None:
+            log_error(f"Error ocurred when extracting the records of {os.path.basename(warc_gz_file_path)}: \n{future.exception()}")
+            continue
+        extraction_statistics.merge(future.result())
+
+    extraction_statistics.log_deferred_extraction_summary(len(grouped_match_locations))
+    extraction_statistics.log_zip_compression_summary()
+
+    results_file_paths = {
+        results_file_path 
+        for located_warc_members in grouped_match_locations.values() 
+        for _, matched_results_file_paths in located_warc_members 
+        for results_file_path in matched_results_file_paths
+    }
+    if os.path.isdir(extraction_temp_dir):
+        finalize_results_zip_archives(sorted(results_file_paths))
+
+
+def deferred_extraction_process(located_warc_members: list[tuple[WarcMember, list[str]]], extraction_temp_dir: str, 
+                                zip_compression_policy: ZipCompressionPolicy) -> SearchStatistics:
+    """
+    Extraction process that reads the records at the recorded gzip member locations of a WARC.gz file in order of their offset,
+    and adds each one to the zip archive of every definition it matched, in its own subdirectory of the temporary directory.
+    Returns the statistics collected while extracting.
+    """
+    global SEARCH_STATISTICS
+    SEARCH_STATISTICS = SearchStatistics()
+
+    zip_temp_dir_for_process = os.path.join(extraction_temp_dir, str(os.getpid()))
+    os.makedirs(zip_temp_dir_for_process, exist_ok=True)
+    zip_archives_dict: dict[str, zipfile.ZipFile] = {}
+    read_http_headers = config.settings["DECODE_HTTP_PAYLOADS"] or zip_compression_policy.store_compressed_formats
+    warc_member_reader = WarcMemberReader(read_http_headers, get_streaming_threshold())
+
+    try:
+        for warc_member, matched_results_file_paths in located_warc_members:
+            try:
+                warc_record = warc_member_reader.read_record(warc_member)
+            except Exception as e:
+                log_error(f"Error ocurred when reading the record at offset {warc_member.offset} of {os.path.basename(warc_member.parent_warc_gz_file)}: \n{e}")
+                warc_record = None
+
+            SEARCH_STATISTICS.count_deferred_extraction(warc_record is not None)
+            if warc_record is None:
+                continue
+
+            for results_file_path in matched_results_file_paths:
+                if results_file_path not in zip_archives_dict:
+                    zip_archives_dict[results_file_path] = zipfile.ZipFile(
+                        os.path.join(zip_temp_dir_for_process, f"{get_base_file_name(results_file_path)}.zip"), 'a', zipfile.ZIP_DEFLATED
+                    )
+            extract_warc_record(warc_record, matched_results_file_paths, zip_archives_dict, zip_temp_dir_for_process, zip_compression_policy)
+
+    finally:
+        for zip_archive in zip_archives_dict.values():
+            zip_archive.close()
+        warc_member_reader.close()
+
+    return SEARCH_STATISTICS
+
+
+def extract_warc_record(warc_record: WarcRecord | StreamedWarcRecord, matched_results_file_paths: list[str], zip_archives_dict: dict[str, zipfile.ZipFile], 
+                        zip_temp_dir_for_process: str, zip_compression_policy: ZipCompressionPolicy):
+    """
+    Adds a record read from its recorded location to the zip archive of each definition it matched, as the search would have added it:
+    its contents are decoded first if DECODE_HTTP_PAYLOADS is enabled, and those of a streamed record are copied to a temporary file
+    as they are decoded, so they can be read again for each definition.
+    """
+    if isinstance(warc_record, StreamedWarcRecord):
+        try:
+            with tempfile.TemporaryFile(dir=zip_temp_dir_for_process) as contents_file:
+                chunks = warc_record.read_chunks(STREAM_COPY_CHUNK_SIZE)
+                if config.settings["DECODE_HTTP_PAYLOADS"]:
+                    chunks = decode_http_payload_chunks(chunks, warc_record.http_headers, STREAM_COPY_CHUNK_SIZE)
+
+                for chunk in chunks:
+                    contents_file.write(chunk)
+
+                for results_file_path in matched_results_file_paths:
+                    try:
+                        add_streamed_record_to_zip_archive(warc_record, contents_file, results_file_path, zip_archives_dict[results_file_path], 
+                                                           zip_compression_policy, SEARCH_STATISTICS)
+                    except Exception as e:
+                        log_error(f"Error adding file to zip archive {zip_archives_dict[results_file_path].filename}: {e}")
+        finally:
+            warc_record.close()
+        return
+
+    if config.settings["DECODE_HTTP_PAYLOADS"]:
+        warc_record.contents = decode_http_payload(warc_record.contents, warc_record.http_headers)
+
+    for results_file_path in matched_results_file_paths:
+        try:
+            add_record_to_zip_archive(warc_record, results_file_path, zip_archives_dict[results_file_path], zip_compression_policy, SEARCH_STATISTICS)
+        except Exception as e:
+            log_error(f"Error adding file to zip archive {zip_archives_dict[results_file_path].filename}: {e}")
@@ -0,0 +1,226 @@
+import glob
+import json
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple
+
+from logger import *
+
+CHECKPOINT_FILE_NAME = 'checkpoint.json'
+
+
+class CheckpointMarker(NamedTuple):
+    """
+    Put into the search queue once per search worker process when a checkpoint is taken. A worker process that retrieves it
+    has searched every item queued before it, so it writes out its results, starts new zip archive segments numbered with
+    the checkpoint's generation, and waits for the other worker processes and the main process to reach the checkpoint.
+    """
+    generation: int
+
+
+class SearchCheckpointer:
+    """
+    Takes periodic checkpoints of a search, so an interrupted search can be resumed from the last one without searching any record twice.
+
+    To take a checkpoint, the read threads are paused between records and every record read so far is searched by the search
+    worker processes, which then write their results to the results files and close their zip archive segments.
+    The checkpoint file then records the size of each results file, the generation of the zip archive segments, the definitions searched,
+    and for each WARC.gz file whether it was read completely, how many records were read from it,
+    and in offset mode the offset of the gzip member following the last one read.
+
+    The read threads only run in the main process, so the progress of each WARC.gz file is kept in plain attributes.
+    The search worker processes are handed the checkpointer as they start, and only use its barrier and generation.
+    """
+    def __init__(self, results_file_paths: list[str], definition_fingerprints: dict[str, str], interval_seconds: float | None, 
+                 generation: int = 0, archives: dict | None = None):
+        self.checkpoint_file_path = os.path.join(os.path.dirname(results_file_paths[0]), CHECKPOINT_FILE_NAME)
+        self.results_file_paths = results_file_paths
+        self.definition_fingerprints = definition_fingerprints
+        self.interval_seconds = interval_seconds
+        self.generation = generation
+        self.archives: dict[str, dict] = archives or {}
+
+        self.condition = threading.Condition()
+        self.reading_threads = 0
+        self.is_checkpoint_pending = False
+        self.last_checkpoint_time = time.monotonic()
+
+        self.worker_processes = 0
+        self.barrier = None
+        self.checkpoints_taken = 0
+
+
+    def __getstate__(self):
+        """Excludes the condition of the read threads, which are only in the main process, when the checkpointer is sent to a worker process."""
+        state = self.__dict__.copy()
+        state["condition"] = None
+        return state
+
+
+    def get_archive_progress(self, warc_gz_file_path: str) -> dict:
+        """Returns the progress of a WARC.gz file, which is created the first time it is requested."""
+        return self.archives.setdefault(warc_gz_file_path, {"records_read": 0, "next_member_offset": None, "completed": False})
+
+
+    @contextmanager
+    def reading_record(self, warc_gz_file_path: str, next_member_offset: int | None = None) -> Iterator[None]:
+        """
+        Context in which a read thread puts a record into the search queue, waiting first while a checkpoint is being taken.
+        The record counts as read once the context exits, along with the offset of the next gzip member if one is given.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: not self.is_checkpoint_pending)
+            self.reading_threads += 1
+
+        try:
+            yield
+        finally:
+            with self.condition:
+                archive_progress = self.get_archive_progress(warc_gz_file_path)
+                archive_progress["records_read"] += 1
+                if next_member_offset is not None:
+                    archive_progress["next_member_offset"] = next_member_offset
+
+                self.reading_threads -= 1
+                self.condition.notify_all()
+
+
+    def complete_archive(self, warc_gz_file_path: str):
+        """Records that every record of a WARC.gz file has been put into the search queue."""
+        with self.condition:
+            self.get_archive_progress(warc_gz_file_path)["completed"] = True
+
+
+    def is_checkpoint_due(self) -> bool:
+        """Returns True if a checkpoint interval is set, search worker processes are running, and the interval has passed since the last checkpoint."""
+        return (
+            self.interval_seconds is not None and self.barrier is not None
+            and time.monotonic() - self.last_checkpoint_time >= self.interval_seconds
+        )
+
+
+    def create_barrier(self, worker_processes: int):
+        """Creates the barrier the search worker processes and the main process wait at during a checkpoint. It must be created before the worker processes."""
+        self.worker_processes = worker_processes
+        self.barrier = multiprocessing.Barrier(worker_processes + 1)
+
+
+    def pause_read_threads(self):
+        """Stops the read threads from queueing more records and waits until none of them is queueing a record."""
+        with self.condition:
+            self.is_checkpoint_pending = True
+            self.condition.wait_for(lambda: self.reading_threads == 0)
+
+
+    def resume_read_threads(self):
+        """Lets the read threads queue records again."""
+        with self.condition:
+            self.is_checkpoint_pending = False
+            self.condition.notify_all()
+
+
+    def write_checkpoint(self, generation: int):
+        """
+        Writes the checkpoint file for the given generation once the search worker processes have reached the checkpoint,
+        replacing the previous checkpoint file only once the new one has been written to disk completely.
+        """
+        self.generation = generation
+        checkpoint = {
+            "generation": generation,
+            "definition_fingerprints": self.definition_fingerprints,
+            "results_file_sizes": {os.path.basename(path): os.path.getsize(path) for path in self.results_file_paths},
+            "archives": self.archives
+        }
+
+        temp_checkpoint_file_path = f"{self.checkpoint_file_path}.tmp"
+        with open(temp_checkpoint_file_path, 'w', encoding='utf-8') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file, indent=1)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temp_checkpoint_file_path, self.checkpoint_file_path)
+
+        self.checkpoints_taken += 1
+        self.last_checkpoint_time = time.monotonic()
+
+
+    def remove_checkpoint(self):
+        """Deletes the checkpoint file once the search has finished, since there is nothing left to resume."""
+        if os.path.exists(self.checkpoint_file_path):
+            os.remove(self.checkpoint_file_path)
+
+
+def load_search_checkpoint(results_directory: str) -> dict | None:
+    """Returns the last checkpoint written to a results subdirectory, or None if there is no readable checkpoint file."""
+    checkpoint_file_path = os.path.join(results_directory, CHECKPOINT_FILE_NAME)
+    if not os.path.isfile(checkpoint_file_path):
+        return None
+
+    try:
+        with open(checkpoint_file_path, 'r', encoding='utf-8') as checkpoint_file:
+            return json.load(checkpoint_file)
+    except (OSError, ValueError) as e:
+        log_error(f"The checkpoint file {checkpoint_file_path} could not be read: {e}")
+        return None
+
+
+def restore_results_files(checkpoint: dict, results_file_paths: list[str]) -> bool:
+    """
+    Truncates each results file to its size at the checkpoint, discarding results written after it, which will be found again.
+    Returns False if a results file is missing or smaller than at the checkpoint.
+    """
+    results_file_sizes = checkpoint["results_file_sizes"]
+    for results_file_path in results_file_paths:
+        checkpoint_size = results_file_sizes.get(os.path.basename(results_file_path))
+        if checkpoint_size is None or not os.path.isfile(results_file_path) or os.path.getsize(results_file_path) < checkpoint_size:
+            log_error(f"{os.path.basename(results_file_path)} does not match the checkpoint, so the search cannot be resumed.")
+            return False
+
+    for results_file_path in results_file_paths:
+        with open(results_file_path, 'r+b') as results_file:
+            results_file.truncate(results_file_sizes[os.path.basename(results_file_path)])
+
+    return True
+
+
+def get_zip_archive_segment_path(zip_archive_path: str, generation: int) -> str:
+    """Returns the path of a search worker process' zip archive segment for a checkpoint generation. Generation 0 uses the zip archive path itself."""
+    if generation == 0:
+        return zip_archive_path
+    return f"{os.path.splitext(zip_archive_path)[0]}.{generation}.zip"
+
+
+def get_zip_archive_segment_generation(zip_archive_segment_path: str) -> int:
+    """Returns the checkpoint generation a zip archive segment was started in."""
+    generation = os.path.splitext(os.path.splitext(zip_archive_segment_path)[0])[1].removeprefix('.')
+    return int(generation) if generation.isdigit() else 0
+
+
+def get_warc_gz_segment_path(warc_gz_file_path: str, generation: int) -> str:
+    """Returns the path of a search worker process' WARC.gz file segment for a checkpoint generation. Generation 0 uses the WARC.gz file path itself."""
+    if generation == 0:
+        return warc_gz_file_path
+    return f"{warc_gz_file_path.removesuffix('.warc.gz')}.{generation}.warc.gz"
+
+
+def remove_unfinished_warc_gz_segments(warc_gz_temp_directory: str, generation: int):
+    """
+    Deletes the WARC.gz file segments started at or after the checkpoint generation. A gzip member may have been cut short in them
+    when the search was interrupted, and the records copied to them will be searched again.
+    """
+    for warc_gz_segment_path in glob.glob(os.path.join(warc_gz_temp_directory, '*', '*.warc.gz')):
+        generation_suffix = os.path.splitext(warc_gz_segment_path.removesuffix('.warc.gz'))[1].removeprefix('.')
+        if (int(generation_suffix) if generation_suffix.isdigit() else 0) >= generation:
+            os.remove(warc_gz_segment_path)
+
+
+def remove_unfinished_zip_archive_segments(zip_temp_directory: str, generation: int):
+    """
+    Deletes the zip archive segments started at or after the checkpoint generation. They were still being written when the search
+    was interrupted, so they may be incomplete, and the records written to them will be searched again.
+    """
+    for zip_archive_segment_path in glob.glob(os.path.join(zip_temp_directory, '*', '*.zip')):
+        if get_zip_archive_segment_generation(zip_archive_segment_path) >= generation:
+            os.remove(zip_archive_segment_path)
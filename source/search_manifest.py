@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import re
+from typing import NamedTuple
+
+from blob_store import copy_blob_manifest_entries, get_blob_manifest_file_path
+import config
+from deferred_extraction import copy_match_locations, get_match_locations_file_path
+from logger import *
+from results import get_previous_result_entries
+from utilities import copy_zip_archive_entries, get_base_file_name
+from warc_gz_extraction import copy_warc_gz_records, get_warc_gz_file_path
+
+MANIFEST_FILE_NAME = 'warcsearcher_manifest.json'
+
+# Settings that change which records match a definition or what is output for them.
+# A definition searched with different values for any of these is searched again instead of carrying its results forward.
+RESULT_AFFECTING_SETTINGS = (
+    "ZIP_FILES_WITH_MATCHES",
+    "SEARCH_BINARY_FILES",
+    "CONTENTS_SEARCH_MODE",
+    "DETECT_CONTENTS_CHARSET",
+    "DECODE_HTTP_PAYLOADS",
+    # The size of the cache decides which revisit records can be given the matches of the payload they refer to
+    "PAYLOAD_DIGEST_CACHE_ENTRIES",
+    "FILTER_HTTP_STATUS_CODES",
+    "FILTER_CONTENT_TYPES_ALLOWED",
+    "FILTER_CONTENT_TYPES_DENIED",
+    "FILTER_MIN_CONTENT_LENGTH_KB",
+    "FILTER_MAX_CONTENT_LENGTH_KB",
+    "FILTER_WARC_DATE_FROM",
+    "FILTER_WARC_DATE_TO",
+    "FILTER_URI_INCLUDE_REGEX",
+    "FILTER_URI_EXCLUDE_REGEX",
+)
+
+
+class SearchManifest:
+    """
+    Persistent record, kept in the results output directory across executions, of which definitions each WARC.gz file
+    has been searched with and which results subdirectory holds the results. A WARC.gz file is identified by its path,
+    size and modification time, and a definition by its name and a fingerprint of its regex and the settings affecting its results.
+    The manifest is only saved once a search has finished, so an interrupted search is repeated in full by the next execution.
+    """
+    def __init__(self, manifest_file_path: str):
+        self.manifest_file_path = manifest_file_path
+        self.archives = self.load()
+        self.archive_states = {}
+
+
+    def load(self) -> dict:
+        """Returns the WARC.gz files recorded in the manifest file, or an empty dictionary if there is no readable manifest file."""
+        if not os.path.isfile(self.manifest_file_path):
+            return {}
+
+        try:
+            with open(self.manifest_file_path, 'r', encoding='utf-8') as manifest_file:
+                return json.load(manifest_file)["archives"]
+        except (OSError, ValueError, KeyError) as e:
+            log_warning(f"The search manifest {self.manifest_file_path} could not be read and will be replaced: {e}")
+            return {}
+
+
+    def get_archive_state(self, archive_path: str) -> dict:
+        """Returns the size and modification time of a WARC.gz file, as they were when first requested during this execution."""
+        if archive_path not in self.archive_states:
+            archive_stat = os.stat(archive_path)
+            self.archive_states[archive_path] = {"size": archive_stat.st_size, "mtime_ns": archive_stat.st_mtime_ns}
+        return self.archive_states[archive_path]
+
+
+    def is_archive_unchanged(self, archive_path: str) -> bool:
+        """Returns True if the WARC.gz file is in the manifest with the same size and modification time it has now."""
+        archive_entry = self.archives.get(archive_path)
+        archive_state = self.get_archive_state(archive_path)
+        return archive_entry is not None and archive_entry["size"] == archive_state["size"] and archive_entry["mtime_ns"] == archive_state["mtime_ns"]
+
+
+    def get_previous_results_directory(self, archive_path: str, definition_name: str, fingerprint: str) -> str | None:
+        """
+        Returns the results subdirectory holding the results of an earlier search of the WARC.gz file with an identical definition,
+        or None if the file changed since, the definition was never searched or has changed, or the earlier results no longer exist.
+        """
+        if not self.is_archive_unchanged(archive_path):
+            return None
+
+        definition_entry = self.archives[archive_path]["definitions"].get(definition_name)
+        if definition_entry is None or definition_entry["fingerprint"] != fingerprint:
+            return None
+
+        results_directory = definition_entry["results_directory"]
+        if not os.path.isfile(os.path.join(results_directory, f"{definition_name}_results.txt")):
+            return None
+
+        return results_directory
+
+
+    def record_search(self, archive_path: str, definition_name: str, fingerprint: str, results_directory: str):
+        """Records that the results of searching the WARC.gz file with a definition are in the results subdirectory."""
+        if not self.is_archive_unchanged(archive_path):
+            self.archives[archive_path] = {**self.get_archive_state(archive_path), "definitions": {}}
+
+        self.archives[archive_path]["definitions"][definition_name] = {"fingerprint": fingerprint, "results_directory": results_directory}
+
+
+    def save(self):
+        """Writes the manifest file, replacing the previous one only once the new one has been written completely."""
+        temp_manifest_file_path = f"{self.manifest_file_path}.tmp"
+        with open(temp_manifest_file_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump({"archives": self.archives}, manifest_file, indent=1)
+        os.replace(temp_manifest_file_path, self.manifest_file_path)
+
+
+class IncrementalSearchPlan(NamedTuple):
+    """
+    The searches needed for the WARC.gz files and definitions that have no earlier results, and the earlier results to carry forward for the rest.
+    Each search group pairs a list of WARC.gz files with the results files and regexes of the definitions they still have to be searched with.
+    The carried forward results map each results file to the earlier results subdirectories and the WARC.gz files whose results are taken from them.
+    """
+    search_groups: list[tuple[list[str], dict[str, re.Pattern]]]
+    carried_forward_results: dict[str, dict[str, list[str]]]
+
+
+def get_search_manifest_file_path() -> str:
+    """Returns the path to the search manifest file in the results output directory."""
+    return os.path.join(config.settings["RESULTS_OUTPUT_DIRECTORY"], MANIFEST_FILE_NAME)
+
+
+def get_definition_name(results_file_path: str) -> str:
+    """Returns the name of the definition file a results file was created for, without its extension."""
+    return get_base_file_name(results_file_path).removesuffix('_results')
+
+
+def get_definition_fingerprint(regex: re.Pattern) -> str:
+    """Returns a hash of a definition's compiled regex pattern and flags, and the current values of the settings affecting its results."""
+    fingerprint_source = json.dumps({
+        "pattern": regex.pattern,
+        "flags": regex.flags,
+        "settings": {setting_name: str(config.settings[setting_name]) for setting_name in RESULT_AFFECTING_SETTINGS}
+    }, sort_keys=True)
+    return hashlib.sha256(fingerprint_source.encode('utf-8')).hexdigest()
+
+
+def plan_incremental_search(search_manifest: SearchManifest, gz_files_list: list[str],
+                            results_and_regexes_dict: dict[str, re.Pattern]) -> IncrementalSearchPlan:
+    """
+    Decides which definitions each WARC.gz file has to be searched with, skipping those it was already searched with in an earlier execution.
+    WARC.gz files that need the same definitions are grouped, so adding a definition searches every file with only the new definition.
+    """
+    fingerprints_dict = {results_file_path: get_definition_fingerprint(regex) for results_file_path, regex in results_and_regexes_dict.items()}
+    search_groups_dict: dict[tuple[str, ...], list[str]] = {}
+    carried_forward_results = {results_file_path: {} for results_file_path in results_and_regexes_dict}
+
+    for gz_file_path in gz_files_list:
+        unsearched_results_file_paths = []
+        for results_file_path in results_and_regexes_dict:
+            previous_results_directory = search_manifest.get_previous_results_directory(
+                gz_file_path, get_definition_name(results_file_path), fingerprints_dict[results_file_path]
+            )
+            if previous_results_directory is None:
+                unsearched_results_file_paths.append(results_file_path)
+            else:
+                carried_forward_results[results_file_path].setdefault(previous_results_directory, []).append(gz_file_path)
+
+        if unsearched_results_file_paths:
+            search_groups_dict.setdefault(tuple(unsearched_results_file_paths), []).append(gz_file_path)
+
+    search_groups = [
+        (group_gz_files_list, {results_file_path: results_and_regexes_dict[results_file_path] for results_file_path in results_file_paths})
+        for results_file_paths, group_gz_files_list in search_groups_dict.items()
+    ]
+    log_incremental_search_plan(search_groups, carried_forward_results, len(gz_files_list), len(results_and_regexes_dict))
+    return IncrementalSearchPlan(search_groups, carried_forward_results)
+
+
+def log_incremental_search_plan(search_groups: list, carried_forward_results: dict, total_gz_files: int, total_definitions: int):
+    """Logs how many WARC.gz files and definitions will be searched, and how many earlier results will be carried forward."""
+    carried_forward_pairs = sum(
+        len(gz_files) for previous_results in carried_forward_results.values() for gz_files in previous_results.values()
+    )
+    log_info(
+        f"Incremental search: {carried_forward_pairs} of {total_gz_files * total_definitions} WARC.gz file and definition pairs "
+        "were already searched in an earlier execution, and their results will be carried forward."
+    )
+    for group_gz_files_list, group_results_and_regexes_dict in search_groups:
+        log_info(
+            f"{len(group_gz_files_list)} WARC.gz files will be searched with "
+            f"{', '.join(get_definition_name(results_file_path) for results_file_path in group_results_and_regexes_dict)}."
+        )
+
+
+def carry_forward_previous_results(carried_forward_results: dict[str, dict[str, list[str]]], zip_files_with_matches: bool, 
+                                   extraction_mode: str = 'zip'):
+    """
+    Appends the results of earlier executions for the WARC.gz files that were not searched again to the results files,
+    and if zipping the files with matches is enabled, copies them from the earlier results zip archives,
+    from the earlier blob manifests and blob store if the extraction mode is blob_store,
+    or the gzip members of their records from the earlier WARC.gz files if it is warc_gz.
+    If it is deferred, their earlier match locations are copied as well as the files in the zip archives.
+    This must be called after the results zip archives, blob manifests or WARC.gz files have been finalized.
+    """
+    for results_file_path, previous_results in carried_forward_results.items():
+        for previous_results_directory, gz_files_list in previous_results.items():
+            previous_results_file_path = os.path.join(previous_results_directory, os.path.basename(results_file_path))
+            matched_file_names = []
+
+            with open(results_file_path, 'a', encoding='utf-8') as results_file:
+                for file_name, result_entry in get_previous_result_entries(previous_results_file_path, gz_files_list):
+                    results_file.write(result_entry)
+                    matched_file_names.append(file_name)
+
+            if not zip_files_with_matches or not matched_file_names:
+                continue
+
+            if extraction_mode == 'warc_gz':
+                previous_warc_gz_file_path = get_warc_gz_file_path(previous_results_directory, results_file_path)
+                if os.path.isfile(previous_warc_gz_file_path):
+                    copy_warc_gz_records(
+                        previous_warc_gz_file_path, 
+                        get_warc_gz_file_path(os.path.dirname(results_file_path), results_file_path), 
+                        matched_file_names
+                    )
+                continue
+
+            if extraction_mode == 'blob_store':
+                previous_manifest_file_path = get_blob_manifest_file_path(previous_results_directory, results_file_path)
+                if os.path.isfile(previous_manifest_file_path):
+                    copy_blob_manifest_entries(
+                        previous_manifest_file_path, 
+                        get_blob_manifest_file_path(os.path.dirname(results_file_path), results_file_path), 
+                        matched_file_names
+                    )
+                continue
+
+            previous_match_locations_file_path = get_match_locations_file_path(previous_results_directory)
+            if extraction_mode == 'deferred' and os.path.isfile(previous_match_locations_file_path):
+                copy_match_locations(
+                    previous_match_locations_file_path, 
+                    get_match_locations_file_path(os.path.dirname(results_file_path)), 
+                    gz_files_list, 
+                    get_base_file_name(results_file_path)
+                )
+
+            previous_zip_archive_path = f"{os.path.splitext(previous_results_file_path)[0]}.zip"
+            if os.path.isfile(previous_zip_archive_path):
+                copy_zip_archive_entries(previous_zip_archive_path, f"{os.path.splitext(results_file_path)[0]}.zip", matched_file_names)
+
+
+def record_incremental_search(search_manifest: SearchManifest, incremental_search_plan: IncrementalSearchPlan, results_directory: str):
+    """
+    Records every WARC.gz file and definition searched or carried forward by this execution in the manifest and saves it.
+    The results subdirectory of this execution holds all of them, so earlier results subdirectories are no longer needed by the next execution.
+    """
+    for group_gz_files_list, group_results_and_regexes_dict in incremental_search_plan.search_groups:
+        for results_file_path, regex in group_results_and_regexes_dict.items():
+            for gz_file_path in group_gz_files_list:
+                search_manifest.record_search(
+                    gz_file_path, get_definition_name(results_file_path), get_definition_fingerprint(regex), results_directory
+                )
+
+    for results_file_path, previous_results in incremental_search_plan.carried_forward_results.items():
+        definition_name = get_definition_name(results_file_path)
+        for gz_files_list in previous_results.values():
+            for gz_file_path in gz_files_list:
+                fingerprint = search_manifest.archives[gz_file_path]["definitions"][definition_name]["fingerprint"]
+                search_manifest.record_search(gz_file_path, definition_name, fingerprint, results_directory)
+
+    search_manifest.save()
@@ -0,0 +1,217 @@
+from logger import *
+from utilities import get_base_file_name
+
+
+class SearchStatistics:
+    """
+    Counters collected by a search worker process while it searches records.
+    Each worker process returns its statistics once it finishes, and the main process merges them to log a summary.
+    """
+    def __init__(self):
+        self.prefilter_counters: dict[str, dict[str, int]] = {}
+        self.skipped_records: dict[str, int] = {}
+        self.duplicate_payloads: dict[str, int] = {}
+        self.match_memo_lookups: dict[str, int] = {"reused": 0, "searched": 0}
+        self.zip_compression: dict[str, dict[str, float]] = {}
+        self.blob_store: dict[str, int] = {"listed files": 0, "blobs written": 0, "bytes written": 0, "duplicate bytes": 0}
+        self.warc_gz_extraction: dict[str, int] = {"copied members": 0, "copied bytes": 0, "unlocated records": 0}
+        self.deferred_extraction: dict[str, int] = {"recorded locations": 0, "unlocated records": 0, "extracted records": 0, "unreadable records": 0}
+
+
+    def count_prefilter_result(self, results_file_path: str, passed: bool, matched: bool = False):
+        """
+        Counts a record checked by the literal prefilter of a definition: rejected records skip the regex entirely,
+        while passed records are searched with the regex and may or may not contain a match.
+        """
+        counters = self.prefilter_counters.setdefault(results_file_path, {"rejected": 0, "passed": 0, "matched": 0})
+        if not passed:
+            counters["rejected"] += 1
+            return
+
+        counters["passed"] += 1
+        if matched:
+            counters["matched"] += 1
+
+
+    def count_skipped_records(self, skipped_records: dict[str, int]):
+        """Adds the number of records the record filters skipped for each reason."""
+        for skip_reason, count in skipped_records.items():
+            self.skipped_records[skip_reason] = self.skipped_records.get(skip_reason, 0) + count
+
+
+    def count_duplicate_payload(self, outcome: str):
+        """
+        Counts a record checked against the payload digest cache: its contents were either 'searched' or their cached matches 'reused',
+        and a revisit record was either given the matches of the payload it refers to ('resolved revisits') or skipped ('unresolved revisits').
+        """
+        self.duplicate_payloads[outcome] = self.duplicate_payloads.get(outcome, 0) + 1
+
+
+    def count_match_memo_lookups(self, reused: int, searched: int):
+        """Counts the definitions whose matches in a record's contents were reused from the match memo, and those the contents were searched with."""
+        self.match_memo_lookups["reused"] += reused
+        self.match_memo_lookups["searched"] += searched
+
+
+    def count_zip_compression(self, results_file_path: str, file_size: int, compress_size: int, stored: bool, cpu_seconds: float):
+        """Counts a file added to the zip archive of a definition: its size before and after compression, and the CPU time spent adding it."""
+        counters = self.zip_compression.setdefault(
+            results_file_path, {"files": 0, "stored files": 0, "bytes": 0, "compressed bytes": 0, "cpu seconds": 0.0}
+        )
+        counters["files"] += 1
+        counters["stored files"] += stored
+        counters["bytes"] += file_size
+        counters["compressed bytes"] += compress_size
+        counters["cpu seconds"] += cpu_seconds
+
+
+    def count_blob_store(self, listed_manifests: int, written: bool, size: int):
+        """
+        Counts a file added to the blob store: the number of blob manifests it was listed in, and whether its blob was written
+        or was already in the store. Every listing without a newly written blob is a duplicate copy of its bytes that was avoided.
+        """
+        self.blob_store["listed files"] += listed_manifests
+        self.blob_store["blobs written"] += written
+        self.blob_store["bytes written"] += size if written else 0
+        self.blob_store["duplicate bytes"] += size * (listed_manifests - written)
+
+
+    def count_warc_gz_extraction(self, copied_members: int, copied_bytes: int, located: bool = True):
+        """
+        Counts a record with matches whose gzip member was copied to the WARC.gz files of the definitions it matched,
+        or that could not be extracted because it was not read by the offset of its gzip member.
+        """
+        self.warc_gz_extraction["copied members"] += copied_members
+        self.warc_gz_extraction["copied bytes"] += copied_bytes
+        self.warc_gz_extraction["unlocated records"] += not located
+
+
+    def count_match_locations(self, recorded_locations: int, located: bool = True):
+        """
+        Counts a record with matches whose gzip member location was recorded for the definitions it matched, to be extracted once the search finishes,
+        or that could not be recorded because it was not read by the offset of its gzip member.
+        """
+        self.deferred_extraction["recorded locations"] += recorded_locations
+        self.deferred_extraction["unlocated records"] += not located
+
+
+    def count_deferred_extraction(self, extracted: bool):
+        """Counts a record read from its recorded gzip member location to be extracted, or that could not be read from it."""
+        self.deferred_extraction["extracted records"] += extracted
+        self.deferred_extraction["unreadable records"] += not extracted
+
+
+    def merge(self, other: "SearchStatistics"):
+        """Adds the counters of another worker process' statistics to these statistics."""
+        for results_file_path, other_counters in other.prefilter_counters.items():
+            counters = self.prefilter_counters.setdefault(results_file_path, {"rejected": 0, "passed": 0, "matched": 0})
+            for counter_name, count in other_counters.items():
+                counters[counter_name] += count
+
+        self.count_skipped_records(other.skipped_records)
+
+        for outcome, count in other.duplicate_payloads.items():
+            self.duplicate_payloads[outcome] = self.duplicate_payloads.get(outcome, 0) + count
+
+        self.count_match_memo_lookups(other.match_memo_lookups["reused"], other.match_memo_lookups["searched"])
+
+        for results_file_path, other_counters in other.zip_compression.items():
+            counters = self.zip_compression.setdefault(results_file_path, dict.fromkeys(other_counters, 0))
+            for counter_name, count in other_counters.items():
+                counters[counter_name] += count
+
+        for counter_name, count in other.blob_store.items():
+            self.blob_store[counter_name] += count
+
+        for counter_name, count in other.warc_gz_extraction.items():
+            self.warc_gz_extraction[counter_name] += count
+
+        for counter_name, count in other.deferred_extraction.items():
+            self.deferred_extraction[counter_name] += count
+
+
+    def log_prefilter_summary(self):
+        """Logs how many records the literal prefilter of each definition rejected, and how many of those it passed contained a match."""
+        for results_file_path, counters in sorted(self.prefilter_counters.items()):
+            checked_records = counters["rejected"] + counters["passed"]
+            if checked_records == 0:
+                continue
+
+            rejected_percent = round(counters["rejected"] / checked_records * 100, 2)
+            log_info(
+                f"Literal prefilter for {get_base_file_name(results_file_path)}: "
+                f"{counters["rejected"]} of {checked_records} records rejected ({rejected_percent}%), "
+                f"{counters["passed"]} searched, of which {counters["matched"]} matched."
+            )
+
+
+    def log_skipped_records_summary(self):
+        """Logs how many records the record filters skipped before reading their contents, in total and for each reason."""
+        skip_reasons = ", ".join(f"{count} by {reason}" for reason, count in self.skipped_records.items() if count)
+        log_info(
+            f"Record filters skipped {sum(self.skipped_records.values())} records before reading their contents"
+            + (f": {skip_reasons}." if skip_reasons else ".")
+        )
+
+
+    def log_duplicate_payloads_summary(self):
+        """Logs how many payloads were searched, how many duplicates reused the matches of a payload already searched, and how many revisit records were resolved."""
+        log_info(
+            f"Payload digest cache: {self.duplicate_payloads.get('searched', 0)} payloads searched, "
+            f"{self.duplicate_payloads.get('reused', 0)} duplicates reused their cached matches, "
+            f"{self.duplicate_payloads.get('resolved revisits', 0)} revisit records resolved and "
+            f"{self.duplicate_payloads.get('unresolved revisits', 0)} skipped as their payload was not cached."
+        )
+
+
+    def log_match_memo_summary(self):
+        """Logs how many definition searches of record contents reused the matches in the match memo, and how many were searched and added to it."""
+        log_info(
+            f"Match memo: {self.match_memo_lookups['reused']} definition searches reused the stored matches, "
+            f"{self.match_memo_lookups['searched']} were searched and stored."
+        )
+
+
+    def log_zip_compression_summary(self):
+        """Logs, for the zip archive of each definition, how many bytes compression saved and how much CPU time adding the files took."""
+        for results_file_path, counters in sorted(self.zip_compression.items()):
+            saved_megabytes = round((counters["bytes"] - counters["compressed bytes"]) / 1024 / 1024, 2)
+            log_info(
+                f"Zip compression for {get_base_file_name(results_file_path)}: {counters["files"]} files added, "
+                f"{counters["stored files"]} of them stored without compression, {saved_megabytes} MB saved "
+                f"in {round(counters["cpu seconds"], 2)} CPU seconds."
+            )
+
+
+    def log_blob_store_summary(self):
+        """Logs how many files the blob manifests list, how many blobs were written for them, and how many bytes writing each file once saved."""
+        log_info(
+            f"Blob store: {self.blob_store['listed files']} files listed in the blob manifests, {self.blob_store['blobs written']} blobs written "
+            f"({round(self.blob_store['bytes written'] / 1024 / 1024, 2)} MB), "
+            f"{round(self.blob_store['duplicate bytes'] / 1024 / 1024, 2)} MB of duplicate copies avoided."
+        )
+
+
+    def log_warc_gz_extraction_summary(self):
+        """Logs how many gzip members were copied to the definitions' WARC.gz files, and how many records with matches could not be copied."""
+        log_info(
+            f"WARC.gz extraction: {self.warc_gz_extraction['copied members']} gzip members copied to the WARC.gz files "
+            f"({round(self.warc_gz_extraction['copied bytes'] / 1024 / 1024, 2)} MB), "
+            f"{self.warc_gz_extraction['unlocated records']} records with matches not extracted as they were not read by offset."
+        )
+
+
+    def log_match_locations_summary(self):
+        """Logs how many match locations were recorded to extract the records with matches from, and how many records with matches could not be recorded."""
+        log_info(
+            f"Deferred extraction: {self.deferred_extraction['recorded locations']} match locations recorded, "
+            f"{self.deferred_extraction['unlocated records']} records with matches not recorded as they were not read by offset."
+        )
+
+
+    def log_deferred_extraction_summary(self, warc_gz_files: int):
+        """Logs how many records were extracted from their recorded gzip member locations, and how many could not be read from them."""
+        log_info(
+            f"Deferred extraction: {self.deferred_extraction['extracted records']} records extracted from {warc_gz_files} WARC.gz files, "
+            f"{self.deferred_extraction['unreadable records']} could not be read from their recorded location."
+        )
@@ -0,0 +1,251 @@
+import multiprocessing
+import queue
+from multiprocessing.shared_memory import SharedMemory
+
+from in_flight_compression import CompressedWarcRecord
+from search_checkpoint import CheckpointMarker
+from spill_queue import SpillSegment
+from streaming_search import SpooledWarcRecord
+from warc_record import WarcMember, WarcRecord
+
+
+class SharedMemoryRing:
+    """
+    Queue-like transport that passes WARC records to the search worker processes through a ring of fixed-size shared memory slots.
+
+    The reader copies the URI, the parent WARC.gz path and the payload of a record into a free slot and only sends a small
+    descriptor through a multiprocessing queue. Workers rebuild the record with its contents as a memoryview over the slot, so the
+    payload is never pickled. Records too large for a slot are spilled through the descriptor queue as a regular WarcRecord,
+    and records spooled to disk, spill segments, records compressed in flight and the locations of records to be read by offset,
+    such as the candidates found by the trigram index, are passed through it as they are.
+
+    The free slots are kept in shared memory and the descriptor queue is a pipe, rather than queues of a manager process,
+    so no record costs a round trip to another process. The ring is handed to the search worker processes as they start,
+    since its semaphores and queue cannot be sent to a process that is already running.
+
+    A batch of records is written into one slot per record and sent as a list of descriptors. If the ring runs out of free slots
+    part way through a batch, the descriptors written so far are sent first, so read threads never wait on slots while holding others.
+    A slot handed out by get() stays reserved until the next call to get() in the same process, so a record must not be used
+    after the worker asks for the next one.
+    """
+    def __init__(self, slot_count: int, slot_size: int):
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.shared_memory = SharedMemory(create=True, size=slot_count * slot_size)
+        self.shared_memory_name = self.shared_memory.name
+
+        self.free_slots = FreeSlots(slot_count)
+        self.descriptors_queue = multiprocessing.Queue()
+        # The size of a multiprocessing queue is not available on every platform, so the descriptors waiting are counted here
+        self.queued_descriptors = multiprocessing.Value('q', 0)
+
+        self.held_slots = []
+        self.held_views = []
+
+
+    def __getstate__(self):
+        """Excludes the process-local shared memory handle and held slots when the ring is sent to a worker process."""
+        state = self.__dict__.copy()
+        state["shared_memory"] = None
+        state["held_slots"] = []
+        state["held_views"] = []
+        return state
+
+
+    def put(self, queue_item: WarcRecord | list[WarcRecord] | None):
+        """
+        Copies a record, or each record of a batch, into a free slot and queues the descriptors, blocking until slots are free.
+        None is passed through as the stop signal.
+        """
+        if queue_item is None:
+            self.put_descriptor(None)
+        elif isinstance(queue_item, list):
+            self.put_batch(queue_item)
+        else:
+            self.put_descriptor(self.write_record_to_slot(queue_item))
+
+
+    def put_batch(self, batch: list[WarcRecord]):
+        """Copies each record of a batch into a free slot, sending the pending descriptors before waiting on a slot."""
+        descriptors = []
+        for warc_record in batch:
+            try:
+                descriptors.append(self.write_record_to_slot(warc_record, block=False))
+            except queue.Empty:
+                if descriptors:
+                    self.put_descriptor(descriptors)
+                descriptors = [self.write_record_to_slot(warc_record)]
+
+        if descriptors:
+            self.put_descriptor(descriptors)
+
+
+    def put_descriptor(self, descriptor):
+        """Queues a descriptor, a list of descriptors, or an item passed through, counting it as waiting."""
+        with self.queued_descriptors.get_lock():
+            self.queued_descriptors.value += 1
+        self.descriptors_queue.put(descriptor)
+
+
+    def get(self) -> WarcRecord | list[WarcRecord] | None:
+        """
+        Releases the slots held by this process, then blocks until a descriptor is available
+        and returns the record, or the batch of records, it describes.
+        """
+        self.release_held_slots()
+
+        descriptor = self.descriptors_queue.get()
+        with self.queued_descriptors.get_lock():
+            self.queued_descriptors.value -= 1
+
+        if isinstance(descriptor, list):
+            return [self.read_record_from_descriptor(record_descriptor) for record_descriptor in descriptor]
+        return self.read_record_from_descriptor(descriptor)
+
+
+    def qsize(self) -> int:
+        """Returns the number of descriptors waiting to be retrieved by the search worker processes."""
+        return self.queued_descriptors.value
+
+
+    def write_record_to_slot(self, warc_record: WarcRecord, block: bool = True):
+        """
+        Writes a record into a free slot and returns its descriptor: 
+        (slot index, URI length, parent path length, HTTP headers length, payload length, charset).
+        If the record does not fit into a single slot, is spooled or spilled to disk, is compressed, or is only the location of a record
+        to be read by offset, the record itself is returned to be passed through the descriptor queue, as is a checkpoint marker.
+        Raises queue.Empty if block is False and no slot is free.
+        """
+        if isinstance(warc_record, (SpooledWarcRecord, SpillSegment, CompressedWarcRecord, CheckpointMarker, WarcMember)):
+            return warc_record
+
+        encoded_name = warc_record.name.encode('utf-8')
+        encoded_parent = warc_record.parent_warc_gz_file.encode('utf-8')
+        http_headers = warc_record.http_headers or b''
+        record_size = len(encoded_name) + len(encoded_parent) + len(http_headers) + len(warc_record.contents)
+
+        if record_size > self.slot_size:
+            return warc_record
+
+        slot_index = self.free_slots.get(block)
+        slot_start = slot_index * self.slot_size
+        buffer = self.attach_shared_memory().buf
+
+        position = slot_start
+        for field in (encoded_name, encoded_parent, http_headers, warc_record.contents):
+            buffer[position:position + len(field)] = field
+            position += len(field)
+
+        return (
+            slot_index, len(encoded_name), len(encoded_parent), len(http_headers), len(warc_record.contents), warc_record.charset,
+            warc_record.payload_identity
+        )
+
+
+    def read_record_from_descriptor(self, descriptor) -> WarcRecord | None:
+        """
+        Rebuilds a record from a descriptor without copying the payload.
+        Records too large for a slot, spooled records, spill segments, compressed records, record locations, checkpoint markers 
+        and the None stop signal are returned as is.
+        """
+        if not isinstance(descriptor, tuple) or isinstance(descriptor, (SpooledWarcRecord, SpillSegment, CompressedWarcRecord, CheckpointMarker, WarcMember)):
+            return descriptor
+
+        slot_index, name_length, parent_length, http_headers_length, contents_length, charset, payload_identity = descriptor
+        name_start = slot_index * self.slot_size
+        parent_start = name_start + name_length
+        http_headers_start = parent_start + parent_length
+        contents_start = http_headers_start + http_headers_length
+
+        buffer = self.attach_shared_memory().buf
+        contents_view = buffer[contents_start:contents_start + contents_length]
+
+        self.held_slots.append(slot_index)
+        self.held_views.append(contents_view)
+
+        return WarcRecord(
+            parent_warc_gz_file=str(buffer[parent_start:http_headers_start], 'utf-8'),
+            name=str(buffer[name_start:parent_start], 'utf-8'),
+            contents=contents_view,
+            charset=charset,
+            # A record without HTTP headers is written with an empty header block
+            http_headers=bytes(buffer[http_headers_start:contents_start]) or None,
+            payload_identity=payload_identity
+        )
+
+
+    def release_held_slots(self):
+        """Releases the memoryviews exported by this process and returns their slots to the free slots."""
+        for contents_view in self.held_views:
+            contents_view.release()
+
+        for slot_index in self.held_slots:
+            self.free_slots.put(slot_index)
+
+        self.held_views = []
+        self.held_slots = []
+
+
+    def attach_shared_memory(self) -> SharedMemory:
+        """Returns the shared memory block, attaching to it by name the first time it is used in a worker process."""
+        if self.shared_memory is None:
+            self.shared_memory = attach_to_shared_memory(self.shared_memory_name)
+        return self.shared_memory
+
+
+    def close(self):
+        """Closes and unlinks the shared memory block. Must only be called by the process that created the ring."""
+        self.release_held_slots()
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+
+class FreeSlots:
+    """
+    The indexes of the free slots of a shared memory ring, taken and returned in order through a circular array in shared memory.
+    A semaphore counts the free slots, so taking one blocks while none is free, and a lock guards the array and its positions.
+    Both are only a system call at most, so a slot is taken and returned without a round trip to another process.
+    """
+    def __init__(self, slot_count: int):
+        self.slot_count = slot_count
+        self.slot_indexes = multiprocessing.RawArray('i', range(slot_count))
+        self.first_position = multiprocessing.RawValue('i', 0)
+        self.free_slot_count = multiprocessing.RawValue('i', slot_count)
+        self.semaphore = multiprocessing.Semaphore(slot_count)
+        self.lock = multiprocessing.Lock()
+
+
+    def get(self, block: bool = True) -> int:
+        """Takes the index of a free slot, blocking until one is free. Raises queue.Empty if block is False and no slot is free."""
+        if not self.semaphore.acquire(block):
+            raise queue.Empty
+
+        with self.lock:
+            slot_index = self.slot_indexes[self.first_position.value]
+            self.first_position.value = (self.first_position.value + 1) % self.slot_count
+            self.free_slot_count.value -= 1
+        return slot_index
+
+
+    def put(self, slot_index: int):
+        """Returns the index of a slot that is no longer in use."""
+        with self.lock:
+            self.slot_indexes[(self.first_position.value + self.free_slot_count.value) % self.slot_count] = slot_index
+            self.free_slot_count.value += 1
+        self.semaphore.release()
+
+
+    def qsize(self) -> int:
+        """Returns the number of free slots."""
+        return self.free_slot_count.value
+
+
+def attach_to_shared_memory(shared_memory_name: str) -> SharedMemory:
+    """
+    Attaches to an existing shared memory block without registering it with the resource tracker of the worker process,
+    which would otherwise unlink the block when the worker exits. The track argument is only available from Python 3.13.
+    """
+    try:
+        return SharedMemory(name=shared_memory_name, track=False)
+    except TypeError:
+        return SharedMemory(name=shared_memory_name)
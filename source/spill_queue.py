@@ -0,0 +1,112 @@
+import os
+import pickle
+import shutil
+import tempfile
+from threading import Lock
+from typing import Any, BinaryIO, Iterator, NamedTuple
+
+from logger import *
+
+
+class SpillSegment(NamedTuple):
+    """An append-only file of queue items spilled to disk while the in-flight budget was exhausted, searched as a whole by one search worker process."""
+    segment_file_path: str
+    item_count: int
+
+
+class SpillWriter:
+    """
+    Writes the records that the read threads cannot fit into the in-flight budget to append-only segment files in the spill directory,
+    so reading and inflating continue at full speed while the search worker processes catch up, without holding more records in memory.
+
+    Each record is appended to the current segment as a pickle. A segment is closed and put into the search queue as a single item
+    once it reaches the maximum segment size, or as soon as records fit into the budget again, so the spilled records are searched
+    after the records queued before them and before the ones queued after them. The search worker process that takes a segment
+    searches all of its records and then deletes it.
+    """
+    def __init__(self, search_queue, spill_directory: str, max_segment_bytes: int):
+        self.search_queue = search_queue
+        self.max_segment_bytes = max_segment_bytes
+
+        os.makedirs(spill_directory, exist_ok=True)
+        self.spill_directory = tempfile.mkdtemp(prefix='warcsearcher_spill_', dir=spill_directory)
+
+        self.lock = Lock()
+        self.segment_file: BinaryIO | None = None
+        self.segment_file_path = ''
+        self.segment_item_count = 0
+
+        self.spilled_items = 0
+        self.spilled_bytes = 0
+        self.segments_written = 0
+
+
+    def spill(self, queue_item: Any):
+        """Appends a queue item to the current segment, putting the segment into the search queue if it is full."""
+        with self.lock:
+            if self.segment_file is None:
+                segment_file_descriptor, self.segment_file_path = tempfile.mkstemp(suffix='.segment', dir=self.spill_directory)
+                self.segment_file = os.fdopen(segment_file_descriptor, 'wb')
+
+            segment_start = self.segment_file.tell()
+            pickle.dump(queue_item, self.segment_file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.segment_item_count += 1
+            self.spilled_items += 1
+            self.spilled_bytes += self.segment_file.tell() - segment_start
+
+            full_segment = self.take_segment() if self.segment_file.tell() >= self.max_segment_bytes else None
+
+        # The segment is put outside of the lock, so other read threads can keep spilling while the queue is blocked.
+        if full_segment:
+            self.search_queue.put(full_segment)
+
+
+    def flush(self):
+        """Closes the current segment and puts it into the search queue if any records were spilled to it."""
+        with self.lock:
+            segment = self.take_segment()
+
+        if segment:
+            self.search_queue.put(segment)
+
+
+    def take_segment(self) -> SpillSegment | None:
+        """Closes the current segment and returns it, or None if there is no open segment. The lock must be held by the caller."""
+        if self.segment_file is None:
+            return None
+
+        self.segment_file.close()
+        segment = SpillSegment(self.segment_file_path, self.segment_item_count)
+
+        self.segment_file = None
+        self.segment_file_path = ''
+        self.segment_item_count = 0
+        self.segments_written += 1
+        return segment
+
+
+    def remove_spill_directory(self):
+        """Deletes the spill directory along with any segments left in it, once the search worker processes have finished."""
+        shutil.rmtree(self.spill_directory, ignore_errors=True)
+
+
+    def log_summary(self):
+        """Logs how many records were spilled to disk, if any."""
+        if self.spilled_items == 0:
+            return
+
+        log_info(
+            f"Spilled {self.spilled_items} records ({round(self.spilled_bytes / 1024)} KB) to {self.segments_written} "
+            "segment files while the in-flight budget was exhausted."
+        )
+
+
+def read_spill_segment(spill_segment: SpillSegment) -> Iterator[Any]:
+    """Yields the queue items of a spill segment in the order they were spilled, and deletes the segment file once they have all been read."""
+    try:
+        with open(spill_segment.segment_file_path, 'rb') as segment_file:
+            for _ in range(spill_segment.item_count):
+                yield pickle.load(segment_file)
+    finally:
+        if os.path.exists(spill_segment.segment_file_path):
+            os.remove(spill_segment.segment_file_path)
@@ -0,0 +1,145 @@
+import codecs
+import os
+import re
+import tempfile
+from typing import BinaryIO, Iterator, NamedTuple
+
+from warc_record import WarcMember
+
+
+class SpooledWarcRecord(NamedTuple):
+    """A record too large to pass through the search queue, written to a spool file for a search worker process to stream it from."""
+    parent_warc_gz_file: str
+    name: str
+    spool_file_path: str
+    charset: str | None = None
+    http_headers: bytes | None = None
+
+
+class StreamedWarcRecord:
+    """
+    A record too large to be held in memory, whose contents are read from a stream in chunks while they are searched.
+    Closing the record closes the file it was opened from, if it owns one, and deletes its spool file, if it was spooled.
+    """
+    def __init__(self, parent_warc_gz_file: str, name: str, contents_stream: BinaryIO, charset: str | None = None,
+                 http_headers: bytes | None = None, opened_file: BinaryIO | None = None, spool_file_path: str | None = None,
+                 warc_member: WarcMember | None = None):
+        self.parent_warc_gz_file = parent_warc_gz_file
+        self.name = name
+        self.contents_stream = contents_stream
+        self.charset = charset
+        self.http_headers = http_headers
+        self.opened_file = opened_file
+        self.spool_file_path = spool_file_path
+        self.warc_member = warc_member
+
+
+    @property
+    def is_rewindable(self) -> bool:
+        """Returns True if the contents can be read again from the start, which is only the case for spooled records."""
+        return self.spool_file_path is not None
+
+
+    def read_chunks(self, chunk_size: int) -> Iterator[bytes]:
+        """Yields the contents in chunks of up to chunk_size bytes."""
+        while chunk := self.contents_stream.read(chunk_size):
+            yield chunk
+
+
+    def close(self):
+        """Closes the file the contents are read from if the record owns it, and deletes the spool file of a spooled record."""
+        if self.opened_file is not None:
+            self.opened_file.close()
+            self.opened_file = None
+
+        if self.spool_file_path is not None and os.path.exists(self.spool_file_path):
+            os.remove(self.spool_file_path)
+
+
+def spool_streamed_warc_record(warc_record: StreamedWarcRecord, spool_directory: str, chunk_size: int) -> SpooledWarcRecord:
+    """Writes the contents of a streamed record to a new file in the spool directory, chunk by chunk, and returns the spooled record."""
+    os.makedirs(spool_directory, exist_ok=True)
+    spool_file_descriptor, spool_file_path = tempfile.mkstemp(suffix='.record', dir=spool_directory)
+
+    with os.fdopen(spool_file_descriptor, 'wb') as spool_file:
+        for chunk in warc_record.read_chunks(chunk_size):
+            spool_file.write(chunk)
+
+    return SpooledWarcRecord(
+        parent_warc_gz_file=warc_record.parent_warc_gz_file,
+        name=warc_record.name,
+        spool_file_path=spool_file_path,
+        charset=warc_record.charset,
+        http_headers=warc_record.http_headers
+    )
+
+
+def open_spooled_warc_record(spooled_warc_record: SpooledWarcRecord) -> StreamedWarcRecord:
+    """Opens the spool file of a spooled record and returns it as a streamed record, which deletes the spool file once closed."""
+    spool_file = open(spooled_warc_record.spool_file_path, 'rb')
+    return StreamedWarcRecord(
+        parent_warc_gz_file=spooled_warc_record.parent_warc_gz_file,
+        name=spooled_warc_record.name,
+        contents_stream=spool_file,
+        charset=spooled_warc_record.charset,
+        http_headers=spooled_warc_record.http_headers,
+        opened_file=spool_file,
+        spool_file_path=spooled_warc_record.spool_file_path
+    )
+
+
+class ChunkedMatchFinder:
+    """
+    Finds the regex matches of each definition in contents that arrive in chunks, holding at most a chunk and two overlap windows of them at a time.
+    The chunks are decoded with the encoding as they arrive, ignoring invalid bytes, without splitting characters that span two chunks.
+
+    Each chunk is searched together with the end of the text before it. Matches starting within the last overlap window
+    of the text received so far are left for the next chunk, where they can extend past the end of the current one, so every match
+    no longer than the overlap window is found exactly once, as if the whole text were searched at once. The overlap window before
+    the deferred text is also kept, so lookbehinds and word boundaries at the start of a chunk see the text before it.
+    Longer matches that cross the end of a chunk may be cut short or missed.
+    """
+    def __init__(self, results_and_regexes_dict: dict[str, re.Pattern], overlap_size: int, encoding: str):
+        self.results_and_regexes_dict = results_and_regexes_dict
+        self.overlap_size = overlap_size
+        self.decoder = codecs.getincrementaldecoder(encoding)('ignore')
+        self.matches_dict: dict[str, list] = {results_file_path: [] for results_file_path in results_and_regexes_dict}
+        # The position in the whole text from which each definition resumes searching, after its last match
+        self.search_positions: dict[str, int] = {results_file_path: 0 for results_file_path in results_and_regexes_dict}
+        self.window = ''
+        self.window_start = 0
+
+
+    def add_chunk(self, chunk: bytes):
+        """Searches the next chunk of the contents, leaving matches that may extend into the following chunk for later."""
+        self.search_window(self.window + self.decoder.decode(chunk), is_final=False)
+
+
+    def finish(self) -> dict[str, list]:
+        """Searches the remaining text once the last chunk has been added and returns the matches of each definition."""
+        self.search_window(self.window + self.decoder.decode(b'', final=True), is_final=True)
+        return self.matches_dict
+
+
+    def search_window(self, window: str, is_final: bool):
+        """Searches the window for matches starting before its last overlap window, or anywhere in it if it is the end of the text."""
+        cutoff = len(window) if is_final else len(window) - self.overlap_size
+
+        for results_file_path, regex in self.results_and_regexes_dict.items():
+            position = self.search_positions[results_file_path] - self.window_start
+            if position > len(window):
+                continue
+
+            for match in regex.finditer(window, position):
+                if match.start() >= cutoff and not is_final:
+                    break
+
+                self.matches_dict[results_file_path].append(match.group())
+                # An empty match would otherwise be found again at the same position in the next window
+                self.search_positions[results_file_path] = self.window_start + max(match.end(), match.start() + 1)
+
+            self.search_positions[results_file_path] = max(self.search_positions[results_file_path], self.window_start + cutoff)
+
+        retained_start = max(cutoff - self.overlap_size, 0)
+        self.window = window[retained_start:]
+        self.window_start += retained_start
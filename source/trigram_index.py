@@ -0,0 +1,489 @@
+import codecs
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import NamedTuple
+
+import config
+from http_payload import decode_http_payload
+from literal_prefilter import PrefilterText, extract_required_literal_alternatives, lowercase_haystack
+from logger import *
+from record_filters import create_record_filter
+from record_text import DEFAULT_ENCODING, RecordText, get_contents_encoding
+from results import get_definition_scope
+from search_manifest import RESULT_AFFECTING_SETTINGS, get_definition_name
+from streaming_search import StreamedWarcRecord
+from utilities import is_file_binary
+from warc_members import WarcMember, WarcMemberReader, is_warc_gz_compressed_per_record, scan_warc_gz_members
+from warc_record import WarcRecord
+
+TRIGRAM_INDEX_FILE_NAME = 'trigram_index.sqlite3'
+TRIGRAM_LENGTH = 3
+# Trigrams of the HTTP headers are kept apart from those of the URI and contents, for the definitions limited to the headers
+HEADERS_TRIGRAM_OFFSET = 1 << (8 * TRIGRAM_LENGTH)
+# Queries are split so they never use more parameters than older SQLite versions allow
+MAX_QUERY_PARAMETERS = 900
+
+# Settings that change which records are indexed or the text they are searched in.
+# A WARC.gz file indexed with different values for any of these is read in full instead of through the index.
+INDEX_AFFECTING_SETTINGS = (
+    "SEARCH_BINARY_FILES",
+    "DETECT_CONTENTS_CHARSET",
+    "DECODE_HTTP_PAYLOADS",
+    "STREAMING_SEARCH_THRESHOLD_KB",
+) + tuple(setting_name for setting_name in RESULT_AFFECTING_SETTINGS if setting_name.startswith("FILTER_"))
+
+TRIGRAM_INDEX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS archives (
+    archive_id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    settings_fingerprint TEXT NOT NULL,
+    member_offsets BLOB NOT NULL,
+    member_lengths BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    archive_id INTEGER NOT NULL,
+    trigram INTEGER NOT NULL,
+    record_numbers BLOB NOT NULL,
+    PRIMARY KEY (archive_id, trigram)
+) WITHOUT ROWID;
+'''
+
+
+class ArchiveIndex(NamedTuple):
+    """
+    The index of a single WARC.gz file: the offset and length of the gzip member of each indexed record, in file order,
+    and for each trigram the numbers of the records containing it, which are their positions in the member lists.
+    """
+    member_offsets: array
+    member_lengths: array
+    postings: dict[int, array]
+
+
+class IndexedArchive(NamedTuple):
+    """A WARC.gz file found in the trigram index unchanged and indexed with the current settings, with the member locations of its records."""
+    archive_id: int
+    member_offsets: array
+    member_lengths: array
+
+
+class NgramQuery:
+    """
+    The n-grams a record must contain to possibly match a definition, built from the literals every match of its regex must contain.
+    The query is a list of requirements that must all be met. Each requirement is a list of alternative literals, and is met by a record
+    containing every n-gram of any one of them. A query without requirements cannot rule out any record.
+    """
+    def __init__(self, requirements: list[list[list[int]]]):
+        self.requirements = requirements
+
+
+    @property
+    def is_unconstrained(self) -> bool:
+        """Returns True if the query has no requirements, so every record is a candidate."""
+        return not self.requirements
+
+
+    def get_ngrams(self) -> set[int]:
+        """Returns the key of every n-gram in the query."""
+        return {trigram for alternatives in self.requirements for literal_trigrams in alternatives for trigram in literal_trigrams}
+
+
+    def find_candidates(self, postings: dict[int, set[int]]) -> set[int]:
+        """Returns the numbers of the records that meet every requirement, given the posting lists of the query's n-grams."""
+        candidates: set[int] | None = None
+        for alternatives in self.requirements:
+            requirement_candidates = set()
+            for literal_trigrams in alternatives:
+                # Starting from the rarest trigram keeps the intersections small
+                posting_lists = sorted((postings.get(trigram, set()) for trigram in literal_trigrams), key=len)
+                requirement_candidates |= posting_lists[0].intersection(*posting_lists[1:])
+
+            candidates = requirement_candidates if candidates is None else candidates & requirement_candidates
+            if not candidates:
+                break
+
+        return candidates or set()
+
+
+class TrigramIndex:
+    """
+    Persistent trigram index over the WARC.gz files, kept in an SQLite database in TRIGRAM_INDEX_DIRECTORY.
+    For each WARC.gz file it records the path, size and modification time, the settings it was indexed with,
+    the member location of each record, and the posting list of each trigram, so the records that can match a definition
+    are found without reading the others. Only WARC.gz files compressed per record can be indexed, since records are read by their offset.
+    """
+    def __init__(self, index_file_path: str):
+        self.connection = sqlite3.connect(index_file_path)
+        self.connection.executescript(TRIGRAM_INDEX_SCHEMA)
+
+
+    def get_indexed_archive(self, warc_gz_file_path: str, settings_fingerprint: str) -> IndexedArchive | None:
+        """Returns the indexed WARC.gz file, or None if it is not in the index, changed since it was indexed, or was indexed with other settings."""
+        archive_row = self.connection.execute(
+            "SELECT archive_id, size, mtime_ns, settings_fingerprint, member_offsets, member_lengths FROM archives WHERE path = ?",
+            (os.path.abspath(warc_gz_file_path),)
+        ).fetchone()
+        if archive_row is None:
+            return None
+
+        archive_id, size, mtime_ns, indexed_settings_fingerprint, member_offsets, member_lengths = archive_row
+        archive_stat = os.stat(warc_gz_file_path)
+        if size != archive_stat.st_size or mtime_ns != archive_stat.st_mtime_ns or indexed_settings_fingerprint != settings_fingerprint:
+            return None
+
+        return IndexedArchive(archive_id, array('Q', member_offsets), array('Q', member_lengths))
+
+
+    def add_archive(self, warc_gz_file_path: str, archive_index: ArchiveIndex, archive_stat: os.stat_result, settings_fingerprint: str):
+        """Adds the index of a WARC.gz file, replacing any earlier index of it, in a single transaction."""
+        with self.connection:
+            self.remove_archive(warc_gz_file_path)
+            archive_id = self.connection.execute(
+                "INSERT INTO archives (path, size, mtime_ns, settings_fingerprint, member_offsets, member_lengths) VALUES (?, ?, ?, ?, ?, ?)",
+                (os.path.abspath(warc_gz_file_path), archive_stat.st_size, archive_stat.st_mtime_ns, settings_fingerprint,
+                 archive_index.member_offsets.tobytes(), archive_index.member_lengths.tobytes())
+            ).lastrowid
+            self.connection.executemany(
+                "INSERT INTO postings (archive_id, trigram, record_numbers) VALUES (?, ?, ?)",
+                ((archive_id, trigram, record_numbers.tobytes()) for trigram, record_numbers in archive_index.postings.items())
+            )
+
+
+    def remove_archive(self, warc_gz_file_path: str):
+        """Removes the index of a WARC.gz file, if it has one."""
+        archive_row = self.connection.execute("SELECT archive_id FROM archives WHERE path = ?", (os.path.abspath(warc_gz_file_path),)).fetchone()
+        if archive_row is not None:
+            self.connection.execute("DELETE FROM postings WHERE archive_id = ?", archive_row)
+            self.connection.execute("DELETE FROM archives WHERE archive_id = ?", archive_row)
+
+
+    def remove_missing_archives(self, warc_gz_files_list: list[str]) -> int:
+        """Removes the index of every WARC.gz file that is no longer in the list and returns how many were removed."""
+        warc_gz_file_paths = {os.path.abspath(warc_gz_file_path) for warc_gz_file_path in warc_gz_files_list}
+        missing_archive_paths = [
+            path for (path,) in self.connection.execute("SELECT path FROM archives") if path not in warc_gz_file_paths
+        ]
+        with self.connection:
+            for missing_archive_path in missing_archive_paths:
+                self.remove_archive(missing_archive_path)
+        return len(missing_archive_paths)
+
+
+    def get_postings(self, archive_id: int, trigrams: set[int]) -> dict[int, set[int]]:
+        """Returns the posting list of each of the trigrams in the WARC.gz file. Trigrams no record contains are left out."""
+        postings = {}
+        trigrams_list = list(trigrams)
+        for start in range(0, len(trigrams_list), MAX_QUERY_PARAMETERS):
+            trigrams_batch = trigrams_list[start:start + MAX_QUERY_PARAMETERS]
+            rows = self.connection.execute(
+                f"SELECT trigram, record_numbers FROM postings WHERE archive_id = ? AND trigram IN ({', '.join('?' * len(trigrams_batch))})",
+                (archive_id, *trigrams_batch)
+            )
+            for trigram, record_numbers in rows:
+                postings[trigram] = set(array('I', record_numbers))
+        return postings
+
+
+    def find_candidate_record_numbers(self, archive_id: int, trigram_queries: list[NgramQuery]) -> set[int]:
+        """Returns the numbers of the records of the WARC.gz file that meet any of the queries."""
+        postings = self.get_postings(archive_id, set().union(*(trigram_query.get_ngrams() for trigram_query in trigram_queries)))
+        return set().union(*(trigram_query.find_candidates(postings) for trigram_query in trigram_queries))
+
+
+    def close(self):
+        """Closes the database connection."""
+        self.connection.close()
+
+
+def get_trigram_index_file_path() -> str:
+    """Returns the path to the trigram index database in TRIGRAM_INDEX_DIRECTORY."""
+    return os.path.join(config.settings["TRIGRAM_INDEX_DIRECTORY"], TRIGRAM_INDEX_FILE_NAME)
+
+
+def get_index_settings_fingerprint() -> str:
+    """Returns a hash of the current values of the settings that change what is indexed."""
+    settings_source = json.dumps({setting_name: str(config.settings[setting_name]) for setting_name in INDEX_AFFECTING_SETTINGS}, sort_keys=True)
+    return hashlib.sha256(settings_source.encode('utf-8')).hexdigest()
+
+
+def get_haystack_ngrams(haystack: bytes | str, ngram_length: int = TRIGRAM_LENGTH) -> set[bytes]:
+    """
+    Returns every n-gram of consecutive ASCII characters in a lowercased haystack. Only ASCII n-grams are needed,
+    since queries are built from ASCII literals, and non-ASCII characters encode to bytes that are never part of one.
+    """
+    if isinstance(haystack, str):
+        haystack = haystack.encode('utf-8')
+
+    ngrams = {haystack[i:i + ngram_length] for i in range(len(haystack) - ngram_length + 1)}
+    return {ngram for ngram in ngrams if ngram.isascii()}
+
+
+def get_ngram_keys(ngrams: set[bytes], key_offset: int = 0) -> set[int]:
+    """Returns the n-grams as the integer keys they are stored under, offset for the HTTP headers."""
+    return {key_offset + int.from_bytes(ngram, 'big') for ngram in ngrams}
+
+
+def get_contents_haystack(contents: bytes, charset: str | None) -> bytes | str:
+    """
+    Returns record contents as the definitions search them, lowercased: decoded with the record's encoding, ignoring invalid bytes,
+    so both case sensitive and case insensitive definitions can be queried.
+    """
+    encoding = get_contents_encoding(contents, charset) if config.settings["DETECT_CONTENTS_CHARSET"] else DEFAULT_ENCODING
+    return PrefilterText(RecordText(contents, encoding)).get_haystack(True)
+
+
+def get_contents_ngrams(contents: bytes, charset: str | None, ngram_length: int = TRIGRAM_LENGTH) -> set[bytes]:
+    """Returns the n-grams of record contents as the definitions search them."""
+    return get_haystack_ngrams(get_contents_haystack(contents, charset), ngram_length)
+
+
+def get_headers_haystack(http_headers: bytes) -> str:
+    """Returns a record's HTTP headers as the definitions limited to the headers search them, lowercased."""
+    return lowercase_haystack(str(http_headers, 'utf-8', 'ignore'))
+
+
+class StreamedContentsNgrams:
+    """
+    Collects the n-grams of the contents of a record too large to be held in memory, as its chunks are read and decoded the way
+    the streaming search decodes them. The last characters of each chunk are kept with the next one, so no n-gram is split between them.
+    Binary contents are left out unless SEARCH_BINARY_FILES is enabled.
+    """
+    def __init__(self, charset: str | None, ngram_length: int = TRIGRAM_LENGTH):
+        self.charset = charset
+        self.ngram_length = ngram_length
+        self.ngrams = set()
+        self.is_binary = False
+        self.decoder = None
+        self.retained_text = ''
+
+
+    def add_chunk(self, chunk: bytes):
+        """Adds the n-grams of the next chunk of the contents. Nothing is added once the first chunk has been found to be binary."""
+        if self.is_binary:
+            return
+
+        if self.decoder is None:
+            if not config.settings["SEARCH_BINARY_FILES"] and is_file_binary(chunk):
+                self.is_binary = True
+                return
+            encoding = get_contents_encoding(chunk, self.charset) if config.settings["DETECT_CONTENTS_CHARSET"] else DEFAULT_ENCODING
+            self.decoder = codecs.getincrementaldecoder(encoding)('ignore')
+
+        text = self.retained_text + self.decoder.decode(chunk)
+        self.ngrams |= self.get_haystack_ngrams(lowercase_haystack(text))
+        self.retained_text = text[-(self.ngram_length - 1):]
+
+
+    def get_haystack_ngrams(self, haystack: bytes | str) -> set:
+        """Returns the n-grams of a lowercased chunk of text."""
+        return get_haystack_ngrams(haystack, self.ngram_length)
+
+
+def get_streamed_contents_trigrams(warc_record: StreamedWarcRecord) -> set[bytes]:
+    """Returns the trigrams of the contents of a record too large to be held in memory, reading them in chunks as the streaming search does."""
+    streamed_contents_trigrams = StreamedContentsNgrams(warc_record.charset)
+    for chunk in warc_record.read_chunks(config.settings["STREAMING_CHUNK_SIZE_KB"] * 1024):
+        streamed_contents_trigrams.add_chunk(chunk)
+        if streamed_contents_trigrams.is_binary:
+            break
+
+    return streamed_contents_trigrams.ngrams
+
+
+def get_record_trigrams(warc_record: WarcRecord | StreamedWarcRecord) -> set[int]:
+    """
+    Returns the keys of the trigrams in everything a definition can search in a record: its URI and its contents, decoded as the search
+    decodes them, and its HTTP headers under separate keys. Binary contents are left out unless SEARCH_BINARY_FILES is enabled.
+    """
+    trigrams = get_ngram_keys(get_haystack_ngrams(lowercase_haystack(warc_record.name)))
+
+    if warc_record.http_headers:
+        trigrams |= get_ngram_keys(get_haystack_ngrams(get_headers_haystack(warc_record.http_headers)), HEADERS_TRIGRAM_OFFSET)
+
+    if isinstance(warc_record, StreamedWarcRecord):
+        return trigrams | get_ngram_keys(get_streamed_contents_trigrams(warc_record))
+
+    contents = warc_record.contents
+    if config.settings["DECODE_HTTP_PAYLOADS"]:
+        contents = decode_http_payload(contents, warc_record.http_headers)
+
+    if config.settings["SEARCH_BINARY_FILES"] or not is_file_binary(contents):
+        trigrams |= get_ngram_keys(get_contents_ngrams(contents, warc_record.charset))
+
+    return trigrams
+
+
+def index_warc_gz_file(warc_gz_file_path: str) -> ArchiveIndex | None:
+    """
+    Reads every response record of a WARC.gz file that passes the record filters and returns the index of the file,
+    or None if the file is not compressed per record, since its records could not be read by offset.
+    Records are read as the search worker processes read them in offset mode, so each is indexed as it will be searched.
+    """
+    if not is_warc_gz_compressed_per_record(warc_gz_file_path):
+        return None
+
+    streaming_threshold = config.settings["STREAMING_SEARCH_THRESHOLD_KB"] * 1024 if config.settings["STREAMING_SEARCH_THRESHOLD_KB"] is not None else None
+    warc_member_reader = WarcMemberReader(read_http_headers=True, streaming_threshold=streaming_threshold)
+    archive_index = ArchiveIndex(array('Q'), array('Q'), {})
+
+    try:
+        for record_number, warc_member in enumerate(scan_warc_gz_members(warc_gz_file_path, create_record_filter(config.settings))):
+            archive_index.member_offsets.append(warc_member.offset)
+            archive_index.member_lengths.append(warc_member.length)
+
+            warc_record = warc_member_reader.read_record(warc_member)
+            if warc_record is None:
+                continue
+
+            try:
+                for trigram in get_record_trigrams(warc_record):
+                    archive_index.postings.setdefault(trigram, array('I')).append(record_number)
+            finally:
+                if isinstance(warc_record, StreamedWarcRecord):
+                    warc_record.close()
+    finally:
+        warc_member_reader.close()
+
+    return archive_index
+
+
+def build_trigram_index():
+    """
+    Builds the trigram index in TRIGRAM_INDEX_DIRECTORY over the WARC.gz files in WARC_GZ_ARCHIVES_DIRECTORY, using a worker process per file.
+    Files already indexed unchanged with the current settings are kept, changed files are indexed again, and removed files are dropped.
+    """
+    if config.settings["TRIGRAM_INDEX_DIRECTORY"] is None:
+        log_error("TRIGRAM_INDEX_DIRECTORY must be set in config.ini to build a trigram index. Exiting.")
+        sys.exit()
+
+    os.makedirs(config.settings["TRIGRAM_INDEX_DIRECTORY"], exist_ok=True)
+    warc_gz_files_list = glob.glob(f"{config.settings["WARC_GZ_ARCHIVES_DIRECTORY"]}/*.gz")
+    settings_fingerprint = get_index_settings_fingerprint()
+    trigram_index = TrigramIndex(get_trigram_index_file_path())
+
+    removed_archives = trigram_index.remove_missing_archives(warc_gz_files_list)
+    unindexed_warc_gz_files_list = [
+        warc_gz_file_path for warc_gz_file_path in warc_gz_files_list
+        if trigram_index.get_indexed_archive(warc_gz_file_path, settings_fingerprint) is None
+    ]
+    log_info(
+        f"Indexing {len(unindexed_warc_gz_files_list)} of {len(warc_gz_files_list)} WARC.gz files. "
+        f"The rest are already indexed, and {removed_archives} WARC.gz files no longer present were removed from the index."
+    )
+
+    indexed_records = 0
+    with ProcessPoolExecutor(max_workers=config.settings["MAX_CONCURRENT_SEARCH_PROCESSES"]) as executor:
+        futures = {
+            executor.submit(index_warc_gz_file, warc_gz_file_path): (warc_gz_file_path, os.stat(warc_gz_file_path))
+            for warc_gz_file_path in unindexed_warc_gz_files_list
+        }
+
+        for future in as_completed(futures):
+            warc_gz_file_path, archive_stat = futures[future]
+            try:
+                archive_index = future.result()
+            except Exception as e:
+                log_error(f"Error ocurred when indexing {os.path.basename(warc_gz_file_path)}: \n{e}")
+                continue
+
+            if archive_index is None:
+                log_warning(
+                    f"{os.path.basename(warc_gz_file_path)} is not compressed per record, so it cannot be indexed and will be read in full by every search."
+                )
+                continue
+
+            trigram_index.add_archive(warc_gz_file_path, archive_index, archive_stat, settings_fingerprint)
+            indexed_records += len(archive_index.member_offsets)
+
+    trigram_index.close()
+    log_info(f"Indexed {indexed_records} records. The trigram index is in {get_trigram_index_file_path()}")
+
+
+def create_ngram_query(regex: re.Pattern, scope: str | None = None, ngram_length: int = TRIGRAM_LENGTH) -> NgramQuery:
+    """
+    Returns the n-gram query of a definition's regex, in the style of codesearch: each requirement the literal prefilter finds becomes
+    an alternation of literals, each standing for all of its n-grams. Requirements with a literal shorter than an n-gram are dropped,
+    since they cannot rule out any record. Definitions limited to the HTTP headers query the n-grams of the headers,
+    whose keys are offset past those of every other n-gram.
+    """
+    key_offset = 1 << (8 * ngram_length) if scope == 'headers' else 0
+    requirements = []
+    for literals in extract_required_literal_alternatives(regex):
+        if any(len(literal) < ngram_length for literal in literals):
+            continue
+
+        requirements.append([
+            sorted(get_ngram_keys(get_haystack_ngrams(literal.lower(), ngram_length), key_offset)) for literal in literals
+        ])
+
+    return NgramQuery(requirements)
+
+
+def find_candidate_warc_members(warc_gz_files_list: list[str], results_and_regexes_dict: dict[str, re.Pattern]) -> dict[str, list[WarcMember]]:
+    """
+    Returns the member locations of the records in each indexed WARC.gz file that can match any of the definitions, in file order.
+    WARC.gz files missing from the index, changed since they were indexed or indexed with other settings are left out, to be read in full.
+    If any definition has no trigram query, every record could match it, so no WARC.gz file is narrowed down.
+    """
+    trigram_queries = []
+    for results_file_path, regex in results_and_regexes_dict.items():
+        trigram_query = create_ngram_query(regex, get_definition_scope(results_file_path))
+        if trigram_query.is_unconstrained:
+            log_info(
+                f"The {get_definition_name(results_file_path)} definition has no literal text of at least {TRIGRAM_LENGTH} characters "
+                "that every match must contain, so the trigram index cannot narrow down the records to search."
+            )
+            return {}
+        trigram_queries.append(trigram_query)
+
+    if not os.path.isfile(get_trigram_index_file_path()):
+        log_warning(f"No trigram index was found in {config.settings["TRIGRAM_INDEX_DIRECTORY"]}. Run main.py build-index to build one.")
+        return {}
+
+    settings_fingerprint = get_index_settings_fingerprint()
+    trigram_index = TrigramIndex(get_trigram_index_file_path())
+    candidate_warc_members_dict = {}
+    indexed_records = 0
+
+    try:
+        for warc_gz_file_path in warc_gz_files_list:
+            indexed_archive = trigram_index.get_indexed_archive(warc_gz_file_path, settings_fingerprint)
+            if indexed_archive is None:
+                continue
+
+            candidate_record_numbers = trigram_index.find_candidate_record_numbers(indexed_archive.archive_id, trigram_queries)
+            candidate_warc_members_dict[warc_gz_file_path] = [
+                WarcMember(warc_gz_file_path, indexed_archive.member_offsets[record_number], indexed_archive.member_lengths[record_number])
+                for record_number in sorted(candidate_record_numbers)
+            ]
+            indexed_records += len(indexed_archive.member_offsets)
+    finally:
+        # The index is closed before the search worker processes are forked, so they do not inherit the connection
+        trigram_index.close()
+
+    log_trigram_index_summary(candidate_warc_members_dict, indexed_records, len(warc_gz_files_list))
+    return candidate_warc_members_dict
+
+
+def log_trigram_index_summary(candidate_warc_members_dict: dict[str, list[WarcMember]], indexed_records: int, total_gz_files: int):
+    """Logs how many records of the indexed WARC.gz files will be searched, and how many WARC.gz files will be read in full."""
+    candidate_records = sum(len(candidate_warc_members) for candidate_warc_members in candidate_warc_members_dict.values())
+    log_info(
+        f"Trigram index: {candidate_records} of {indexed_records} records in {len(candidate_warc_members_dict)} indexed WARC.gz files "
+        "can match the definitions and will be searched."
+    )
+
+    unindexed_gz_files = total_gz_files - len(candidate_warc_members_dict)
+    if unindexed_gz_files > 0:
+        log_warning(
+            f"{unindexed_gz_files} WARC.gz files are not in the trigram index, changed since they were indexed or were indexed with other settings, "
+            "so they will be read in full. Run main.py build-index to index them."
+        )
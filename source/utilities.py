@@ -1,9 +1,14 @@
 import glob
 import os
 import re
+import shutil
 import zipfile
 import psutil
 
+from zip_merge import merge_zip_archives_without_recompression
+
+STREAM_COPY_CHUNK_SIZE = 1024 * 1024
+
 
 def find_regex_matches(input_string: str, regex_pattern: re.Pattern) -> list:
     """Finds all matches of the regex pattern in the input string and returns them as a list."""
@@ -16,9 +21,9 @@ def get_base_file_name(file_path: str) -> str:
 
 
 def is_file_binary(file_data) -> bool:
-    """Returns True if the file is binary data based on the first 1024 characters."""
+    """Returns True if the file is binary data based on the first 1024 characters. Accepts bytes or a memoryview over bytes."""
     text_chars = bytearray({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7f})
-    first_1024_chars = file_data[:1024]
+    first_1024_chars = bytes(file_data[:1024])
     return bool(first_1024_chars.translate(None, text_chars))
 
 
@@ -33,25 +38,78 @@ def sanitize_file_name_string(file_name: str) -> str:
     return web_prefixes_removed.translate(str.maketrans('','','\\/*?:"<>|'))
 
 
-def add_file_to_zip_archive(file_name: str, file_data, zip_archive: zipfile.ZipFile):
-    """Adds a file to an existing zip archive after ensuring a file with the same name is not already present in the archive."""
+def is_file_in_zip_archive(file_name: str, zip_archive: zipfile.ZipFile) -> bool:
+    """
+    Returns True if a file with the name is already present in the zip archive. The archive's own dictionary of its entries by name
+    is looked up, rather than its list of names, which namelist() builds anew on every call.
+    """
+    return file_name in zip_archive.NameToInfo
+
+
+def add_file_to_zip_archive(file_name: str, file_data, zip_archive: zipfile.ZipFile, compress_type: int | None = None, 
+                            compresslevel: int | None = None) -> bool:
+    """
+    Adds a file to an existing zip archive after ensuring a file with the same name is not already present in the archive,
+    compressed with the given method and level or else with those of the archive. Returns True if the file was added.
+    """
     sanitized_file_name = sanitize_file_name_string(file_name)
-    if sanitized_file_name not in zip_archive.namelist():
-        zip_archive.writestr(sanitized_file_name, file_data)
+    if is_file_in_zip_archive(sanitized_file_name, zip_archive):
+        return False
 
+    zip_archive.writestr(sanitized_file_name, file_data, compress_type, compresslevel)
+    return True
 
-def merge_zip_archives(parent_dir: str, output_dir: str, archive_name: str):
+
+def add_stream_to_zip_archive(file_name: str, file_stream, zip_archive: zipfile.ZipFile, compress_type: int | None = None, 
+                              compresslevel: int | None = None) -> bool:
     """
-    Merges identically named zip archives in subdirectories of the parent directory into a single zip archive in the output directory. 
+    Adds a file read from the start of a seekable stream to an existing zip archive after ensuring a file with the same name is not already present,
+    copying it in chunks so the file is never held in memory whole. It is compressed with the given method and level or else with those of the archive.
+    Returns True if the file was added.
     """
-    combined_zip = os.path.join(output_dir, f"{archive_name}.zip")
-    added_files = set()
+    sanitized_file_name = sanitize_file_name_string(file_name)
+    if is_file_in_zip_archive(sanitized_file_name, zip_archive):
+        return False
+
+    file_stream.seek(0)
+    archive_compression = (zip_archive.compression, zip_archive.compresslevel)
+    if compress_type is not None:
+        # Files opened for writing by name take the compression of the archive
+        zip_archive.compression, zip_archive.compresslevel = compress_type, compresslevel
+    try:
+        with zip_archive.open(sanitized_file_name, 'w', force_zip64=True) as zip_archive_file:
+            shutil.copyfileobj(file_stream, zip_archive_file, STREAM_COPY_CHUNK_SIZE)
+    finally:
+        zip_archive.compression, zip_archive.compresslevel = archive_compression
+    return True
+
+
+def copy_zip_archive_entries(source_zip_path: str, target_zip_path: str, file_names: list[str]):
+    """
+    Copies the files with the given names, as they were named before being sanitized, from one zip archive to another,
+    skipping any that are missing from the source archive or already present in the target archive.
+    """
+    with zipfile.ZipFile(source_zip_path, 'r') as source_zip_archive:
+        source_file_names = set(source_zip_archive.namelist())
+        with zipfile.ZipFile(target_zip_path, 'a', compression=zipfile.ZIP_DEFLATED) as target_zip_archive:
+            added_file_names = set(target_zip_archive.namelist())
+            for file_name in map(sanitize_file_name_string, file_names):
+                if file_name in source_file_names and file_name not in added_file_names:
+                    with source_zip_archive.open(file_name) as source_file:
+                        with target_zip_archive.open(file_name, 'w', force_zip64=True) as target_file:
+                            shutil.copyfileobj(source_file, target_file, STREAM_COPY_CHUNK_SIZE)
+                    added_file_names.add(file_name)
+
 
-    for subdir, _, _ in os.walk(parent_dir):
-        for file in glob.glob(os.path.join(subdir, f"{archive_name}*.zip")):
-            with zipfile.ZipFile(file, 'r') as zip1:
-                with zipfile.ZipFile(combined_zip, 'a', compression=zipfile.ZIP_DEFLATED) as zip2:
-                    for file in zip1.namelist():
-                        if file not in added_files:
-                            zip2.writestr(file, zip1.read(file))
-                            added_files.add(file)
\ No newline at end of file
+def merge_zip_archives(parent_dir: str, output_dir: str, archive_name: str):
+    """
+    Merges identically named zip archives in subdirectories of the parent directory into a single zip archive in the output directory,
+    copying their compressed entries without recompressing them. Archives are merged in order of their paths, and the first entry of each name is kept.
+    """
+    zip_archive_paths = [
+        zip_archive_path
+        for subdir, _, _ in sorted(os.walk(parent_dir))
+        for zip_archive_path in sorted(glob.glob(os.path.join(subdir, f"{archive_name}*.zip")))
+    ]
+    if zip_archive_paths:
+        merge_zip_archives_without_recompression(zip_archive_paths, os.path.join(output_dir, f"{archive_name}.zip"))
\ No newline at end of file
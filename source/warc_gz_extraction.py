@@ -0,0 +1,244 @@
+import errno
+import glob
+import os
+from typing import BinaryIO, Iterable, Iterator
+
+from fastwarc.warc import ArchiveIterator, WarcRecordType
+from search_checkpoint import get_warc_gz_segment_path
+from utilities import get_base_file_name
+from warc_record import WarcMember
+
+WARC_GZ_EXTENSION = '.warc.gz'
+COPY_CHUNK_SIZE = 1024 * 1024
+# Errors raised by os.copy_file_range and os.sendfile when the kernel or the file systems cannot copy between the files
+UNSUPPORTED_COPY_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
+
+
+def get_warc_gz_file_path(directory: str, results_file_path: str) -> str:
+    """Returns the path of the WARC.gz file of a results file's definition in the directory."""
+    return os.path.join(directory, f"{get_base_file_name(results_file_path)}{WARC_GZ_EXTENSION}")
+
+
+def open_file_for_copying(file_path: str) -> BinaryIO:
+    """
+    Opens a file to copy byte ranges to its end, creating it if needed. It is not opened in append mode,
+    which os.copy_file_range refuses to write to, so its position is moved to its end instead.
+    """
+    output_file = os.fdopen(os.open(file_path, os.O_WRONLY | os.O_CREAT, 0o644), 'wb', buffering=0)
+    output_file.seek(0, os.SEEK_END)
+    return output_file
+
+
+def copy_file_range(source_file: BinaryIO, output_file: BinaryIO, offset: int, length: int):
+    """
+    Copies length bytes at offset in the source file to the current position of the output file, without the bytes passing through Python:
+    with os.copy_file_range, which can share the blocks on file systems that support it, or else with os.sendfile.
+    Where neither is available or the file systems do not allow them, the bytes are read and written in chunks.
+    """
+    source_fd, output_fd = source_file.fileno(), output_file.fileno()
+    for copy_function in (copy_with_copy_file_range, copy_with_sendfile):
+        copied = copy_function(source_fd, output_fd, offset, length)
+        offset += copied
+        length -= copied
+        if length == 0:
+            return
+
+    copy_with_read_and_write(source_file, output_file, offset, length)
+
+
+def copy_with_copy_file_range(source_fd: int, output_fd: int, offset: int, length: int) -> int:
+    """
+    Copies the byte range with os.copy_file_range, and returns the number of bytes copied before it was copied whole
+    or os.copy_file_range turned out to be unsupported for these files.
+    """
+    if not hasattr(os, 'copy_file_range'):
+        return 0
+
+    copied = 0
+    while copied < length:
+        try:
+            # The output file's position is used and moved on, since no output offset is given
+            count = os.copy_file_range(source_fd, output_fd, length - copied, offset + copied)
+        except OSError as e:
+            if e.errno in UNSUPPORTED_COPY_ERRNOS:
+                return copied
+            raise
+        if count == 0:
+            raise EOFError(f"The byte range at offset {offset} of {length} bytes runs past the end of the source file")
+        copied += count
+    return copied
+
+
+def copy_with_sendfile(source_fd: int, output_fd: int, offset: int, length: int) -> int:
+    """
+    Copies the byte range with os.sendfile, and returns the number of bytes copied before it was copied whole
+    or os.sendfile turned out to be unsupported for these files, as it is on systems that only send files to sockets.
+    """
+    if not hasattr(os, 'sendfile'):
+        return 0
+
+    copied = 0
+    while copied < length:
+        try:
+            count = os.sendfile(output_fd, source_fd, offset + copied, length - copied)
+        except OSError as e:
+            if e.errno in UNSUPPORTED_COPY_ERRNOS:
+                return copied
+            raise
+        if count == 0:
+            raise EOFError(f"The byte range at offset {offset} of {length} bytes runs past the end of the source file")
+        copied += count
+    return copied
+
+
+def copy_with_read_and_write(source_file: BinaryIO, output_file: BinaryIO, offset: int, length: int):
+    """Copies the byte range by reading and writing it in chunks."""
+    source_file.seek(offset)
+    while length > 0:
+        chunk = source_file.read(min(length, COPY_CHUNK_SIZE))
+        if not chunk:
+            raise EOFError(f"The byte range at offset {offset} runs past the end of the source file")
+        output_file.write(chunk)
+        length -= len(chunk)
+
+
+def merge_warc_gz_files(parent_dir: str, output_dir: str, warc_gz_name: str):
+    """
+    Merges identically named WARC.gz files in subdirectories of the parent directory into a single WARC.gz file in the output directory.
+    A WARC.gz file compressed per record is a series of gzip members, so the files are concatenated byte for byte, in order of their paths,
+    after the output file if it already exists. The merged file is written next to it and replaces it once complete.
+    """
+    warc_gz_file_paths = [
+        warc_gz_file_path
+        for subdir, _, _ in sorted(os.walk(parent_dir))
+        for warc_gz_file_path in sorted(glob.glob(os.path.join(subdir, f"{warc_gz_name}*{WARC_GZ_EXTENSION}")))
+    ]
+    if not warc_gz_file_paths:
+        return
+
+    output_warc_gz_file_path = os.path.join(output_dir, f"{warc_gz_name}{WARC_GZ_EXTENSION}")
+    if os.path.exists(output_warc_gz_file_path):
+        warc_gz_file_paths.insert(0, output_warc_gz_file_path)
+
+    merging_warc_gz_file_path = f"{output_warc_gz_file_path}.merging"
+    with open(merging_warc_gz_file_path, 'wb', buffering=0) as merging_warc_gz_file:
+        for warc_gz_file_path in warc_gz_file_paths:
+            with open(warc_gz_file_path, 'rb') as warc_gz_file:
+                copy_file_range(warc_gz_file, merging_warc_gz_file, 0, os.path.getsize(warc_gz_file_path))
+
+    os.replace(merging_warc_gz_file_path, output_warc_gz_file_path)
+
+
+def scan_warc_gz_response_members(warc_gz_file_path: str) -> Iterator[tuple[str, WarcMember]]:
+    """Yields the target URI and the gzip member location of each response record in a WARC.gz file compressed per record."""
+    file_size = os.path.getsize(warc_gz_file_path)
+    pending_response = None
+
+    # A plain file object is used so record.stream_pos reports positions in the compressed file
+    with open(warc_gz_file_path, 'rb') as warc_gz_file:
+        for record in ArchiveIterator(warc_gz_file, parse_http=False):
+            if pending_response is not None:
+                yield pending_response[0], WarcMember(warc_gz_file_path, pending_response[1], record.stream_pos - pending_response[1])
+                pending_response = None
+
+            if record.record_type == WarcRecordType.response:
+                pending_response = (record.headers['WARC-Target-URI'], record.stream_pos)
+
+    if pending_response is not None:
+        yield pending_response[0], WarcMember(warc_gz_file_path, pending_response[1], file_size - pending_response[1])
+
+
+def copy_warc_gz_records(source_warc_gz_file_path: str, target_warc_gz_file_path: str, file_names: Iterable[str]):
+    """Copies the gzip members of the response records with the given target URIs from one WARC.gz file to the end of another."""
+    file_names = set(file_names)
+    with open(source_warc_gz_file_path, 'rb') as source_file, open_file_for_copying(target_warc_gz_file_path) as target_file:
+        for target_uri, warc_member in scan_warc_gz_response_members(source_warc_gz_file_path):
+            if target_uri in file_names:
+                copy_file_range(source_file, target_file, warc_member.offset, warc_member.length)
+
+
+class WarcGzExtractor:
+    """
+    Extracts the records with matches into a WARC.gz file for each definition they matched, by copying their original gzip member
+    from the WARC.gz file they were read from, so they are never decompressed or compressed again and keep their WARC headers.
+    Each search worker process writes its own WARC.gz files, which are concatenated into one per definition once the search finishes.
+    Only records read by the offset of their gzip member know where it is, so other records cannot be extracted.
+    """
+    MAX_OPEN_SOURCE_FILES = 8
+
+    def __init__(self):
+        self.output_directory = ''
+        self.output_files: dict[str, BinaryIO] = {}
+        # Members copied to each definition's WARC.gz file by this worker process, so a member is never copied twice
+        self.copied_members: dict[str, set[tuple[str, int]]] = {}
+        self.source_files: dict[str, BinaryIO] = {}
+
+
+    def start_worker(self, results_file_paths: Iterable[str], output_directory: str, generation: int):
+        """
+        Opens the WARC.gz file segment of each definition a search worker process searches with, in its own output directory,
+        for the checkpoint generation it starts in.
+        """
+        self.output_directory = output_directory
+        for results_file_path in results_file_paths:
+            self.output_files[results_file_path] = open_file_for_copying(self.get_output_file_path(results_file_path, generation))
+            self.copied_members[results_file_path] = set()
+
+
+    def get_output_file_path(self, results_file_path: str, generation: int) -> str:
+        """Returns the path of the WARC.gz file segment of a definition for a checkpoint generation."""
+        return get_warc_gz_segment_path(get_warc_gz_file_path(self.output_directory, results_file_path), generation)
+
+
+    def add_member(self, warc_member: WarcMember, results_file_paths: Iterable[str]) -> int:
+        """Copies the gzip member to the WARC.gz file of each definition that matched its record, and returns the number of copies made."""
+        source_file = self.get_source_file(warc_member.parent_warc_gz_file)
+        member_key = (warc_member.parent_warc_gz_file, warc_member.offset)
+        copies = 0
+        for results_file_path in results_file_paths:
+            if member_key in self.copied_members[results_file_path]:
+                continue
+
+            output_file = self.output_files[results_file_path]
+            member_start = output_file.tell()
+            try:
+                copy_file_range(source_file, output_file, warc_member.offset, warc_member.length)
+            except Exception:
+                # A member cut short would make every member after it unreadable
+                output_file.truncate(member_start)
+                output_file.seek(member_start)
+                raise
+            self.copied_members[results_file_path].add(member_key)
+            copies += 1
+        return copies
+
+
+    def get_source_file(self, warc_gz_file_path: str) -> BinaryIO:
+        """Returns an open handle to a source WARC.gz file, closing the one opened first if too many are open."""
+        if warc_gz_file_path not in self.source_files:
+            if len(self.source_files) >= self.MAX_OPEN_SOURCE_FILES:
+                self.source_files.pop(next(iter(self.source_files))).close()
+            self.source_files[warc_gz_file_path] = open(warc_gz_file_path, 'rb')
+        return self.source_files[warc_gz_file_path]
+
+
+    def start_segments(self, generation: int):
+        """
+        Makes sure the WARC.gz file segments written so far are on disk and closes them, then starts new segments for the checkpoint generation,
+        so the segments closed remain intact if the search is interrupted.
+        """
+        for output_file in self.output_files.values():
+            os.fsync(output_file.fileno())
+            output_file.close()
+
+        for results_file_path in self.output_files:
+            self.output_files[results_file_path] = open_file_for_copying(self.get_output_file_path(results_file_path, generation))
+
+
+    def finish_worker(self):
+        """Closes the WARC.gz files of a search worker process and the source WARC.gz files it copied from."""
+        for open_file in [*self.output_files.values(), *self.source_files.values()]:
+            open_file.close()
+        self.output_files = {}
+        self.copied_members = {}
+        self.source_files = {}
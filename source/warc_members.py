@@ -0,0 +1,214 @@
+import io
+import os
+import zlib
+from collections import OrderedDict
+from typing import BinaryIO, Iterator
+
+from fastwarc.warc import ArchiveIterator, WarcRecordType
+from http_payload import serialize_http_headers
+from record_filters import RecordFilter
+from record_text import get_http_charset
+from streaming_search import StreamedWarcRecord
+from warc_record import WarcMember, WarcRecord
+
+GZIP_MAGIC_NUMBER = b'\x1f\x8b'
+READ_CHUNK_SIZE = 1024 * 1024
+MAX_FIRST_MEMBER_SCAN_BYTES = 64 * 1024 * 1024
+
+
+def is_warc_gz_compressed_per_record(warc_gz_file_path: str) -> bool:
+    """
+    Returns True if the WARC.gz file is made of one gzip member per record, which is required to read records by their offset.
+    Only the first member is inflated: the file qualifies if that member holds a single WARC record
+    and is followed by the end of the file or by the start of the next member.
+    """
+    decompressor = zlib.decompressobj(wbits=31)
+    first_member = bytearray()
+
+    with open(warc_gz_file_path, 'rb') as warc_gz_file:
+        while not decompressor.eof and len(first_member) < MAX_FIRST_MEMBER_SCAN_BYTES:
+            chunk = warc_gz_file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return False
+
+            try:
+                first_member += decompressor.decompress(chunk)
+            except zlib.error:
+                return False
+
+        if not decompressor.eof:
+            return False
+
+        following_bytes = decompressor.unused_data or warc_gz_file.read(len(GZIP_MAGIC_NUMBER))
+        if following_bytes and not following_bytes.startswith(GZIP_MAGIC_NUMBER):
+            return False
+
+    records = ArchiveIterator(io.BytesIO(first_member), parse_http=False, strict_mode=False)
+    return sum(1 for _ in records) == 1
+
+
+def scan_warc_gz_members(warc_gz_file_path: str, record_filter: RecordFilter | None = None, start_offset: int = 0) -> Iterator[WarcMember]:
+    """
+    Yields the location of the gzip member of each response record in a WARC.gz file compressed per record.
+    Only the WARC headers, and the HTTP headers if the record filter checks them, are parsed and record contents are skipped without being copied.
+    Response records skipped by the record filter are not yielded.
+    The length of a member is the distance to the start of the following record, or to the end of the file.
+    Scanning starts at start_offset, which must be the start of a gzip member.
+    """
+    file_size = os.path.getsize(warc_gz_file_path)
+    pending_response_offset = None
+
+    # A plain file object is used so record.stream_pos reports positions in the compressed file
+    with open(warc_gz_file_path, 'rb') as warc_gz_file:
+        warc_gz_file.seek(start_offset)
+        for record in ArchiveIterator(warc_gz_file, parse_http=False):
+            if pending_response_offset is not None:
+                yield WarcMember(warc_gz_file_path, pending_response_offset, record.stream_pos - pending_response_offset)
+                pending_response_offset = None
+
+            if record.record_type == WarcRecordType.response and passes_record_filter(record, record_filter):
+                pending_response_offset = record.stream_pos
+
+    if pending_response_offset is not None:
+        yield WarcMember(warc_gz_file_path, pending_response_offset, file_size - pending_response_offset)
+
+
+def passes_record_filter(record, record_filter: RecordFilter | None) -> bool:
+    """Returns True if there is no record filter or the record passes it, parsing the record's HTTP headers first if the filter checks them."""
+    if record_filter is None:
+        return True
+
+    # Every record is still scanned to find where the members end, so the filter is applied here rather than as func_filter
+    if record_filter.needs_http_headers:
+        record.parse_http()
+    return record_filter(record)
+
+
+def read_file_range(file: BinaryIO, offset: int, length: int) -> bytes:
+    """Reads length bytes at offset, with os.pread where it is available so the file position is never shared."""
+    if hasattr(os, 'pread'):
+        return os.pread(file.fileno(), length, offset)
+
+    file.seek(offset)
+    return file.read(length)
+
+
+def parse_warc_gz_member(warc_gz_file_path: str, member_bytes: bytes, read_http_headers: bool = False) -> WarcRecord | None:
+    """
+    Inflates a single gzip member and returns the response record it contains, or None if it holds no response record.
+    The raw HTTP header block is kept with the record if read_http_headers is True.
+    """
+    return parse_warc_record_bytes(warc_gz_file_path, zlib.decompress(member_bytes, wbits=31), read_http_headers)
+
+
+def parse_warc_record_bytes(warc_gz_file_path: str, warc_bytes: bytes, read_http_headers: bool = False) -> WarcRecord | None:
+    """Returns the response record held in the inflated bytes of a gzip member, or None if they hold no response record."""
+    records = ArchiveIterator(
+        io.BytesIO(warc_bytes),
+        strict_mode=False,
+        record_types=WarcRecordType.response
+    )
+
+    for record in records:
+        return WarcRecord(
+            parent_warc_gz_file=warc_gz_file_path,
+            name=record.headers['WARC-Target-URI'],
+            contents=record.reader.read(),
+            charset=get_http_charset(record),
+            http_headers=serialize_http_headers(record.http_headers) if read_http_headers else None
+        )
+
+    return None
+
+
+def inflate_warc_gz_member(member_bytes: bytes, max_size: int) -> bytes | None:
+    """Inflates a single gzip member, or returns None without inflating the rest of it once it exceeds max_size bytes."""
+    decompressor = zlib.decompressobj(wbits=31)
+    warc_bytes = decompressor.decompress(member_bytes, max_size)
+    return warc_bytes if decompressor.eof else None
+
+
+def open_streamed_warc_gz_member(warc_member: WarcMember, read_http_headers: bool = False) -> StreamedWarcRecord | None:
+    """
+    Opens the response record of a gzip member as a streamed record, whose contents are inflated as they are read,
+    or returns None if the member holds no response record. The record owns the file it is read from until it is closed.
+    """
+    warc_gz_file = open(warc_member.parent_warc_gz_file, 'rb')
+    warc_gz_file.seek(warc_member.offset)
+    records = ArchiveIterator(warc_gz_file, strict_mode=False, record_types=WarcRecordType.response)
+
+    for record in records:
+        return StreamedWarcRecord(
+            parent_warc_gz_file=warc_member.parent_warc_gz_file,
+            name=record.headers['WARC-Target-URI'],
+            contents_stream=record.reader,
+            charset=get_http_charset(record),
+            http_headers=serialize_http_headers(record.http_headers) if read_http_headers else None,
+            opened_file=warc_gz_file
+        )
+
+    warc_gz_file.close()
+    return None
+
+
+class WarcMemberReader:
+    """
+    Reads single records from WARC.gz files by the offset and length of their gzip member.
+    The most recently used files are kept open, since consecutive members usually come from the same file.
+    If a streaming threshold is given, records larger than it are opened as streamed records instead of being read whole.
+    """
+    MAX_OPEN_FILES = 8
+
+    def __init__(self, read_http_headers: bool = False, streaming_threshold: int | None = None):
+        self.open_files: OrderedDict[str, BinaryIO] = OrderedDict()
+        self.read_http_headers = read_http_headers
+        self.streaming_threshold = streaming_threshold
+
+
+    def read_record(self, warc_member: WarcMember) -> WarcRecord | StreamedWarcRecord | None:
+        """Reads and inflates the gzip member and returns the response record it contains, which keeps the location of its gzip member."""
+        warc_record = self.read_member_record(warc_member)
+        if warc_record is not None:
+            warc_record.warc_member = warc_member
+        return warc_record
+
+
+    def read_member_record(self, warc_member: WarcMember) -> WarcRecord | StreamedWarcRecord | None:
+        """Reads and inflates the gzip member, or opens it as a streamed record if it is larger than the streaming threshold."""
+        if self.streaming_threshold is None:
+            warc_gz_file = self.get_open_file(warc_member.parent_warc_gz_file)
+            member_bytes = read_file_range(warc_gz_file, warc_member.offset, warc_member.length)
+            return parse_warc_gz_member(warc_member.parent_warc_gz_file, member_bytes, self.read_http_headers)
+
+        # A member larger than the threshold holds a record about as large or larger, so it is streamed without being read whole
+        if warc_member.length > self.streaming_threshold:
+            return open_streamed_warc_gz_member(warc_member, self.read_http_headers)
+
+        warc_gz_file = self.get_open_file(warc_member.parent_warc_gz_file)
+        member_bytes = read_file_range(warc_gz_file, warc_member.offset, warc_member.length)
+        warc_bytes = inflate_warc_gz_member(member_bytes, self.streaming_threshold)
+        if warc_bytes is None:
+            return open_streamed_warc_gz_member(warc_member, self.read_http_headers)
+
+        return parse_warc_record_bytes(warc_member.parent_warc_gz_file, warc_bytes, self.read_http_headers)
+
+
+    def get_open_file(self, warc_gz_file_path: str) -> BinaryIO:
+        """Returns an open handle to the file, opening it and closing the least recently used file if needed."""
+        if warc_gz_file_path in self.open_files:
+            self.open_files.move_to_end(warc_gz_file_path)
+            return self.open_files[warc_gz_file_path]
+
+        if len(self.open_files) >= self.MAX_OPEN_FILES:
+            _, least_recently_used_file = self.open_files.popitem(last=False)
+            least_recently_used_file.close()
+
+        self.open_files[warc_gz_file_path] = open(warc_gz_file_path, 'rb')
+        return self.open_files[warc_gz_file_path]
+
+
+    def close(self):
+        """Closes every open file."""
+        for open_file in self.open_files.values():
+            open_file.close()
+        self.open_files.clear()
@@ -1,5 +1,28 @@
+from typing import NamedTuple
+
+
+class PayloadIdentity(NamedTuple):
+  """The WARC headers identifying a record's payload, read when PAYLOAD_DIGEST_CACHE_ENTRIES is set to recognize duplicate payloads."""
+  payload_digest: str | None
+  record_id: str | None
+  refers_to: str | None = None
+  is_revisit: bool = False
+
+
+class WarcMember(NamedTuple):
+  """Location of the gzip member holding a single response record in a WARC.gz file."""
+  parent_warc_gz_file: str
+  offset: int
+  length: int
+
+
 class WarcRecord:
-  def __init__(self, parent_warc_gz_file: str, name: str, contents: bytes):
+  def __init__(self, parent_warc_gz_file: str, name: str, contents: bytes, charset: str | None = None,
+               http_headers: bytes | None = None, payload_identity: PayloadIdentity | None = None, warc_member: WarcMember | None = None):
     self.parent_warc_gz_file: str = parent_warc_gz_file
     self.name: str = name
-    self.contents: bytes = contents
\ No newline at end of file
+    self.contents: bytes = contents
+    self.charset: str | None = charset
+    self.http_headers: bytes | None = http_headers
+    self.payload_identity: PayloadIdentity | None = payload_identity
+    self.warc_member: WarcMember | None = warc_member
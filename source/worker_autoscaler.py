@@ -0,0 +1,171 @@
+import multiprocessing
+import threading
+import time
+from typing import Iterator
+
+from logger import *
+
+
+class SearchWorkerAutoscaler:
+    """
+    Grows and shrinks the number of active search worker processes while the WARC.gz files are being read, between a minimum
+    and the number of worker processes started. Worker processes beyond the active count park before taking their next item
+    from the search queue, leaving their CPU to the read threads and the remaining worker processes, until they are activated again.
+
+    Parking a worker process alone does not make reading any faster, since the read threads keep reading as many WARC.gz files
+    at a time. So the read threads take turns reading their next record, and one more of them may read at a time for each parked
+    worker process. Extra read threads only speed up reading as far as it waits on the disk or runs outside the interpreter lock.
+
+    Every adjustment interval, the autoscaler compares the records waiting in the search queue, how fast they are being read,
+    and the share of the interval the active worker processes spent searching rather than waiting for records.
+    A growing backlog with busy worker processes means searching is the bottleneck, so a worker process is activated.
+    An empty queue with idle worker processes means reading is the bottleneck, so a worker process is parked.
+
+    The active count, condition and busy time counters are handed to the worker processes as they start.
+    Each worker process only adds to its own busy time counter, so they are kept in an unsynchronized array.
+    The read threads only run in the main process, so the number of them reading is kept in a plain attribute.
+    """
+    ADJUST_INTERVAL_SECONDS = 2.0
+    # Searching is the bottleneck if the active worker processes are busy at least this share of the time, and reading if they are busy less
+    BUSY_UTILIZATION = 0.9
+    IDLE_UTILIZATION = 0.5
+    # Records waiting per active worker process before the queue counts as backed up
+    BACKLOG_RECORDS_PER_WORKER = 2
+
+    def __init__(self, min_workers: int, max_workers: int, read_threads: int = 4):
+        self.min_workers = min(min_workers, max_workers)
+        self.max_workers = max_workers
+        self.condition = multiprocessing.Condition()
+        self.active_workers = multiprocessing.RawValue('i', max_workers)
+        self.busy_seconds = multiprocessing.RawArray('d', max_workers)
+
+        self.read_threads = read_threads
+        self.max_read_threads = read_threads + self.max_workers - self.min_workers
+        self.reading_threads = 0
+        self.read_threads_condition = threading.Condition()
+
+        self.last_adjust_time = time.monotonic()
+        self.last_queue_depth = 0
+        self.last_records_read = 0
+        self.last_busy_seconds = 0.0
+
+        self.scale_ups = 0
+        self.scale_downs = 0
+        self.fewest_active_workers = max_workers
+
+
+    def __getstate__(self):
+        """Excludes the condition of the read threads, which are only in the main process, when the autoscaler is sent to a worker process."""
+        state = self.__dict__.copy()
+        state["read_threads_condition"] = None
+        return state
+
+
+    @property
+    def active_read_threads(self) -> int:
+        """Returns how many read threads may read at a time: the read threads started with, plus one for each parked worker process."""
+        return self.read_threads + self.max_workers - self.active_workers.value
+
+
+    def is_active(self, worker_index: int) -> bool:
+        """Returns True if the worker process with the given index may take items from the search queue."""
+        return worker_index < self.active_workers.value
+
+
+    def wait_until_active(self, worker_index: int):
+        """Blocks the worker process with the given index while it is parked."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.is_active(worker_index))
+
+
+    def add_busy_seconds(self, worker_index: int, seconds: float):
+        """Adds the time the worker process with the given index spent searching an item from the search queue."""
+        self.busy_seconds[worker_index] += seconds
+
+
+    def set_active_workers(self, active_workers: int):
+        """Sets the number of active worker processes, waking the parked worker processes and the read threads that become active."""
+        with self.condition:
+            self.active_workers.value = active_workers
+            self.condition.notify_all()
+
+        with self.read_threads_condition:
+            self.read_threads_condition.notify_all()
+
+
+    def iterate_as_read_thread(self, items: Iterator) -> Iterator:
+        """
+        Yields the items a read thread reads from the iterator, reading each one once fewer read threads are reading than are active.
+        A read thread waiting for its turn holds no record, so reading speeds up as soon as the autoscaler activates more read threads.
+        """
+        end_of_items = object()
+        while True:
+            with self.read_threads_condition:
+                self.read_threads_condition.wait_for(lambda: self.reading_threads < self.active_read_threads)
+                self.reading_threads += 1
+
+            try:
+                item = next(items, end_of_items)
+            finally:
+                with self.read_threads_condition:
+                    self.reading_threads -= 1
+                    self.read_threads_condition.notify()
+
+            if item is end_of_items:
+                return
+            yield item
+
+
+    def activate_all_workers(self):
+        """Activates every worker process, so all of them search the remaining records and receive the stop signal."""
+        self.set_active_workers(self.max_workers)
+
+
+    def adjust(self, queue_depth: int, total_records_read: int):
+        """Activates or parks a worker process based on the samples since the last adjustment, once the adjustment interval has passed."""
+        now = time.monotonic()
+        elapsed_seconds = now - self.last_adjust_time
+        if elapsed_seconds < self.ADJUST_INTERVAL_SECONDS:
+            return
+
+        active_workers = self.active_workers.value
+        total_busy_seconds = sum(self.busy_seconds)
+        utilization = min((total_busy_seconds - self.last_busy_seconds) / (elapsed_seconds * active_workers), 1.0)
+        records_read_per_second = (total_records_read - self.last_records_read) / elapsed_seconds
+
+        new_active_workers = self.decide_active_workers(active_workers, queue_depth, utilization, records_read_per_second)
+        if new_active_workers > active_workers:
+            self.scale_ups += 1
+        elif new_active_workers < active_workers:
+            self.scale_downs += 1
+            self.fewest_active_workers = min(self.fewest_active_workers, new_active_workers)
+
+        if new_active_workers != active_workers:
+            self.set_active_workers(new_active_workers)
+
+        self.last_adjust_time = now
+        self.last_queue_depth = queue_depth
+        self.last_records_read = total_records_read
+        self.last_busy_seconds = total_busy_seconds
+
+
+    def decide_active_workers(self, active_workers: int, queue_depth: int, utilization: float, records_read_per_second: float) -> int:
+        """Returns the number of worker processes that should be active, one more or one fewer than now at most."""
+        is_backed_up = queue_depth >= active_workers * self.BACKLOG_RECORDS_PER_WORKER and queue_depth >= self.last_queue_depth
+        if is_backed_up and utilization >= self.BUSY_UTILIZATION:
+            return min(active_workers + 1, self.max_workers)
+
+        # Records are still being read, but the worker processes search them faster than they arrive
+        if queue_depth == 0 and records_read_per_second > 0 and utilization < self.IDLE_UTILIZATION:
+            return max(active_workers - 1, self.min_workers)
+
+        return active_workers
+
+
+    def log_summary(self):
+        """Logs how often the number of active worker processes changed, and the fewest that were active."""
+        log_info(
+            f"Search worker process autoscaling activated a worker process {self.scale_ups} times and parked one {self.scale_downs} times. "
+            f"At least {self.fewest_active_workers} of {self.max_workers} worker processes were active at all times, "
+            f"and up to {self.read_threads + self.max_workers - self.fewest_active_workers} read threads read at a time."
+        )
@@ -0,0 +1,120 @@
+import zipfile
+
+from http_payload import get_http_header_values
+from utilities import get_base_file_name
+
+ZIP_COMPRESSION_METHODS = {
+    'stored': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+# Compression levels accepted by the methods that have them
+ZIP_COMPRESSION_LEVELS = {
+    'deflate': range(0, 10),
+    'bzip2': range(1, 10),
+}
+
+# MIME types whose contents are already compressed, listed as in FILTER_CONTENT_TYPES_ALLOWED
+COMPRESSED_CONTENT_TYPES = (
+    'image/*', 'video/*', 'audio/*', 'font/woff', 'font/woff2', 'application/font-woff', 'application/zip', 'application/gzip',
+    'application/x-gzip', 'application/x-bzip2', 'application/x-xz', 'application/x-7z-compressed', 'application/x-rar-compressed',
+    'application/vnd.rar', 'application/zstd', 'application/pdf', 'application/epub+zip', 'application/java-archive',
+    'application/vnd.openxmlformats-officedocument.*', 'application/vnd.oasis.opendocument.*',
+)
+# Uncompressed formats among the MIME types above
+UNCOMPRESSED_CONTENT_TYPES = ('image/svg+xml', 'image/bmp', 'image/x-ms-bmp', 'image/x-icon', 'image/vnd.microsoft.icon', 'image/tiff',
+                              'audio/wav', 'audio/x-wav', 'audio/wave')
+
+# Magic numbers at the start of contents in already compressed formats, for records without a Content-Type or with a wrong one
+COMPRESSED_FORMAT_MAGIC_NUMBERS = (
+    b'\xff\xd8\xff',                # JPEG
+    b'\x89PNG\r\n\x1a\n',           # PNG
+    b'GIF87a', b'GIF89a',           # GIF
+    b'\x1f\x8b',                    # gzip
+    b'PK\x03\x04',                  # zip, and formats based on it such as docx, epub and jar
+    b'BZh',                         # bzip2
+    b'\xfd7zXZ\x00',                # xz
+    b"7z\xbc\xaf'\x1c",             # 7z
+    b'(\xb5/\xfd',                  # zstd
+    b'Rar!\x1a\x07',                # RAR
+    b'%PDF-',                       # PDF
+    b'wOFF', b'wOF2',               # WOFF fonts
+    b'OggS',                        # Ogg
+    b'fLaC',                        # FLAC
+    b'ID3',                         # MP3
+    b'\x1aE\xdf\xa3',               # Matroska and WebM
+)
+# Magic numbers found after a 4 byte size at the start of the contents: ISO media such as MP4, MOV and AVIF
+ISO_MEDIA_MAGIC_NUMBER = b'ftyp'
+# Bytes at the start of the contents needed to recognize every format above
+MAGIC_NUMBER_PREFIX_SIZE = 16
+
+
+def parse_zip_compression(value: str) -> tuple[int, int | None]:
+    """
+    Returns the zipfile compression method and level of a value naming a method and optionally a level, such as lzma or deflate:9.
+    Raises ValueError if the method is unknown or does not accept the level.
+    """
+    method_name, _, level = value.strip().lower().partition(':')
+    if method_name not in ZIP_COMPRESSION_METHODS:
+        raise ValueError(f"Unknown compression method {method_name}")
+    if not level:
+        return ZIP_COMPRESSION_METHODS[method_name], None
+
+    if method_name not in ZIP_COMPRESSION_LEVELS or int(level) not in ZIP_COMPRESSION_LEVELS[method_name]:
+        raise ValueError(f"Invalid compression level {level} for {method_name}")
+    return ZIP_COMPRESSION_METHODS[method_name], int(level)
+
+
+def get_content_type(http_headers: bytes | None) -> str:
+    """Returns the lowercase MIME type of the HTTP Content-Type header, without its parameters, or an empty string if there is none."""
+    if not http_headers:
+        return ''
+    content_types = get_http_header_values(http_headers, b'Content-Type')
+    return content_types[0].partition(';')[0].strip().lower() if content_types else ''
+
+
+def is_listed_content_type(content_type: str, content_types: tuple[str, ...]) -> bool:
+    """Returns True if the MIME type is one of the listed ones, or has the type of one listed followed by /* or the prefix of one ending in .*"""
+    return any(
+        content_type.startswith(listed_content_type[:-1]) if listed_content_type.endswith('*') else content_type == listed_content_type
+        for listed_content_type in content_types
+    )
+
+
+def is_compressed_format(contents_start: bytes, http_headers: bytes | None) -> bool:
+    """Returns True if the contents are in an already compressed format, judging by their Content-Type or else by their magic number."""
+    content_type = get_content_type(http_headers)
+    if is_listed_content_type(content_type, COMPRESSED_CONTENT_TYPES) and not is_listed_content_type(content_type, UNCOMPRESSED_CONTENT_TYPES):
+        return True
+
+    contents_start = bytes(contents_start[:MAGIC_NUMBER_PREFIX_SIZE])
+    return contents_start.startswith(COMPRESSED_FORMAT_MAGIC_NUMBERS) or contents_start[4:8] == ISO_MEDIA_MAGIC_NUMBER
+
+
+class ZipCompressionPolicy:
+    """
+    Decides how the contents of each record are compressed in the zip archive of each definition it matched.
+    Contents in an already compressed format, such as JPEG, MP4 or gzip, are stored without compression if store_compressed_formats is enabled,
+    since compressing them again saves next to nothing. Other contents are compressed with the method and level set for the definition,
+    by its name without the _results suffix, or else with the default ones.
+    """
+    def __init__(self, default_compression: str, compression_by_definition: dict[str, str] | None, store_compressed_formats: bool):
+        self.default_compression = parse_zip_compression(default_compression)
+        self.compression_by_definition = {
+            definition_name.lower(): parse_zip_compression(compression) for definition_name, compression in (compression_by_definition or {}).items()
+        }
+        self.store_compressed_formats = store_compressed_formats
+
+
+    def get_definition_compression(self, results_file_path: str) -> tuple[int, int | None]:
+        """Returns the compression method and level set for the definition of a results file, or the default ones."""
+        return self.compression_by_definition.get(get_base_file_name(results_file_path).removesuffix('_results').lower(), self.default_compression)
+
+
+    def get_compression(self, results_file_path: str, contents_start: bytes, http_headers: bytes | None) -> tuple[int, int | None]:
+        """Returns the compression method and level for a record's contents, given at least their first MAGIC_NUMBER_PREFIX_SIZE bytes."""
+        if self.store_compressed_formats and is_compressed_format(contents_start, http_headers):
+            return zipfile.ZIP_STORED, None
+        return self.get_definition_compression(results_file_path)
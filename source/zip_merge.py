@@ -0,0 +1,179 @@
+import os
+import struct
+import zipfile
+
+COPY_CHUNK_SIZE = 1024 * 1024
+# Size of the fixed part of a local file header, which is followed by the file name and the extra field
+LOCAL_FILE_HEADER_SIZE = struct.calcsize(zipfile.structFileHeader)
+# Positions of the signature and of the lengths of the file name and extra field in the fixed part of a local file header
+LOCAL_FILE_HEADER_SIGNATURE = 0
+LOCAL_FILE_HEADER_FILE_NAME_LENGTH = 10
+LOCAL_FILE_HEADER_EXTRA_FIELD_LENGTH = 11
+# Bit of the general purpose flags marking an entry whose CRC and sizes follow its data instead of its local file header
+DATA_DESCRIPTOR_FLAG = 0x08
+# Bit of the general purpose flags marking an entry whose name is encoded in UTF-8
+UTF8_FILE_NAME_FLAG = 0x800
+
+
+def get_dos_date_time(date_time: tuple) -> tuple[int, int]:
+    """Returns the MS-DOS date and time fields a zip archive stores an entry's modification time in."""
+    dos_date = (date_time[0] - 1980) << 9 | date_time[1] << 5 | date_time[2]
+    dos_time = date_time[3] << 11 | date_time[4] << 5 | (date_time[5] // 2)
+    return dos_date, dos_time
+
+
+def encode_file_name(zip_info: zipfile.ZipInfo) -> tuple[bytes, int]:
+    """Returns an entry's name encoded as it is stored, in ASCII if possible or else in UTF-8, and its general purpose flags."""
+    try:
+        return zip_info.filename.encode('ascii'), zip_info.flag_bits
+    except UnicodeEncodeError:
+        return zip_info.filename.encode('utf-8'), zip_info.flag_bits | UTF8_FILE_NAME_FLAG
+
+
+def get_entry_data_offset(zip_archive_file, zip_info: zipfile.ZipInfo) -> int:
+    """Returns the offset of an entry's compressed data in its zip archive, which follows its local file header."""
+    zip_archive_file.seek(zip_info.header_offset)
+    local_file_header = struct.unpack(zipfile.structFileHeader, zip_archive_file.read(LOCAL_FILE_HEADER_SIZE))
+    if local_file_header[LOCAL_FILE_HEADER_SIGNATURE] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local file header for {zip_info.filename}")
+
+    return (zip_info.header_offset + LOCAL_FILE_HEADER_SIZE
+            + local_file_header[LOCAL_FILE_HEADER_FILE_NAME_LENGTH] + local_file_header[LOCAL_FILE_HEADER_EXTRA_FIELD_LENGTH])
+
+
+class RawZipArchiveWriter:
+    """
+    Writes a zip archive from the entries of other zip archives by copying their compressed data, CRCs and sizes byte for byte,
+    so no entry is ever inflated or deflated again. Each entry is given a new local file header, and the central directory
+    of every entry copied is written once the archive is closed, with ZIP64 records if the archive needs them.
+    Entries are named as in their source archive, and an entry named like one already copied is skipped.
+    """
+    def __init__(self, zip_archive_path: str):
+        self.zip_archive_path = zip_archive_path
+        self.zip_archive_file = open(zip_archive_path, 'wb')
+        self.entries: list[zipfile.ZipInfo] = []
+        self.file_names: set[str] = set()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def copy_entries(self, source_zip_archive_path: str):
+        """Copies every entry of the source zip archive whose name was not copied yet."""
+        with zipfile.ZipFile(source_zip_archive_path, 'r') as source_zip_archive, open(source_zip_archive_path, 'rb') as source_file:
+            for source_zip_info in source_zip_archive.infolist():
+                if source_zip_info.filename in self.file_names:
+                    continue
+
+                data_offset = get_entry_data_offset(source_file, source_zip_info)
+                zip_info = self.write_local_file_header(source_zip_info)
+                source_file.seek(data_offset)
+                self.copy_compressed_data(source_file, zip_info.compress_size)
+                self.entries.append(zip_info)
+                self.file_names.add(zip_info.filename)
+
+
+    def write_local_file_header(self, source_zip_info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+        """
+        Writes the local file header of an entry copied from another zip archive and returns its zip info. The CRC and sizes are
+        known, so they are always written in the header rather than in a data descriptor, and extra fields other than ZIP64 are dropped.
+        """
+        zip_info = zipfile.ZipInfo(source_zip_info.filename, source_zip_info.date_time)
+        zip_info.compress_type = source_zip_info.compress_type
+        zip_info.flag_bits = source_zip_info.flag_bits & ~DATA_DESCRIPTOR_FLAG
+        zip_info.CRC = source_zip_info.CRC
+        zip_info.compress_size = source_zip_info.compress_size
+        zip_info.file_size = source_zip_info.file_size
+        zip_info.create_system = source_zip_info.create_system
+        zip_info.external_attr = source_zip_info.external_attr
+        zip_info.header_offset = self.zip_archive_file.tell()
+
+        zip64 = zip_info.file_size > zipfile.ZIP64_LIMIT or zip_info.compress_size > zipfile.ZIP64_LIMIT
+        self.zip_archive_file.write(zip_info.FileHeader(zip64))
+        return zip_info
+
+
+    def copy_compressed_data(self, source_file, size: int):
+        """Copies the given number of bytes from the source file's current position, in chunks."""
+        while size > 0:
+            chunk = source_file.read(min(size, COPY_CHUNK_SIZE))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Truncated entry in {source_file.name}")
+            self.zip_archive_file.write(chunk)
+            size -= len(chunk)
+
+
+    def write_central_directory(self):
+        """Writes the central directory of every entry copied, followed by the ZIP64 end records if needed and the end of central directory record."""
+        central_directory_offset = self.zip_archive_file.tell()
+        for zip_info in self.entries:
+            zip64_fields = []
+            file_size, compress_size, header_offset = zip_info.file_size, zip_info.compress_size, zip_info.header_offset
+            if file_size > zipfile.ZIP64_LIMIT or compress_size > zipfile.ZIP64_LIMIT:
+                zip64_fields += [file_size, compress_size]
+                file_size = compress_size = 0xffffffff
+            if header_offset > zipfile.ZIP64_LIMIT:
+                zip64_fields.append(header_offset)
+                header_offset = 0xffffffff
+
+            extra = struct.pack(f'<HH{len(zip64_fields)}Q', 1, 8 * len(zip64_fields), *zip64_fields) if zip64_fields else b''
+            version = max(zip_info.extract_version, zipfile.ZIP64_VERSION if zip64_fields else 0)
+            file_name, flag_bits = encode_file_name(zip_info)
+            dos_date, dos_time = get_dos_date_time(zip_info.date_time)
+            self.zip_archive_file.write(struct.pack(
+                zipfile.structCentralDir, zipfile.stringCentralDir, max(version, zip_info.create_version), zip_info.create_system,
+                version, zip_info.reserved, flag_bits, zip_info.compress_type, dos_time, dos_date, zip_info.CRC, compress_size, file_size,
+                len(file_name), len(extra), 0, 0, zip_info.internal_attr, zip_info.external_attr, header_offset
+            ))
+            self.zip_archive_file.write(file_name)
+            self.zip_archive_file.write(extra)
+
+        central_directory_size = self.zip_archive_file.tell() - central_directory_offset
+        entries_count = len(self.entries)
+        if (entries_count > zipfile.ZIP_FILECOUNT_LIMIT or central_directory_offset > zipfile.ZIP64_LIMIT
+                or central_directory_size > zipfile.ZIP64_LIMIT):
+            zip64_end_record_offset = self.zip_archive_file.tell()
+            self.zip_archive_file.write(struct.pack(
+                zipfile.structEndArchive64, zipfile.stringEndArchive64, struct.calcsize(zipfile.structEndArchive64) - 12,
+                zipfile.ZIP64_VERSION, zipfile.ZIP64_VERSION, 0, 0, entries_count, entries_count, central_directory_size, central_directory_offset
+            ))
+            self.zip_archive_file.write(struct.pack(zipfile.structEndArchive64Locator, zipfile.stringEndArchive64Locator, 0, zip64_end_record_offset, 1))
+
+        self.zip_archive_file.write(struct.pack(
+            zipfile.structEndArchive, zipfile.stringEndArchive, 0, 0,
+            min(entries_count, zipfile.ZIP_FILECOUNT_LIMIT), min(entries_count, zipfile.ZIP_FILECOUNT_LIMIT),
+            min(central_directory_size, zipfile.ZIP64_LIMIT), min(central_directory_offset, zipfile.ZIP64_LIMIT), 0
+        ))
+
+
+    def close(self):
+        """Writes the central directory and closes the zip archive."""
+        if self.zip_archive_file.closed:
+            return
+
+        try:
+            self.write_central_directory()
+        finally:
+            self.zip_archive_file.close()
+
+
+def merge_zip_archives_without_recompression(source_zip_archive_paths: list[str], output_zip_archive_path: str):
+    """
+    Merges the zip archives into a single zip archive by copying their compressed entries, keeping the first entry of each name.
+    If the output zip archive already exists, its entries are kept and come first. The merged archive is written next to it
+    and replaces it once complete, so an interrupted merge never leaves it truncated.
+    """
+    if os.path.exists(output_zip_archive_path):
+        source_zip_archive_paths = [output_zip_archive_path] + source_zip_archive_paths
+
+    merging_zip_archive_path = f"{output_zip_archive_path}.merging"
+    with RawZipArchiveWriter(merging_zip_archive_path) as raw_zip_archive_writer:
+        for source_zip_archive_path in source_zip_archive_paths:
+            raw_zip_archive_writer.copy_entries(source_zip_archive_path)
+
+    os.replace(merging_zip_archive_path, output_zip_archive_path)
@@ -0,0 +1,97 @@
+import hashlib
+import io
+import os
+
+from blob_store import (BLOB_MANIFEST_HEADER, BlobStore, copy_blob_manifest_entries, get_blob_manifest_file_path, get_blob_path,
+                        merge_blob_manifests, read_blob_manifest)
+
+RESULTS_FILE_PATHS = ["/results/keys_results.txt", "/results/tokens_results.txt"]
+
+
+def open_blob_store(tmp_path, worker_name: str = "1") -> BlobStore:
+    blob_store = BlobStore(str(tmp_path / "blobs"))
+    manifest_directory = tmp_path / "temp" / worker_name
+    manifest_directory.mkdir(parents=True, exist_ok=True)
+    blob_store.start_worker(RESULTS_FILE_PATHS, str(manifest_directory))
+    return blob_store
+
+def write_manifest(manifest_file_path, rows):
+    with open(manifest_file_path, "w", encoding="utf-8") as manifest_file:
+        manifest_file.write("\t".join(BLOB_MANIFEST_HEADER) + "\n")
+        for row in rows:
+            manifest_file.write("\t".join(map(str, row)) + "\n")
+
+
+def test_file_matching_several_definitions_is_written_once(tmp_path):
+    blob_store = open_blob_store(tmp_path)
+    digest = hashlib.sha256(b"secret key").hexdigest()
+
+    assert blob_store.add_file("http://a.com/1", b"secret key", RESULTS_FILE_PATHS) == (2, True)
+    # The same contents under another name reuse the blob, and a name already listed is skipped
+    assert blob_store.add_file("http://a.com/2", b"secret key", RESULTS_FILE_PATHS[:1]) == (1, False)
+    assert blob_store.add_file("http://a.com/1", b"secret key", RESULTS_FILE_PATHS) == (0, False)
+    blob_store.finish_worker()
+
+    with open(get_blob_path(str(tmp_path / "blobs"), digest), "rb") as blob_file:
+        assert blob_file.read() == b"secret key"
+    assert list(read_blob_manifest(get_blob_manifest_file_path(str(tmp_path / "temp" / "1"), RESULTS_FILE_PATHS[0]))) == [
+        ("a.com1", digest, 10), ("a.com2", digest, 10)
+    ]
+    assert list(read_blob_manifest(get_blob_manifest_file_path(str(tmp_path / "temp" / "1"), RESULTS_FILE_PATHS[1]))) == [("a.com1", digest, 10)]
+
+def test_blob_written_by_another_worker_is_reused(tmp_path):
+    open_blob_store(tmp_path, "1").add_file("http://a.com/", b"contents", RESULTS_FILE_PATHS)
+    other_blob_store = open_blob_store(tmp_path, "2")
+
+    assert other_blob_store.add_file("http://b.com/", b"contents", RESULTS_FILE_PATHS) == (2, False)
+    assert not [file_name for file_name in os.listdir(tmp_path / "blobs") if file_name.endswith(".tmp")]
+
+def test_add_stream_hashes_contents_while_copying(tmp_path):
+    blob_store = open_blob_store(tmp_path)
+    contents = os.urandom(3 * 1024 * 1024)
+
+    assert blob_store.add_stream("http://a.com/big", io.BytesIO(contents), RESULTS_FILE_PATHS) == (2, True, len(contents))
+    assert blob_store.add_stream("http://a.com/copy", io.BytesIO(contents), RESULTS_FILE_PATHS) == (2, False, len(contents))
+    blob_store.sync()
+
+    with open(get_blob_path(str(tmp_path / "blobs"), hashlib.sha256(contents).hexdigest()), "rb") as blob_file:
+        assert blob_file.read() == contents
+    assert not [file_name for file_name in os.listdir(tmp_path / "blobs") if file_name.endswith(".tmp")]
+    blob_store.finish_worker()
+
+def test_merge_blob_manifests_keeps_first_row_of_each_file_and_skips_incomplete_rows(tmp_path):
+    first_digest, second_digest = "a" * 64, "b" * 64
+    for worker_name in ("1", "2"):
+        (tmp_path / "temp" / worker_name).mkdir(parents=True)
+    with open(tmp_path / "temp" / "1" / "keys_results.manifest.tsv", "w", encoding="utf-8") as manifest_file:
+        manifest_file.write(f"a.com1\t{first_digest}\t10\nshared\t{first_digest}\t10\n")
+    with open(tmp_path / "temp" / "2" / "keys_results.manifest.tsv", "w", encoding="utf-8") as manifest_file:
+        manifest_file.write(f"shared\t{second_digest}\t20\nb.com1\t{second_digest}\t20\ncut\t{second_digest[:10]}")
+    write_manifest(tmp_path / "keys_results.manifest.tsv", [("kept", second_digest, 20)])
+
+    merge_blob_manifests(str(tmp_path / "temp"), str(tmp_path), "keys_results")
+
+    assert list(read_blob_manifest(str(tmp_path / "keys_results.manifest.tsv"))) == [
+        ("kept", second_digest, 20), ("a.com1", first_digest, 10), ("shared", first_digest, 10), ("b.com1", second_digest, 20)
+    ]
+    assert not os.path.exists(tmp_path / "keys_results.manifest.tsv.merging")
+
+def test_copy_blob_manifest_entries_copies_rows_and_blobs(tmp_path):
+    (tmp_path / "run1").mkdir()
+    (tmp_path / "run2").mkdir()
+    blob_store = BlobStore(str(tmp_path / "run1" / "blobs"))
+    blob_store.start_worker(RESULTS_FILE_PATHS[:1], str(tmp_path / "run1"))
+    blob_store.add_file("http://a.com/1", b"first", RESULTS_FILE_PATHS[:1])
+    blob_store.add_file("http://b.com/1", b"second", RESULTS_FILE_PATHS[:1])
+    blob_store.finish_worker()
+
+    source_manifest_file_path = str(tmp_path / "run1" / "keys_results.manifest.tsv")
+    target_manifest_file_path = str(tmp_path / "run2" / "keys_results.manifest.tsv")
+    copy_blob_manifest_entries(source_manifest_file_path, target_manifest_file_path, ["http://a.com/1", "http://missing.com/"])
+    copy_blob_manifest_entries(source_manifest_file_path, target_manifest_file_path, ["http://a.com/1"])
+
+    digest = hashlib.sha256(b"first").hexdigest()
+    assert list(read_blob_manifest(target_manifest_file_path)) == [("a.com1", digest, 5)]
+    with open(get_blob_path(str(tmp_path / "run2" / "blobs"), digest), "rb") as blob_file:
+        assert blob_file.read() == b"first"
+    assert not os.path.exists(get_blob_path(str(tmp_path / "run2" / "blobs"), hashlib.sha256(b"second").hexdigest()))
@@ -0,0 +1,176 @@
+import io
+import os
+import re
+import pytest
+
+import bloom_sidecar
+from bloom_sidecar import (HEADERS_NGRAM_OFFSET, BloomFilter, BloomSidecarBuilder, get_bloom_sidecar_path, get_haystack_ngram_keys,
+                           is_bloom_sidecar_current, load_bloom_sidecar, skip_warc_gz_files_without_matches, write_bloom_sidecar)
+from streaming_search import StreamedWarcRecord
+from trigram_index import INDEX_AFFECTING_SETTINGS, create_ngram_query, get_haystack_ngrams, get_index_settings_fingerprint, get_ngram_keys
+from warc_record import WarcRecord
+
+FILTER_SIZE_BYTES = 1024
+
+
+@pytest.fixture(autouse=True)
+def patch_settings(monkeypatch):
+    for setting_name in INDEX_AFFECTING_SETTINGS:
+        monkeypatch.setitem(bloom_sidecar.config.settings, setting_name, None)
+    monkeypatch.setitem(bloom_sidecar.config.settings, "SEARCH_BINARY_FILES", False)
+    monkeypatch.setitem(bloom_sidecar.config.settings, "DETECT_CONTENTS_CHARSET", False)
+    monkeypatch.setitem(bloom_sidecar.config.settings, "STREAMING_CHUNK_SIZE_KB", 1)
+    monkeypatch.setitem(bloom_sidecar.config.settings, "PAYLOAD_DIGEST_CACHE_ENTRIES", None)
+    monkeypatch.setattr(bloom_sidecar, "log_info", lambda msg: None)
+
+@pytest.fixture
+def warc_gz_files(tmp_path):
+    paths = [str(tmp_path / f"{name}.warc.gz") for name in ("a", "b")]
+    for path in paths:
+        with open(path, "wb") as f:
+            f.write(b"records")
+    return paths
+
+def build_sidecars(warc_gz_files, records):
+    builder = BloomSidecarBuilder(warc_gz_files, FILTER_SIZE_BYTES)
+    builder.start_worker()
+    for warc_record in records:
+        builder.add_record(warc_record)
+    builder.finish_worker()
+    builder.write_sidecars(True)
+    return builder
+
+
+@pytest.mark.parametrize("haystack", [b"", b"abc", b"secret api_key", "café token".encode(), bytes(range(256)) * 3, "str haystack"])
+def test_get_haystack_ngram_keys_matches_ngram_keys(haystack):
+    keys = {key for key in get_haystack_ngram_keys(haystack) if not key & bloom_sidecar.NON_ASCII_KEY_MASK}
+    assert keys == get_ngram_keys(get_haystack_ngrams(haystack, 4))
+
+def test_bloom_filter_add_contains_and_merge():
+    first_filter, second_filter = BloomFilter(FILTER_SIZE_BYTES), BloomFilter(FILTER_SIZE_BYTES)
+    first_filter.add_keys([1, 2, 3])
+    second_filter.add_keys([HEADERS_NGRAM_OFFSET + 1])
+    assert all(first_filter.contains_key(key) for key in (1, 2, 3))
+    assert not first_filter.contains_key(HEADERS_NGRAM_OFFSET + 1)
+
+    first_filter.merge(second_filter)
+    assert all(first_filter.contains_key(key) for key in (1, 2, 3, HEADERS_NGRAM_OFFSET + 1))
+    assert 0 < first_filter.get_fill_ratio() < 0.01
+
+def test_bloom_filter_may_match_requires_every_literal():
+    bloom_filter = BloomFilter(FILTER_SIZE_BYTES)
+    bloom_filter.add_keys(get_ngram_keys(get_haystack_ngrams(b"the api_key is here", 4)))
+    assert bloom_filter.may_match(create_ngram_query(re.compile(r"api_key\s*=\s*\w+"), None, 4))
+    assert bloom_filter.may_match(create_ngram_query(re.compile(r"(missing|here)"), None, 4))
+    assert not bloom_filter.may_match(create_ngram_query(re.compile(r"api_key.*missing"), None, 4))
+    assert not bloom_filter.may_match(create_ngram_query(re.compile(r"api_key"), "headers", 4))
+
+def test_write_and_load_bloom_sidecar(warc_gz_files):
+    bloom_filter = BloomFilter(FILTER_SIZE_BYTES)
+    bloom_filter.add_keys([42])
+    write_bloom_sidecar(warc_gz_files[0], bloom_filter, os.stat(warc_gz_files[0]), "fingerprint")
+
+    assert os.path.exists(get_bloom_sidecar_path(warc_gz_files[0]))
+    assert is_bloom_sidecar_current(warc_gz_files[0], "fingerprint", FILTER_SIZE_BYTES)
+    assert load_bloom_sidecar(warc_gz_files[0], "fingerprint", FILTER_SIZE_BYTES).contains_key(42)
+
+    assert load_bloom_sidecar(warc_gz_files[0], "other settings", FILTER_SIZE_BYTES) is None
+    assert load_bloom_sidecar(warc_gz_files[0], "fingerprint", 2 * FILTER_SIZE_BYTES) is None
+    assert load_bloom_sidecar(warc_gz_files[1], "fingerprint", FILTER_SIZE_BYTES) is None
+
+    with open(warc_gz_files[0], "ab") as f:
+        f.write(b"more records")
+    assert not is_bloom_sidecar_current(warc_gz_files[0], "fingerprint", FILTER_SIZE_BYTES)
+
+def test_builder_writes_sidecars_of_searched_records(warc_gz_files):
+    build_sidecars(warc_gz_files, [
+        WarcRecord(warc_gz_files[0], "http://a.com/1", b"the SECRET_TOKEN is here"),
+        WarcRecord(warc_gz_files[0], "http://a.com/2", b"\x00\x01binary password"),
+        WarcRecord(warc_gz_files[1], "http://b.com/1", b"nothing", http_headers=b"HTTP/1.1 200 OK\r\nX-Key: password\r\n\r\n"),
+    ])
+
+    first_filter = load_bloom_sidecar(warc_gz_files[0], get_index_settings_fingerprint(), FILTER_SIZE_BYTES)
+    second_filter = load_bloom_sidecar(warc_gz_files[1], get_index_settings_fingerprint(), FILTER_SIZE_BYTES)
+    assert first_filter.may_match(create_ngram_query(re.compile(r"secret_token", re.IGNORECASE), None, 4))
+    assert not first_filter.may_match(create_ngram_query(re.compile(r"password"), None, 4))
+    assert second_filter.may_match(create_ngram_query(re.compile(r"password"), "headers", 4))
+    assert not second_filter.may_match(create_ngram_query(re.compile(r"password"), "body", 4))
+
+def test_builder_collects_streamed_record_contents_across_chunks(warc_gz_files):
+    contents = b"x" * 1022 + b"SECRET" + b"y" * 2000
+    warc_record = StreamedWarcRecord(warc_gz_files[0], "http://a.com/big", io.BytesIO(contents))
+    builder = BloomSidecarBuilder(warc_gz_files, FILTER_SIZE_BYTES)
+    builder.start_worker()
+    streamed_contents_keys = builder.create_streamed_contents_keys(warc_record)
+    for chunk in warc_record.read_chunks(1024):
+        streamed_contents_keys.add_chunk(chunk)
+    builder.add_streamed_record(warc_record, streamed_contents_keys)
+    builder.finish_worker()
+    builder.write_sidecars(True)
+
+    bloom_filter = load_bloom_sidecar(warc_gz_files[0], get_index_settings_fingerprint(), FILTER_SIZE_BYTES)
+    assert bloom_filter.may_match(create_ngram_query(re.compile(r"secret"), None, 4))
+
+def test_builder_merges_filters_written_out_by_a_worker(warc_gz_files, monkeypatch):
+    monkeypatch.setattr(bloom_sidecar, "MAX_PENDING_KEYS", 1)
+    monkeypatch.setattr(bloom_sidecar, "MAX_WORKER_FILTERS", 1)
+    build_sidecars(warc_gz_files, [
+        WarcRecord(warc_gz_files[0], "http://a.com/1", b"first secret"),
+        WarcRecord(warc_gz_files[1], "http://b.com/1", b"unrelated"),
+        WarcRecord(warc_gz_files[0], "http://a.com/2", b"second password"),
+    ])
+
+    bloom_filter = load_bloom_sidecar(warc_gz_files[0], get_index_settings_fingerprint(), FILTER_SIZE_BYTES)
+    assert bloom_filter.may_match(create_ngram_query(re.compile(r"secret.*password"), None, 4))
+
+def test_builder_skips_excluded_archives_and_errors(warc_gz_files, monkeypatch):
+    warnings = []
+    monkeypatch.setattr(bloom_sidecar, "log_warning", warnings.append)
+
+    builder = BloomSidecarBuilder(warc_gz_files, FILTER_SIZE_BYTES)
+    builder.exclude_archives([warc_gz_files[1]])
+    builder.start_worker()
+    builder.finish_worker()
+    builder.write_sidecars(True)
+    assert os.path.exists(get_bloom_sidecar_path(warc_gz_files[0]))
+    assert not os.path.exists(get_bloom_sidecar_path(warc_gz_files[1]))
+    assert not os.path.exists(builder.scratch_directory)
+
+    os.remove(get_bloom_sidecar_path(warc_gz_files[0]))
+    builder = BloomSidecarBuilder(warc_gz_files, FILTER_SIZE_BYTES)
+    builder.start_worker()
+    bloom_sidecar.logger.error_count += 1
+    builder.finish_worker()
+    bloom_sidecar.logger.error_count -= 1
+    builder.write_sidecars(True)
+    assert not os.path.exists(get_bloom_sidecar_path(warc_gz_files[0]))
+    assert len(warnings) == 1
+
+def test_skip_warc_gz_files_without_matches(warc_gz_files, tmp_path):
+    build_sidecars(warc_gz_files[:1], [WarcRecord(warc_gz_files[0], "http://a.com/1", b"nothing to see")])
+    tokens_results_path = str(tmp_path / "tokens_results.txt")
+    any_results_path = str(tmp_path / "any_results.txt")
+
+    # The second file has no sidecar, so it is kept
+    assert skip_warc_gz_files_without_matches(warc_gz_files, {tokens_results_path: re.compile(r"ghp_\w+")}, FILTER_SIZE_BYTES) == warc_gz_files[1:]
+    assert skip_warc_gz_files_without_matches(warc_gz_files, {tokens_results_path: re.compile(r"nothing")}, FILTER_SIZE_BYTES) == warc_gz_files
+
+    # A definition without literal text can match in any file
+    results_and_regexes_dict = {tokens_results_path: re.compile(r"ghp_\w+"), any_results_path: re.compile(r"\d+")}
+    assert skip_warc_gz_files_without_matches(warc_gz_files, results_and_regexes_dict, FILTER_SIZE_BYTES) == warc_gz_files
+
+def test_builder_never_rules_out_archives_with_revisit_records(warc_gz_files, monkeypatch):
+    monkeypatch.setitem(bloom_sidecar.config.settings, "PAYLOAD_DIGEST_CACHE_ENTRIES", 100)
+    builder = BloomSidecarBuilder(warc_gz_files, FILTER_SIZE_BYTES)
+    builder.start_worker()
+    builder.add_revisit_record(WarcRecord(warc_gz_files[0], "http://a.com/1", b""))
+    builder.finish_worker()
+    builder.write_sidecars(True)
+
+    first_filter = load_bloom_sidecar(warc_gz_files[0], get_index_settings_fingerprint(), FILTER_SIZE_BYTES)
+    assert first_filter.get_fill_ratio() == 1.0
+    assert not load_bloom_sidecar(warc_gz_files[1], get_index_settings_fingerprint(), FILTER_SIZE_BYTES).may_match(create_ngram_query(re.compile(r"secret"), None, 4))
+
+    # Sidecars are only current when revisit records are read as they were when the sidecar was built
+    monkeypatch.setitem(bloom_sidecar.config.settings, "PAYLOAD_DIGEST_CACHE_ENTRIES", None)
+    assert not is_bloom_sidecar_current(warc_gz_files[0], get_index_settings_fingerprint(), FILTER_SIZE_BYTES)
@@ -0,0 +1,133 @@
+import random
+import re
+import pytest
+
+from combined_matcher import (CombinedMatcher, can_combine_regex, compile_combined_regex, compile_literal_prefixes_trie,
+                              contains_group_reference, get_literal_prefix)
+from re import _parser as regex_parser
+from utilities import find_regex_matches
+
+
+def compile_definitions(*patterns, flags=re.IGNORECASE):
+    return {f"results{index}.txt": re.compile(pattern, flags) for index, pattern in enumerate(patterns)}
+
+@pytest.mark.parametrize("pattern", [
+    r"api_?key\s*=\s*\w+",
+    r"\w+@\w+\.com",
+    r"alpha|alph",
+    r"(ab)+",
+    r"(?<=a)b",
+    r"^start",
+    r"end$",
+    r"(?i:x)y",
+])
+def test_can_combine_regex(pattern):
+    assert can_combine_regex(re.compile(pattern, re.IGNORECASE))
+
+@pytest.mark.parametrize("pattern", [
+    r"(a)\1",          # numbered backreference
+    r"(a)?(?(1)b|c)",  # conditional group reference
+    r"(?P<name>a)",    # named group
+    r"a*",             # can match an empty string
+    r"\b",             # zero width
+    r"(?s)a.b",        # global inline flag
+])
+def test_cannot_combine_regex(pattern):
+    assert not can_combine_regex(re.compile(pattern, re.IGNORECASE))
+
+def test_contains_group_reference_in_nested_groups():
+    assert contains_group_reference(regex_parser.parse(r"(?:x|(a)(?:b\1)+)"))
+    assert not contains_group_reference(regex_parser.parse(r"(?:x|(a)(?:b)+)"))
+
+def test_compile_combined_regex_captures_each_definition():
+    combined_regex = compile_combined_regex([re.compile("abc"), re.compile("bcd"), re.compile("ab")], 0)
+    match = combined_regex.search("xabcd")
+
+    assert match.start() == 1
+    assert match.group("definition0") == "abc"
+    assert match.group("definition1") is None
+    assert match.group("definition2") == "ab"
+
+@pytest.mark.parametrize("pattern, expected_prefix", [
+    (r"api_key=\w+", "api_key="),
+    (r"alpha|alph", "alph"),
+    (r"ab*c", "a"),
+    (r"\w+@example", ""),
+    (r"(?:abc)d", "abcd"),
+    (r"(abc)", ""),
+])
+def test_get_literal_prefix(pattern, expected_prefix):
+    assert get_literal_prefix(regex_parser.parse(pattern)) == expected_prefix
+
+def test_compile_literal_prefixes_trie():
+    assert compile_literal_prefixes_trie(["abc", "abd", "x.y"], ignore_case=False) == r"(?:ab(?:c|d)|x\.y)"
+    # A prefix that starts another prefix replaces it
+    assert compile_literal_prefixes_trie(["abc", "ab"], ignore_case=False) == "ab"
+    # ASCII letters are merged regardless of case when ignoring case
+    assert compile_literal_prefixes_trie(["Key", "kEY"], ignore_case=True) == "key"
+    assert compile_literal_prefixes_trie(["Key", "kEY"], ignore_case=False) == "(?:Key|kEY)"
+
+def test_compile_combined_regex_skips_positions_without_candidates():
+    combined_regex = compile_combined_regex([re.compile("secret"), re.compile(r"\d+-key")], 0)
+    assert [match.start() for match in combined_regex.finditer("a secret 12-key")] == [2, 9, 10]
+
+def test_find_matches_overlapping_definitions():
+    definitions = compile_definitions(r"secret", r"secret_\w+", r"cret")
+    matcher = CombinedMatcher(definitions)
+
+    matches = matcher.find_matches("my secret_key and another SECRET")
+
+    assert matches == {
+        "results0.txt": ["secret", "SECRET"],
+        "results1.txt": ["secret_key"],
+        "results2.txt": ["cret", "CRET"],
+    }
+
+def test_find_matches_keeps_matches_of_a_definition_non_overlapping():
+    matcher = CombinedMatcher(compile_definitions(r"aba"))
+    assert matcher.find_matches("ababababa") == {"results0.txt": ["aba", "aba"]}
+
+def test_find_matches_with_separate_definitions():
+    definitions = compile_definitions(r"(\w)\1", r"ab", r"x*")
+    matcher = CombinedMatcher(definitions)
+
+    assert matcher.combined_results_file_paths == ["results1.txt"]
+    assert list(matcher.separate_regexes_dict) == ["results0.txt", "results2.txt"]
+    assert matcher.find_matches("aab") == {
+        "results0.txt": ["aa"],
+        "results1.txt": ["ab"],
+        "results2.txt": ["", "", "", ""],
+    }
+
+def test_definitions_with_different_flags_are_searched_separately():
+    definitions = {
+        "insensitive.txt": re.compile("abc", re.IGNORECASE),
+        "sensitive.txt": re.compile("abc"),
+    }
+    matcher = CombinedMatcher(definitions)
+
+    assert matcher.combined_results_file_paths == ["insensitive.txt"]
+    assert matcher.find_matches("ABC abc") == {"insensitive.txt": ["ABC", "abc"], "sensitive.txt": ["abc"]}
+
+def test_no_combinable_definitions():
+    matcher = CombinedMatcher(compile_definitions(r"(a)\1"))
+    assert matcher.combined_regex is None
+    assert matcher.find_matches("aa") == {"results0.txt": ["aa"]}
+
+def test_find_matches_identical_to_separate_searches():
+    # Plan:
+    # - Search random strings with a mix of combinable and separate definitions
+    # - Every definition must find exactly the matches that finditer() finds with its own regex
+    definitions = compile_definitions(
+        r"api_?key\s*=\s*\w+", r"\w+@\w+\.com", r"alpha|alph", r"\bbe\w*", r"a.a", r"(ab)+", r"[a-z]{3}",
+        r"(a)\1", r"a*", r"(?s)a.b", r"delta\b", r"é|e", r"ß", r"\d+", r"(?<=a)b", r"^al", r"x$", r"[ſs]ec",
+        r"Key", r"kEy\d", r"İx", r"K", r"(?-i:Ab)",
+    )
+    matcher = CombinedMatcher(definitions)
+
+    random_generator = random.Random(3)
+    characters = "abtelpha_ky=@.com 12ßSEſé\nxdABKKİ"
+    for _ in range(500):
+        input_string = "".join(random_generator.choice(characters) for _ in range(random_generator.randint(0, 60)))
+        expected_matches = {path: find_regex_matches(input_string, regex) for path, regex in definitions.items()}
+        assert matcher.find_matches(input_string) == expected_matches
@@ -367,4 +367,307 @@ class TestValidateAndGetMaxRamUsagePercent(unittest.TestCase):
         # Should warn and return 90 if value > 100
         result = config.validate_and_get_max_ram_usage_percent('101')
         self.assertEqual(result, 90)
-        mock_log_warning.assert_called_once()
\ No newline at end of file
+        mock_log_warning.assert_called_once()
+
+
+class TestReadPerformanceConfigIniVariables(unittest.TestCase):
+    def setUp(self):
+        self.original_settings = dict(config.settings)
+
+    def tearDown(self):
+        config.settings.clear()
+        config.settings.update(self.original_settings)
+
+    def test_keeps_defaults_when_section_missing(self):
+        parser = config.configparser.ConfigParser()
+        config.read_performance_config_ini_variables(parser)
+        self.assertEqual(config.settings["SEARCH_PIPELINE_MODE"], 'queue')
+        self.assertEqual(config.settings["SEARCH_QUEUE_TRANSPORT"], 'manager')
+        self.assertEqual(config.settings["SHARED_MEMORY_SLOT_COUNT"], 256)
+        self.assertEqual(config.settings["SHARED_MEMORY_SLOT_SIZE_KB"], 256)
+        self.assertEqual(config.settings["SEARCH_BATCH_MAX_RECORDS"], 1)
+        self.assertEqual(config.settings["SEARCH_BATCH_MAX_KB"], 1024)
+        self.assertEqual(config.settings["SEARCH_BATCH_FLUSH_TIMEOUT_SECONDS"], 1.0)
+        self.assertEqual(config.settings["SEARCH_QUEUE_MAX_IN_FLIGHT_KB"], None)
+        self.assertEqual(config.settings["SEARCH_QUEUE_SPILL_DIRECTORY"], None)
+        self.assertEqual(config.settings["SEARCH_QUEUE_SPILL_SEGMENT_KB"], 65536)
+        self.assertEqual(config.settings["IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT"], None)
+        self.assertEqual(config.settings["SEARCH_PROCESS_AUTOSCALING"], False)
+        self.assertEqual(config.settings["SEARCH_PROCESS_AUTOSCALING_MIN_PROCESSES"], 1)
+        self.assertEqual(config.settings["REGEX_MATCHING_MODE"], 'separate')
+        self.assertEqual(config.settings["LITERAL_PREFILTER"], False)
+        self.assertEqual(config.settings["CONTENTS_SEARCH_MODE"], 'text')
+        self.assertEqual(config.settings["DETECT_CONTENTS_CHARSET"], False)
+        self.assertEqual(config.settings["DECODE_HTTP_PAYLOADS"], False)
+        self.assertEqual(config.settings["STREAMING_SEARCH_THRESHOLD_KB"], None)
+        self.assertEqual(config.settings["STREAMING_CHUNK_SIZE_KB"], 4096)
+        self.assertEqual(config.settings["STREAMING_OVERLAP_KB"], 64)
+        self.assertEqual(config.settings["INCREMENTAL_SEARCH"], False)
+        self.assertEqual(config.settings["CHECKPOINT_INTERVAL_SECONDS"], None)
+        self.assertEqual(config.settings["TRIGRAM_INDEX_DIRECTORY"], None)
+        self.assertEqual(config.settings["BLOOM_FILTER_SIDECAR_KB"], None)
+        self.assertEqual(config.settings["PAYLOAD_DIGEST_CACHE_ENTRIES"], None)
+        self.assertEqual(config.settings["MATCH_MEMO"], False)
+        self.assertEqual(config.settings["ZIP_COMPRESSION"], 'deflate')
+        self.assertEqual(config.settings["ZIP_COMPRESSION_BY_DEFINITION"], None)
+        self.assertEqual(config.settings["ZIP_STORE_COMPRESSED_FORMATS"], False)
+        self.assertEqual(config.settings["EXTRACTION_MODE"], 'zip')
+
+    def test_reads_and_sets_performance_variables(self):
+        parser = config.configparser.ConfigParser()
+        parser.read_string(
+            "[PERFORMANCE]\n"
+            "SEARCH_PIPELINE_MODE = fused\n"
+            "SEARCH_QUEUE_TRANSPORT = Shared_Memory\n"
+            "SHARED_MEMORY_SLOT_COUNT = 16\n"
+            "SHARED_MEMORY_SLOT_SIZE_KB = 1024\n"
+            "SEARCH_BATCH_MAX_RECORDS = 200\n"
+            "SEARCH_BATCH_MAX_KB = 512\n"
+            "SEARCH_BATCH_FLUSH_TIMEOUT_SECONDS = 0.25\n"
+            "SEARCH_QUEUE_MAX_IN_FLIGHT_KB = 4096\n"
+            "SEARCH_QUEUE_SPILL_DIRECTORY = /scratch/spill\n"
+            "SEARCH_QUEUE_SPILL_SEGMENT_KB = 2048\n"
+            "IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT = 50\n"
+            "SEARCH_PROCESS_AUTOSCALING = True\n"
+            "SEARCH_PROCESS_AUTOSCALING_MIN_PROCESSES = 3\n"
+            "REGEX_MATCHING_MODE = Combined\n"
+            "LITERAL_PREFILTER = yes\n"
+            "CONTENTS_SEARCH_MODE = Bytes\n"
+            "DETECT_CONTENTS_CHARSET = True\n"
+            "DECODE_HTTP_PAYLOADS = True\n"
+            "STREAMING_SEARCH_THRESHOLD_KB = 65536\n"
+            "STREAMING_CHUNK_SIZE_KB = 1024\n"
+            "STREAMING_OVERLAP_KB = 16\n"
+            "INCREMENTAL_SEARCH = True\n"
+            "CHECKPOINT_INTERVAL_SECONDS = 30\n"
+            "TRIGRAM_INDEX_DIRECTORY = /scratch/index\n"
+            "BLOOM_FILTER_SIDECAR_KB = 512\n"
+            "PAYLOAD_DIGEST_CACHE_ENTRIES = 10000\n"
+            "MATCH_MEMO = True\n"
+            "ZIP_COMPRESSION = Deflate:9\n"
+            "ZIP_COMPRESSION_BY_DEFINITION = Secrets=lzma, images=stored, broken=zstd\n"
+            "ZIP_STORE_COMPRESSED_FORMATS = True\n"
+            "EXTRACTION_MODE = Blob_Store\n"
+        )
+        config.read_performance_config_ini_variables(parser)
+        self.assertEqual(config.settings["SEARCH_PIPELINE_MODE"], 'fused')
+        self.assertEqual(config.settings["SEARCH_QUEUE_TRANSPORT"], 'shared_memory')
+        self.assertEqual(config.settings["SHARED_MEMORY_SLOT_COUNT"], 16)
+        self.assertEqual(config.settings["SHARED_MEMORY_SLOT_SIZE_KB"], 1024)
+        self.assertEqual(config.settings["SEARCH_BATCH_MAX_RECORDS"], 200)
+        self.assertEqual(config.settings["SEARCH_BATCH_MAX_KB"], 512)
+        self.assertEqual(config.settings["SEARCH_BATCH_FLUSH_TIMEOUT_SECONDS"], 0.25)
+        self.assertEqual(config.settings["SEARCH_QUEUE_MAX_IN_FLIGHT_KB"], 4096)
+        self.assertEqual(config.settings["SEARCH_QUEUE_SPILL_DIRECTORY"], '/scratch/spill')
+        self.assertEqual(config.settings["SEARCH_QUEUE_SPILL_SEGMENT_KB"], 2048)
+        self.assertEqual(config.settings["IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT"], 50)
+        self.assertEqual(config.settings["SEARCH_PROCESS_AUTOSCALING"], True)
+        self.assertEqual(config.settings["SEARCH_PROCESS_AUTOSCALING_MIN_PROCESSES"], 3)
+        self.assertEqual(config.settings["REGEX_MATCHING_MODE"], 'combined')
+        self.assertEqual(config.settings["LITERAL_PREFILTER"], True)
+        self.assertEqual(config.settings["CONTENTS_SEARCH_MODE"], 'bytes')
+        self.assertEqual(config.settings["DETECT_CONTENTS_CHARSET"], True)
+        self.assertEqual(config.settings["DECODE_HTTP_PAYLOADS"], True)
+        self.assertEqual(config.settings["STREAMING_SEARCH_THRESHOLD_KB"], 65536)
+        self.assertEqual(config.settings["STREAMING_CHUNK_SIZE_KB"], 1024)
+        self.assertEqual(config.settings["STREAMING_OVERLAP_KB"], 16)
+        self.assertEqual(config.settings["INCREMENTAL_SEARCH"], True)
+        self.assertEqual(config.settings["CHECKPOINT_INTERVAL_SECONDS"], 30.0)
+        self.assertEqual(config.settings["TRIGRAM_INDEX_DIRECTORY"], '/scratch/index')
+        self.assertEqual(config.settings["BLOOM_FILTER_SIDECAR_KB"], 512)
+        self.assertEqual(config.settings["PAYLOAD_DIGEST_CACHE_ENTRIES"], 10000)
+        self.assertEqual(config.settings["MATCH_MEMO"], True)
+        self.assertEqual(config.settings["ZIP_COMPRESSION"], 'deflate:9')
+        self.assertEqual(config.settings["ZIP_COMPRESSION_BY_DEFINITION"], {"secrets": "lzma", "images": "stored"})
+        self.assertEqual(config.settings["ZIP_STORE_COMPRESSED_FORMATS"], True)
+        self.assertEqual(config.settings["EXTRACTION_MODE"], 'blob_store')
+
+    def test_disables_in_flight_budget_with_none_empty_or_zero(self):
+        for parsed_value in ("None", "", "0"):
+            config.settings["SEARCH_QUEUE_MAX_IN_FLIGHT_KB"] = 4096
+            parser = config.configparser.ConfigParser()
+            parser.read_string(f"[PERFORMANCE]\nSEARCH_QUEUE_MAX_IN_FLIGHT_KB = {parsed_value}\n")
+            config.read_performance_config_ini_variables(parser)
+            self.assertEqual(config.settings["SEARCH_QUEUE_MAX_IN_FLIGHT_KB"], None)
+
+    def test_reads_offset_pipeline_mode(self):
+        parser = config.configparser.ConfigParser()
+        parser.read_string("[PERFORMANCE]\nSEARCH_PIPELINE_MODE = Offset\n")
+        config.read_performance_config_ini_variables(parser)
+        self.assertEqual(config.settings["SEARCH_PIPELINE_MODE"], 'offset')
+
+    @patch('config.log_warning')
+    def test_invalid_values_fall_back_to_defaults(self, mock_log_warning):
+        parser = config.configparser.ConfigParser()
+        parser.read_string(
+            "[PERFORMANCE]\n"
+            "SEARCH_QUEUE_TRANSPORT = carrier_pigeon\n"
+            "SHARED_MEMORY_SLOT_COUNT = -1\n"
+        )
+        config.read_performance_config_ini_variables(parser)
+        self.assertEqual(config.settings["SEARCH_QUEUE_TRANSPORT"], 'manager')
+        self.assertEqual(config.settings["SHARED_MEMORY_SLOT_COUNT"], 256)
+        self.assertEqual(mock_log_warning.call_count, 2)
+
+
+class TestValidateAndGetOption(unittest.TestCase):
+    @patch('config.log_warning')
+    def test_returns_value_when_valid(self, mock_log_warning):
+        self.assertEqual(config.validate_and_get_option('b', 'VAR', ('a', 'b'), 'a'), 'b')
+        mock_log_warning.assert_not_called()
+
+    @patch('config.log_warning')
+    def test_returns_default_and_warns_on_invalid(self, mock_log_warning):
+        self.assertEqual(config.validate_and_get_option('c', 'VAR', ('a', 'b'), 'a'), 'a')
+        mock_log_warning.assert_called_once()
+
+
+class TestValidateAndGetPositiveInteger(unittest.TestCase):
+    @patch('config.log_warning')
+    def test_returns_int_when_valid(self, mock_log_warning):
+        self.assertEqual(config.validate_and_get_positive_integer('12', 'VAR', 5), 12)
+        mock_log_warning.assert_not_called()
+
+    @patch('config.log_warning')
+    def test_returns_default_and_warns_on_invalid_string(self, mock_log_warning):
+        self.assertEqual(config.validate_and_get_positive_integer('abc', 'VAR', 5), 5)
+        mock_log_warning.assert_called_once()
+
+    @patch('config.log_warning')
+    def test_returns_default_and_warns_on_zero(self, mock_log_warning):
+        self.assertEqual(config.validate_and_get_positive_integer('0', 'VAR', 5), 5)
+        mock_log_warning.assert_called_once()
+
+
+class TestValidateAndGetPositiveFloat(unittest.TestCase):
+    @patch('config.log_warning')
+    def test_returns_float_when_valid(self, mock_log_warning):
+        self.assertEqual(config.validate_and_get_positive_float('0.5', 'VAR', 1.0), 0.5)
+        self.assertEqual(config.validate_and_get_positive_float('3', 'VAR', 1.0), 3.0)
+        mock_log_warning.assert_not_called()
+
+    @patch('config.log_warning')
+    def test_returns_default_and_warns_on_invalid(self, mock_log_warning):
+        self.assertEqual(config.validate_and_get_positive_float('soon', 'VAR', 1.0), 1.0)
+        self.assertEqual(config.validate_and_get_positive_float('-1', 'VAR', 1.0), 1.0)
+        self.assertEqual(mock_log_warning.call_count, 2)
+
+
+class TestValidateAndGetPercent(unittest.TestCase):
+    @patch('config.log_warning')
+    def test_returns_percent_when_valid(self, mock_log_warning):
+        self.assertEqual(config.validate_and_get_percent('0', 'VAR', 50), 0)
+        self.assertEqual(config.validate_and_get_percent('100', 'VAR', 50), 100)
+        mock_log_warning.assert_not_called()
+
+    @patch('config.log_warning')
+    def test_returns_default_and_warns_on_invalid(self, mock_log_warning):
+        self.assertEqual(config.validate_and_get_percent('half', 'VAR', 50), 50)
+        self.assertEqual(config.validate_and_get_percent('101', 'VAR', 50), 50)
+        self.assertEqual(config.validate_and_get_percent('-1', 'VAR', 50), 50)
+        self.assertEqual(mock_log_warning.call_count, 3)
+
+
+class TestValidateAndGetBoolean(unittest.TestCase):
+    @patch('config.log_warning')
+    def test_returns_boolean_when_valid(self, mock_log_warning):
+        self.assertIs(config.validate_and_get_boolean('True', 'VAR', False), True)
+        self.assertIs(config.validate_and_get_boolean('off', 'VAR', True), False)
+        mock_log_warning.assert_not_called()
+
+    @patch('config.log_warning')
+    def test_returns_default_and_warns_on_invalid(self, mock_log_warning):
+        self.assertIs(config.validate_and_get_boolean('maybe', 'VAR', False), False)
+        mock_log_warning.assert_called_once()
+
+
+class TestReadFiltersConfigIniVariables(unittest.TestCase):
+    def setUp(self):
+        self.original_settings = dict(config.settings)
+
+    def tearDown(self):
+        config.settings.clear()
+        config.settings.update(self.original_settings)
+
+    def test_keeps_filters_disabled_when_section_missing(self):
+        parser = config.configparser.ConfigParser()
+        config.read_filters_config_ini_variables(parser)
+        for variable_name in (
+            "FILTER_HTTP_STATUS_CODES", "FILTER_CONTENT_TYPES_ALLOWED", "FILTER_CONTENT_TYPES_DENIED",
+            "FILTER_MIN_CONTENT_LENGTH_KB", "FILTER_MAX_CONTENT_LENGTH_KB", "FILTER_WARC_DATE_FROM",
+            "FILTER_WARC_DATE_TO", "FILTER_URI_INCLUDE_REGEX", "FILTER_URI_EXCLUDE_REGEX",
+        ):
+            self.assertIsNone(config.settings[variable_name])
+
+    def test_reads_and_sets_filters_variables(self):
+        parser = config.configparser.ConfigParser()
+        parser.read_string(
+            "[FILTERS]\n"
+            "FILTER_HTTP_STATUS_CODES = 200, 300-399\n"
+            "FILTER_CONTENT_TYPES_ALLOWED = Text/*, application/json\n"
+            "FILTER_CONTENT_TYPES_DENIED = image/*\n"
+            "FILTER_MIN_CONTENT_LENGTH_KB = 1\n"
+            "FILTER_MAX_CONTENT_LENGTH_KB = none\n"
+            "FILTER_WARC_DATE_FROM = 2024-01-01\n"
+            "FILTER_WARC_DATE_TO = 2024-01-31\n"
+            "FILTER_URI_INCLUDE_REGEX = example\\.com\n"
+            "FILTER_URI_EXCLUDE_REGEX = None\n"
+        )
+        config.read_filters_config_ini_variables(parser)
+        utc = config.datetime.timezone.utc
+        self.assertEqual(config.settings["FILTER_HTTP_STATUS_CODES"], [(200, 200), (300, 399)])
+        self.assertEqual(config.settings["FILTER_CONTENT_TYPES_ALLOWED"], ['text/*', 'application/json'])
+        self.assertEqual(config.settings["FILTER_CONTENT_TYPES_DENIED"], ['image/*'])
+        self.assertEqual(config.settings["FILTER_MIN_CONTENT_LENGTH_KB"], 1)
+        self.assertIsNone(config.settings["FILTER_MAX_CONTENT_LENGTH_KB"])
+        self.assertEqual(config.settings["FILTER_WARC_DATE_FROM"], config.datetime.datetime(2024, 1, 1, tzinfo=utc))
+        self.assertEqual(config.settings["FILTER_WARC_DATE_TO"], config.datetime.datetime(2024, 1, 31, 23, 59, 59, 999999, tzinfo=utc))
+        self.assertEqual(config.settings["FILTER_URI_INCLUDE_REGEX"], 'example\\.com')
+        self.assertIsNone(config.settings["FILTER_URI_EXCLUDE_REGEX"])
+
+
+class TestValidateAndGetStatusCodeRanges(unittest.TestCase):
+    @patch('config.log_warning')
+    def test_returns_ranges_when_valid(self, mock_log_warning):
+        self.assertEqual(config.validate_and_get_status_code_ranges('404', 'VAR'), [(404, 404)])
+        self.assertEqual(config.validate_and_get_status_code_ranges(' 200-299 ,301', 'VAR'), [(200, 299), (301, 301)])
+        self.assertIsNone(config.validate_and_get_status_code_ranges('None', 'VAR'))
+        mock_log_warning.assert_not_called()
+
+    @patch('config.log_warning')
+    def test_returns_none_and_warns_on_invalid(self, mock_log_warning):
+        self.assertIsNone(config.validate_and_get_status_code_ranges('ok', 'VAR'))
+        self.assertIsNone(config.validate_and_get_status_code_ranges('399-300', 'VAR'))
+        self.assertEqual(mock_log_warning.call_count, 2)
+
+
+class TestValidateAndGetDate(unittest.TestCase):
+    @patch('config.log_warning')
+    def test_returns_date_when_valid(self, mock_log_warning):
+        utc = config.datetime.timezone.utc
+        self.assertEqual(
+            config.validate_and_get_date('2024-01-31T12:30:00', 'VAR', end_of_day=True),
+            config.datetime.datetime(2024, 1, 31, 12, 30, tzinfo=utc)
+        )
+        self.assertEqual(
+            config.validate_and_get_date('2024-01-31T12:30:00+02:00', 'VAR', end_of_day=False),
+            config.datetime.datetime(2024, 1, 31, 10, 30, tzinfo=utc)
+        )
+        mock_log_warning.assert_not_called()
+
+    @patch('config.log_warning')
+    def test_returns_none_and_warns_on_invalid(self, mock_log_warning):
+        self.assertIsNone(config.validate_and_get_date('yesterday', 'VAR', end_of_day=False))
+        mock_log_warning.assert_called_once()
+
+
+class TestValidateAndGetRegex(unittest.TestCase):
+    @patch('config.log_warning')
+    def test_returns_regex_when_valid(self, mock_log_warning):
+        self.assertEqual(config.validate_and_get_regex('\\.pdf$', 'VAR'), '\\.pdf$')
+        mock_log_warning.assert_not_called()
+
+    @patch('config.log_warning')
+    def test_returns_none_and_warns_on_invalid(self, mock_log_warning):
+        self.assertIsNone(config.validate_and_get_regex('(unclosed', 'VAR'))
+        mock_log_warning.assert_called_once()
@@ -0,0 +1,98 @@
+import os
+
+from deferred_extraction import (MATCH_LOCATIONS_HEADER, MatchLocationRecorder, copy_match_locations, get_match_locations_file_path,
+                                 group_match_locations, merge_match_locations, read_match_locations)
+from warc_record import WarcMember
+
+RESULTS_FILE_PATHS = ["/results/keys_results.txt", "/results/tokens_results.txt"]
+
+
+def write_match_locations(match_locations_file_path, rows, cut_row: str = ""):
+    with open(match_locations_file_path, "w", encoding="utf-8") as match_locations_file:
+        match_locations_file.write("\t".join(MATCH_LOCATIONS_HEADER) + "\n")
+        for row in rows:
+            match_locations_file.write("\t".join(map(str, row)) + "\n")
+        match_locations_file.write(cut_row)
+
+
+def test_recorder_records_each_location_once_per_definition(tmp_path):
+    recorder = MatchLocationRecorder()
+    recorder.start_worker(str(tmp_path))
+    warc_member = WarcMember("/archives/a.warc.gz", 100, 50)
+
+    assert recorder.add_record(warc_member, RESULTS_FILE_PATHS) == 2
+    assert recorder.add_record(warc_member, RESULTS_FILE_PATHS[1:]) == 0
+    recorder.sync()
+    assert recorder.add_record(WarcMember("/archives/a.warc.gz", 0, 100), RESULTS_FILE_PATHS[1:]) == 1
+    recorder.finish_worker()
+
+    assert list(read_match_locations(get_match_locations_file_path(str(tmp_path)))) == [
+        (warc_member, "keys_results"), (warc_member, "tokens_results"), (WarcMember("/archives/a.warc.gz", 0, 100), "tokens_results")
+    ]
+
+def test_recorder_records_absolute_warc_gz_file_paths(tmp_path):
+    recorder = MatchLocationRecorder()
+    recorder.start_worker(str(tmp_path))
+    recorder.add_record(WarcMember("archives/a.warc.gz", 0, 10), RESULTS_FILE_PATHS[:1])
+    recorder.finish_worker()
+
+    [(warc_member, _)] = read_match_locations(get_match_locations_file_path(str(tmp_path)))
+    assert warc_member.parent_warc_gz_file == os.path.abspath("archives/a.warc.gz")
+
+def test_read_match_locations_skips_row_cut_short(tmp_path):
+    match_locations_file_path = str(tmp_path / "match_locations.tsv")
+    write_match_locations(match_locations_file_path, [("/a.warc.gz", 0, 10, "keys_results")], cut_row="/a.warc.gz\t10\t2")
+
+    assert list(read_match_locations(match_locations_file_path)) == [(WarcMember("/a.warc.gz", 0, 10), "keys_results")]
+
+def test_merge_match_locations_keeps_each_row_once(tmp_path):
+    for worker_name in ("1", "2"):
+        (tmp_path / "temp" / worker_name).mkdir(parents=True)
+    write_match_locations(tmp_path / "temp" / "1" / "match_locations.tsv", [("/a.warc.gz", 0, 10, "keys_results"), ("/a.warc.gz", 10, 5, "keys_results")])
+    write_match_locations(tmp_path / "temp" / "2" / "match_locations.tsv", [("/a.warc.gz", 10, 5, "keys_results"), ("/b.warc.gz", 0, 7, "tokens_results")])
+
+    merge_match_locations(str(tmp_path / "temp"), str(tmp_path))
+
+    assert list(read_match_locations(str(tmp_path / "match_locations.tsv"))) == [
+        (WarcMember("/a.warc.gz", 0, 10), "keys_results"), (WarcMember("/a.warc.gz", 10, 5), "keys_results"), (WarcMember("/b.warc.gz", 0, 7), "tokens_results")
+    ]
+    assert not os.path.exists(tmp_path / "match_locations.tsv.merging")
+
+def test_group_match_locations_sorts_members_of_each_warc_gz_file_by_offset(tmp_path):
+    match_locations_file_path = str(tmp_path / "match_locations.tsv")
+    write_match_locations(match_locations_file_path, [
+        ("/b.warc.gz", 500, 10, "keys_results"),
+        ("/a.warc.gz", 300, 10, "keys_results"),
+        ("/b.warc.gz", 20, 10, "tokens_results"),
+        ("/a.warc.gz", 300, 10, "tokens_results"),
+        ("/a.warc.gz", 0, 10, "keys_results"),
+    ])
+
+    keys_results_file_path, tokens_results_file_path = str(tmp_path / "keys_results.txt"), str(tmp_path / "tokens_results.txt")
+    assert group_match_locations(match_locations_file_path) == {
+        "/a.warc.gz": [
+            (WarcMember("/a.warc.gz", 0, 10), [keys_results_file_path]), 
+            (WarcMember("/a.warc.gz", 300, 10), [keys_results_file_path, tokens_results_file_path])
+        ],
+        "/b.warc.gz": [(WarcMember("/b.warc.gz", 20, 10), [tokens_results_file_path]), (WarcMember("/b.warc.gz", 500, 10), [keys_results_file_path])],
+    }
+
+def test_group_match_locations_keeps_scoped_definitions_apart(tmp_path):
+    match_locations_file_path = str(tmp_path / "match_locations.tsv")
+    write_match_locations(match_locations_file_path, [("/a.warc.gz", 0, 10, "keys.headers_results"), ("/a.warc.gz", 0, 10, "keys_results")])
+
+    assert group_match_locations(match_locations_file_path) == {
+        "/a.warc.gz": [(WarcMember("/a.warc.gz", 0, 10), [str(tmp_path / "keys.headers_results.txt"), str(tmp_path / "keys_results.txt")])]
+    }
+
+def test_copy_match_locations_copies_rows_of_definition_in_warc_gz_files(tmp_path):
+    source_match_locations_file_path = str(tmp_path / "source.tsv")
+    target_match_locations_file_path = str(tmp_path / "target.tsv")
+    write_match_locations(source_match_locations_file_path, [
+        ("/a.warc.gz", 0, 10, "keys_results"), ("/a.warc.gz", 0, 10, "tokens_results"), ("/b.warc.gz", 0, 10, "keys_results")
+    ])
+
+    copy_match_locations(source_match_locations_file_path, target_match_locations_file_path, ["/a.warc.gz"], "keys_results")
+    copy_match_locations(source_match_locations_file_path, target_match_locations_file_path, ["/a.warc.gz"], "keys_results")
+
+    assert list(read_match_locations(target_match_locations_file_path)) == [(WarcMember("/a.warc.gz", 0, 10), "keys_results")]
@@ -0,0 +1,140 @@
+import gzip
+import zlib
+import pytest
+
+import http_payload
+from http_payload import (decode_chunked_payload, decode_chunked_payload_chunks, decode_http_payload, decode_http_payload_chunks,
+                          decompress_payload, get_http_header_values, serialize_http_headers)
+
+
+class DummyHttpHeaders:
+    status_line_bytes = b"HTTP/1.1 200 OK"
+
+    def items_bytes(self):
+        return [(b"Content-Type", b"text/html"), (b"Content-Encoding", b"gzip")]
+
+
+def headers_block(*header_lines: bytes) -> bytes:
+    return b"\r\n".join((b"HTTP/1.1 200 OK",) + header_lines) + b"\r\n"
+
+
+def test_serialize_http_headers():
+    assert serialize_http_headers(DummyHttpHeaders()) == headers_block(b"Content-Type: text/html", b"Content-Encoding: gzip")
+    assert serialize_http_headers(None) is None
+
+def test_get_http_header_values():
+    block = headers_block(b"content-encoding: GZIP, br", b"Content-Type: text/html", b"Content-Encoding: identity")
+    assert get_http_header_values(block, b"Content-Encoding") == ["gzip", "br", "identity"]
+    assert get_http_header_values(block, b"Transfer-Encoding") == []
+
+def test_decode_chunked_payload():
+    assert decode_chunked_payload(b"5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\n\r\n") == b"hello world"
+    # Truncated captures keep the chunks they have
+    assert decode_chunked_payload(b"5\r\nhello\r\n10\r\n wor") == b"hello wor"
+    # Payloads that are not chunked are kept as they are
+    assert decode_chunked_payload(b"not chunked\r\n") == b"not chunked\r\n"
+    assert decode_chunked_payload(b"no line end") == b"no line end"
+
+@pytest.mark.parametrize("content_encoding, compress", [
+    ("gzip", gzip.compress),
+    ("x-gzip", gzip.compress),
+    ("deflate", zlib.compress),
+    ("deflate", lambda data: zlib.compress(data)[2:-4]),
+    ("identity", lambda data: data),
+])
+def test_decompress_payload(content_encoding, compress):
+    assert decompress_payload(compress(b"payload text"), content_encoding) == b"payload text"
+
+def test_decompress_payload_brotli():
+    brotli = pytest.importorskip("brotli")
+    assert decompress_payload(brotli.compress(b"payload text"), "br") == b"payload text"
+
+def test_decompress_payload_fails():
+    assert decompress_payload(b"not compressed", "gzip") is None
+    assert decompress_payload(b"not compressed", "deflate") is None
+    assert decompress_payload(b"payload", "compress") is None
+
+def test_decompress_payload_stops_at_max_size(monkeypatch):
+    monkeypatch.setattr(http_payload, "MAX_DECODED_PAYLOAD_SIZE", 10)
+    assert decompress_payload(gzip.compress(b"a" * 1000), "gzip") == b"a" * 10
+
+def test_decode_http_payload_chunked_and_compressed():
+    compressed = gzip.compress(b"<html>decoded</html>")
+    chunked = b"%x\r\n" % len(compressed) + compressed + b"\r\n0\r\n\r\n"
+    block = headers_block(b"Transfer-Encoding: chunked", b"Content-Encoding: gzip")
+    assert decode_http_payload(chunked, block) == b"<html>decoded</html>"
+
+def test_decode_http_payload_multiple_encodings():
+    payload = gzip.compress(zlib.compress(b"twice"))
+    assert decode_http_payload(payload, headers_block(b"Content-Encoding: deflate, gzip")) == b"twice"
+
+def test_decode_http_payload_keeps_payload_on_failure():
+    payload = memoryview(b"stored as is")
+    assert decode_http_payload(payload, headers_block(b"Content-Encoding: gzip")) is payload
+    # A later encoding is not removed once an earlier step fails
+    payload = gzip.compress(b"inner")
+    assert decode_http_payload(payload, headers_block(b"Content-Encoding: gzip, compress")) == payload
+
+def test_decode_http_payload_without_headers():
+    assert decode_http_payload(b"payload", None) == b"payload"
+    assert decode_http_payload(b"payload", headers_block(b"Content-Type: text/plain")) == b"payload"
+
+def split_into_chunks(payload: bytes, chunk_size: int) -> list[bytes]:
+    return [payload[position:position + chunk_size] for position in range(0, len(payload), chunk_size)]
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1000])
+def test_decode_chunked_payload_chunks(chunk_size):
+    payload = b"5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\n\r\n"
+    assert b"".join(decode_chunked_payload_chunks(iter(split_into_chunks(payload, chunk_size)))) == b"hello world"
+    # Truncated captures keep the chunks they have
+    assert b"".join(decode_chunked_payload_chunks(iter(split_into_chunks(b"5\r\nhello\r\n10\r\n wor", chunk_size)))) == b"hello wor"
+    # Payloads that are not chunked are kept as they are
+    for payload in (b"not chunked\r\n", b"no line end"):
+        assert b"".join(decode_chunked_payload_chunks(iter(split_into_chunks(payload, chunk_size)))) == payload
+
+def test_decode_chunked_payload_chunks_without_size_line(monkeypatch):
+    monkeypatch.setattr(http_payload, "MAX_CHUNK_SIZE_LINE_LENGTH", 8)
+    # A payload without a line end near its start is passed on without waiting for the rest of it
+    decoded_chunks = decode_chunked_payload_chunks(iter([b"0123456789", b"more"]))
+    assert next(decoded_chunks) == b"0123456789"
+    assert list(decoded_chunks) == [b"more"]
+
+@pytest.mark.parametrize("content_encodings, encode", [
+    (b"gzip", gzip.compress),
+    (b"deflate", zlib.compress),
+    (b"deflate", lambda data: zlib.compress(data)[2:-4]),
+    (b"deflate, gzip", lambda data: gzip.compress(zlib.compress(data))),
+    (b"compress", lambda data: data),
+    (b"gzip, compress", gzip.compress),
+])
+@pytest.mark.parametrize("chunk_size", [1, 7, 100000])
+def test_decode_http_payload_chunks_matches_decode_http_payload(content_encodings, encode, chunk_size):
+    payload = encode(b"<html>" + b"decoded text " * 1000 + b"</html>")
+    block = headers_block(b"Content-Encoding: " + content_encodings)
+
+    decoded_chunks = list(decode_http_payload_chunks(iter(split_into_chunks(payload, chunk_size)), block, chunk_size))
+    assert b"".join(decoded_chunks) == decode_http_payload(payload, block)
+    assert max(len(decoded_chunk) for decoded_chunk in decoded_chunks) <= max(chunk_size, 7)
+
+def test_decode_http_payload_chunks_chunked_and_compressed():
+    compressed = gzip.compress(b"<html>decoded</html>")
+    chunked = b"%x\r\n" % len(compressed) + compressed + b"\r\n0\r\n\r\n"
+    block = headers_block(b"Transfer-Encoding: chunked", b"Content-Encoding: gzip")
+    assert b"".join(decode_http_payload_chunks(iter(split_into_chunks(chunked, 4)), block, 4)) == b"<html>decoded</html>"
+
+def test_decode_http_payload_chunks_brotli():
+    brotli = pytest.importorskip("brotli")
+    payload = brotli.compress(b"payload text " * 1000)
+    decoded_chunks = list(decode_http_payload_chunks(iter(split_into_chunks(payload, 5)), headers_block(b"Content-Encoding: br"), 64))
+    assert b"".join(decoded_chunks) == b"payload text " * 1000
+    assert max(len(decoded_chunk) for decoded_chunk in decoded_chunks) <= 64
+
+def test_decode_http_payload_chunks_stops_at_max_size(monkeypatch):
+    monkeypatch.setattr(http_payload, "MAX_DECODED_PAYLOAD_SIZE", 10)
+    payload = gzip.compress(b"a" * 1000)
+    assert b"".join(decode_http_payload_chunks(iter([payload]), headers_block(b"Content-Encoding: gzip"), 4)) == b"a" * 10
+
+def test_decode_http_payload_chunks_keeps_payload_on_failure():
+    chunks = [b"stored ", b"as is"]
+    assert list(decode_http_payload_chunks(iter(chunks), headers_block(b"Content-Encoding: gzip"), 4)) == chunks
+    assert list(decode_http_payload_chunks(iter(chunks), None, 4)) == chunks
@@ -0,0 +1,67 @@
+import threading
+import time
+
+from in_flight_budget import InFlightBytesBudget
+
+
+def test_reserve_and_release():
+    budget = InFlightBytesBudget(100)
+    budget.reserve(60)
+    budget.reserve(40)
+    assert budget.in_flight_bytes.value == 100
+    budget.release(70)
+    assert budget.in_flight_bytes.value == 30
+    assert budget.peak_in_flight_bytes == 100
+    assert budget.blocked_reservations == 0
+
+def test_try_reserve_without_room():
+    budget = InFlightBytesBudget(100)
+    assert budget.try_reserve(80)
+    assert not budget.try_reserve(30)
+    assert budget.in_flight_bytes.value == 80
+    # Records without a size in memory, such as spooled records, always fit
+    assert budget.try_reserve(0)
+
+def test_oversized_record_fits_once_nothing_is_in_flight():
+    budget = InFlightBytesBudget(100)
+    assert budget.try_reserve(500)
+    assert not budget.try_reserve(1)
+    budget.release(500)
+    assert budget.try_reserve(1)
+
+def test_reserve_blocks_until_bytes_are_released():
+    budget = InFlightBytesBudget(100)
+    budget.reserve(90)
+    reserved = threading.Event()
+
+    def reserve_in_thread():
+        budget.reserve(20)
+        reserved.set()
+
+    reserve_thread = threading.Thread(target=reserve_in_thread)
+    reserve_thread.start()
+    assert not reserved.wait(0.2)
+
+    # Releasing too few bytes keeps the read thread blocked
+    budget.release(5)
+    assert not reserved.wait(0.2)
+
+    budget.release(10)
+    assert reserved.wait(5)
+    reserve_thread.join()
+
+    assert budget.in_flight_bytes.value == 95
+    assert budget.blocked_reservations == 1
+    assert budget.blocked_seconds >= 0.3
+
+def test_log_summary(monkeypatch):
+    messages = []
+    monkeypatch.setattr("in_flight_budget.log_info", lambda msg: messages.append(msg))
+    budget = InFlightBytesBudget(4 * 1024 * 1024)
+    budget.reserve(1024 * 1024)
+    budget.blocked_reservations = 3
+    budget.blocked_seconds = 1.234
+
+    budget.log_summary()
+    assert "peaked at 1024 KB of the 4096 KB budget" in messages[0]
+    assert "blocked 3 times, for 1.23 seconds" in messages[0]
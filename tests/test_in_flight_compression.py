@@ -0,0 +1,57 @@
+import os
+import zlib
+
+import in_flight_compression
+from in_flight_compression import CompressedWarcRecord, InFlightCompressor, compress_contents, decompress_warc_record
+from warc_record import PayloadIdentity, WarcRecord
+
+
+def make_record(contents: bytes) -> WarcRecord:
+    return WarcRecord("parent.gz", "http://example.com", contents, "utf-8", b"HTTP/1.1 200 OK\r\n", PayloadIdentity("sha1:ABC", "<urn:uuid:1>"))
+
+
+def test_compress_and_decompress_record():
+    contents = b"<html>text compresses well</html>" * 200
+    compressed_warc_record = InFlightCompressor(0).compress_if_over_threshold(make_record(contents), 0)
+
+    assert isinstance(compressed_warc_record, CompressedWarcRecord)
+    assert len(compressed_warc_record.compressed_contents) < len(contents)
+
+    warc_record = decompress_warc_record(compressed_warc_record)
+    assert (warc_record.name, warc_record.contents, warc_record.charset) == ("http://example.com", contents, "utf-8")
+    assert warc_record.http_headers == b"HTTP/1.1 200 OK\r\n"
+    assert warc_record.payload_identity == PayloadIdentity("sha1:ABC", "<urn:uuid:1>")
+
+def test_keeps_record_below_threshold():
+    warc_record = make_record(b"a" * 10000)
+    assert InFlightCompressor(5000).compress_if_over_threshold(warc_record, 4999) is warc_record
+
+def test_keeps_small_and_incompressible_records():
+    in_flight_compressor = InFlightCompressor(0)
+    small_warc_record = make_record(b"a" * 100)
+    random_warc_record = make_record(os.urandom(10000))
+
+    assert in_flight_compressor.compress_if_over_threshold(small_warc_record, 0) is small_warc_record
+    assert in_flight_compressor.compress_if_over_threshold(random_warc_record, 0) is random_warc_record
+    assert in_flight_compressor.compressed_records == 0
+
+def test_zlib_codec_without_lz4(monkeypatch):
+    monkeypatch.setattr(in_flight_compression, "lz4", None)
+    in_flight_compressor = InFlightCompressor(0)
+    assert in_flight_compressor.codec == 'zlib'
+
+    compressed_warc_record = in_flight_compressor.compress_if_over_threshold(make_record(b"b" * 10000), 0)
+    assert zlib.decompress(compressed_warc_record.compressed_contents) == b"b" * 10000
+    assert compress_contents(b"b" * 10000, 'zlib') == compressed_warc_record.compressed_contents
+
+def test_log_summary(monkeypatch):
+    messages = []
+    monkeypatch.setattr("in_flight_compression.log_info", lambda msg: messages.append(msg))
+    in_flight_compressor = InFlightCompressor(0)
+
+    in_flight_compressor.log_summary()
+    assert messages == []
+
+    in_flight_compressor.compress_if_over_threshold(make_record(b"c" * 10240), 0)
+    in_flight_compressor.log_summary()
+    assert f"Compressed 1 records in flight with {in_flight_compressor.codec}, from 10 KB" in messages[0]
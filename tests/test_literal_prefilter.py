@@ -0,0 +1,92 @@
+import random
+import re
+import pytest
+
+from literal_prefilter import (LiteralPrefilter, PrefilterText, create_literal_prefilter, create_literal_prefilters_dict,
+                               extract_required_literal_alternatives, extract_required_literals, lowercase_haystack)
+from record_text import RecordText
+
+
+@pytest.mark.parametrize("pattern, flags, expected_literals", [
+    (r"api_key\s*=\s*\w+", re.IGNORECASE, ["api_key"]),
+    (r"\w+@example\.com", re.IGNORECASE, ["@example.com"]),
+    (r"(?:secret|token)_\w+", re.IGNORECASE, ["secret", "token"]),
+    (r"six|(?:ti|is)x", re.IGNORECASE, ["six", "ti", "is"]),
+    (r"(abc)+d", re.IGNORECASE, ["abc"]),
+    (r"(?:abc)?de", re.IGNORECASE, ["de"]),
+    (r"café", re.IGNORECASE, ["caf"]),
+    (r"(?i:se)c", 0, ["c"]),
+    (r"\d+|abc", re.IGNORECASE, []),
+    (r"[a-z]+", re.IGNORECASE, []),
+    (r"é", re.IGNORECASE, []),
+])
+def test_extract_required_literals(pattern, flags, expected_literals):
+    assert extract_required_literals(re.compile(pattern, flags)) == expected_literals
+
+def test_extract_required_literal_alternatives_returns_every_requirement():
+    assert extract_required_literal_alternatives(re.compile(r"ab\d+(?:cde|fgh)\s+ijkl")) == [["ab"], ["cde", "fgh"], ["ijkl"]]
+    assert extract_required_literal_alternatives(re.compile(r"\d+")) == []
+
+def test_create_literal_prefilter():
+    literal_prefilter = create_literal_prefilter(re.compile(r"API_KEY=\w+", re.IGNORECASE))
+    assert literal_prefilter.ignore_case is True
+    assert literal_prefilter.required_literals == ["api_key="]
+    assert literal_prefilter.required_literals_bytes == [b"api_key="]
+    assert create_literal_prefilter(re.compile(r"\d+")) is None
+
+def test_create_literal_prefilters_dict():
+    literal_prefilters_dict = create_literal_prefilters_dict({"a.txt": re.compile("abc"), "b.txt": re.compile(r"\w+")})
+    assert list(literal_prefilters_dict) == ["a.txt"]
+
+def test_may_match_ascii_contents_as_bytes():
+    prefilter_text = PrefilterText(RecordText(memoryview(b"Some API_KEY = 1")))
+    assert prefilter_text.record_text.get_ascii_contents() == b"Some API_KEY = 1"
+    assert LiteralPrefilter(["api_key"], ignore_case=True).may_match(prefilter_text)
+    assert not LiteralPrefilter(["api_key"], ignore_case=False).may_match(prefilter_text)
+    assert LiteralPrefilter(["missing", "API"], ignore_case=False).may_match(prefilter_text)
+    # ASCII contents are never decoded
+    assert prefilter_text.record_text.decoded_text is None
+
+def test_may_match_non_ascii_contents_as_decoded_text():
+    prefilter_text = PrefilterText(RecordText("café ſecret".encode()))
+    assert prefilter_text.record_text.get_ascii_contents() is None
+    assert LiteralPrefilter(["secret"], ignore_case=True).may_match(prefilter_text)
+    assert not LiteralPrefilter(["secret"], ignore_case=False).may_match(prefilter_text)
+    assert prefilter_text.record_text.get_decoded_text() == "café ſecret"
+
+def test_may_match_text_joined_by_invalid_bytes():
+    # Invalid UTF-8 bytes are dropped when decoding, so the literal is only found in the decoded text
+    prefilter_text = PrefilterText(RecordText(b"api\xffkey"))
+    assert LiteralPrefilter(["apikey"], ignore_case=False).may_match(prefilter_text)
+
+def test_may_match_contents_decoded_with_their_encoding():
+    # ASCII bytes are not ASCII characters in UTF-16, so the decoded text is checked
+    prefilter_text = PrefilterText(RecordText("secret".encode("utf-16-le"), "utf-16-le"))
+    assert prefilter_text.record_text.get_ascii_contents() is None
+    assert LiteralPrefilter(["secret"], ignore_case=False).may_match(prefilter_text)
+
+def test_lowercase_haystack():
+    assert lowercase_haystack(b"ABC") == b"abc"
+    assert lowercase_haystack("ſ ı İx K") == "s i ix k"
+
+def test_prefilter_never_rejects_a_match():
+    # Plan:
+    # - Check random contents, including invalid UTF-8 and characters that case-insensitively match ASCII letters
+    # - Whenever a regex finds a match in the decoded contents, its prefilter must pass them
+    patterns = [
+        r"api_?key\s*=\s*\w+", r"\w+@\w+\.com", r"alpha|alph", r"\bbe\w*", r"(ab)+", r"delta\b", r"[ſs]ec",
+        r"Key", r"kEy\d", r"İx", r"(?-i:Ab)", r"six|(?:ti|is)x", r"a{2,}b", r"(?i:se)c", r"si", r"ki",
+    ]
+    pieces = [b"a", b"b", b"e", b"i", b"s", b"x", b"k", b"K", b"y", b" ", b"=", b"_", b"@", b".com", "ſ".encode(), "ı".encode(),
+              "İ".encode(), "K".encode(), b"\xff", b"\xc3", b"p", b"l", b"h", b"t", b"d", b"1", "é".encode(), b"I", b"S"]
+    random_generator = random.Random(5)
+    for flags in (re.IGNORECASE, 0):
+        regexes = [re.compile(pattern, flags) for pattern in patterns]
+        literal_prefilters = [create_literal_prefilter(regex) for regex in regexes]
+        for _ in range(2000):
+            contents = b"".join(random_generator.choice(pieces) for _ in range(random_generator.randint(0, 25)))
+            prefilter_text = PrefilterText(RecordText(contents))
+            decoded_contents = str(contents, "utf-8", "ignore")
+            for regex, literal_prefilter in zip(regexes, literal_prefilters):
+                if regex.search(decoded_contents):
+                    assert literal_prefilter.may_match(prefilter_text), (regex.pattern, contents)
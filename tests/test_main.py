@@ -32,6 +32,47 @@ class TestMainSetup(unittest.TestCase):
         mock_read_config.assert_called_once()
         mock_init_results_dir.assert_called_once()
 
+    @patch('main.use_resumed_results_output_subdirectory')
+    @patch('main.initialize_results_output_subdirectory')
+    @patch('main.read_config_ini_variables')
+    @patch('main.atexit.register')
+    @patch('main.initialize_logging')
+    @patch('main.searchTimer')
+    def test_setup_uses_resumed_results_directory(self, mock_search_timer, mock_initialize_logging, mock_atexit_register, mock_read_config, mock_init_results_dir, mock_use_resumed_dir):
+        main.setup("results/12-01-2024_10-00-00")
+        mock_use_resumed_dir.assert_called_once_with("results/12-01-2024_10-00-00")
+        mock_init_results_dir.assert_not_called()
+
+    @patch('main.use_extracted_results_output_subdirectory')
+    @patch('main.use_resumed_results_output_subdirectory')
+    @patch('main.initialize_results_output_subdirectory')
+    @patch('main.read_config_ini_variables')
+    @patch('main.atexit.register')
+    @patch('main.initialize_logging')
+    @patch('main.searchTimer')
+    def test_setup_uses_extracted_results_directory(self, mock_search_timer, mock_initialize_logging, mock_atexit_register, mock_read_config, mock_init_results_dir, 
+                                                    mock_use_resumed_dir, mock_use_extracted_dir):
+        main.setup(extract_results_directory="results/run")
+        mock_use_extracted_dir.assert_called_once_with("results/run")
+        mock_use_resumed_dir.assert_not_called()
+        mock_init_results_dir.assert_not_called()
+
+class TestMainArguments(unittest.TestCase):
+    def test_parse_arguments_without_resume(self):
+        self.assertIsNone(main.parse_arguments([]).resume)
+
+    def test_parse_arguments_with_resume(self):
+        self.assertEqual(main.parse_arguments(["--resume", "results/run"]).resume, "results/run")
+
+    def test_parse_arguments_build_index(self):
+        self.assertEqual(main.parse_arguments(["build-index"]).command, "build-index")
+        self.assertIsNone(main.parse_arguments([]).command)
+
+    def test_parse_arguments_extract(self):
+        arguments = main.parse_arguments(["extract", "results/run"])
+        self.assertEqual(arguments.command, "extract")
+        self.assertEqual(arguments.results_folder, "results/run")
+
 class TestMainEntryPoint(unittest.TestCase):
     @patch('main.perform_search')
     @patch('main.setup')
@@ -42,6 +83,33 @@ class TestMainEntryPoint(unittest.TestCase):
         mock_perform_search.assert_called_once()
         self.assertEqual(result, 0)
 
+    @patch('main.build_trigram_index')
+    @patch('main.perform_search')
+    @patch('main.setup')
+    def test_main_builds_trigram_index(self, mock_setup, mock_perform_search, mock_build_trigram_index):
+        result = main.main(["build-index"])
+        mock_setup.assert_called_once_with(create_results_directory=False)
+        mock_build_trigram_index.assert_called_once()
+        mock_perform_search.assert_not_called()
+        self.assertEqual(result, 0)
+
+    @patch('main.extract_recorded_matches')
+    @patch('main.perform_search')
+    @patch('main.setup')
+    def test_main_extracts_recorded_matches(self, mock_setup, mock_perform_search, mock_extract_recorded_matches):
+        result = main.main(["extract", "results/run"])
+        mock_setup.assert_called_once_with(extract_results_directory="results/run")
+        mock_extract_recorded_matches.assert_called_once()
+        mock_perform_search.assert_not_called()
+        self.assertEqual(result, 0)
+
+    @patch('main.perform_search')
+    @patch('main.setup')
+    def test_main_resumes_search(self, mock_setup, mock_perform_search):
+        main.main(["--resume", "results/run"])
+        mock_setup.assert_called_once_with("results/run")
+        mock_perform_search.assert_called_once_with(resume=True)
+
     @patch('main.main', return_value=0)
     @patch('main.sys')
     def test_entry_point_calls_sys_exit(self, mock_sys, mock_main):
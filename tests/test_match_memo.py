@@ -0,0 +1,76 @@
+import re
+import sqlite3
+
+import pytest
+
+import match_memo
+from match_memo import MatchMemo, get_memo_definition_fingerprint, get_memo_payload_key
+
+PAYLOAD_KEY = ("sha1:ABC", (None,))
+
+
+@pytest.fixture
+def memo_file_path(tmp_path):
+    return str(tmp_path / "memo.sqlite3")
+
+def open_memo(memo_file_path: str, results_and_regexes_dict: dict) -> MatchMemo:
+    memo = MatchMemo(memo_file_path, results_and_regexes_dict)
+    memo.start_worker()
+    return memo
+
+
+def test_get_memo_definition_fingerprint_depends_on_pattern_and_flags():
+    assert get_memo_definition_fingerprint(re.compile(r"secret")) == get_memo_definition_fingerprint(re.compile(r"secret"))
+    assert get_memo_definition_fingerprint(re.compile(r"secret")) != get_memo_definition_fingerprint(re.compile(r"secret", re.IGNORECASE))
+    assert get_memo_definition_fingerprint(re.compile(r"secret")) != get_memo_definition_fingerprint(re.compile(r"token"))
+
+def test_get_memo_payload_key_depends_on_digest_and_context():
+    assert len(get_memo_payload_key(PAYLOAD_KEY)) == 16
+    assert get_memo_payload_key(PAYLOAD_KEY) != get_memo_payload_key(("sha1:ABC", ("shift_jis",)))
+    assert get_memo_payload_key(PAYLOAD_KEY) != get_memo_payload_key(("sha1:DEF", (None,)))
+
+def test_matches_and_no_matches_persist_across_searches(memo_file_path):
+    results_and_regexes_dict = {"keys.txt": re.compile(r"key"), "tokens.txt": re.compile(r"token")}
+    memo = open_memo(memo_file_path, results_and_regexes_dict)
+    memo.add_matches(PAYLOAD_KEY, {"keys.txt": ["key", "key"], "tokens.txt": []})
+    # Pending rows are found before they are written
+    assert memo.get_matches(PAYLOAD_KEY, ["keys.txt", "tokens.txt"]) == {"keys.txt": ["key", "key"], "tokens.txt": []}
+    memo.finish_worker()
+
+    # A later search finds them by the definition's regex, whatever its results file
+    memo = open_memo(memo_file_path, {"renamed_keys.txt": re.compile(r"key"), "urls.txt": re.compile(r"https?://")})
+    assert memo.get_matches(PAYLOAD_KEY, ["renamed_keys.txt", "urls.txt"]) == {"renamed_keys.txt": ["key", "key"]}
+    assert memo.get_matches(("sha1:DEF", (None,)), ["renamed_keys.txt", "urls.txt"]) == {}
+    memo.finish_worker()
+
+def test_no_matches_are_stored_as_null(memo_file_path):
+    memo = open_memo(memo_file_path, {"keys.txt": re.compile(r"key")})
+    memo.add_matches(PAYLOAD_KEY, {"keys.txt": []})
+    memo.finish_worker()
+
+    with sqlite3.connect(memo_file_path) as connection:
+        assert connection.execute("SELECT matches FROM matches").fetchall() == [(None,)]
+
+def test_pending_rows_are_written_once_too_many_are_held(memo_file_path, monkeypatch):
+    monkeypatch.setattr(match_memo, "MAX_PENDING_ROWS", 2)
+    memo = open_memo(memo_file_path, {"keys.txt": re.compile(r"key")})
+    memo.add_matches(("sha1:A", (None,)), {"keys.txt": ["key"]})
+    assert memo.pending_rows
+    memo.add_matches(("sha1:B", (None,)), {"keys.txt": []})
+    assert not memo.pending_rows
+
+    other_memo = open_memo(memo_file_path, {"keys.txt": re.compile(r"key")})
+    assert other_memo.get_matches(("sha1:A", (None,)), ["keys.txt"]) == {"keys.txt": ["key"]}
+    other_memo.finish_worker()
+    memo.finish_worker()
+
+def test_unreadable_memo_is_searched_again(memo_file_path, monkeypatch):
+    warnings = []
+    monkeypatch.setattr(match_memo, "log_warning", warnings.append)
+    memo = open_memo(memo_file_path, {"keys.txt": re.compile(r"key")})
+    memo.connection.execute("DROP TABLE matches")
+
+    assert memo.get_matches(PAYLOAD_KEY, ["keys.txt"]) == {}
+    memo.add_matches(PAYLOAD_KEY, {"keys.txt": ["key"]})
+    memo.finish_worker()
+    assert len(warnings) == 2
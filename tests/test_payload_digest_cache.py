@@ -0,0 +1,76 @@
+import pytest
+
+import payload_digest_cache
+from payload_digest_cache import COMPUTED_DIGEST_PREFIX, PayloadDigestCache, get_payload_context, get_payload_digest, get_payload_key
+from warc_record import PayloadIdentity, WarcRecord
+
+
+@pytest.fixture(autouse=True)
+def patch_settings(monkeypatch):
+    monkeypatch.setitem(payload_digest_cache.config.settings, "DETECT_CONTENTS_CHARSET", False)
+    monkeypatch.setitem(payload_digest_cache.config.settings, "DECODE_HTTP_PAYLOADS", False)
+
+def make_record(contents: bytes = b"body", payload_digest: str | None = "sha1:ABC", record_id: str | None = "<urn:uuid:1>", **kwargs) -> WarcRecord:
+    return WarcRecord("a.gz", "http://a.com/", contents, payload_identity=PayloadIdentity(payload_digest, record_id), **kwargs)
+
+
+def test_get_payload_digest():
+    assert get_payload_digest(make_record()) == "sha1:ABC"
+
+    computed_digest = get_payload_digest(make_record(payload_digest=None))
+    assert computed_digest.startswith(COMPUTED_DIGEST_PREFIX)
+    assert computed_digest == get_payload_digest(WarcRecord("b.gz", "http://b.com/", memoryview(b"body")))
+    assert computed_digest != get_payload_digest(WarcRecord("b.gz", "http://b.com/", b"other body"))
+
+def test_get_payload_context(monkeypatch):
+    warc_record = make_record(charset="shift_jis", http_headers=b"HTTP/1.1 200 OK\r\nContent-Encoding: gzip\r\n")
+    assert get_payload_context(warc_record) == (None,)
+
+    monkeypatch.setitem(payload_digest_cache.config.settings, "DETECT_CONTENTS_CHARSET", True)
+    monkeypatch.setitem(payload_digest_cache.config.settings, "DECODE_HTTP_PAYLOADS", True)
+    assert get_payload_context(warc_record) == ("shift_jis", (), ("gzip",))
+
+def test_cached_matches_are_reused_only_with_the_same_decoding(monkeypatch):
+    digest_cache = PayloadDigestCache(10)
+    warc_record = make_record()
+    payload_key = get_payload_key(warc_record)
+    assert digest_cache.get_matches(warc_record, payload_key) is None
+
+    digest_cache.add_matches(warc_record, payload_key, {"keys.txt": ["secret"]})
+    duplicate_warc_record = make_record(record_id="<urn:uuid:2>")
+    matches_in_contents_dict = digest_cache.get_matches(duplicate_warc_record, get_payload_key(duplicate_warc_record))
+    assert matches_in_contents_dict == {"keys.txt": ["secret"]}
+
+    # The copy returned can be changed without changing the cached matches
+    matches_in_contents_dict["keys.txt"] = []
+    assert digest_cache.get_matches(warc_record, payload_key) == {"keys.txt": ["secret"]}
+    # Revisit records can refer to the duplicate too
+    assert digest_cache.payload_digests_by_record_id == {"<urn:uuid:1>": "sha1:ABC", "<urn:uuid:2>": "sha1:ABC"}
+
+    monkeypatch.setitem(payload_digest_cache.config.settings, "DETECT_CONTENTS_CHARSET", True)
+    assert digest_cache.get_matches(warc_record, get_payload_key(make_record(charset="shift_jis"))) is None
+
+def test_least_recently_used_payloads_are_dropped():
+    digest_cache = PayloadDigestCache(2)
+    warc_records = [make_record(payload_digest=f"sha1:{index}", record_id=f"<urn:uuid:{index}>") for index in range(3)]
+    payload_keys = [get_payload_key(warc_record) for warc_record in warc_records]
+    for index, warc_record in enumerate(warc_records):
+        digest_cache.add_matches(warc_record, payload_keys[index], {"keys.txt": [str(index)]})
+        if index == 1:
+            digest_cache.get_matches(warc_records[0], payload_keys[0])
+
+    assert digest_cache.get_matches(warc_records[0], payload_keys[0]) == {"keys.txt": ["0"]}
+    assert digest_cache.get_matches(warc_records[1], payload_keys[1]) is None
+    assert len(digest_cache.payload_digests_by_record_id) == 2
+
+def test_get_revisit_matches_by_digest_or_refers_to():
+    digest_cache = PayloadDigestCache(10)
+    for warc_record, matches in ((make_record(), ["by digest"]), (make_record(b"other", None, "<urn:uuid:2>"), ["by record ID"])):
+        digest_cache.add_matches(warc_record, get_payload_key(warc_record), {"keys.txt": matches})
+
+    assert digest_cache.get_revisit_matches(PayloadIdentity("sha1:ABC", "<urn:uuid:3>", None, True)) == {"keys.txt": ["by digest"]}
+    assert digest_cache.get_revisit_matches(PayloadIdentity("sha1:DEF", "<urn:uuid:3>", "<urn:uuid:2>", True)) == {"keys.txt": ["by record ID"]}
+    assert digest_cache.get_revisit_matches(PayloadIdentity("sha1:DEF", "<urn:uuid:3>", "<urn:uuid:9>", True)) is None
+
+    digest_cache.clear()
+    assert digest_cache.get_revisit_matches(PayloadIdentity("sha1:ABC", "<urn:uuid:3>", None, True)) is None
@@ -0,0 +1,113 @@
+import time
+import pytest
+
+from record_batcher import RecordBatcher, get_batch_item_size
+from in_flight_compression import CompressedWarcRecord
+from spill_queue import SpillSegment
+from streaming_search import SpooledWarcRecord
+from warc_members import WarcMember
+from warc_record import WarcRecord
+
+
+class FakeQueue:
+    def __init__(self):
+        self.items = []
+    def put(self, item):
+        self.items.append(item)
+
+def make_record(contents=b"data"):
+    return WarcRecord(parent_warc_gz_file="parent.gz", name="http://example.com", contents=contents)
+
+def test_add_flushes_when_max_records_reached():
+    fake_queue = FakeQueue()
+    batcher = RecordBatcher(fake_queue, max_records=3, max_bytes=1024, flush_timeout_seconds=10)
+
+    records = [make_record() for _ in range(4)]
+    for record in records:
+        batcher.add(record)
+
+    assert fake_queue.items == [records[:3]]
+    assert batcher.batch == [records[3]]
+
+def test_add_flushes_when_max_bytes_reached():
+    fake_queue = FakeQueue()
+    batcher = RecordBatcher(fake_queue, max_records=100, max_bytes=10, flush_timeout_seconds=10)
+
+    first = make_record(b"12345")
+    second = make_record(b"67890")
+    batcher.add(first)
+    assert fake_queue.items == []
+    batcher.add(second)
+
+    assert fake_queue.items == [[first, second]]
+    assert batcher.batch == []
+    assert batcher.batch_bytes == 0
+
+def test_flush_puts_partial_batch():
+    fake_queue = FakeQueue()
+    batcher = RecordBatcher(fake_queue, max_records=100, max_bytes=1024, flush_timeout_seconds=10)
+
+    record = make_record()
+    batcher.add(record)
+    batcher.flush()
+
+    assert fake_queue.items == [[record]]
+
+def test_flush_does_nothing_when_empty():
+    fake_queue = FakeQueue()
+    batcher = RecordBatcher(fake_queue, max_records=100, max_bytes=1024, flush_timeout_seconds=10)
+
+    batcher.flush()
+    assert fake_queue.items == []
+
+def test_close_flushes_remaining_records_and_stops_thread():
+    fake_queue = FakeQueue()
+    batcher = RecordBatcher(fake_queue, max_records=100, max_bytes=1024, flush_timeout_seconds=10)
+    batcher.start()
+
+    record = make_record()
+    batcher.add(record)
+    batcher.close()
+
+    assert fake_queue.items == [[record]]
+    assert not batcher.flush_thread.is_alive()
+
+def test_close_without_start():
+    fake_queue = FakeQueue()
+    batcher = RecordBatcher(fake_queue, max_records=100, max_bytes=1024, flush_timeout_seconds=10)
+    batcher.close()
+    assert fake_queue.items == []
+
+def test_stale_batch_is_flushed_after_timeout():
+    fake_queue = FakeQueue()
+    batcher = RecordBatcher(fake_queue, max_records=100, max_bytes=1024, flush_timeout_seconds=0.05)
+    batcher.start()
+
+    record = make_record()
+    batcher.add(record)
+
+    deadline = time.monotonic() + 5
+    while not fake_queue.items and time.monotonic() < deadline:
+        time.sleep(0.01)
+    batcher.close()
+
+    assert fake_queue.items == [[record]]
+
+def test_warc_members_are_sized_by_member_length():
+    fake_queue = FakeQueue()
+    batcher = RecordBatcher(fake_queue, max_records=100, max_bytes=100, flush_timeout_seconds=10)
+
+    first = WarcMember("parent.gz", 0, 60)
+    second = WarcMember("parent.gz", 60, 40)
+    batcher.add(first)
+    assert batcher.batch_bytes == 60
+    batcher.add(second)
+
+    assert fake_queue.items == [[first, second]]
+
+def test_get_batch_item_size():
+    assert get_batch_item_size(make_record(b"12345")) == 5
+    assert get_batch_item_size(WarcMember("parent.gz", 0, 42)) == 42
+    assert get_batch_item_size(SpooledWarcRecord("parent.gz", "http://example.com", "spool/a.record")) == 0
+    assert get_batch_item_size(SpillSegment("spill/a.segment", 5)) == 0
+    assert get_batch_item_size(CompressedWarcRecord("parent.gz", "http://example.com", b"123", "zlib")) == 3
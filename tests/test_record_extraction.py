@@ -0,0 +1,134 @@
+import io
+import os
+import pickle
+import zipfile
+
+from blob_store import BlobStore
+from record_extraction import (BlobStoreExtraction, DeferredExtraction, RecordExtraction, WarcGzExtraction, ZipArchiveExtraction,
+                               add_record_to_zip_archive, add_streamed_record_to_zip_archive)
+from search_statistics import SearchStatistics
+from streaming_search import StreamedWarcRecord
+from warc_members import WarcMember
+from warc_record import WarcRecord
+from zip_compression import ZipCompressionPolicy
+
+
+def test_record_extraction_defaults():
+    record_extraction = RecordExtraction()
+    assert record_extraction.needs_http_headers is False
+    assert record_extraction.get_streamed_contents_directory() is None
+    search_statistics = SearchStatistics()
+    record_extraction.start_worker(["keys_results.txt"], "temp", 0, search_statistics)
+    assert record_extraction.search_statistics is search_statistics
+
+def test_zip_archive_extraction_needs_http_headers_to_store_compressed_formats():
+    assert ZipArchiveExtraction(None).needs_http_headers is False
+    assert ZipArchiveExtraction(ZipCompressionPolicy("deflate", None, False)).needs_http_headers is False
+    assert ZipArchiveExtraction(ZipCompressionPolicy("deflate", None, True)).needs_http_headers is True
+
+def test_zip_archive_extraction_is_handed_to_worker_processes_before_it_starts():
+    # The extraction selected by the main process is pickled for each worker process, before any zip archive is opened
+    record_extraction = pickle.loads(pickle.dumps(ZipArchiveExtraction(ZipCompressionPolicy("lzma", {"pages": "stored"}, True))))
+    assert record_extraction.zip_compression_policy.store_compressed_formats is True
+    assert record_extraction.zip_archives_dict == {}
+
+def test_zip_archive_extraction_adds_records_to_zip_archives_of_their_definitions(tmp_path):
+    record_extraction = ZipArchiveExtraction(None)
+    keys_results_file_path, tokens_results_file_path = str(tmp_path / "keys_results.txt"), str(tmp_path / "tokens_results.txt")
+    record_extraction.start_worker([keys_results_file_path, tokens_results_file_path], str(tmp_path), 0, SearchStatistics())
+    assert record_extraction.get_streamed_contents_directory() == str(tmp_path)
+
+    record_extraction.add_record(WarcRecord("parent.gz", "http://a.com/", b"key"), [keys_results_file_path, tokens_results_file_path])
+    streamed_warc_record = StreamedWarcRecord("parent.gz", "http://a.com/big", io.BytesIO(b""))
+    record_extraction.add_streamed_record(streamed_warc_record, io.BytesIO(b"big key"), [tokens_results_file_path])
+    record_extraction.finish_worker()
+
+    with zipfile.ZipFile(tmp_path / "keys_results.zip") as zip_archive:
+        assert zip_archive.namelist() == ["a.com"]
+    with zipfile.ZipFile(tmp_path / "tokens_results.zip") as zip_archive:
+        assert zip_archive.namelist() == ["a.com", "a.combig"]
+        assert zip_archive.read("a.combig") == b"big key"
+    assert record_extraction.zip_archives_dict == {}
+
+def test_zip_archive_extraction_checkpoint_starts_new_segments(tmp_path):
+    record_extraction = ZipArchiveExtraction(None)
+    keys_results_file_path = str(tmp_path / "keys_results.txt")
+    record_extraction.start_worker([keys_results_file_path], str(tmp_path), 0, SearchStatistics())
+
+    record_extraction.add_record(WarcRecord("parent.gz", "http://a.com/", b"key"), [keys_results_file_path])
+    record_extraction.checkpoint(1)
+    record_extraction.add_record(WarcRecord("parent.gz", "http://b.com/", b"key"), [keys_results_file_path])
+    record_extraction.finish_worker()
+
+    # The segment closed by the checkpoint can be read, and the records added after it go to the segment of the checkpoint generation
+    with zipfile.ZipFile(tmp_path / "keys_results.zip") as zip_archive:
+        assert zip_archive.namelist() == ["a.com"]
+    with zipfile.ZipFile(tmp_path / "keys_results.1.zip") as zip_archive:
+        assert zip_archive.namelist() == ["b.com"]
+
+def test_add_record_to_zip_archive_follows_zip_compression_policy(tmp_path):
+    zip_compression_policy = ZipCompressionPolicy("deflate", {"pages": "lzma"}, True)
+    search_statistics = SearchStatistics()
+
+    with zipfile.ZipFile(tmp_path / "pages.zip", "w", zipfile.ZIP_DEFLATED) as zip_archive:
+        add_record_to_zip_archive(WarcRecord("parent.gz", "http://a.com/", b"<html>" * 100), "pages_results.txt", zip_archive,
+                                  zip_compression_policy, search_statistics)
+        add_record_to_zip_archive(WarcRecord("parent.gz", "http://a.com/logo", b"\x89PNG\r\n\x1a\n" + bytes(100)), "pages_results.txt", zip_archive,
+                                  zip_compression_policy, search_statistics)
+        streamed_warc_record = StreamedWarcRecord("parent.gz", "http://a.com/big", io.BytesIO(b"<html>" * 100))
+        add_streamed_record_to_zip_archive(streamed_warc_record, streamed_warc_record.contents_stream, "other_results.txt", zip_archive,
+                                           zip_compression_policy, search_statistics)
+
+        assert [zip_info.compress_type for zip_info in zip_archive.infolist()] == [zipfile.ZIP_LZMA, zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED]
+    assert search_statistics.zip_compression["pages_results.txt"]["files"] == 2
+    assert search_statistics.zip_compression["pages_results.txt"]["stored files"] == 1
+    assert search_statistics.zip_compression["other_results.txt"]["compressed bytes"] < 600
+
+def test_warc_gz_extraction_counts_records_not_read_by_offset():
+    added = []
+    class FakeExtractor:
+        def add_member(self, warc_member, results_file_paths):
+            added.append((warc_member, results_file_paths))
+            return len(results_file_paths)
+    record_extraction = WarcGzExtraction(FakeExtractor())
+    record_extraction.search_statistics = SearchStatistics()
+    warc_member = WarcMember("parent.gz", 100, 50)
+
+    record_extraction.add_record(WarcRecord("parent.gz", "http://a.com/", b"key", warc_member=warc_member), ["a.txt", "b.txt"])
+    record_extraction.add_record(WarcRecord("parent.gz", "http://b.com/", b"key"), ["a.txt"])
+    record_extraction.add_record(WarcRecord("parent.gz", "http://c.com/", b"none", warc_member=warc_member), [])
+
+    assert added == [(warc_member, ["a.txt", "b.txt"])]
+    assert record_extraction.search_statistics.warc_gz_extraction == {"copied members": 2, "copied bytes": 100, "unlocated records": 1}
+
+def test_deferred_extraction_counts_records_not_read_by_offset():
+    recorded = []
+    class FakeRecorder:
+        def add_record(self, warc_member, results_file_paths):
+            recorded.append((warc_member, results_file_paths))
+            return len(results_file_paths)
+    record_extraction = DeferredExtraction(FakeRecorder())
+    record_extraction.search_statistics = SearchStatistics()
+    warc_member = WarcMember("parent.gz", 100, 50)
+
+    record_extraction.add_record(WarcRecord("parent.gz", "http://a.com/", b"key", warc_member=warc_member), ["a.txt", "b.txt"])
+    record_extraction.add_record(WarcRecord("parent.gz", "http://b.com/", b"key"), ["a.txt"])
+    record_extraction.add_record(WarcRecord("parent.gz", "http://c.com/", b"none", warc_member=warc_member), [])
+
+    assert recorded == [(warc_member, ["a.txt", "b.txt"])]
+    assert record_extraction.search_statistics.deferred_extraction["recorded locations"] == 2
+    assert record_extraction.search_statistics.deferred_extraction["unlocated records"] == 1
+
+def test_blob_store_extraction_writes_contents_once(tmp_path):
+    record_extraction = BlobStoreExtraction(BlobStore(str(tmp_path / "blobs")))
+    search_statistics = SearchStatistics()
+    record_extraction.start_worker(["keys_results.txt", "pages_results.txt"], str(tmp_path), 0, search_statistics)
+    assert record_extraction.get_streamed_contents_directory() == str(tmp_path / "blobs")
+
+    record_extraction.add_record(WarcRecord("parent.gz", "http://a.com/", b"<html>key</html>"), ["keys_results.txt", "pages_results.txt"])
+    record_extraction.add_record(WarcRecord("parent.gz", "http://b.com/", b"<html>key</html>"), ["keys_results.txt"])
+    record_extraction.add_record(WarcRecord("parent.gz", "http://c.com/", b"unmatched"), [])
+    record_extraction.finish_worker()
+
+    assert search_statistics.blob_store == {"listed files": 3, "blobs written": 1, "bytes written": 16, "duplicate bytes": 32}
+    assert len(os.listdir(tmp_path / "blobs")) == 1
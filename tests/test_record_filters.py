@@ -0,0 +1,98 @@
+import datetime
+import re
+import pytest
+
+from record_filters import (RecordFilter, create_record_filter, is_status_code_in_ranges, is_within_date_range,
+                            matches_content_type)
+
+UTC = datetime.timezone.utc
+
+
+class FakeHttpHeaders(dict):
+    def __init__(self, status_code, content_type):
+        super().__init__({"Content-Type": content_type} if content_type else {})
+        self.status_code = status_code
+
+class FakeRecord:
+    def __init__(self, uri="http://example.com/page", content_length=1000, record_date=datetime.datetime(2024, 1, 2, tzinfo=UTC),
+                 status_code=200, content_type="text/html", is_http=True):
+        self.headers = {"WARC-Target-URI": uri}
+        self.content_length = content_length
+        self.record_date = record_date
+        self.http_headers = FakeHttpHeaders(status_code, content_type) if is_http else None
+        self.http_content_type = content_type if is_http else None
+
+def make_settings(**filter_settings):
+    settings = {
+        "FILTER_HTTP_STATUS_CODES": None, "FILTER_CONTENT_TYPES_ALLOWED": None, "FILTER_CONTENT_TYPES_DENIED": None,
+        "FILTER_MIN_CONTENT_LENGTH_KB": None, "FILTER_MAX_CONTENT_LENGTH_KB": None, "FILTER_WARC_DATE_FROM": None,
+        "FILTER_WARC_DATE_TO": None, "FILTER_URI_INCLUDE_REGEX": None, "FILTER_URI_EXCLUDE_REGEX": None,
+    }
+    settings.update(filter_settings)
+    return settings
+
+def test_create_record_filter_without_filters():
+    assert create_record_filter(make_settings()) is None
+
+def test_create_record_filter():
+    record_filter = create_record_filter(make_settings(FILTER_MAX_CONTENT_LENGTH_KB=2, FILTER_URI_EXCLUDE_REGEX=r"\.PNG$"))
+    assert record_filter.max_content_length == 2048
+    assert record_filter.min_content_length is None
+    assert record_filter.uri_exclude_regex.search("http://a.com/image.png")
+    assert not record_filter.needs_http_headers
+
+@pytest.mark.parametrize("record_filter, record, expected_skip_reason", [
+    (RecordFilter(min_content_length=2000), FakeRecord(), 'content length'),
+    (RecordFilter(max_content_length=500), FakeRecord(), 'content length'),
+    (RecordFilter(min_content_length=1000, max_content_length=1000), FakeRecord(), None),
+    (RecordFilter(warc_date_from=datetime.datetime(2024, 2, 1, tzinfo=UTC)), FakeRecord(), 'WARC-Date'),
+    (RecordFilter(warc_date_to=datetime.datetime(2024, 1, 1, tzinfo=UTC)), FakeRecord(), 'WARC-Date'),
+    (RecordFilter(warc_date_to=datetime.datetime(2024, 1, 1, tzinfo=UTC)), FakeRecord(record_date=None), 'WARC-Date'),
+    (RecordFilter(uri_include_regex=re.compile("other")), FakeRecord(), 'URI'),
+    (RecordFilter(uri_include_regex=re.compile("example")), FakeRecord(), None),
+    (RecordFilter(uri_exclude_regex=re.compile("example")), FakeRecord(), 'URI'),
+    (RecordFilter(status_code_ranges=[(200, 299)]), FakeRecord(status_code=404), 'HTTP status code'),
+    (RecordFilter(status_code_ranges=[(200, 299)]), FakeRecord(is_http=False), 'HTTP status code'),
+    (RecordFilter(status_code_ranges=[(200, 299)]), FakeRecord(status_code=204), None),
+    (RecordFilter(allowed_content_types=["text/*"]), FakeRecord(content_type="image/png"), 'Content-Type'),
+    (RecordFilter(allowed_content_types=["text/*"]), FakeRecord(content_type=None), 'Content-Type'),
+    (RecordFilter(allowed_content_types=["text/*"]), FakeRecord(content_type="Text/HTML"), None),
+    (RecordFilter(denied_content_types=["image/*", "video/mp4"]), FakeRecord(content_type="video/mp4"), 'Content-Type'),
+    (RecordFilter(denied_content_types=["image/*"]), FakeRecord(content_type=None), None),
+    (RecordFilter(denied_content_types=["image/*"]), FakeRecord(is_http=False), None),
+])
+def test_get_skip_reason(record_filter, record, expected_skip_reason):
+    assert record_filter.get_skip_reason(record) == expected_skip_reason
+
+def test_record_filter_counts_skipped_records():
+    record_filter = RecordFilter(max_content_length=500, denied_content_types=["image/*"])
+
+    assert record_filter(FakeRecord(content_length=100)) is True
+    assert record_filter(FakeRecord(content_length=1000)) is False
+    assert record_filter(FakeRecord(content_length=100, content_type="image/gif")) is False
+
+    assert record_filter.skipped_records["content length"] == 1
+    assert record_filter.skipped_records["Content-Type"] == 1
+    record_filter.reset_skipped_records()
+    assert sum(record_filter.skipped_records.values()) == 0
+
+def test_needs_http_headers():
+    assert RecordFilter(status_code_ranges=[(200, 200)]).needs_http_headers
+    assert RecordFilter(denied_content_types=["image/*"]).needs_http_headers
+    assert not RecordFilter(min_content_length=1, uri_exclude_regex=re.compile("a")).needs_http_headers
+
+def test_is_within_date_range_assumes_utc_for_naive_dates():
+    date_from = datetime.datetime(2024, 1, 1, tzinfo=UTC)
+    assert is_within_date_range(datetime.datetime(2024, 1, 1), date_from, None)
+    assert not is_within_date_range(datetime.datetime(2023, 12, 31, 23, 59), date_from, None)
+
+def test_is_status_code_in_ranges():
+    assert is_status_code_in_ranges(301, [(200, 200), (300, 399)])
+    assert not is_status_code_in_ranges(404, [(200, 200), (300, 399)])
+    assert not is_status_code_in_ranges(None, [(200, 200)])
+
+def test_matches_content_type():
+    assert matches_content_type("image/png", ["image/*"])
+    assert matches_content_type("text/html", ["text/html"])
+    assert not matches_content_type("text/htmlx", ["text/html"])
+    assert not matches_content_type("imagex/png", ["image/*"])
@@ -0,0 +1,126 @@
+import random
+import re
+import pytest
+
+from record_text import (RecordText, compile_bytes_regex, create_bytes_regexes_dict, find_bytes_regex_matches,
+                         find_html_meta_charset, get_charset_from_content_type, get_contents_encoding, get_http_charset,
+                         is_ascii_compatible_encoding)
+from utilities import find_regex_matches
+
+
+def test_record_text_decodes_once():
+    record_text = RecordText(memoryview("café".encode()))
+    assert record_text.get_ascii_contents() is None
+    assert record_text.decoded_text is None
+    decoded_text = record_text.get_decoded_text()
+    assert decoded_text == "café"
+    assert record_text.get_decoded_text() is decoded_text
+
+def test_record_text_decodes_memoryview_without_copying():
+    contents = memoryview(b"plain")
+    record_text = RecordText(contents)
+    assert record_text.get_decoded_text() == "plain"
+    assert record_text.contents is contents
+    # Contents are only copied to be checked for non-ASCII bytes, once
+    ascii_contents = record_text.get_ascii_contents()
+    assert ascii_contents == b"plain" and isinstance(ascii_contents, bytes)
+    assert record_text.get_ascii_contents() is ascii_contents
+
+def test_record_text_with_encoding():
+    record_text = RecordText("café".encode("cp1252"), "cp1252")
+    assert record_text.get_decoded_text() == "café"
+    assert RecordText(b"plain", "cp1252").get_ascii_contents() == b"plain"
+    # ASCII bytes do not decode to the same characters in UTF-16
+    assert RecordText(b"plain", "utf-16-le").get_ascii_contents() is None
+
+@pytest.mark.parametrize("content_type, expected_charset", [
+    ("text/html; charset=UTF-8", "UTF-8"),
+    ('text/html; Charset="Shift_JIS"', "Shift_JIS"),
+    ("text/html", None),
+    (None, None),
+])
+def test_get_charset_from_content_type(content_type, expected_charset):
+    assert get_charset_from_content_type(content_type) == expected_charset
+
+def test_get_http_charset():
+    class FakeRecord:
+        http_headers = {"Content-Type": "text/html; charset=koi8-r"}
+    assert get_http_charset(FakeRecord()) == "koi8-r"
+    FakeRecord.http_headers = None
+    assert get_http_charset(FakeRecord()) is None
+
+def test_find_html_meta_charset():
+    assert find_html_meta_charset(b'<html><head><meta charset="windows-1251">') == "windows-1251"
+    assert find_html_meta_charset(b'<meta http-equiv="Content-Type" content="text/html; charset=euc-jp">') == "euc-jp"
+    assert find_html_meta_charset(b'<meta name="description">') is None
+    # Meta tags after the first 1024 bytes are ignored
+    assert find_html_meta_charset(b" " * 1024 + b'<meta charset="euc-jp">') is None
+
+@pytest.mark.parametrize("contents, declared_charset, expected_encoding", [
+    (b"text", "Shift_JIS", "shift_jis"),
+    (b'<meta charset="latin-1">', None, "iso8859-1"),
+    (b'<meta charset="latin-1">', "cp1252", "cp1252"),
+    (b'<meta charset="unknown">', "unknown", "utf-8"),
+    (b"text", None, "utf-8"),
+])
+def test_get_contents_encoding(contents, declared_charset, expected_encoding):
+    assert get_contents_encoding(contents, declared_charset) == expected_encoding
+
+def test_is_ascii_compatible_encoding():
+    assert is_ascii_compatible_encoding("utf-8")
+    assert is_ascii_compatible_encoding("cp1252")
+    assert is_ascii_compatible_encoding("shift_jis")
+    assert not is_ascii_compatible_encoding("utf-16-le")
+    assert not is_ascii_compatible_encoding("utf-7")
+    assert not is_ascii_compatible_encoding("cp500")
+
+def test_compile_bytes_regex():
+    bytes_regex = compile_bytes_regex(re.compile(r"api_key=\w+", re.IGNORECASE | re.MULTILINE))
+    assert bytes_regex.pattern == rb"api_key=\w+"
+    assert bytes_regex.flags & (re.IGNORECASE | re.MULTILINE)
+    assert find_bytes_regex_matches(b"API_KEY=abc", bytes_regex) == ["API_KEY=abc"]
+
+@pytest.mark.parametrize("pattern", [r"café", r"(?u)abc", "ſecret", r"a\sb", r"[^\S]", r"a\\\sb"])
+def test_compile_bytes_regex_without_bytes_equivalent(pattern):
+    assert compile_bytes_regex(re.compile(pattern, re.IGNORECASE)) is None
+
+def test_compile_bytes_regex_with_whitespace_escape():
+    # \s matches the separator characters \x1c to \x1f in a str regex, but not in a bytes regex
+    assert re.compile(r"a\sb", re.IGNORECASE).findall("a\x1cb") == ["a\x1cb"]
+    assert re.compile(rb"a\sb", re.IGNORECASE).findall(b"a\x1cb") == []
+
+    # With re.ASCII, the str regex does not match them either, and an escaped backslash followed by s is no \s escape
+    assert compile_bytes_regex(re.compile(r"a\sb", re.ASCII)).pattern == rb"a\sb"
+    assert compile_bytes_regex(re.compile(r"a\\sb")).pattern == rb"a\\sb"
+
+def test_create_bytes_regexes_dict():
+    bytes_regexes_dict = create_bytes_regexes_dict({"a.txt": re.compile("abc"), "b.txt": re.compile("é")})
+    assert list(bytes_regexes_dict) == ["a.txt"]
+
+def test_bytes_regex_matches_identical_on_ascii_contents():
+    # Plan:
+    # - Search random ASCII contents with each definition's str regex and bytes regex
+    # - Both must find exactly the same matches
+    patterns = [
+        r"api_?key\s*=\s*\w+", r"\w+@\w+\.com", r"alpha|alph", r"\bbe\w*", r"a.a", r"(ab)+", r"[a-z]{3}", r"(a)\1",
+        r"a*", r"(?s)a.b", r"delta\b", r"\d+", r"(?<=a)b", r"^al", r"x$", r"[^a-z]+", r"\W\S", r"Key", r"K", r"(?-i:Ab)",
+    ]
+    characters = "abtelpha_ky=@.com 12SE\nxdABK\t-\x1c\x1f\x0b"
+    random_generator = random.Random(7)
+    for flags in (re.IGNORECASE, re.MULTILINE, 0, re.ASCII):
+        regexes = [re.compile(pattern, flags) for pattern in patterns]
+        bytes_regexes = [compile_bytes_regex(regex) for regex in regexes]
+        for _ in range(300):
+            input_string = "".join(random_generator.choice(characters) for _ in range(random_generator.randint(0, 60)))
+            for regex, bytes_regex in zip(regexes, bytes_regexes):
+                # Definitions without a bytes regex are searched as decoded text
+                if bytes_regex is not None:
+                    assert find_bytes_regex_matches(input_string.encode(), bytes_regex) == find_regex_matches(input_string, regex)
+
+@pytest.mark.parametrize("pattern", [r"\w", r"\W", r"\d", r"\D", r"x?\b", r"x?\B", r"[\w\d]"])
+def test_bytes_regex_escapes_match_identical_ascii_characters(pattern):
+    # Unlike \s, these escapes match the same ASCII characters in a str regex and a bytes regex
+    for flags in (0, re.IGNORECASE):
+        bytes_regex = compile_bytes_regex(re.compile(pattern, flags))
+        for character in map(chr, range(128)):
+            assert find_bytes_regex_matches(character.encode(), bytes_regex) == re.findall(pattern, character, flags)
@@ -25,6 +25,7 @@ def patch_dependencies(monkeypatch, tmp_path):
         "SEARCH_REGEX_DEFINITIONS_DIRECTORY": str(search_dir),
         "RESULTS_OUTPUT_DIRECTORY": str(tmp_path),
         "ZIP_FILES_WITH_MATCHES": False,
+        "LITERAL_PREFILTER": False,
     })
     # Patch results_output_subdirectory global
     monkeypatch.setattr(results, "results_output_subdirectory", str(tmp_path))
@@ -84,6 +85,24 @@ def test_mixed_valid_and_invalid_regex(tmp_path, patch_dependencies):
     assert result[key].pattern == r"foo.*bar"
     assert dummy_logger.errors  # Should log error for bad.txt
 
+def test_builds_literal_prefilters_with_regex_patterns(tmp_path, patch_dependencies, monkeypatch):
+    search_dir, _ = patch_dependencies
+    write_definition_file(search_dir / "keys.txt", r"api_key=\w+")
+    write_definition_file(search_dir / "digits.txt", r"\d+")
+    monkeypatch.setitem(results.config.settings, "LITERAL_PREFILTER", True)
+    monkeypatch.setattr(results, "get_results_file_path", lambda p: str(tmp_path / (os.path.splitext(os.path.basename(p))[0] + "_results.txt")))
+    logged = []
+    monkeypatch.setattr(results, "log_info", logged.append)
+
+    result = results.create_result_files_associated_with_regexes_dict()
+
+    # Definitions without a required literal have no prefilter
+    literal_prefilters_dict = results.get_literal_prefilters_dict()
+    assert list(literal_prefilters_dict) == [str(tmp_path / "keys_results.txt")]
+    assert literal_prefilters_dict[str(tmp_path / "keys_results.txt")].required_literals == ["api_key="]
+    assert len(result) == 2
+    assert len(logged) == 2
+
 def test_no_definition_files(tmp_path, patch_dependencies):
     _, dummy_logger = patch_dependencies
     with pytest.raises(SystemExit):
@@ -222,6 +241,22 @@ def test_initialize_results_output_subdirectory_sets_global(tmp_path, monkeypatc
     assert results.results_output_subdirectory.startswith(str(tmp_path))
     assert os.path.isdir(results.results_output_subdirectory)
 
+def test_use_resumed_results_output_subdirectory_sets_global(tmp_path, monkeypatch):
+    monkeypatch.setattr(results, "log_info", lambda msg: None)
+    monkeypatch.setattr(results, "results_output_subdirectory", "")
+
+    results.use_resumed_results_output_subdirectory(str(tmp_path))
+
+    assert results.results_output_subdirectory == str(tmp_path)
+
+def test_use_resumed_results_output_subdirectory_exits_if_missing(tmp_path, monkeypatch):
+    errors = []
+    monkeypatch.setattr(results, "log_error", errors.append)
+
+    with pytest.raises(SystemExit):
+        results.use_resumed_results_output_subdirectory(str(tmp_path / "missing"))
+    assert len(errors) == 1
+
 def test_create_result_files_write_locks_dict_creates_locks(tmp_path):
     # Prepare dummy file paths
     file_paths = [str(tmp_path / f"file_{i}.txt") for i in range(3)]
@@ -372,6 +407,38 @@ def test_write_record_info_to_result_output_buffer_real_helper(monkeypatch):
     assert "duplicates omitted" in output
     assert "___________________________________________________________________" in output
 
+def test_write_record_info_to_result_output_buffer_contents_match_type():
+    buf = StringIO()
+    results.write_record_info_to_result_output_buffer(buf, [], ["Server: nginx"], "archive4.warc.gz", "file4.txt", "HTTP headers")
+    output = buf.getvalue()
+    assert "[Matches found in HTTP headers: 1 (0 duplicates omitted)]" in output
+    assert "file contents" not in output
+
+def test_get_previous_result_entries_yields_entries_of_given_archives(tmp_path):
+    results_file_path = str(tmp_path / "emails_results.txt")
+    results.write_result_files_headers({results_file_path: re.compile("abc")})
+    buf = StringIO()
+    results.write_record_info_to_result_output_buffer(buf, [], ["abc"], "a.warc.gz", "http://a.com")
+    results.write_record_info_to_result_output_buffer(buf, ["abc"], [], "b.warc.gz", "http://b.com/abc")
+    results.write_record_info_to_result_output_buffer(buf, [], ["abc\n\nabc"], "a.warc.gz", "http://a.com/2")
+    with open(results_file_path, "a", encoding="utf-8") as results_file:
+        results_file.write(buf.getvalue())
+
+    entries = list(results.get_previous_result_entries(results_file_path, ["a.warc.gz"]))
+    assert [file_name for file_name, _ in entries] == ["http://a.com", "http://a.com/2"]
+    assert entries[1][1].startswith("[Archive: a.warc.gz]\n[File: http://a.com/2]\n")
+    assert entries[1][1].endswith(results.RESULT_ENTRY_SEPARATOR)
+    assert '"abc\n\nabc"' in entries[1][1]
+
+@pytest.mark.parametrize("results_file_path, expected_scope", [
+    (os.path.join("results", "servers.headers_results.txt"), "headers"),
+    (os.path.join("results", "emails.body_results.txt"), "body"),
+    (os.path.join("results", "emails_results.txt"), None),
+    (os.path.join("results", "v1.2_results.txt"), None),
+])
+def test_get_definition_scope(results_file_path, expected_scope):
+    assert results.get_definition_scope(results_file_path) == expected_scope
+
 def test_write_matches_to_result_output_buffer_no_matches():
     buf = StringIO()
     results.write_matches_to_result_output_buffer(buf, [], "file name")
@@ -450,6 +517,20 @@ def test_move_log_file_to_results_subdirectory_moves_file(tmp_path, monkeypatch)
     assert moved_log.read_text(encoding="utf-8") == "log content"
     assert not log_file.exists()
 
+def test_move_log_file_to_results_subdirectory_appends_to_resumed_log(tmp_path, monkeypatch):
+    log_file = tmp_path / "log.log"
+    log_file.write_text("resumed log\n", encoding="utf-8")
+    results_dir = tmp_path / "results_subdir"
+    results_dir.mkdir()
+    (results_dir / "log.log").write_text("interrupted log\n", encoding="utf-8")
+    monkeypatch.setattr(results, "results_output_subdirectory", str(results_dir))
+    monkeypatch.setattr(os, "getcwd", lambda: str(tmp_path))
+
+    results.move_log_file_to_results_subdirectory()
+
+    assert (results_dir / "log.log").read_text(encoding="utf-8") == "interrupted log\nresumed log\n"
+    assert not log_file.exists()
+
 def test_move_log_file_to_results_subdirectory_no_results_dir(monkeypatch, tmp_path):
     # Setup: create dummy log file
     log_file = tmp_path / "log.log"
@@ -1,11 +1,35 @@
+import hashlib
+import multiprocessing
 import os
+import pickle
+import re
 import time
+from concurrent.futures import ProcessPoolExecutor
 from io import StringIO
 import sys
 import pytest
 import search
 import zipfile
 
+from in_flight_budget import InFlightBytesBudget
+from in_flight_compression import CompressedWarcRecord, InFlightCompressor
+from search_checkpoint import SearchCheckpointer
+from shared_memory_ring import SharedMemoryRing
+from spill_queue import SpillSegment, SpillWriter
+from worker_autoscaler import SearchWorkerAutoscaler
+from streaming_search import SpooledWarcRecord, StreamedWarcRecord
+from warc_members import WarcMember
+from match_memo import MatchMemo
+from payload_digest_cache import PayloadDigestCache
+from search_statistics import SearchStatistics
+from warc_record import PayloadIdentity, WarcRecord
+from warc_test_records import make_warc_record
+from zip_compression import ZipCompressionPolicy
+from blob_store import BlobStore, read_blob_manifest
+from deferred_extraction import MatchLocationRecorder
+from record_extraction import BlobStoreExtraction, DeferredExtraction, WarcGzExtraction, ZipArchiveExtraction
+from literal_prefilter import create_literal_prefilters_dict
+
 # A fake queue that always returns the same value
 class FakeQueue:
     def __init__(self, sizes):
@@ -114,8 +138,23 @@ def test_perform_search_basic(monkeypatch):
     class FakeConfig:
         settings = {
             "WARC_GZ_ARCHIVES_DIRECTORY": "/fake/dir",
+            "DECODE_HTTP_PAYLOADS": False,
+            "STREAMING_SEARCH_THRESHOLD_KB": None,
+            "LITERAL_PREFILTER": False,
+            "SEARCH_QUEUE_MAX_IN_FLIGHT_KB": None,
+            "SEARCH_QUEUE_SPILL_DIRECTORY": None,
+            "IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT": None,
+            "INCREMENTAL_SEARCH": False,
+            "CHECKPOINT_INTERVAL_SECONDS": None,
+            "TRIGRAM_INDEX_DIRECTORY": None,
+            "BLOOM_FILTER_SIDECAR_KB": None,
+            "PAYLOAD_DIGEST_CACHE_ENTRIES": None,
+            "MATCH_MEMO": False,
             "ZIP_FILES_WITH_MATCHES": False,
             "MAX_CONCURRENT_SEARCH_PROCESSES": 2,
+            "SEARCH_QUEUE_TRANSPORT": "manager",
+            "SEARCH_PIPELINE_MODE": "queue",
+            "REGEX_MATCHING_MODE": "separate",
         }
     monkeypatch.setattr("search.config", FakeConfig)
 
@@ -131,6 +170,8 @@ def test_perform_search_basic(monkeypatch):
 
     # Fake create_result_files_associated_with_regexes_dict
     monkeypatch.setattr("search.create_result_files_associated_with_regexes_dict", lambda: {"result1.txt": "regex1"})
+    monkeypatch.setattr("search.create_record_filter", lambda settings: None)
+    monkeypatch.setattr("search.READ_HTTP_HEADERS", True)
 
     # Fake write_result_files_headers
     monkeypatch.setattr("search.write_result_files_headers", lambda d: called.setdefault("write_headers", True))
@@ -139,15 +180,14 @@ def test_perform_search_basic(monkeypatch):
     monkeypatch.setattr("search.create_result_files_write_locks_dict", lambda m, k: {"result1.txt": object()})
 
     # Fake initiate_search_worker_processes
-    def fake_initiate_search_worker_processes(files, dct, locks):
-        called["initiate_workers"] = (files, dct, locks)
+    def fake_initiate_search_worker_processes(files, dct, locks, record_extraction):
+        called["initiate_workers"] = (files, dct, locks, record_extraction)
+        return []
     monkeypatch.setattr("search.initiate_search_worker_processes", fake_initiate_search_worker_processes)
 
     # Fake log_info
     monkeypatch.setattr("search.log_info", lambda msg: called.setdefault("log_info", msg))
 
-    # Fake finalize_results_zip_archives (should not be called in this test)
-    monkeypatch.setattr("search.finalize_results_zip_archives", lambda keys: called.setdefault("finalize_zip", True))
 
     # Run
     search.perform_search()
@@ -157,7 +197,8 @@ def test_perform_search_basic(monkeypatch):
     assert called["write_headers"]
     assert "initiate_workers" in called
     assert called["log_info"] == "Finished searching."
-    assert "finalize_zip" not in called  # ZIP_FILES_WITH_MATCHES is False
+    assert called["initiate_workers"][3] is None  # ZIP_FILES_WITH_MATCHES is False
+    assert search.READ_HTTP_HEADERS is False  # No definition is limited to the HTTP headers
 
 def test_perform_search_with_zip(monkeypatch):
     # Plan:
@@ -169,8 +210,27 @@ def test_perform_search_with_zip(monkeypatch):
     class FakeConfig:
         settings = {
             "WARC_GZ_ARCHIVES_DIRECTORY": "/fake/dir",
+            "DECODE_HTTP_PAYLOADS": False,
+            "STREAMING_SEARCH_THRESHOLD_KB": None,
+            "LITERAL_PREFILTER": False,
+            "SEARCH_QUEUE_MAX_IN_FLIGHT_KB": None,
+            "SEARCH_QUEUE_SPILL_DIRECTORY": None,
+            "IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT": None,
+            "INCREMENTAL_SEARCH": False,
+            "CHECKPOINT_INTERVAL_SECONDS": None,
+            "TRIGRAM_INDEX_DIRECTORY": None,
+            "BLOOM_FILTER_SIDECAR_KB": None,
+            "PAYLOAD_DIGEST_CACHE_ENTRIES": None,
+            "MATCH_MEMO": False,
             "ZIP_FILES_WITH_MATCHES": True,
+            "ZIP_COMPRESSION": "deflate",
+            "ZIP_COMPRESSION_BY_DEFINITION": None,
+            "ZIP_STORE_COMPRESSED_FORMATS": False,
+            "EXTRACTION_MODE": 'zip',
             "MAX_CONCURRENT_SEARCH_PROCESSES": 2,
+            "SEARCH_QUEUE_TRANSPORT": "manager",
+            "SEARCH_PIPELINE_MODE": "queue",
+            "REGEX_MATCHING_MODE": "separate",
         }
     monkeypatch.setattr("search.config", FakeConfig)
     monkeypatch.setattr("search.glob", type("FakeGlob", (), {"glob": staticmethod(lambda pattern: ["file1.gz"])}))
@@ -179,15 +239,20 @@ def test_perform_search_with_zip(monkeypatch):
         def Queue(self): return FakeQueue()
     monkeypatch.setattr("search.Manager", FakeManager)
     monkeypatch.setattr("search.create_result_files_associated_with_regexes_dict", lambda: {"result1.txt": "regex1"})
+    monkeypatch.setattr("search.create_record_filter", lambda settings: None)
     monkeypatch.setattr("search.write_result_files_headers", lambda d: None)
     monkeypatch.setattr("search.create_result_files_write_locks_dict", lambda m, k: {"result1.txt": object()})
-    monkeypatch.setattr("search.initiate_search_worker_processes", lambda files, dct, locks: None)
+    def fake_initiate(files, dct, locks, record_extraction):
+        called["record_extraction"] = record_extraction
+        return []
+    monkeypatch.setattr("search.initiate_search_worker_processes", fake_initiate)
     monkeypatch.setattr("search.log_info", lambda msg: None)
     def fake_finalize(keys):
         called["finalize_zip"] = list(keys)
-    monkeypatch.setattr("search.finalize_results_zip_archives", fake_finalize)
+    monkeypatch.setattr("record_extraction.finalize_results_zip_archives", fake_finalize)
 
     search.perform_search()
+    assert isinstance(called["record_extraction"], ZipArchiveExtraction)
     assert called["finalize_zip"] == ["result1.txt"]
 
 def test_perform_search_empty_files(monkeypatch):
@@ -200,8 +265,23 @@ def test_perform_search_empty_files(monkeypatch):
     class FakeConfig:
         settings = {
             "WARC_GZ_ARCHIVES_DIRECTORY": "/fake/dir",
+            "DECODE_HTTP_PAYLOADS": False,
+            "STREAMING_SEARCH_THRESHOLD_KB": None,
+            "LITERAL_PREFILTER": False,
+            "SEARCH_QUEUE_MAX_IN_FLIGHT_KB": None,
+            "SEARCH_QUEUE_SPILL_DIRECTORY": None,
+            "IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT": None,
+            "INCREMENTAL_SEARCH": False,
+            "CHECKPOINT_INTERVAL_SECONDS": None,
+            "TRIGRAM_INDEX_DIRECTORY": None,
+            "BLOOM_FILTER_SIDECAR_KB": None,
+            "PAYLOAD_DIGEST_CACHE_ENTRIES": None,
+            "MATCH_MEMO": False,
             "ZIP_FILES_WITH_MATCHES": False,
             "MAX_CONCURRENT_SEARCH_PROCESSES": 2,
+            "SEARCH_QUEUE_TRANSPORT": "manager",
+            "SEARCH_PIPELINE_MODE": "queue",
+            "REGEX_MATCHING_MODE": "separate",
         }
     monkeypatch.setattr("search.config", FakeConfig)
     monkeypatch.setattr("search.glob", type("FakeGlob", (), {"glob": staticmethod(lambda pattern: [])}))
@@ -210,17 +290,353 @@ def test_perform_search_empty_files(monkeypatch):
         def Queue(self): return FakeQueue()
     monkeypatch.setattr("search.Manager", FakeManager)
     monkeypatch.setattr("search.create_result_files_associated_with_regexes_dict", lambda: {"result1.txt": "regex1"})
+    monkeypatch.setattr("search.create_record_filter", lambda settings: None)
     monkeypatch.setattr("search.write_result_files_headers", lambda d: None)
     monkeypatch.setattr("search.create_result_files_write_locks_dict", lambda m, k: {"result1.txt": object()})
-    def fake_initiate(files, dct, locks):
+    def fake_initiate(files, dct, locks, record_extraction):
         called["files"] = files
+        return []
     monkeypatch.setattr("search.initiate_search_worker_processes", fake_initiate)
     monkeypatch.setattr("search.log_info", lambda msg: None)
-    monkeypatch.setattr("search.finalize_results_zip_archives", lambda keys: None)
 
     search.perform_search()
     assert called["files"] == []
 
+def test_perform_search_fused_mode(monkeypatch):
+    # Plan:
+    # - SEARCH_PIPELINE_MODE is fused: the fused worker processes are started and no search queue is created
+    called = {}
+    class FakeConfig:
+        settings = {
+            "WARC_GZ_ARCHIVES_DIRECTORY": "/fake/dir",
+            "DECODE_HTTP_PAYLOADS": False,
+            "STREAMING_SEARCH_THRESHOLD_KB": None,
+            "LITERAL_PREFILTER": False,
+            "SEARCH_QUEUE_MAX_IN_FLIGHT_KB": None,
+            "SEARCH_QUEUE_SPILL_DIRECTORY": None,
+            "IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT": None,
+            "INCREMENTAL_SEARCH": False,
+            "CHECKPOINT_INTERVAL_SECONDS": None,
+            "TRIGRAM_INDEX_DIRECTORY": None,
+            "BLOOM_FILTER_SIDECAR_KB": None,
+            "PAYLOAD_DIGEST_CACHE_ENTRIES": None,
+            "MATCH_MEMO": False,
+            "ZIP_FILES_WITH_MATCHES": False,
+            "SEARCH_PIPELINE_MODE": "fused",
+            "REGEX_MATCHING_MODE": "separate",
+        }
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.glob", type("FakeGlob", (), {"glob": staticmethod(lambda pattern: ["file1.gz"])}))
+    monkeypatch.setattr("search.Manager", lambda: "manager")
+    monkeypatch.setattr("search.create_search_queue", lambda manager: (_ for _ in ()).throw(AssertionError("Should not create a search queue")))
+    monkeypatch.setattr("search.create_result_files_associated_with_regexes_dict", lambda: {"result1.txt": "regex1"})
+    monkeypatch.setattr("search.create_record_filter", lambda settings: None)
+    monkeypatch.setattr("search.write_result_files_headers", lambda d: None)
+    monkeypatch.setattr("search.create_result_files_write_locks_dict", lambda m, k: {"result1.txt": "lock"})
+    monkeypatch.setattr("search.initiate_search_worker_processes", lambda *a: (_ for _ in ()).throw(AssertionError("Should not start queue workers")))
+    def fake_initiate_fused(manager, files, dct, locks, record_extraction):
+        called["fused"] = (manager, files, dct, locks)
+        return []
+    monkeypatch.setattr("search.initiate_fused_search_worker_processes", fake_initiate_fused)
+    monkeypatch.setattr("search.log_info", lambda msg: None)
+
+    search.perform_search()
+    assert called["fused"] == ("manager", ["file1.gz"], {"result1.txt": "regex1"}, {"result1.txt": "lock"})
+
+def test_perform_search_incremental_searches_each_group(monkeypatch):
+    # Plan:
+    # - INCREMENTAL_SEARCH is enabled: each planned search group is searched, and the earlier results are carried forward afterwards
+    called = {"groups": []}
+    class FakeConfig:
+        settings = {
+            "WARC_GZ_ARCHIVES_DIRECTORY": "/fake/dir",
+            "DECODE_HTTP_PAYLOADS": False,
+            "STREAMING_SEARCH_THRESHOLD_KB": None,
+            "LITERAL_PREFILTER": False,
+            "SEARCH_QUEUE_MAX_IN_FLIGHT_KB": None,
+            "SEARCH_QUEUE_SPILL_DIRECTORY": None,
+            "IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT": None,
+            "INCREMENTAL_SEARCH": True,
+            "CHECKPOINT_INTERVAL_SECONDS": None,
+            "TRIGRAM_INDEX_DIRECTORY": None,
+            "BLOOM_FILTER_SIDECAR_KB": None,
+            "PAYLOAD_DIGEST_CACHE_ENTRIES": None,
+            "MATCH_MEMO": False,
+            "ZIP_FILES_WITH_MATCHES": False,
+            "EXTRACTION_MODE": 'zip',
+            "SEARCH_QUEUE_TRANSPORT": "manager",
+            "SEARCH_PIPELINE_MODE": "queue",
+            "REGEX_MATCHING_MODE": "separate",
+        }
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.glob", type("FakeGlob", (), {"glob": staticmethod(lambda pattern: ["old.gz", "new.gz"])}))
+    class FakeManager:
+        def Queue(self): return object()
+    monkeypatch.setattr("search.Manager", FakeManager)
+    results_and_regexes_dict = {"run/emails_results.txt": "regex1", "run/urls_results.txt": "regex2"}
+    monkeypatch.setattr("search.create_result_files_associated_with_regexes_dict", lambda: results_and_regexes_dict)
+    monkeypatch.setattr("search.create_record_filter", lambda settings: None)
+    monkeypatch.setattr("search.write_result_files_headers", lambda d: None)
+    monkeypatch.setattr("search.create_result_files_write_locks_dict", lambda m, k: {})
+    monkeypatch.setattr("search.log_info", lambda msg: None)
+
+    search_groups = [(["old.gz"], {"run/urls_results.txt": "regex2"}), (["new.gz"], results_and_regexes_dict)]
+    plan = search.IncrementalSearchPlan(search_groups, {"run/emails_results.txt": {"earlier_run": ["old.gz"]}})
+    monkeypatch.setattr("search.SearchManifest", lambda path: "manifest")
+    monkeypatch.setattr("search.plan_incremental_search", lambda manifest, files, dct: plan)
+    def fake_initiate(files, dct, locks, record_extraction):
+        called["groups"].append((files, dct))
+        return []
+    monkeypatch.setattr("search.initiate_search_worker_processes", fake_initiate)
+    monkeypatch.setattr("search.carry_forward_previous_results", lambda carried, zip_files, extraction_mode: called.setdefault("carried", carried))
+    def fake_record(manifest, recorded_plan, results_directory):
+        called["recorded"] = (manifest, recorded_plan, results_directory)
+    monkeypatch.setattr("search.record_incremental_search", fake_record)
+
+    search.perform_search()
+    assert called["groups"] == search_groups
+    assert called["carried"] == plan.carried_forward_results
+    assert called["recorded"] == ("manifest", plan, "run")
+
+def test_initiate_fused_search_worker_processes(monkeypatch):
+    called = {}
+    class FakeConfig:
+        settings = {"MAX_CONCURRENT_SEARCH_PROCESSES": 3, "ZIP_FILES_WITH_MATCHES": True}
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.log_info", lambda msg: called.setdefault("log_info", []).append(msg))
+    class FakeManager:
+        def Queue(self): return "offload_queue"
+        def Value(self, typecode, value): called["value"] = (typecode, value); return "counter"
+        def Lock(self): return "lock"
+    monkeypatch.setattr("search.create_warc_gz_files_queue", lambda manager, files, workers: "files_queue")
+    class FakeExecutor:
+        def __init__(self, **kwargs): called["max_workers"] = kwargs["max_workers"]
+        def __enter__(self): return self
+        def __exit__(self, exc_type, exc_val, exc_tb): pass
+        def submit(self, *args):
+            called.setdefault("submit_calls", []).append(args)
+            return object()
+    monkeypatch.setattr("search.ProcessPoolExecutor", FakeExecutor)
+    monkeypatch.setattr("search.print_remaining_warc_gz_files", lambda futures, queue, workers: called.setdefault("printed", queue))
+    monkeypatch.setattr("search.wait", lambda futures: called.setdefault("waited", len(futures)))
+    monkeypatch.setattr("search.log_search_statistics", lambda futures, record_extraction: None)
+
+    record_extraction = ZipArchiveExtraction(None)
+    search.initiate_fused_search_worker_processes(FakeManager(), ["a.gz", "b.gz"], {"r.txt": "re"}, {"r.txt": "lock"}, record_extraction)
+
+    # Every configured process searches, since there is no separate read process
+    assert called["max_workers"] == 3
+    assert called["value"] == ("i", 3)
+    assert len(called["submit_calls"]) == 3
+    assert called["submit_calls"][0] == (
+        search.fused_search_worker_process, "files_queue", "offload_queue", "counter", "lock", 3, {"r.txt": "re"}, {"r.txt": "lock"}, record_extraction
+    )
+    assert called["printed"] == "files_queue"
+    assert called["waited"] == 3
+    assert any("fewer WARC.gz files than worker processes" in msg for msg in called["log_info"])
+
+def test_create_warc_gz_files_queue_largest_first(monkeypatch, tmp_path):
+    small = tmp_path / "small.gz"
+    large = tmp_path / "large.gz"
+    small.write_bytes(b"x")
+    large.write_bytes(b"x" * 100)
+    class FakeManager:
+        def Queue(self): return FakeListQueue()
+    class FakeListQueue:
+        def __init__(self): self.items = []
+        def put(self, item): self.items.append(item)
+
+    files_queue = search.create_warc_gz_files_queue(FakeManager(), [str(small), str(large)], 2)
+    assert files_queue.items == [str(large), str(small), None, None]
+
+def test_print_remaining_warc_gz_files(monkeypatch, capfd):
+    class FakeFuture:
+        def __init__(self): self.calls = 0
+        def done(self):
+            self.calls += 1
+            return self.calls > 1
+    class FakeQueue:
+        def qsize(self): return 5
+
+    search.print_remaining_warc_gz_files([FakeFuture()], FakeQueue(), 2)
+    captured = capfd.readouterr().out
+    assert "WARC.gz files waiting to be searched: 3" in captured
+    assert "WARC.gz files waiting to be searched: 0" in captured
+
+class FakeListQueue:
+    def __init__(self, items=None):
+        self.items = list(items or [])
+    def get(self):
+        return self.items.pop(0)
+    def put(self, item):
+        self.items.append(item)
+    def qsize(self):
+        return len(self.items)
+
+class FakeCounter:
+    def __init__(self, value):
+        self.value = value
+
+def test_fused_search_worker_process_searches_files_then_offloaded_records(monkeypatch):
+    # Plan:
+    # - The worker reads two files, never offloads, then searches a record offloaded by another worker
+    # - As the last busy worker it signals every worker to stop
+    searched = []
+    called = {}
+    files_queue = FakeListQueue(["a.gz", "b.gz", None])
+    offloaded_queue = FakeListQueue(["offloaded"])
+    counter = FakeCounter(1)
+
+    monkeypatch.setattr("search.initialize_worker_process_resources", lambda d, record_extraction: {})
+    monkeypatch.setattr("search.iterate_warc_gz_records", lambda path: [f"{path}-record"])
+    monkeypatch.setattr("search.search_warc_record", lambda warc_record, *a: searched.append(warc_record))
+    monkeypatch.setattr("search.finalize_worker_process_resources", lambda *a: called.setdefault("finalized", True))
+    monkeypatch.setattr("search.RecordOffloadPlanner.should_offload", lambda self: False)
+
+    search.fused_search_worker_process(files_queue, offloaded_queue, counter, FakeLock(), 2, {}, {}, None)
+
+    assert searched == ["a.gz-record", "b.gz-record", "offloaded"]
+    assert counter.value == 0
+    # One None was consumed by this worker, the other is left for the second worker
+    assert offloaded_queue.items == [None]
+    assert called["finalized"] is True
+
+def test_fused_search_worker_process_offloads_records(monkeypatch):
+    searched = []
+    files_queue = FakeListQueue(["a.gz", None])
+    offloaded_queue = FakeListQueue()
+    counter = FakeCounter(2)
+
+    monkeypatch.setattr("search.initialize_worker_process_resources", lambda d, record_extraction: {})
+    monkeypatch.setattr("search.iterate_warc_gz_records", lambda path: ["r1", "r2"])
+    monkeypatch.setattr("search.search_warc_record", lambda warc_record, *a: searched.append(warc_record))
+    monkeypatch.setattr("search.finalize_worker_process_resources", lambda *a: None)
+    decisions = iter([True, False])
+    monkeypatch.setattr("search.RecordOffloadPlanner.should_offload", lambda self: next(decisions))
+    # Another worker is still busy, so this one must not signal the stop; provide it manually
+    original_put = offloaded_queue.put
+    def put_then_stop(item):
+        original_put(item)
+        original_put(None)
+    offloaded_queue.put = put_then_stop
+
+    search.fused_search_worker_process(files_queue, offloaded_queue, counter, FakeLock(), 2, {}, {}, None)
+
+    # r1 was offloaded and then picked up again from the offloaded queue by this now idle worker
+    assert searched == ["r2", "r1"]
+    assert counter.value == 1
+
+def test_record_offload_planner_no_idle_workers(monkeypatch):
+    planner = search.RecordOffloadPlanner(FakeListQueue(), FakeCounter(4), 4)
+    assert planner.should_offload() is False
+
+def test_record_offload_planner_offloads_to_idle_workers(monkeypatch):
+    offloaded_queue = FakeListQueue(["queued"])
+    planner = search.RecordOffloadPlanner(offloaded_queue, FakeCounter(2), 4)
+    # 2 idle workers, 2 records each, 1 already queued
+    decisions = [planner.should_offload() for _ in range(4)]
+    assert decisions == [True, True, True, False]
+
+def test_record_offload_planner_refreshes_after_interval(monkeypatch):
+    counter = FakeCounter(4)
+    planner = search.RecordOffloadPlanner(FakeListQueue(), counter, 4)
+    now = [100.0]
+    monkeypatch.setattr(search.time, "monotonic", lambda: now[0])
+
+    assert planner.should_offload() is False
+    counter.value = 3
+    assert planner.should_offload() is False  # Not refreshed yet
+    now[0] += planner.REFRESH_INTERVAL_SECONDS
+    assert planner.should_offload() is True
+
+def test_iterate_warc_gz_records_yields_first_record(monkeypatch):
+    # The first response record must be yielded, not consumed by an emptiness check
+    class DummyStream:
+        def __init__(self, *a): pass
+        def __enter__(self): return self
+        def __exit__(self, exc_type, exc_val, exc_tb): pass
+    class DummyRecord:
+        def __init__(self, uri, content):
+            self.headers = {'WARC-Target-URI': uri}
+            self.http_headers = {'Content-Type': 'text/html; charset=Shift_JIS'} if uri == "second" else None
+            self.reader = type("R", (), {"read": staticmethod(lambda: content)})
+    monkeypatch.setattr("search.FileStream", DummyStream)
+    monkeypatch.setattr("search.GZipStream", DummyStream)
+    monkeypatch.setattr("search.ArchiveIterator", lambda *a, **k: iter([DummyRecord("first", b"1"), DummyRecord("second", b"2")]))
+
+    records = list(search.iterate_warc_gz_records("file.gz"))
+    assert [record.name for record in records] == ["first", "second"]
+    assert [record.contents for record in records] == [b"1", b"2"]
+    assert all(record.parent_warc_gz_file == "file.gz" for record in records)
+    assert [record.charset for record in records] == [None, "Shift_JIS"]
+
+def test_create_search_queue_manager(monkeypatch):
+    class FakeConfig:
+        settings = {"SEARCH_QUEUE_TRANSPORT": "manager"}
+    monkeypatch.setattr("search.config", FakeConfig)
+    class FakeManager:
+        def Queue(self): return "manager_queue"
+
+    assert search.create_search_queue(FakeManager()) == "manager_queue"
+
+def test_create_search_queue_shared_memory(monkeypatch):
+    called = {}
+    class FakeConfig:
+        settings = {
+            "SEARCH_QUEUE_TRANSPORT": "shared_memory",
+            "SEARCH_PIPELINE_MODE": "queue",
+            "SHARED_MEMORY_SLOT_COUNT": 4,
+            "SHARED_MEMORY_SLOT_SIZE_KB": 2,
+        }
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.log_info", lambda msg: None)
+    def fake_ring(slot_count, slot_size):
+        called["ring"] = (slot_count, slot_size)
+        return "ring"
+    monkeypatch.setattr("search.SharedMemoryRing", fake_ring)
+
+    assert search.create_search_queue("manager") == "ring"
+    assert called["ring"] == (4, 2048)
+
+def test_perform_search_closes_shared_memory_ring(monkeypatch):
+    called = {}
+    class FakeConfig:
+        settings = {
+            "WARC_GZ_ARCHIVES_DIRECTORY": "/fake/dir",
+            "DECODE_HTTP_PAYLOADS": False,
+            "STREAMING_SEARCH_THRESHOLD_KB": None,
+            "LITERAL_PREFILTER": False,
+            "SEARCH_QUEUE_MAX_IN_FLIGHT_KB": None,
+            "SEARCH_QUEUE_SPILL_DIRECTORY": None,
+            "IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT": None,
+            "INCREMENTAL_SEARCH": False,
+            "CHECKPOINT_INTERVAL_SECONDS": None,
+            "TRIGRAM_INDEX_DIRECTORY": None,
+            "BLOOM_FILTER_SIDECAR_KB": None,
+            "PAYLOAD_DIGEST_CACHE_ENTRIES": None,
+            "MATCH_MEMO": False,
+            "ZIP_FILES_WITH_MATCHES": False,
+            "SEARCH_PIPELINE_MODE": "queue",
+            "REGEX_MATCHING_MODE": "separate",
+        }
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.glob", type("FakeGlob", (), {"glob": staticmethod(lambda pattern: ["file1.gz"])}))
+    monkeypatch.setattr("search.Manager", lambda: object())
+    class FakeRing(search.SharedMemoryRing):
+        def __init__(self): pass
+        def close(self): called["closed"] = True
+    monkeypatch.setattr("search.create_search_queue", lambda manager: FakeRing())
+    monkeypatch.setattr("search.SEARCH_QUEUE", None)
+    monkeypatch.setattr("search.create_result_files_associated_with_regexes_dict", lambda: {"result1.txt": "regex1"})
+    monkeypatch.setattr("search.create_record_filter", lambda settings: None)
+    monkeypatch.setattr("search.write_result_files_headers", lambda d: None)
+    monkeypatch.setattr("search.create_result_files_write_locks_dict", lambda m, k: {"result1.txt": object()})
+    monkeypatch.setattr("search.initiate_search_worker_processes", lambda files, dct, locks, record_extraction: [])
+    monkeypatch.setattr("search.log_info", lambda msg: None)
+
+    search.perform_search()
+    assert called["closed"] is True
+
 def test_initiate_search_worker_processes_basic(monkeypatch):
     # Plan:
     # - Patch dependencies: calculate_max_search_worker_processes, log_info, ProcessPoolExecutor, initiate_warc_gz_read_threads,
@@ -262,6 +678,7 @@ def test_initiate_search_worker_processes_basic(monkeypatch):
 
     # Patch wait
     monkeypatch.setattr("search.wait", lambda futures: called.setdefault("waited", True))
+    monkeypatch.setattr("search.log_search_statistics", lambda futures, record_extraction: None)
 
     # Prepare dummy args
     gz_files_list = ["file1.gz", "file2.gz"]
@@ -272,18 +689,27 @@ def test_initiate_search_worker_processes_basic(monkeypatch):
     monkeypatch.setattr("search.SEARCH_QUEUE", "dummy_queue")
 
     # Run
-    search.initiate_search_worker_processes(gz_files_list, results_and_regexes_dict, result_files_write_locks_dict)
+    record_extraction = ZipArchiveExtraction(None)
+    search.initiate_search_worker_processes(gz_files_list, results_and_regexes_dict, result_files_write_locks_dict, record_extraction)
 
     # Assert
-    assert called["executor_init"] == {"max_workers": 2}
+    assert called["executor_init"]["max_workers"] == 2
+    # The settings and globals of the main process are handed to each worker process as it starts
+    assert called["executor_init"]["initializer"] == search.initialize_worker_process_globals
+    assert called["executor_init"]["initargs"][0]["settings"] is search.config.settings
+    assert called["executor_init"]["initargs"][0]["RECORD_FILTER"] is search.RECORD_FILTER
     assert called["executor_enter"]
     assert len(called["submit_calls"]) == 2
     for args, kwargs in called["submit_calls"]:
         assert args[0] == search.search_worker_process
-        assert args[1] == "dummy_queue"
-        assert args[2] == results_and_regexes_dict
-        assert args[3] == result_files_write_locks_dict
-        # args[4] is config.settings["ZIP_FILES_WITH_MATCHES"], not checked here
+        assert args[1] == results_and_regexes_dict
+        assert args[2] == result_files_write_locks_dict
+        # The extraction mode selected by perform_search is handed to each worker process
+        assert args[3] is record_extraction
+    # Each worker process is given its own index
+    assert [args[4] for args, kwargs in called["submit_calls"]] == [0, 1]
+    # The search queue is handed to the worker processes as they start rather than with each call
+    assert called["executor_init"]["initargs"][0]["SEARCH_QUEUE"] == "dummy_queue"
     assert called["read_threads"] == gz_files_list
     assert "All records read from the WARC.gz files." in "".join(called["log_info"])
     assert called["signal_workers"] == 2
@@ -310,9 +736,10 @@ def test_initiate_search_worker_processes_zero_workers(monkeypatch):
     monkeypatch.setattr("search.signal_worker_processes_to_stop", lambda n: None)
     monkeypatch.setattr("search.print_remaining_search_queue_items", lambda: None)
     monkeypatch.setattr("search.wait", lambda futures: None)
+    monkeypatch.setattr("search.log_search_statistics", lambda futures, record_extraction: None)
     monkeypatch.setattr("search.SEARCH_QUEUE", "dummy_queue")
 
-    search.initiate_search_worker_processes([], {}, {})
+    search.initiate_search_worker_processes([], {}, {}, None)
 
     assert called["max_workers"] == 0
 
@@ -336,9 +763,10 @@ def test_initiate_search_worker_processes_calls_all_steps(monkeypatch):
     monkeypatch.setattr("search.signal_worker_processes_to_stop", lambda n: steps.append("signal_workers"))
     monkeypatch.setattr("search.print_remaining_search_queue_items", lambda: steps.append("print_remaining"))
     monkeypatch.setattr("search.wait", lambda futures: steps.append("wait"))
+    monkeypatch.setattr("search.log_search_statistics", lambda futures, record_extraction: steps.append("log_statistics"))
     monkeypatch.setattr("search.SEARCH_QUEUE", "dummy_queue")
 
-    search.initiate_search_worker_processes(["f1"], {"r": "re"}, {"r": object()})
+    search.initiate_search_worker_processes(["f1"], {"r": "re"}, {"r": object()}, None)
 
     # Check that all steps are present in the correct order
     assert steps == [
@@ -350,9 +778,64 @@ def test_initiate_search_worker_processes_calls_all_steps(monkeypatch):
         "signal_workers",
         "print_remaining",
         "wait",
+        "log_statistics",
         "executor_exit"
     ]
 
+def test_initialize_worker_process_globals_sets_settings_and_globals(monkeypatch):
+    class FakeConfig:
+        settings = {"ZIP_FILES_WITH_MATCHES": False}
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.RECORD_FILTER", None)
+
+    worker_process_globals = {"settings": {"ZIP_FILES_WITH_MATCHES": True}, "RECORD_FILTER": "filter"}
+    search.initialize_worker_process_globals(worker_process_globals)
+
+    assert FakeConfig.settings == {"ZIP_FILES_WITH_MATCHES": True}
+    assert search.RECORD_FILTER == "filter"
+    # The initargs are not changed, since the same ones initialize every worker process
+    assert "settings" in worker_process_globals
+
+def release_in_flight_bytes_in_worker_process(size: int) -> tuple:
+    """Runs in a spawned worker process, which only has the settings and globals it was handed as it started."""
+    warc_record = search.SEARCH_QUEUE.get()
+    search.IN_FLIGHT_BUDGET.release(size)
+    return search.config.settings["ZIP_FILES_WITH_MATCHES"], search.get_zip_archive_segment_generation(), bytes(warc_record.contents)
+
+def test_worker_process_globals_reach_spawned_worker_processes(monkeypatch, tmp_path):
+    # The budget, barrier and ring must be created with the start method they are shared with, as when it is set for the whole search
+    start_method = multiprocessing.get_start_method(allow_none=True)
+    multiprocessing.set_start_method("spawn", force=True)
+    try:
+        result, in_flight_budget = search_in_spawned_worker_process(monkeypatch, tmp_path)
+    finally:
+        multiprocessing.set_start_method(start_method, force=True)
+
+    assert result == ("handed over", 3, b"shared")
+    # The bytes released by the worker process are released from the main process' budget
+    assert in_flight_budget.in_flight_bytes.value == 0
+
+def search_in_spawned_worker_process(monkeypatch, tmp_path) -> tuple:
+    class FakeConfig:
+        settings = {"ZIP_FILES_WITH_MATCHES": "handed over"}
+    monkeypatch.setattr("search.config", FakeConfig)
+    in_flight_budget = InFlightBytesBudget(100)
+    in_flight_budget.reserve(60)
+    monkeypatch.setattr("search.IN_FLIGHT_BUDGET", in_flight_budget)
+    search_checkpointer = SearchCheckpointer([str(tmp_path / "r.txt")], {}, 1, generation=3)
+    search_checkpointer.create_barrier(1)
+    monkeypatch.setattr("search.SEARCH_CHECKPOINTER", search_checkpointer)
+    ring = SharedMemoryRing(slot_count=2, slot_size=64)
+    ring.put(WarcRecord("p.gz", "http://a.com", b"shared"))
+    monkeypatch.setattr("search.SEARCH_QUEUE", ring)
+
+    try:
+        with ProcessPoolExecutor(max_workers=1, initializer=search.initialize_worker_process_globals,
+                                 initargs=(search.get_worker_process_globals(),)) as executor:
+            return executor.submit(release_in_flight_bytes_in_worker_process, 60).result(), in_flight_budget
+    finally:
+        ring.close()
+
 def test_calculate_max_search_worker_processes_gt_1(monkeypatch):
     # Plan:
     # - Patch config.settings["MAX_CONCURRENT_SEARCH_PROCESSES"] to a value > 1
@@ -408,7 +891,7 @@ def test_initiate_warc_gz_read_threads_basic(monkeypatch):
 
     # Patch config.settings
     class FakeConfig:
-        settings = {"MAX_RAM_USAGE_PERCENT": 42}
+        settings = {"MAX_RAM_USAGE_PERCENT": 42, "SEARCH_PIPELINE_MODE": "queue"}
     monkeypatch.setattr("search.config", FakeConfig)
 
     # Patch ThreadPoolExecutor
@@ -462,7 +945,7 @@ def test_initiate_warc_gz_read_threads_empty(monkeypatch):
     monkeypatch.setattr("search.log_info", lambda msg: called.setdefault("log_info", msg))
     monkeypatch.setattr(search.PAUSE_READ_THREADS_EVENT, "set", lambda: called.setdefault("pause_set", True))
     class FakeConfig:
-        settings = {"MAX_RAM_USAGE_PERCENT": 99}
+        settings = {"MAX_RAM_USAGE_PERCENT": 99, "SEARCH_PIPELINE_MODE": "queue"}
     monkeypatch.setattr("search.config", FakeConfig)
     class FakeExecutor:
         def __init__(self, max_workers=None): called["executor_max_workers"] = max_workers
@@ -488,6 +971,34 @@ def test_initiate_warc_gz_read_threads_empty(monkeypatch):
     assert called["monitor_thread_joined"] is True
     assert called["executor_exit"] is True
 
+def test_initiate_warc_gz_read_threads_with_autoscaler(monkeypatch):
+    called = {}
+    monkeypatch.setattr("search.log_info", lambda msg: None)
+    class FakeExecutor:
+        def __init__(self, max_workers=None): called["executor_max_workers"] = max_workers
+        def __enter__(self): return self
+        def __exit__(self, exc_type, exc_val, exc_tb): pass
+    monkeypatch.setattr("search.ThreadPoolExecutor", FakeExecutor)
+    class FakeThread:
+        def __init__(self, target, args): pass
+        def start(self): pass
+        def join(self): pass
+    monkeypatch.setattr("search.Thread", FakeThread)
+    monkeypatch.setattr("search.WORKER_AUTOSCALER", SearchWorkerAutoscaler(2, 6))
+
+    search.initiate_warc_gz_read_threads([])
+
+    # A read thread is started for each worker process that may be parked
+    assert called["executor_max_workers"] == 8
+
+def test_throttle_read_thread(monkeypatch):
+    items = iter([1, 2])
+    monkeypatch.setattr("search.WORKER_AUTOSCALER", None)
+    assert search.throttle_read_thread(items) is items
+
+    monkeypatch.setattr("search.WORKER_AUTOSCALER", SearchWorkerAutoscaler(1, 2))
+    assert list(search.throttle_read_thread(items)) == [1, 2]
+
 def test_initiate_warc_gz_read_threads_monitor_thread_receives_tasks(monkeypatch):
     # Plan:
     # - Ensure the monitor thread receives the correct set of tasks
@@ -497,7 +1008,7 @@ def test_initiate_warc_gz_read_threads_monitor_thread_receives_tasks(monkeypatch
     monkeypatch.setattr("search.log_info", lambda msg: None)
     monkeypatch.setattr(search.PAUSE_READ_THREADS_EVENT, "set", lambda: None)
     class FakeConfig:
-        settings = {"MAX_RAM_USAGE_PERCENT": 77}
+        settings = {"MAX_RAM_USAGE_PERCENT": 77, "SEARCH_PIPELINE_MODE": "queue"}
     monkeypatch.setattr("search.config", FakeConfig)
     class FakeFuture:
         def result(self): pass
@@ -717,6 +1228,7 @@ def test_read_warc_gz_records_puts_records(monkeypatch):
 
     class DummyRecord:
         headers = {'WARC-Target-URI': 'http://example.com'}
+        http_headers = None
         class reader:
             @staticmethod
             def read():
@@ -737,7 +1249,7 @@ def test_read_warc_gz_records_puts_records(monkeypatch):
     dummy_queue = DummyQueue()
     monkeypatch.setattr("search.SEARCH_QUEUE", dummy_queue)
     # Patch WarcRecord to just store args
-    monkeypatch.setattr("search.WarcRecord", lambda parent_warc_gz_file, name, contents: ("WARC", parent_warc_gz_file, name, contents))
+    monkeypatch.setattr("search.WarcRecord", lambda parent_warc_gz_file, name, contents, charset=None, http_headers=None, payload_identity=None: ("WARC", parent_warc_gz_file, name, contents))
     monkeypatch.setattr("search.log_warning", lambda msg: called.setdefault("log_warning", msg))
     monkeypatch.setattr("search.log_error", lambda msg: called.setdefault("log_error", msg))
     monkeypatch.setattr("search.os.path.basename", lambda path: "file.gz")
@@ -848,15 +1360,15 @@ def test_search_worker_process_processes_records(monkeypatch):
 
     called = {}
 
-    def fake_init_worker_proc_resources(results_and_regexes_dict, zip_files_with_matches):
-        called["init"] = (results_and_regexes_dict, zip_files_with_matches)
-        return {"buf": "buffer"}, {"zip": "zipfile"}
+    def fake_init_worker_proc_resources(results_and_regexes_dict, record_extraction):
+        called["init"] = (results_and_regexes_dict, record_extraction)
+        return {"buf": "buffer"}
 
-    def fake_search_warc_record(warc_record, results_and_regexes_dict, result_files_write_buffers, zip_archives_dict, zip_files_with_matches):
+    def fake_search_warc_record(warc_record, results_and_regexes_dict, result_files_write_buffers, record_extraction):
         called.setdefault("records", []).append(warc_record)
 
-    def fake_finalize_worker_proc_resources(results_and_regexes_dict, results_files_locks_dict, result_files_write_buffers, zip_archives_dict):
-        called["finalize"] = (results_and_regexes_dict, results_files_locks_dict, result_files_write_buffers, zip_archives_dict)
+    def fake_finalize_worker_proc_resources(results_and_regexes_dict, results_files_locks_dict, result_files_write_buffers, record_extraction):
+        called["finalize"] = (results_and_regexes_dict, results_files_locks_dict, result_files_write_buffers, record_extraction)
 
     monkeypatch.setattr("search.initialize_worker_process_resources", fake_init_worker_proc_resources)
     monkeypatch.setattr("search.search_warc_record", fake_search_warc_record)
@@ -865,16 +1377,567 @@ def test_search_worker_process_processes_records(monkeypatch):
     # Dummy dicts for arguments
     results_and_regexes_dict = {"f.txt": "regex"}
     results_files_locks_dict = {"f.txt": object()}
-    zip_files_with_matches = True
+    record_extraction = ZipArchiveExtraction(None)
 
     # Run
-    search.search_worker_process(fake_queue, results_and_regexes_dict, results_files_locks_dict, zip_files_with_matches)
+    monkeypatch.setattr("search.SEARCH_QUEUE", fake_queue)
+    search.search_worker_process(results_and_regexes_dict, results_files_locks_dict, record_extraction)
 
     # Assert
-    assert called["init"] == (results_and_regexes_dict, zip_files_with_matches)
+    assert called["init"] == (results_and_regexes_dict, record_extraction)
     assert called["records"] == [record1, record2]
     assert called["finalize"][0] == results_and_regexes_dict
     assert called["finalize"][1] == results_files_locks_dict
+    assert called["finalize"][3] is record_extraction
+
+def test_search_worker_process_processes_batches(monkeypatch):
+    # Plan:
+    # - Provide a fake queue returning a batch (list) of records, a single record, then None
+    # - Every record of the batch should be searched individually
+
+    class FakeQueue:
+        def __init__(self, items):
+            self.items = items
+        def get(self):
+            return self.items.pop(0)
+
+    record1, record2, record3 = object(), object(), object()
+    fake_queue = FakeQueue([[record1, record2], record3, None])
+    searched = []
+
+    monkeypatch.setattr("search.initialize_worker_process_resources", lambda d, record_extraction: {})
+    monkeypatch.setattr("search.search_warc_record", lambda warc_record, *a: searched.append(warc_record))
+    monkeypatch.setattr("search.finalize_worker_process_resources", lambda *a: None)
+
+    monkeypatch.setattr("search.SEARCH_QUEUE", fake_queue)
+    search.search_worker_process({}, {}, None)
+
+    assert searched == [record1, record2, record3]
+
+def test_get_records_from_queue_item():
+    record = object()
+    assert list(search.get_records_from_queue_item(record, None)) == [record]
+    assert list(search.get_records_from_queue_item([record, record], None)) == [record, record]
+
+def test_get_records_from_queue_item_reads_warc_members(monkeypatch):
+    # Plan:
+    # - Record locations are read through the member reader, records are passed through as is
+    # - A location that fails to read is logged and skipped, one holding no response record is skipped silently
+    errors = []
+    monkeypatch.setattr("search.log_error", lambda msg: errors.append(msg))
+    record = WarcRecord(parent_warc_gz_file="a.gz", name="queued", contents=b"data")
+    read_record = WarcRecord(parent_warc_gz_file="a.gz", name="read", contents=b"data")
+
+    class FakeMemberReader:
+        def read_record(self, warc_member):
+            if warc_member.offset == 1:
+                raise ValueError("corrupt member")
+            return read_record if warc_member.offset == 0 else None
+
+    queue_item = [WarcMember("a.gz", 0, 10), record, WarcMember("a.gz", 1, 10), WarcMember("a.gz", 2, 10)]
+    records = list(search.get_records_from_queue_item(queue_item, FakeMemberReader()))
+
+    assert records == [read_record, record]
+    assert len(errors) == 1
+    assert "offset 1 of a.gz" in errors[0]
+
+def test_get_records_from_queue_item_opens_and_closes_spooled_records(monkeypatch, tmp_path):
+    errors = []
+    monkeypatch.setattr("search.log_error", lambda msg: errors.append(msg))
+    spool_file_path = tmp_path / "big.record"
+    spool_file_path.write_bytes(b"spooled contents")
+    queue_item = [SpooledWarcRecord("a.gz", "big", str(spool_file_path)), SpooledWarcRecord("a.gz", "missing", str(tmp_path / "missing.record"))]
+
+    records = []
+    for warc_record in search.get_records_from_queue_item(queue_item, None):
+        assert spool_file_path.exists()
+        records.append((warc_record.name, b"".join(warc_record.read_chunks(4))))
+
+    assert records == [("big", b"spooled contents")]
+    assert not spool_file_path.exists()
+    assert len(errors) == 1
+    assert "spooled record missing of a.gz" in errors[0]
+
+def test_initiate_warc_gz_read_threads_offset_mode_reads_members(monkeypatch):
+    submitted = []
+    monkeypatch.setattr("search.log_info", lambda msg: None)
+    class FakeConfig:
+        settings = {"MAX_RAM_USAGE_PERCENT": 90, "SEARCH_PIPELINE_MODE": "offset"}
+    monkeypatch.setattr("search.config", FakeConfig)
+    class FakeFuture:
+        def result(self): pass
+        def done(self): return True
+    class FakeExecutor:
+        def __init__(self, max_workers=None): pass
+        def __enter__(self): return self
+        def __exit__(self, exc_type, exc_val, exc_tb): pass
+        def submit(self, fn, arg):
+            submitted.append(fn)
+            return FakeFuture()
+    monkeypatch.setattr("search.ThreadPoolExecutor", FakeExecutor)
+    monkeypatch.setattr("search.as_completed", lambda tasks: list(tasks))
+    monkeypatch.setattr("search.Thread", lambda target, args: type("T", (), {"start": lambda self: None, "join": lambda self: None})())
+
+    search.initiate_warc_gz_read_threads(["a.gz"])
+    assert submitted == [search.read_warc_gz_members]
+
+def test_read_warc_gz_members_enqueues_member_locations(monkeypatch):
+    enqueued = []
+    members = [WarcMember("a.gz", 0, 100), WarcMember("a.gz", 100, 50)]
+    monkeypatch.setattr("search.is_warc_gz_compressed_per_record", lambda path: True)
+    monkeypatch.setattr("search.scan_warc_gz_members", lambda path, record_filter, start_offset=0: iter(members))
+    monkeypatch.setattr("search.enqueue_warc_record", lambda item: enqueued.append(item))
+    monkeypatch.setattr("search.TOTAL_RECORDS_READ", 0)
+    search.PAUSE_READ_THREADS_EVENT.set()
+
+    search.read_warc_gz_members("a.gz")
+
+    assert enqueued == members
+    assert search.TOTAL_RECORDS_READ == 2
+
+def test_get_read_function_uses_trigram_index_candidates(monkeypatch):
+    class FakeConfig:
+        settings = {"SEARCH_PIPELINE_MODE": "queue"}
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.CANDIDATE_WARC_MEMBERS", {"indexed.gz": []})
+
+    assert search.get_read_function("indexed.gz") == search.read_candidate_warc_gz_members
+    assert search.get_read_function("other.gz") == search.read_warc_gz_records
+    FakeConfig.settings["SEARCH_PIPELINE_MODE"] = "offset"
+    assert search.get_read_function("other.gz") == search.read_warc_gz_members
+
+def test_read_candidate_warc_gz_members_enqueues_candidates(monkeypatch, tmp_path):
+    results_file_path = str(tmp_path / "emails_results.txt")
+    open(results_file_path, "w").close()
+    checkpointer = SearchCheckpointer([results_file_path], {}, None, archives={
+        "a.gz": {"records_read": 1, "next_member_offset": 150, "completed": False}
+    })
+    candidates = [WarcMember("a.gz", 100, 50), WarcMember("a.gz", 400, 20), WarcMember("a.gz", 900, 30)]
+    enqueued = []
+    monkeypatch.setattr("search.CANDIDATE_WARC_MEMBERS", {"a.gz": candidates})
+    monkeypatch.setattr("search.enqueue_warc_record", lambda item: enqueued.append(item))
+    monkeypatch.setattr("search.SEARCH_CHECKPOINTER", checkpointer)
+    monkeypatch.setattr("search.TOTAL_RECORDS_READ", 0)
+    search.PAUSE_READ_THREADS_EVENT.set()
+
+    search.read_candidate_warc_gz_members("a.gz")
+
+    # The candidate read before the checkpoint is not queued again
+    assert enqueued == candidates[1:]
+    assert search.TOTAL_RECORDS_READ == 2
+    assert checkpointer.archives["a.gz"] == {"records_read": 3, "next_member_offset": 930, "completed": True}
+
+def test_read_candidate_warc_gz_members_through_shared_memory_ring(monkeypatch):
+    ring = SharedMemoryRing(slot_count=2, slot_size=64)
+    candidates = [WarcMember("a.gz", 100, 50), WarcMember("a.gz", 400, 20)]
+    monkeypatch.setattr("search.CANDIDATE_WARC_MEMBERS", {"a.gz": candidates})
+    monkeypatch.setattr("search.SEARCH_QUEUE", ring)
+    for global_name in ("SEARCH_CHECKPOINTER", "IN_FLIGHT_COMPRESSOR", "IN_FLIGHT_BUDGET", "RECORD_BATCHER"):
+        monkeypatch.setattr(f"search.{global_name}", None)
+    search.PAUSE_READ_THREADS_EVENT.set()
+
+    try:
+        search.read_candidate_warc_gz_members("a.gz")
+        assert [ring.get(), ring.get()] == candidates
+    finally:
+        ring.close()
+
+def test_read_warc_gz_members_resumes_after_checkpointed_member(monkeypatch, tmp_path):
+    results_file_path = str(tmp_path / "emails_results.txt")
+    open(results_file_path, "w").close()
+    checkpointer = SearchCheckpointer([results_file_path], {}, None, archives={
+        "a.gz": {"records_read": 1, "next_member_offset": 100, "completed": False}
+    })
+    scanned_from = []
+    def fake_scan(path, record_filter, start_offset=0):
+        scanned_from.append(start_offset)
+        return iter([WarcMember("a.gz", 100, 50)])
+    enqueued = []
+    monkeypatch.setattr("search.is_warc_gz_compressed_per_record", lambda path: True)
+    monkeypatch.setattr("search.scan_warc_gz_members", fake_scan)
+    monkeypatch.setattr("search.enqueue_warc_record", lambda item: enqueued.append(item))
+    monkeypatch.setattr("search.SEARCH_CHECKPOINTER", checkpointer)
+    search.PAUSE_READ_THREADS_EVENT.set()
+
+    search.read_warc_gz_members("a.gz")
+
+    assert scanned_from == [100]
+    assert enqueued == [WarcMember("a.gz", 100, 50)]
+    assert checkpointer.archives["a.gz"] == {"records_read": 2, "next_member_offset": 150, "completed": True}
+
+def test_read_warc_gz_members_falls_back_for_single_member_files(monkeypatch):
+    called = {}
+    monkeypatch.setattr("search.is_warc_gz_compressed_per_record", lambda path: False)
+    monkeypatch.setattr("search.log_warning", lambda msg: called.setdefault("warning", msg))
+    monkeypatch.setattr("search.read_warc_gz_records", lambda path: called.setdefault("read", path))
+    monkeypatch.setattr("search.scan_warc_gz_members", lambda path, record_filter, start_offset=0: (_ for _ in ()).throw(AssertionError("Should not scan")))
+
+    search.read_warc_gz_members("dir/a.gz")
+
+    assert called["read"] == "dir/a.gz"
+    assert "not compressed per record" in called["warning"]
+
+def test_read_warc_gz_members_logs_scan_errors(monkeypatch):
+    errors = []
+    def failing_scan(path, record_filter, start_offset=0):
+        raise ValueError("bad header")
+        yield
+    monkeypatch.setattr("search.is_warc_gz_compressed_per_record", lambda path: True)
+    monkeypatch.setattr("search.scan_warc_gz_members", failing_scan)
+    monkeypatch.setattr("search.log_error", lambda msg: errors.append(msg))
+
+    search.read_warc_gz_members("a.gz")
+    assert "bad header" in errors[0]
+
+def test_create_search_queue_offset_mode_uses_manager_queue(monkeypatch):
+    warnings = []
+    class FakeConfig:
+        settings = {"SEARCH_QUEUE_TRANSPORT": "shared_memory", "SEARCH_PIPELINE_MODE": "offset"}
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.log_warning", lambda msg: warnings.append(msg))
+    monkeypatch.setattr("search.SharedMemoryRing", lambda *a: (_ for _ in ()).throw(AssertionError("Should not create a ring")))
+
+    manager_queue = object()
+    assert search.create_search_queue(type("M", (), {"Queue": lambda self: manager_queue})()) is manager_queue
+    assert len(warnings) == 1
+
+def test_enqueue_warc_record_puts_directly_without_batcher(monkeypatch):
+    items = []
+    monkeypatch.setattr("search.SEARCH_QUEUE", type("Q", (), {"put": lambda self, item: items.append(item)})())
+    monkeypatch.setattr("search.RECORD_BATCHER", None)
+
+    search.enqueue_warc_record("record")
+    assert items == ["record"]
+
+def test_enqueue_warc_record_uses_batcher(monkeypatch):
+    added = []
+    monkeypatch.setattr("search.RECORD_BATCHER", type("B", (), {"add": lambda self, record: added.append(record)})())
+
+    search.enqueue_warc_record("record")
+    assert added == ["record"]
+
+def test_enqueue_warc_record_reserves_in_flight_bytes(monkeypatch):
+    items = []
+    monkeypatch.setattr("search.SEARCH_QUEUE", type("Q", (), {"put": lambda self, item: items.append(item)})())
+    monkeypatch.setattr("search.RECORD_BATCHER", None)
+    monkeypatch.setattr("search.IN_FLIGHT_BUDGET", InFlightBytesBudget(100))
+
+    search.enqueue_warc_record(WarcRecord("parent.gz", "http://a.com", b"x" * 40))
+    assert search.IN_FLIGHT_BUDGET.in_flight_bytes.value == 40
+    assert len(items) == 1
+
+def test_reserve_in_flight_bytes_flushes_batch_before_blocking(monkeypatch):
+    budget = InFlightBytesBudget(100)
+    budget.reserve(80)
+    called = {}
+    class FakeBatcher:
+        def flush(self):
+            # Searching the flushed batch releases its bytes
+            called["flushed"] = True
+            budget.release(80)
+    monkeypatch.setattr("search.IN_FLIGHT_BUDGET", budget)
+    monkeypatch.setattr("search.RECORD_BATCHER", FakeBatcher())
+
+    search.reserve_in_flight_bytes(50)
+    assert called["flushed"] is True
+    assert budget.in_flight_bytes.value == 50
+
+def test_reserve_in_flight_bytes_does_not_flush_with_room(monkeypatch):
+    monkeypatch.setattr("search.IN_FLIGHT_BUDGET", InFlightBytesBudget(100))
+    monkeypatch.setattr("search.RECORD_BATCHER", type("B", (), {"flush": lambda self: (_ for _ in ()).throw(AssertionError("Should not flush"))})())
+
+    search.reserve_in_flight_bytes(50)
+    assert search.IN_FLIGHT_BUDGET.in_flight_bytes.value == 50
+
+def test_enqueue_warc_record_spills_when_budget_is_exhausted(monkeypatch, tmp_path):
+    items = []
+    search_queue = type("Q", (), {"put": lambda self, item: items.append(item)})()
+    budget = InFlightBytesBudget(100)
+    budget.reserve(90)
+    monkeypatch.setattr("search.SEARCH_QUEUE", search_queue)
+    monkeypatch.setattr("search.RECORD_BATCHER", None)
+    monkeypatch.setattr("search.IN_FLIGHT_BUDGET", budget)
+    monkeypatch.setattr("search.SPILL_WRITER", SpillWriter(search_queue, str(tmp_path), 1024 * 1024))
+
+    search.enqueue_warc_record(WarcRecord("parent.gz", "http://a.com", b"x" * 50))
+    search.enqueue_warc_record(WarcRecord("parent.gz", "http://b.com", b"x" * 50))
+    # Nothing is queued or reserved while the records are spilled to the open segment
+    assert items == []
+    assert budget.in_flight_bytes.value == 90
+
+    budget.release(90)
+    search.enqueue_warc_record(WarcRecord("parent.gz", "http://c.com", b"x" * 50))
+    # The segment is queued ahead of the first record that fits into the budget again
+    assert isinstance(items[0], SpillSegment) and items[0].item_count == 2
+    assert items[1].name == "http://c.com"
+    assert budget.in_flight_bytes.value == 50
+
+def test_create_spill_writer(monkeypatch, tmp_path):
+    warnings = []
+    class FakeConfig:
+        settings = {"SEARCH_QUEUE_SPILL_DIRECTORY": str(tmp_path / "scratch"), "SEARCH_QUEUE_SPILL_SEGMENT_KB": 4}
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.log_info", lambda msg: None)
+    monkeypatch.setattr("search.log_warning", lambda msg: warnings.append(msg))
+    monkeypatch.setattr("search.SEARCH_QUEUE", "dummy_queue")
+
+    monkeypatch.setattr("search.IN_FLIGHT_BUDGET", InFlightBytesBudget(100))
+    spill_writer = search.create_spill_writer()
+    assert spill_writer.max_segment_bytes == 4096
+    assert os.path.dirname(spill_writer.spill_directory) == str(tmp_path / "scratch")
+
+    # Nothing can be spilled without an in-flight budget
+    monkeypatch.setattr("search.IN_FLIGHT_BUDGET", None)
+    assert search.create_spill_writer() is None
+    assert len(warnings) == 1
+
+    FakeConfig.settings["SEARCH_QUEUE_SPILL_DIRECTORY"] = None
+    assert search.create_spill_writer() is None
+
+def test_get_records_from_queue_item_reads_spill_segments(tmp_path):
+    spilled_segments = []
+    spill_writer = SpillWriter(type("Q", (), {"put": lambda self, item: spilled_segments.append(item)})(), str(tmp_path), 1024)
+    spill_writer.spill(WarcRecord("parent.gz", "http://a.com", b"first"))
+    spill_writer.spill([WarcRecord("parent.gz", "http://b.com", b"second"), WarcRecord("parent.gz", "http://c.com", b"third")])
+    spill_writer.flush()
+
+    records = list(search.get_records_from_queue_item(spilled_segments[0], None))
+    assert [record.name for record in records] == ["http://a.com", "http://b.com", "http://c.com"]
+    assert not os.path.exists(spilled_segments[0].segment_file_path)
+
+def test_get_records_from_queue_item_logs_missing_spill_segment(monkeypatch, tmp_path):
+    errors = []
+    monkeypatch.setattr("search.log_error", lambda msg: errors.append(msg))
+    assert list(search.get_records_from_queue_item(SpillSegment(str(tmp_path / "missing.segment"), 1), None)) == []
+    assert "missing.segment" in errors[0]
+
+def test_enqueue_warc_record_compresses_over_threshold(monkeypatch):
+    items = []
+    budget = InFlightBytesBudget(1024 * 1024)
+    monkeypatch.setattr("search.SEARCH_QUEUE", type("Q", (), {"put": lambda self, item: items.append(item)})())
+    monkeypatch.setattr("search.RECORD_BATCHER", None)
+    monkeypatch.setattr("search.SPILL_WRITER", None)
+    monkeypatch.setattr("search.IN_FLIGHT_BUDGET", budget)
+    monkeypatch.setattr("search.IN_FLIGHT_COMPRESSOR", InFlightCompressor(10000))
+
+    contents = b"<p>compressible text</p>" * 500
+    search.enqueue_warc_record(WarcRecord("parent.gz", "http://a.com", contents))
+    search.enqueue_warc_record(WarcRecord("parent.gz", "http://b.com", contents))
+
+    # The first record is queued as it is, and the second once the records in flight exceed the threshold
+    assert not isinstance(items[0], CompressedWarcRecord)
+    assert isinstance(items[1], CompressedWarcRecord)
+    # The compressed record only reserves its compressed size
+    assert budget.in_flight_bytes.value == len(contents) + len(items[1].compressed_contents)
+
+def test_create_in_flight_compressor(monkeypatch):
+    warnings = []
+    class FakeConfig:
+        settings = {"IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT": 25}
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.log_info", lambda msg: None)
+    monkeypatch.setattr("search.log_warning", lambda msg: warnings.append(msg))
+
+    monkeypatch.setattr("search.IN_FLIGHT_BUDGET", InFlightBytesBudget(4000))
+    assert search.create_in_flight_compressor().threshold_bytes == 1000
+
+    # The threshold is a percentage of the budget, so there is nothing to compress against without one
+    monkeypatch.setattr("search.IN_FLIGHT_BUDGET", None)
+    assert search.create_in_flight_compressor() is None
+    assert len(warnings) == 1
+
+    FakeConfig.settings["IN_FLIGHT_COMPRESSION_THRESHOLD_PERCENT"] = None
+    assert search.create_in_flight_compressor() is None
+
+def test_get_records_from_queue_item_decompresses_records():
+    contents = b"compressed in flight " * 500
+    compressed_warc_record = InFlightCompressor(0).compress_if_over_threshold(WarcRecord("parent.gz", "http://a.com", contents, "utf-8"), 0)
+
+    records = list(search.get_records_from_queue_item([compressed_warc_record], None))
+    assert [(record.name, record.contents, record.charset) for record in records] == [("http://a.com", contents, "utf-8")]
+
+def test_get_records_from_queue_item_logs_corrupt_compressed_record(monkeypatch):
+    errors = []
+    monkeypatch.setattr("search.log_error", lambda msg: errors.append(msg))
+    corrupt_warc_record = CompressedWarcRecord("parent.gz", "http://a.com", b"not compressed", "zlib")
+
+    assert list(search.get_records_from_queue_item(corrupt_warc_record, None)) == []
+    assert "http://a.com" in errors[0]
+
+def test_create_worker_autoscaler(monkeypatch):
+    class FakeConfig:
+        settings = {"SEARCH_PROCESS_AUTOSCALING": True, "SEARCH_PROCESS_AUTOSCALING_MIN_PROCESSES": 2}
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.log_info", lambda msg: None)
+
+    worker_autoscaler = search.create_worker_autoscaler(6)
+    assert (worker_autoscaler.min_workers, worker_autoscaler.max_workers) == (2, 6)
+    assert worker_autoscaler.active_workers.value == 6
+
+    FakeConfig.settings["SEARCH_PROCESS_AUTOSCALING"] = False
+    assert search.create_worker_autoscaler(6) is None
+
+def test_search_worker_process_records_busy_time(monkeypatch):
+    worker_autoscaler = SearchWorkerAutoscaler(1, 2)
+    monkeypatch.setattr("search.WORKER_AUTOSCALER", worker_autoscaler)
+    monkeypatch.setattr("search.initialize_worker_process_resources", lambda d, record_extraction: {})
+    monkeypatch.setattr("search.finalize_worker_process_resources", lambda *a: None)
+    # Searching the record takes 3 seconds of the fake clock
+    now = [100.0]
+    monkeypatch.setattr(search.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr("search.search_warc_record", lambda *a: now.__setitem__(0, now[0] + 3))
+
+    queue_items = [WarcRecord("parent.gz", "http://a.com", b"x"), None]
+    monkeypatch.setattr("search.SEARCH_QUEUE", type("Q", (), {"get": lambda self: queue_items.pop(0)})())
+    search.search_worker_process({}, {}, False, 1)
+
+    assert worker_autoscaler.busy_seconds[0] == 0
+    assert worker_autoscaler.busy_seconds[1] == 3
+
+def test_search_worker_process_parks_while_inactive(monkeypatch):
+    worker_autoscaler = SearchWorkerAutoscaler(1, 2)
+    worker_autoscaler.set_active_workers(1)
+    monkeypatch.setattr("search.WORKER_AUTOSCALER", worker_autoscaler)
+    monkeypatch.setattr("search.initialize_worker_process_resources", lambda d, record_extraction: {})
+    monkeypatch.setattr("search.finalize_worker_process_resources", lambda *a: None)
+
+    parked = []
+    def fake_park_search_worker_process(search_queue, worker_index):
+        parked.append(worker_index)
+        worker_autoscaler.activate_all_workers()
+    monkeypatch.setattr("search.park_search_worker_process", fake_park_search_worker_process)
+
+    queue_items = [None]
+    monkeypatch.setattr("search.SEARCH_QUEUE", type("Q", (), {"get": lambda self: queue_items.pop(0)})())
+    search.search_worker_process({}, {}, False, 1)
+    assert parked == [1]
+
+def test_park_search_worker_process_releases_ring_slots(monkeypatch):
+    called = {}
+    class FakeRing(search.SharedMemoryRing):
+        def __init__(self): pass
+        def release_held_slots(self): called["released"] = True
+    worker_autoscaler = SearchWorkerAutoscaler(1, 2)
+    monkeypatch.setattr("search.WORKER_AUTOSCALER", worker_autoscaler)
+
+    search.park_search_worker_process(FakeRing(), 0)
+    assert called["released"] is True
+
+def test_monitoring_thread_adjusts_worker_autoscaler(monkeypatch, capsys):
+    class FakeFuture:
+        def __init__(self): self.calls = 0
+        def done(self):
+            self.calls += 1
+            return self.calls >= 2
+
+    adjusted = []
+    worker_autoscaler = SearchWorkerAutoscaler(1, 4)
+    monkeypatch.setattr(worker_autoscaler, "adjust", lambda queue_depth, records_read: adjusted.append((queue_depth, records_read)))
+    monkeypatch.setattr("search.WORKER_AUTOSCALER", worker_autoscaler)
+    monkeypatch.setattr("search.IN_FLIGHT_BUDGET", None)
+    monkeypatch.setattr("search.SEARCH_QUEUE", type("Q", (), {"qsize": staticmethod(lambda: 5)})())
+    monkeypatch.setattr("search.get_total_ram_used_percent", lambda: 10)
+    monkeypatch.setattr("search.monitor_ram_usage", lambda ram, target: None)
+    monkeypatch.setattr(search.time, "sleep", lambda s: None)
+    search.TOTAL_RECORDS_READ = 12
+
+    search.monitoring_thread({FakeFuture()}, 90)
+    assert adjusted == [(5, 12)]
+    assert "Search processes: 4/4" in capsys.readouterr().out
+
+def test_get_queue_item_size():
+    record = WarcRecord("parent.gz", "http://a.com", b"x" * 10)
+    member = WarcMember("parent.gz", 0, 25)
+    spooled = SpooledWarcRecord("parent.gz", "http://b.com", "/spool/b.record")
+    assert search.get_queue_item_size(record) == 10
+    assert search.get_queue_item_size([record, member, spooled]) == 35
+    assert search.get_queue_item_size(SpillSegment("/spill/a.segment", 3)) == 0
+
+def test_search_worker_process_releases_in_flight_bytes(monkeypatch):
+    budget = InFlightBytesBudget(1000)
+    budget.reserve(30)
+    monkeypatch.setattr("search.IN_FLIGHT_BUDGET", budget)
+    monkeypatch.setattr("search.initialize_worker_process_resources", lambda d, record_extraction: {})
+    monkeypatch.setattr("search.finalize_worker_process_resources", lambda *a: None)
+    released_before_search = []
+    monkeypatch.setattr("search.search_warc_record", lambda warc_record, *a: released_before_search.append(budget.in_flight_bytes.value))
+
+    batch = [WarcRecord("parent.gz", "http://a.com", b"x" * 10), WarcRecord("parent.gz", "http://b.com", b"x" * 20)]
+    queue_items = [batch, None]
+    monkeypatch.setattr("search.SEARCH_QUEUE", type("Q", (), {"get": lambda self: queue_items.pop(0)})())
+    search.search_worker_process({}, {}, None)
+
+    # The bytes of a batch are released once all of its records have been searched
+    assert released_before_search == [30, 30]
+    assert budget.in_flight_bytes.value == 0
+
+def test_create_in_flight_budget(monkeypatch):
+    class FakeConfig:
+        settings = {"SEARCH_QUEUE_MAX_IN_FLIGHT_KB": 2}
+    monkeypatch.setattr("search.config", FakeConfig)
+    messages = []
+    monkeypatch.setattr("search.log_info", messages.append)
+    assert search.create_in_flight_budget().max_bytes == 2048
+    # The budget replaces the RAM usage polling, which is logged as the search starts
+    assert "MAX_RAM_USAGE_PERCENT" in messages[0]
+
+    FakeConfig.settings["SEARCH_QUEUE_MAX_IN_FLIGHT_KB"] = None
+    assert search.create_in_flight_budget() is None
+
+def test_monitoring_thread_with_in_flight_budget(monkeypatch, capsys):
+    class FakeFuture:
+        def __init__(self): self.calls = 0
+        def done(self):
+            self.calls += 1
+            return self.calls >= 2
+
+    budget = InFlightBytesBudget(10 * 1024 * 1024)
+    budget.reserve(3 * 1024 * 1024)
+    monkeypatch.setattr("search.IN_FLIGHT_BUDGET", budget)
+    monkeypatch.setattr("search.SEARCH_QUEUE", type("Q", (), {"qsize": staticmethod(lambda: 5)})())
+    monkeypatch.setattr("search.get_total_ram_used_percent", lambda: 95)
+    monkeypatch.setattr("search.monitor_ram_usage", lambda ram, target: (_ for _ in ()).throw(AssertionError("Should not poll RAM usage")))
+    monkeypatch.setattr(search.time, "sleep", lambda s: None)
+
+    search.monitoring_thread({FakeFuture()}, 90)
+    out = capsys.readouterr().out
+    assert "In flight: 3.0 MB" in out
+    assert "RAM used: 95%" in out
+
+def test_start_record_batcher_disabled(monkeypatch):
+    class FakeConfig:
+        settings = {"SEARCH_BATCH_MAX_RECORDS": 1}
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.RECORD_BATCHER", None)
+    monkeypatch.setattr("search.RecordBatcher", lambda *a: (_ for _ in ()).throw(AssertionError("Should not create a batcher")))
+
+    search.start_record_batcher()
+    assert search.RECORD_BATCHER is None
+
+def test_start_and_stop_record_batcher(monkeypatch):
+    called = {}
+    class FakeConfig:
+        settings = {
+            "SEARCH_BATCH_MAX_RECORDS": 100,
+            "SEARCH_BATCH_MAX_KB": 2,
+            "SEARCH_BATCH_FLUSH_TIMEOUT_SECONDS": 0.5,
+        }
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.SEARCH_QUEUE", "dummy_queue")
+    class FakeBatcher:
+        def __init__(self, *args): called["init"] = args
+        def start(self): called["started"] = True
+        def close(self): called["closed"] = True
+    monkeypatch.setattr("search.RecordBatcher", FakeBatcher)
+    monkeypatch.setattr("search.RECORD_BATCHER", None)
+
+    search.start_record_batcher()
+    assert called["init"] == ("dummy_queue", 100, 2048, 0.5)
+    assert called["started"] is True
+
+    search.stop_record_batcher()
+    assert called["closed"] is True
+    assert search.RECORD_BATCHER is None
 
 def test_search_worker_process_stops_on_none(monkeypatch):
     # Plan:
@@ -888,11 +1951,11 @@ def test_search_worker_process_stops_on_none(monkeypatch):
 
     called = {}
 
-    def fake_init_worker_proc_resources(results_and_regexes_dict, zip_files_with_matches):
+    def fake_init_worker_proc_resources(results_and_regexes_dict, record_extraction):
         called["init"] = True
-        return {}, {}
+        return {}
 
-    def fake_finalize_worker_proc_resources(results_and_regexes_dict, results_files_locks_dict, result_files_write_buffers, zip_archives_dict):
+    def fake_finalize_worker_proc_resources(results_and_regexes_dict, results_files_locks_dict, result_files_write_buffers, record_extraction):
         called["finalize"] = True
 
     def fake_search_warc_record(*a, **k):
@@ -904,9 +1967,8 @@ def test_search_worker_process_stops_on_none(monkeypatch):
 
     results_and_regexes_dict = {}
     results_files_locks_dict = {}
-    zip_files_with_matches = False
-
-    search.search_worker_process(FakeQueue(), results_and_regexes_dict, results_files_locks_dict, zip_files_with_matches)
+    monkeypatch.setattr("search.SEARCH_QUEUE", FakeQueue())
+    search.search_worker_process(results_and_regexes_dict, results_files_locks_dict, None)
 
     assert called["init"] is True
     assert called["finalize"] is True
@@ -925,10 +1987,10 @@ def test_search_worker_process_multiple_nones(monkeypatch):
 
     called = {}
 
-    def fake_init_worker_proc_resources(results_and_regexes_dict, zip_files_with_matches):
-        return {}, {}
+    def fake_init_worker_proc_resources(results_and_regexes_dict, record_extraction):
+        return {}
 
-    def fake_finalize_worker_proc_resources(results_and_regexes_dict, results_files_locks_dict, result_files_write_buffers, zip_archives_dict):
+    def fake_finalize_worker_proc_resources(results_and_regexes_dict, results_files_locks_dict, result_files_write_buffers, record_extraction):
         called.setdefault("finalize_count", 0)
         called["finalize_count"] += 1
 
@@ -941,9 +2003,8 @@ def test_search_worker_process_multiple_nones(monkeypatch):
 
     results_and_regexes_dict = {}
     results_files_locks_dict = {}
-    zip_files_with_matches = False
-
-    search.search_worker_process(FakeQueue(), results_and_regexes_dict, results_files_locks_dict, zip_files_with_matches)
+    monkeypatch.setattr("search.SEARCH_QUEUE", FakeQueue())
+    search.search_worker_process(results_and_regexes_dict, results_files_locks_dict, None)
 
     # Only one record processed, finalize called once
     assert len(called["records"]) == 1
@@ -952,27 +2013,19 @@ def test_search_worker_process_multiple_nones(monkeypatch):
 def test_initialize_worker_process_resources_no_zip(monkeypatch):
     # Plan:
     # - Provide a dict of result files
-    # - zip_files_with_matches=False
-    # - Should return a dict of StringIOs, empty zip_archives_dict, no directory created
-
-    called = {}
+    # - No record extraction (ZIP_FILES_WITH_MATCHES disabled)
+    # - Should return a dict of StringIOs, no directory created
 
     # Patch os.makedirs to fail if called
-    monkeypatch.setattr("os.makedirs", lambda path: (_ for _ in ()).throw(AssertionError("Should not create dir")))
-    # Patch os.getpid to a fixed value
-    monkeypatch.setattr("os.getpid", lambda: 12345)
-
-    # Provide a fake get_base_file_name (should not be called)
-    monkeypatch.setattr("search.get_base_file_name", lambda path: (_ for _ in ()).throw(AssertionError("Should not call get_base_file_name")))
+    monkeypatch.setattr("os.makedirs", lambda path, exist_ok=False: (_ for _ in ()).throw(AssertionError("Should not create dir")))
     # Patch zipfile.ZipFile to fail if called
     monkeypatch.setattr("zipfile.ZipFile", lambda *a, **k: (_ for _ in ()).throw(AssertionError("Should not create zip")))
 
     dct = {"/tmp/results1.txt": "regex1", "/tmp/results2.txt": "regex2"}
-    buffers, zips = search.initialize_worker_process_resources(dct, zip_files_with_matches=False)
+    buffers = search.initialize_worker_process_resources(dct, None)
     assert set(buffers.keys()) == set(dct.keys())
     for v in buffers.values():
         assert isinstance(v, StringIO)
-    assert zips == {}
 
 def test_initialize_worker_process_resources_with_zip(monkeypatch, tmp_path):
     # Prepare two fake result file paths in a temporary directory.
@@ -982,23 +2035,21 @@ def test_initialize_worker_process_resources_with_zip(monkeypatch, tmp_path):
     
     # Capture the directory creation call.
     called_makedirs = []
-    def fake_makedirs(path):
+    def fake_makedirs(path, exist_ok=False):
         called_makedirs.append(path)
     monkeypatch.setattr(search.os, "makedirs", fake_makedirs)
     
-    # Monkeypatch get_base_file_name to return the file name (without extension)
-    monkeypatch.setattr(search, "get_base_file_name", lambda path: os.path.splitext(os.path.basename(path))[0])
-    
     # Replace ZipFile with a dummy that records its filename.
     class DummyZip:
         def __init__(self, filename, mode, compression):
             self.filename = filename
         def close(self):
             pass
-    monkeypatch.setattr(search.zipfile, "ZipFile", DummyZip)
+    monkeypatch.setattr("record_extraction.zipfile.ZipFile", DummyZip)
     
     # Call the function under test.
-    buffers, zips = search.initialize_worker_process_resources(results_dict, zip_files_with_matches=True)
+    record_extraction = ZipArchiveExtraction(None)
+    buffers = search.initialize_worker_process_resources(results_dict, record_extraction)
     
     # Assert the buffers dictionary has one StringIO per result file.
     assert set(buffers.keys()) == set(results_dict.keys())
@@ -1006,6 +2057,7 @@ def test_initialize_worker_process_resources_with_zip(monkeypatch, tmp_path):
         assert isinstance(buf, StringIO)
     
     # Expect a zip archive per result file.
+    zips = record_extraction.zip_archives_dict
     assert len(zips) == len(results_dict)
     
     # Compute the expected temporary directory.
@@ -1013,6 +2065,9 @@ def test_initialize_worker_process_resources_with_zip(monkeypatch, tmp_path):
     results_dir = os.path.dirname(result_file1)
     expected_zip_dir = os.path.join(f"{results_dir}/temp", str(os.getpid()))
     assert expected_zip_dir in called_makedirs
+    assert record_extraction.get_streamed_contents_directory() == expected_zip_dir
+    # The record extraction counts what it extracts in the worker process' statistics
+    assert record_extraction.search_statistics is search.SEARCH_STATISTICS
     
     # Verify that each expected result produces a zip file in the archive dict.
     for results_file in results_dict.keys():
@@ -1027,26 +2082,26 @@ def test_initialize_worker_process_resources_empty_dict(monkeypatch):
     def fail_on_call(*args, **kwargs):
         raise AssertionError("Should not call this function")
     monkeypatch.setattr(search.os, "makedirs", fail_on_call)
-    monkeypatch.setattr(search.zipfile, "ZipFile", fail_on_call)
+    monkeypatch.setattr("record_extraction.zipfile.ZipFile", fail_on_call)
     
-    buffers, zips = search.initialize_worker_process_resources({}, zip_files_with_matches=True)
+    record_extraction = ZipArchiveExtraction(None)
+    buffers = search.initialize_worker_process_resources({}, record_extraction)
     assert buffers == {}
-    assert zips == {}
+    assert record_extraction.zip_archives_dict == {}
 
 def test_initialize_worker_process_resources_zipfile_exception(monkeypatch, tmp_path):
     # Plan:
     # - Simulate ZipFile raising an exception
     # - Should propagate the exception
 
-    monkeypatch.setattr("os.makedirs", lambda path: None)
+    monkeypatch.setattr("os.makedirs", lambda path, exist_ok=False: None)
     monkeypatch.setattr("os.getpid", lambda: 42)
-    monkeypatch.setattr("search.get_base_file_name", lambda path: "basename")
     def raise_zip(*a, **k): raise RuntimeError("zipfail")
     monkeypatch.setattr("zipfile.ZipFile", raise_zip)
 
     dct = {str(tmp_path / "f.txt"): "r"}
     try:
-        search.initialize_worker_process_resources(dct, zip_files_with_matches=True)
+        search.initialize_worker_process_resources(dct, ZipArchiveExtraction(None))
         assert False, "Should have raised"
     except RuntimeError as e:
         assert "zipfail" in str(e)
@@ -1066,8 +2121,6 @@ def test_search_warc_record_match_in_name(monkeypatch):
     warc_record = DummyRecord()
     results_and_regexes_dict = {"result.txt": "regex"}
     result_files_write_buffers = {"result.txt": "buffer"}
-    zip_archives_dict = {}
-    zip_files_with_matches = False
 
     def fake_find_regex_matches(val, regex):
         if val == warc_record.name:
@@ -1075,7 +2128,7 @@ def test_search_warc_record_match_in_name(monkeypatch):
         return []
     monkeypatch.setattr("search.find_regex_matches", fake_find_regex_matches)
     monkeypatch.setattr("search.is_file_binary", lambda contents: False)
-    def fake_write_record_info_to_result_output_buffer(buf, matches_in_name, matches_in_contents, parent, name):
+    def fake_write_record_info_to_result_output_buffer(buf, matches_in_name, matches_in_contents, parent, name, contents_match_type="file contents"):
         called["write"] = (buf, matches_in_name, matches_in_contents, parent, name)
     monkeypatch.setattr("search.write_record_info_to_result_output_buffer", fake_write_record_info_to_result_output_buffer)
 
@@ -1083,8 +2136,7 @@ def test_search_warc_record_match_in_name(monkeypatch):
         warc_record,
         results_and_regexes_dict,
         result_files_write_buffers,
-        zip_archives_dict,
-        zip_files_with_matches
+        None
     )
     assert called["write"][0] == "buffer"
     assert called["write"][1] == ["match"]
@@ -1107,8 +2159,6 @@ def test_search_warc_record_match_in_contents(monkeypatch):
     warc_record = DummyRecord()
     results_and_regexes_dict = {"result.txt": "regex"}
     result_files_write_buffers = {"result.txt": "buffer"}
-    zip_archives_dict = {}
-    zip_files_with_matches = False
 
     def fake_find_regex_matches(val, regex):
         if isinstance(val, str) and "matching" in val:
@@ -1116,7 +2166,7 @@ def test_search_warc_record_match_in_contents(monkeypatch):
         return []
     monkeypatch.setattr("search.find_regex_matches", fake_find_regex_matches)
     monkeypatch.setattr("search.is_file_binary", lambda contents: False)
-    def fake_write_record_info_to_result_output_buffer(buf, matches_in_name, matches_in_contents, parent, name):
+    def fake_write_record_info_to_result_output_buffer(buf, matches_in_name, matches_in_contents, parent, name, contents_match_type="file contents"):
         called["write"] = (buf, matches_in_name, matches_in_contents, parent, name)
     monkeypatch.setattr("search.write_record_info_to_result_output_buffer", fake_write_record_info_to_result_output_buffer)
 
@@ -1124,8 +2174,7 @@ def test_search_warc_record_match_in_contents(monkeypatch):
         warc_record,
         results_and_regexes_dict,
         result_files_write_buffers,
-        zip_archives_dict,
-        zip_files_with_matches
+        None
     )
     assert called["write"][0] == "buffer"
     assert called["write"][1] == []
@@ -1140,7 +2189,7 @@ def test_search_warc_record_binary_file_skipped(monkeypatch):
     called = {}
 
     class DummyConfig:
-        settings = {"SEARCH_BINARY_FILES": False}
+        settings = {"SEARCH_BINARY_FILES": False, "DECODE_HTTP_PAYLOADS": False}
     monkeypatch.setattr("search.config", DummyConfig)
 
     class DummyRecord:
@@ -1151,12 +2200,10 @@ def test_search_warc_record_binary_file_skipped(monkeypatch):
     warc_record = DummyRecord()
     results_and_regexes_dict = {"result.txt": "regex"}
     result_files_write_buffers = {"result.txt": "buffer"}
-    zip_archives_dict = {}
-    zip_files_with_matches = False
 
     monkeypatch.setattr("search.find_regex_matches", lambda val, regex: ["nm"] if val == "bin" else [])
     monkeypatch.setattr("search.is_file_binary", lambda contents: True)
-    def fake_write_record_info_to_result_output_buffer(buf, matches_in_name, matches_in_contents, parent, name):
+    def fake_write_record_info_to_result_output_buffer(buf, matches_in_name, matches_in_contents, parent, name, contents_match_type="file contents"):
         called["write"] = (buf, matches_in_name, matches_in_contents, parent, name)
     monkeypatch.setattr("search.write_record_info_to_result_output_buffer", fake_write_record_info_to_result_output_buffer)
 
@@ -1164,8 +2211,7 @@ def test_search_warc_record_binary_file_skipped(monkeypatch):
         warc_record,
         results_and_regexes_dict,
         result_files_write_buffers,
-        zip_archives_dict,
-        zip_files_with_matches
+        None
     )
     assert called["write"][2] == ''
 
@@ -1183,8 +2229,6 @@ def test_search_warc_record_no_match(monkeypatch):
     warc_record = DummyRecord()
     results_and_regexes_dict = {"result.txt": "regex"}
     result_files_write_buffers = {"result.txt": "buffer"}
-    zip_archives_dict = {}
-    zip_files_with_matches = False
 
     monkeypatch.setattr("search.find_regex_matches", lambda val, regex: [])
     monkeypatch.setattr("search.is_file_binary", lambda contents: False)
@@ -1196,8 +2240,7 @@ def test_search_warc_record_no_match(monkeypatch):
         warc_record,
         results_and_regexes_dict,
         result_files_write_buffers,
-        zip_archives_dict,
-        zip_files_with_matches
+        None
     )
     assert "write" not in called
 
@@ -1216,24 +2259,23 @@ def test_search_warc_record_zipfile_success(monkeypatch):
     warc_record = DummyRecord()
     results_and_regexes_dict = {"result.txt": "regex"}
     result_files_write_buffers = {"result.txt": "buffer"}
-    zip_archives_dict = {"zipfile.zip": "zipobj"}
-    zip_files_with_matches = True
+    record_extraction = ZipArchiveExtraction(None)
+    record_extraction.zip_archives_dict = {"zipfile.zip": "zipobj"}
 
     monkeypatch.setattr("search.find_regex_matches", lambda val, regex: ["match"])
     monkeypatch.setattr("search.is_file_binary", lambda contents: False)
     monkeypatch.setattr("search.write_record_info_to_result_output_buffer", lambda *a, **k: None)
-    monkeypatch.setattr("search.get_results_zip_archive_file_path", lambda zdict, rfp: "zipfile.zip")
+    monkeypatch.setattr("record_extraction.get_results_zip_archive_file_path", lambda zdict, rfp: "zipfile.zip")
     def fake_add_file_to_zip_archive(name, contents, zipobj):
         called["add"] = (name, contents, zipobj)
-    monkeypatch.setattr("search.add_file_to_zip_archive", fake_add_file_to_zip_archive)
-    monkeypatch.setattr("search.log_error", lambda msg: called.setdefault("log_error", msg))
+    monkeypatch.setattr("record_extraction.add_file_to_zip_archive", fake_add_file_to_zip_archive)
+    monkeypatch.setattr("record_extraction.log_error", lambda msg: called.setdefault("log_error", msg))
 
     search.search_warc_record(
         warc_record,
         results_and_regexes_dict,
         result_files_write_buffers,
-        zip_archives_dict,
-        zip_files_with_matches
+        record_extraction
     )
     assert called["add"][0] == "zipme"
     assert called["add"][1] == b"zipcontent"
@@ -1254,26 +2296,25 @@ def test_search_warc_record_zipfile_exception(monkeypatch):
     warc_record = DummyRecord()
     results_and_regexes_dict = {"result.txt": "regex"}
     result_files_write_buffers = {"result.txt": "buffer"}
-    zip_archives_dict = {"zipfile.zip": "zipobj"}
-    zip_files_with_matches = True
+    record_extraction = ZipArchiveExtraction(None)
+    record_extraction.zip_archives_dict = {"zipfile.zip": "zipobj"}
 
     monkeypatch.setattr("search.find_regex_matches", lambda val, regex: ["match"])
     monkeypatch.setattr("search.is_file_binary", lambda contents: False)
     monkeypatch.setattr("search.write_record_info_to_result_output_buffer", lambda *a, **k: None)
-    monkeypatch.setattr("search.get_results_zip_archive_file_path", lambda zdict, rfp: "zipfile.zip")
+    monkeypatch.setattr("record_extraction.get_results_zip_archive_file_path", lambda zdict, rfp: "zipfile.zip")
     def fake_add_file_to_zip_archive(name, contents, zipobj):
         raise Exception("fail!")
-    monkeypatch.setattr("search.add_file_to_zip_archive", fake_add_file_to_zip_archive)
+    monkeypatch.setattr("record_extraction.add_file_to_zip_archive", fake_add_file_to_zip_archive)
     def fake_log_error(msg):
         called["log_error"] = msg
-    monkeypatch.setattr("search.log_error", fake_log_error)
+    monkeypatch.setattr("record_extraction.log_error", fake_log_error)
 
     search.search_warc_record(
         warc_record,
         results_and_regexes_dict,
         result_files_write_buffers,
-        zip_archives_dict,
-        zip_files_with_matches
+        record_extraction
     )
     assert "fail!" in called["log_error"]
 
@@ -1303,13 +2344,12 @@ def test_finalize_worker_process_resources_writes_to_file(tmp_path):
     results_and_regexes_dict = {str(output_file): "dummy_regex"}
     result_files_write_buffers = {str(output_file): buffer}
     result_files_write_locks_dict = {str(output_file): FakeLock()}
-    zip_archives_dict = {}  # No zip archives in this test
 
-    # Call the function to finalize worker process resources.
+    # Call the function to finalize worker process resources, with no record extraction in this test.
     search.finalize_worker_process_resources(results_and_regexes_dict,
                                                 result_files_write_locks_dict,
                                                 result_files_write_buffers,
-                                                zip_archives_dict)
+                                                None)
     
     # Verify the file now contains the content from the buffer.
     file_content = output_file.read_text()
@@ -1330,13 +2370,642 @@ def test_finalize_worker_process_resources_closes_zip(tmp_path):
     results_and_regexes_dict = {str(output_file): "dummy_regex"}
     result_files_write_buffers = {str(output_file): buffer}
     result_files_write_locks_dict = {str(output_file): FakeLock()}
-    # Provide a dummy zip archive in the zip_archives_dict.
-    zip_archives_dict = {str(tmp_path / "dummy.zip"): fake_zip}
+    # Provide a dummy zip archive in the zip_archives_dict of the record extraction.
+    record_extraction = ZipArchiveExtraction(None)
+    record_extraction.zip_archives_dict = {str(tmp_path / "dummy.zip"): fake_zip}
 
     # Call the function.
     search.finalize_worker_process_resources(results_and_regexes_dict,
                                                 result_files_write_locks_dict,
                                                 result_files_write_buffers,
-                                                zip_archives_dict)
+                                                record_extraction)
     # Verify that the fake zip archive was closed.
     assert fake_zip.closed is True
+
+def test_search_warc_record_memoryview_contents(monkeypatch):
+    # Records read from the shared memory ring carry their contents as a memoryview
+    called = {}
+
+    class DummyConfig:
+        settings = {"SEARCH_BINARY_FILES": False, "DECODE_HTTP_PAYLOADS": False, "DETECT_CONTENTS_CHARSET": False}
+    monkeypatch.setattr("search.config", DummyConfig)
+
+    class DummyRecord:
+        parent_warc_gz_file = "parent.gz"
+        name = "no-match"
+        contents = memoryview(b"caf\xc3\xa9 content")
+
+    monkeypatch.setattr("search.write_record_info_to_result_output_buffer",
+                        lambda buf, name_matches, contents_matches, parent, name, contents_match_type: called.setdefault("write", contents_matches))
+
+    search.search_warc_record(DummyRecord(), {"result.txt": re.compile("café", re.IGNORECASE)}, {"result.txt": "buffer"}, None)
+    assert called["write"] == ["café"]
+
+def test_search_warc_record_with_combined_matcher(monkeypatch):
+    # Plan:
+    # - With a combined matcher set for the worker process, all definitions are matched through it
+    # - Only definitions with matches are written, with the same arguments as in separate mode
+    written = {}
+    class DummyConfig:
+        settings = {"SEARCH_BINARY_FILES": False, "DECODE_HTTP_PAYLOADS": False, "DETECT_CONTENTS_CHARSET": False}
+    monkeypatch.setattr("search.config", DummyConfig)
+    results_and_regexes_dict = {
+        "keys.txt": re.compile(r"api_key=\w+", re.IGNORECASE),
+        "emails.txt": re.compile(r"\w+@\w+\.com", re.IGNORECASE),
+        "none.txt": re.compile(r"nomatch", re.IGNORECASE),
+    }
+    monkeypatch.setattr("search.COMBINED_MATCHER", search.CombinedMatcher(results_and_regexes_dict))
+    monkeypatch.setattr("search.find_regex_matches", lambda *a: (_ for _ in ()).throw(AssertionError("Should use the combined matcher")))
+    monkeypatch.setattr("search.write_record_info_to_result_output_buffer",
+                        lambda buf, name_matches, contents_matches, parent, name, contents_match_type: written.setdefault(buf, (name_matches, contents_matches)))
+
+    record = WarcRecord(parent_warc_gz_file="parent.gz", name="http://a.com/?api_key=URL", contents=b"api_key=abc mail me@site.com")
+    buffers = {path: path for path in results_and_regexes_dict}
+    search.search_warc_record(record, results_and_regexes_dict, buffers, None)
+
+    assert written == {
+        "keys.txt": (["api_key=URL"], ["api_key=abc"]),
+        "emails.txt": ([], ["me@site.com"]),
+    }
+
+def test_find_regex_matches_for_each_definition_separate(monkeypatch):
+    monkeypatch.setattr("search.COMBINED_MATCHER", None)
+    results_and_regexes_dict = {"a.txt": re.compile("a+"), "b.txt": re.compile("b")}
+    assert search.find_regex_matches_for_each_definition("aab a", results_and_regexes_dict) == {"a.txt": ["aa", "a"], "b.txt": ["b"]}
+
+def test_initialize_worker_process_resources_creates_combined_matcher(monkeypatch):
+    class FakeConfig:
+        settings = {"REGEX_MATCHING_MODE": "combined", "LITERAL_PREFILTER": False, "CONTENTS_SEARCH_MODE": "text"}
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.COMBINED_MATCHER", None)
+
+    search.initialize_worker_process_resources({"a.txt": re.compile("abc")}, None)
+
+    assert isinstance(search.COMBINED_MATCHER, search.CombinedMatcher)
+    assert search.COMBINED_MATCHER.combined_results_file_paths == ["a.txt"]
+
+def test_log_combined_matcher_summary(monkeypatch):
+    logged = []
+    monkeypatch.setattr("search.log_info", lambda msg: logged.append(msg))
+
+    search.log_combined_matcher_summary({"dir/keys_results.txt": re.compile("abc"), "dir/repeats_results.txt": re.compile(r"(a)\1")})
+
+    assert logged[0].startswith("Combining 1 of 2 regex definitions")
+    assert logged[1].endswith("searched separately: repeats_results")
+
+def test_initialize_worker_process_globals_hands_over_literal_prefilters(monkeypatch):
+    # The prefilters built with the regex patterns in the main process are handed to the worker processes, not rebuilt in them
+    literal_prefilters_dict = create_literal_prefilters_dict({"keys.txt": re.compile(r"api_key=\w+")})
+    monkeypatch.setattr("search.LITERAL_PREFILTERS", literal_prefilters_dict)
+    worker_process_globals = pickle.loads(pickle.dumps(search.get_worker_process_globals()))
+    monkeypatch.setattr("search.LITERAL_PREFILTERS", None)
+    monkeypatch.setattr("search.config.settings", dict(search.config.settings))
+
+    search.initialize_worker_process_globals(worker_process_globals)
+
+    assert list(search.LITERAL_PREFILTERS) == ["keys.txt"]
+    assert search.LITERAL_PREFILTERS["keys.txt"].required_literals == ["api_key="]
+
+def test_search_warc_record_with_literal_prefilters(monkeypatch):
+    # Plan:
+    # - Definitions whose prefilter rejects the contents are not searched, and the rejection is counted
+    # - Definitions without a prefilter are always searched
+    # - The results are the same as without the prefilter
+    written = {}
+    class DummyConfig:
+        settings = {"SEARCH_BINARY_FILES": False, "DECODE_HTTP_PAYLOADS": False, "DETECT_CONTENTS_CHARSET": False}
+    monkeypatch.setattr("search.config", DummyConfig)
+    results_and_regexes_dict = {
+        "keys.txt": re.compile(r"api_key=\w+", re.IGNORECASE),
+        "emails.txt": re.compile(r"\w+@example\.com", re.IGNORECASE),
+        "digits.txt": re.compile(r"\d+", re.IGNORECASE),
+    }
+    monkeypatch.setattr("search.COMBINED_MATCHER", None)
+    monkeypatch.setattr("search.LITERAL_PREFILTERS", create_literal_prefilters_dict(results_and_regexes_dict))
+    monkeypatch.setattr("search.SEARCH_STATISTICS", search.SearchStatistics())
+    searched = []
+    original_find_regex_matches = search.find_regex_matches
+    def tracking_find_regex_matches(input_string, regex):
+        searched.append(regex.pattern)
+        return original_find_regex_matches(input_string, regex)
+    monkeypatch.setattr("search.find_regex_matches", tracking_find_regex_matches)
+    monkeypatch.setattr("search.write_record_info_to_result_output_buffer",
+                        lambda buf, name_matches, contents_matches, parent, name, contents_match_type: written.setdefault(buf, contents_matches))
+
+    record = WarcRecord(parent_warc_gz_file="parent.gz", name="name", contents=b"API_KEY=abc 42")
+    buffers = {path: path for path in results_and_regexes_dict}
+    search.search_warc_record(record, results_and_regexes_dict, buffers, None)
+
+    assert written == {"keys.txt": ["API_KEY=abc"], "digits.txt": ["42"]}
+    # The email regex only ran against the record name
+    assert searched.count(r"\w+@example\.com") == 1
+    assert search.SEARCH_STATISTICS.prefilter_counters == {
+        "keys.txt": {"rejected": 0, "passed": 1, "matched": 1},
+        "emails.txt": {"rejected": 1, "passed": 0, "matched": 0},
+    }
+
+def test_find_regex_matches_in_contents_all_rejected(monkeypatch):
+    class FakeConfig:
+        settings = {"DETECT_CONTENTS_CHARSET": False}
+    monkeypatch.setattr("search.config", FakeConfig)
+    results_and_regexes_dict = {"keys.txt": re.compile(r"api_key", re.IGNORECASE)}
+    monkeypatch.setattr("search.LITERAL_PREFILTERS", create_literal_prefilters_dict(results_and_regexes_dict))
+    monkeypatch.setattr("search.SEARCH_STATISTICS", search.SearchStatistics())
+    monkeypatch.setattr("search.find_regex_matches_for_each_definition", lambda *a: (_ for _ in ()).throw(AssertionError("Should not search")))
+
+    record = WarcRecord(parent_warc_gz_file="parent.gz", name="name", contents=b"nothing here")
+    assert search.find_regex_matches_in_contents(record, results_and_regexes_dict) == {}
+
+def test_log_search_statistics_merges_worker_results(monkeypatch):
+    logged = []
+    monkeypatch.setattr("search_statistics.log_info", lambda msg: logged.append(msg))
+    class FakeFuture:
+        def __init__(self, result, exception=None):
+            self._result, self._exception = result, exception
+        def exception(self): return self._exception
+        def result(self): return self._result
+    first, second = search.SearchStatistics(), search.SearchStatistics()
+    first.count_prefilter_result("dir/keys_results.txt", passed=False)
+    second.count_prefilter_result("dir/keys_results.txt", passed=True, matched=True)
+
+    search.log_search_statistics([FakeFuture(first), FakeFuture(second), FakeFuture(None), FakeFuture(None, RuntimeError())], None)
+
+    assert logged == ["Literal prefilter for keys_results: 1 of 2 records rejected (50.0%), 1 searched, of which 1 matched."]
+
+def test_search_worker_process_returns_statistics(monkeypatch):
+    class FakeQueue:
+        def get(self): return None
+    monkeypatch.setattr("search.initialize_worker_process_resources", lambda d, record_extraction: {})
+    monkeypatch.setattr("search.finalize_worker_process_resources", lambda *a: None)
+    statistics = search.SearchStatistics()
+    monkeypatch.setattr("search.SEARCH_STATISTICS", statistics)
+
+    monkeypatch.setattr("search.SEARCH_QUEUE", FakeQueue())
+    assert search.search_worker_process({}, {}, None) is statistics
+
+def test_initialize_worker_process_resources_creates_bytes_regexes(monkeypatch):
+    class FakeConfig:
+        settings = {"REGEX_MATCHING_MODE": "separate", "LITERAL_PREFILTER": False, "CONTENTS_SEARCH_MODE": "bytes"}
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.BYTES_REGEXES", None)
+
+    search.initialize_worker_process_resources({"a.txt": re.compile("abc"), "b.txt": re.compile("é")}, None)
+
+    assert list(search.BYTES_REGEXES) == ["a.txt"]
+
+def test_find_regex_matches_in_record_text_searches_ascii_contents_as_bytes(monkeypatch):
+    # Plan:
+    # - ASCII contents are searched as bytes by definitions with a bytes regex, without being decoded
+    # - Definitions without a bytes regex decode the contents, and only once
+    results_and_regexes_dict = {"keys.txt": re.compile(r"api_key=\w+", re.IGNORECASE), "accents.txt": re.compile(r"é|key")}
+    monkeypatch.setattr("search.COMBINED_MATCHER", None)
+    monkeypatch.setattr("search.BYTES_REGEXES", search.create_bytes_regexes_dict(results_and_regexes_dict))
+
+    record_text = search.RecordText(b"API_KEY=abc")
+    matches = search.find_regex_matches_in_record_text(record_text, {"keys.txt": results_and_regexes_dict["keys.txt"]})
+    assert matches == {"keys.txt": ["API_KEY=abc"]}
+    assert record_text.decoded_text is None
+
+    record_text = search.RecordText(b"API_KEY=abc")
+    assert search.find_regex_matches_in_record_text(record_text, results_and_regexes_dict) == {"keys.txt": ["API_KEY=abc"], "accents.txt": []}
+    assert record_text.decoded_text == "API_KEY=abc"
+
+def test_find_regex_matches_in_record_text_decodes_non_ascii_contents(monkeypatch):
+    results_and_regexes_dict = {"words.txt": re.compile(r"\w+")}
+    monkeypatch.setattr("search.COMBINED_MATCHER", None)
+    monkeypatch.setattr("search.BYTES_REGEXES", search.create_bytes_regexes_dict(results_and_regexes_dict))
+    monkeypatch.setattr("search.find_bytes_regex_matches", lambda *a: (_ for _ in ()).throw(AssertionError("Should search the decoded text")))
+
+    # Searched as bytes, \w would stop at the first byte of 'é'
+    record_text = search.RecordText("café".encode())
+    assert search.find_regex_matches_in_record_text(record_text, results_and_regexes_dict) == {"words.txt": ["café"]}
+
+@pytest.mark.parametrize("detect_charset, charset, expected_matches", [
+    (True, "windows-1252", ["café"]),
+    (False, "windows-1252", ["caf"]),
+    (True, None, ["caf"]),
+])
+def test_find_regex_matches_in_contents_uses_declared_charset(monkeypatch, detect_charset, charset, expected_matches):
+    class FakeConfig:
+        settings = {"DETECT_CONTENTS_CHARSET": detect_charset}
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.COMBINED_MATCHER", None)
+    monkeypatch.setattr("search.LITERAL_PREFILTERS", None)
+    monkeypatch.setattr("search.BYTES_REGEXES", None)
+
+    record = WarcRecord(parent_warc_gz_file="parent.gz", name="name", contents="café".encode("windows-1252"), charset=charset)
+    assert search.find_regex_matches_in_contents(record, {"words.txt": re.compile(r"\w+")}) == {"words.txt": expected_matches}
+
+def test_log_search_statistics_adds_records_skipped_by_main_process(monkeypatch):
+    logged = []
+    monkeypatch.setattr("search_statistics.log_info", lambda msg: logged.append(msg))
+    record_filter = search.RecordFilter(denied_content_types=["image/*"])
+    record_filter.skipped_records["Content-Type"] = 2
+    monkeypatch.setattr("search.RECORD_FILTER", record_filter)
+    class FakeFuture:
+        def exception(self): return None
+        def result(self):
+            worker_statistics = search.SearchStatistics()
+            worker_statistics.count_skipped_records({"Content-Type": 3})
+            return worker_statistics
+
+    search.log_search_statistics([FakeFuture()], None)
+
+    assert logged == ["Record filters skipped 5 records before reading their contents: 5 by Content-Type."]
+
+def test_iterate_warc_gz_records_passes_record_filter(monkeypatch):
+    class DummyStream:
+        def __init__(self, *a): pass
+        def __enter__(self): return self
+        def __exit__(self, exc_type, exc_val, exc_tb): pass
+    received = {}
+    def fake_archive_iterator(*a, **k):
+        received.update(k)
+        return iter([])
+    record_filter = search.RecordFilter(min_content_length=1)
+    monkeypatch.setattr("search.FileStream", DummyStream)
+    monkeypatch.setattr("search.GZipStream", DummyStream)
+    monkeypatch.setattr("search.ArchiveIterator", fake_archive_iterator)
+    monkeypatch.setattr("search.RECORD_FILTER", record_filter)
+    monkeypatch.setattr("search.log_warning", lambda msg: None)
+
+    assert list(search.iterate_warc_gz_records("file.gz")) == []
+    assert received["func_filter"] is record_filter
+
+def test_initialize_worker_process_resources_resets_record_filter(monkeypatch):
+    class FakeConfig:
+        settings = {"REGEX_MATCHING_MODE": "separate", "LITERAL_PREFILTER": False, "CONTENTS_SEARCH_MODE": "text"}
+    monkeypatch.setattr("search.config", FakeConfig)
+    record_filter = search.RecordFilter(min_content_length=1)
+    record_filter.skipped_records["content length"] = 4
+    monkeypatch.setattr("search.RECORD_FILTER", record_filter)
+
+    search.initialize_worker_process_resources({}, None)
+
+    assert record_filter.skipped_records["content length"] == 0
+
+def test_initialize_worker_process_resources_creates_definition_scopes(monkeypatch):
+    class FakeConfig:
+        settings = {"REGEX_MATCHING_MODE": "separate", "LITERAL_PREFILTER": False, "CONTENTS_SEARCH_MODE": "text"}
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.DEFINITION_SCOPES", {})
+    regex = re.compile("a")
+
+    search.initialize_worker_process_resources(
+        {"servers.headers_results.txt": regex, "emails.body_results.txt": regex, "keys_results.txt": regex}, None
+    )
+
+    assert search.DEFINITION_SCOPES == {"servers.headers_results.txt": "headers", "emails.body_results.txt": "body"}
+
+def test_search_warc_record_with_definition_scopes(monkeypatch):
+    # Plan:
+    # - Headers scoped definitions only search the HTTP headers, and their matches are labeled as such
+    # - Body scoped definitions drop their matches in the URI, and definitions without a scope are unchanged
+    written = {}
+    class DummyConfig:
+        settings = {"SEARCH_BINARY_FILES": False, "DECODE_HTTP_PAYLOADS": False, "DETECT_CONTENTS_CHARSET": False}
+    monkeypatch.setattr("search.config", DummyConfig)
+    results_and_regexes_dict = {
+        "servers.headers.txt": re.compile(r"nginx", re.IGNORECASE),
+        "servers.body.txt": re.compile(r"nginx", re.IGNORECASE),
+        "servers.txt": re.compile(r"nginx", re.IGNORECASE),
+    }
+    monkeypatch.setattr("search.DEFINITION_SCOPES", {"servers.headers.txt": "headers", "servers.body.txt": "body"})
+    monkeypatch.setattr("search.write_record_info_to_result_output_buffer",
+                        lambda buf, name_matches, contents_matches, parent, name, contents_match_type:
+                        written.setdefault(buf, (name_matches, contents_matches, contents_match_type)))
+
+    record = WarcRecord(parent_warc_gz_file="parent.gz", name="http://nginx.org/", contents=b"<p>nginx docs</p>",
+                        http_headers=b"HTTP/1.1 200 OK\r\nServer: NGINX\r\n")
+    buffers = {path: path for path in results_and_regexes_dict}
+    search.search_warc_record(record, results_and_regexes_dict, buffers, None)
+
+    assert written == {
+        "servers.headers.txt": ([], ["NGINX"], "HTTP headers"),
+        "servers.body.txt": ([], ["nginx"], "file contents"),
+        "servers.txt": (["nginx"], ["nginx"], "file contents"),
+    }
+
+def test_search_warc_record_decodes_http_payload(monkeypatch):
+    import gzip
+    written = {}
+    class DummyConfig:
+        settings = {"SEARCH_BINARY_FILES": False, "DECODE_HTTP_PAYLOADS": True, "DETECT_CONTENTS_CHARSET": False}
+    monkeypatch.setattr("search.config", DummyConfig)
+    monkeypatch.setattr("search.write_record_info_to_result_output_buffer",
+                        lambda buf, name_matches, contents_matches, parent, name, contents_match_type: written.setdefault(buf, contents_matches))
+
+    record = WarcRecord(parent_warc_gz_file="parent.gz", name="http://a.com/", contents=gzip.compress(b"compressed secret"),
+                        http_headers=b"HTTP/1.1 200 OK\r\nContent-Encoding: gzip\r\n")
+    search.search_warc_record(record, {"result.txt": re.compile("secret")}, {"result.txt": "result.txt"}, None)
+
+    assert written == {"result.txt": ["secret"]}
+
+def test_search_warc_record_reuses_matches_of_duplicate_payloads(monkeypatch):
+    written = []
+    searched_contents = []
+    class DummyConfig:
+        settings = {"SEARCH_BINARY_FILES": False, "DECODE_HTTP_PAYLOADS": False, "DETECT_CONTENTS_CHARSET": False}
+    monkeypatch.setattr("search.config", DummyConfig)
+    monkeypatch.setattr("payload_digest_cache.config", DummyConfig)
+    monkeypatch.setattr("search.PAYLOAD_DIGEST_CACHE", PayloadDigestCache(10))
+    monkeypatch.setattr("search.SEARCH_STATISTICS", SearchStatistics())
+    monkeypatch.setattr("search.DEFINITION_SCOPES", {})
+    original_find_regex_matches_in_contents = search.find_regex_matches_in_contents
+    monkeypatch.setattr("search.find_regex_matches_in_contents",
+                        lambda warc_record, regexes: searched_contents.append(warc_record.name) or original_find_regex_matches_in_contents(warc_record, regexes))
+    monkeypatch.setattr("search.write_record_info_to_result_output_buffer",
+                        lambda buf, name_matches, contents_matches, parent, name, contents_match_type: written.append((name, name_matches, contents_matches)))
+
+    results_and_regexes_dict = {"result.txt": re.compile(r"secret\w*")}
+    for name, payload_digest in (("http://a.com/secret_page", "sha1:ABC"), ("http://b.com/", "sha1:ABC"), ("http://c.com/", None)):
+        record = WarcRecord("parent.gz", name, b"the secret_key", payload_identity=PayloadIdentity(payload_digest, None))
+        search.search_warc_record(record, results_and_regexes_dict, {"result.txt": "result.txt"}, None)
+
+    # The record without a WARC-Payload-Digest is identified by a hash of its contents, so it is searched again
+    assert searched_contents == ["http://a.com/secret_page", "http://c.com/"]
+    assert written == [
+        ("http://a.com/secret_page", ["secret_page"], ["secret_key"]),
+        ("http://b.com/", [], ["secret_key"]),
+        ("http://c.com/", [], ["secret_key"]),
+    ]
+    assert search.SEARCH_STATISTICS.duplicate_payloads == {"searched": 2, "reused": 1}
+
+def test_search_warc_record_resolves_revisit_records(monkeypatch):
+    written = []
+    class DummyConfig:
+        settings = {"SEARCH_BINARY_FILES": False, "DECODE_HTTP_PAYLOADS": False, "DETECT_CONTENTS_CHARSET": False}
+    monkeypatch.setattr("search.config", DummyConfig)
+    monkeypatch.setattr("payload_digest_cache.config", DummyConfig)
+    monkeypatch.setattr("search.PAYLOAD_DIGEST_CACHE", PayloadDigestCache(10))
+    monkeypatch.setattr("search.SEARCH_STATISTICS", SearchStatistics())
+    monkeypatch.setattr("search.DEFINITION_SCOPES", {})
+    monkeypatch.setattr("search.write_record_info_to_result_output_buffer",
+                        lambda buf, name_matches, contents_matches, parent, name, contents_match_type: written.append((name, contents_matches)))
+
+    results_and_regexes_dict = {"result.txt": re.compile(r"secret")}
+    buffers = {"result.txt": "result.txt"}
+    search.search_warc_record(WarcRecord("parent.gz", "http://a.com/", b"a secret", payload_identity=PayloadIdentity("sha1:ABC", "<urn:uuid:1>")),
+                              results_and_regexes_dict, buffers, None)
+    for refers_to, payload_digest in (("<urn:uuid:1>", None), (None, "sha1:ABC"), ("<urn:uuid:9>", "sha1:DEF")):
+        revisit_record = WarcRecord("parent.gz", "http://a.com/again", b"", payload_identity=PayloadIdentity(payload_digest, None, refers_to, True))
+        search.search_warc_record(revisit_record, results_and_regexes_dict, buffers, None)
+
+    assert written == [("http://a.com/", ["secret"]), ("http://a.com/again", ["secret"]), ("http://a.com/again", ["secret"])]
+    assert search.SEARCH_STATISTICS.duplicate_payloads == {"searched": 1, "resolved revisits": 2, "unresolved revisits": 1}
+
+def test_search_warc_record_reuses_matches_in_match_memo(monkeypatch, tmp_path):
+    written = []
+    searched_regexes = []
+    class DummyConfig:
+        settings = {"SEARCH_BINARY_FILES": False, "DECODE_HTTP_PAYLOADS": False, "DETECT_CONTENTS_CHARSET": False}
+    monkeypatch.setattr("search.config", DummyConfig)
+    monkeypatch.setattr("payload_digest_cache.config", DummyConfig)
+    monkeypatch.setattr("search.SEARCH_STATISTICS", SearchStatistics())
+    monkeypatch.setattr("search.DEFINITION_SCOPES", {})
+    original_find_regex_matches_in_contents = search.find_regex_matches_in_contents
+    monkeypatch.setattr("search.find_regex_matches_in_contents",
+                        lambda warc_record, regexes: searched_regexes.append(list(regexes)) or original_find_regex_matches_in_contents(warc_record, regexes))
+    monkeypatch.setattr("search.write_record_info_to_result_output_buffer",
+                        lambda buf, name_matches, contents_matches, parent, name, contents_match_type: written.append((buf, contents_matches)))
+
+    memo_file_path = str(tmp_path / "memo.sqlite3")
+    results_and_regexes_dict = {"keys.txt": re.compile(r"secret\w*")}
+    # Each search adds a definition, as a later execution searching the same crawl would
+    for results_and_regexes_dict in (results_and_regexes_dict, results_and_regexes_dict | {"tokens.txt": re.compile(r"token")}):
+        match_memo = MatchMemo(memo_file_path, results_and_regexes_dict)
+        monkeypatch.setattr("search.MATCH_MEMO", match_memo)
+        match_memo.start_worker()
+        record = WarcRecord("parent.gz", "http://a.com/", b"the secret_key", payload_identity=PayloadIdentity("sha1:ABC", None))
+        search.search_warc_record(record, results_and_regexes_dict, {path: path for path in results_and_regexes_dict}, None)
+        match_memo.finish_worker()
+
+    assert searched_regexes == [["keys.txt"], ["tokens.txt"]]
+    assert written == [("keys.txt", ["secret_key"]), ("keys.txt", ["secret_key"])]
+    assert search.SEARCH_STATISTICS.match_memo_lookups == {"reused": 1, "searched": 2}
+
+@pytest.mark.parametrize("streaming_search_threshold_kb", [None, 1])
+def test_deferred_extraction_process_adds_records_to_zip_archives_of_their_definitions(monkeypatch, tmp_path, streaming_search_threshold_kb):
+    import gzip
+    members = [gzip.compress(make_warc_record("http://a.com/1", b"first")), gzip.compress(make_warc_record("http://a.com/2", b"second " * 1000))]
+    (tmp_path / "source.warc.gz").write_bytes(b"".join(members) + b"not a gzip member")
+    warc_gz_file_path = str(tmp_path / "source.warc.gz")
+
+    class FakeConfig:
+        settings = {"DECODE_HTTP_PAYLOADS": False, "STREAMING_SEARCH_THRESHOLD_KB": streaming_search_threshold_kb}
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.log_error", lambda msg: None)
+
+    keys_results_file_path, tokens_results_file_path = str(tmp_path / "keys_results.txt"), str(tmp_path / "tokens_results.txt")
+    statistics = search.deferred_extraction_process([
+        (WarcMember(warc_gz_file_path, 0, len(members[0])), [keys_results_file_path]),
+        (WarcMember(warc_gz_file_path, len(members[0]), len(members[1])), [keys_results_file_path, tokens_results_file_path]),
+        (WarcMember(warc_gz_file_path, len(members[0]) + len(members[1]), 17), [keys_results_file_path]),
+    ], str(tmp_path / "temp"), ZipCompressionPolicy("deflate", None, False))
+
+    zip_temp_dir_for_process = tmp_path / "temp" / str(os.getpid())
+    with zipfile.ZipFile(zip_temp_dir_for_process / "keys_results.zip") as zip_archive:
+        assert zip_archive.namelist() == ["a.com1", "a.com2"]
+        assert zip_archive.read("a.com2") == b"second " * 1000
+    with zipfile.ZipFile(zip_temp_dir_for_process / "tokens_results.zip") as zip_archive:
+        assert zip_archive.namelist() == ["a.com2"]
+    assert statistics.deferred_extraction["extracted records"] == 2
+    assert statistics.deferred_extraction["unreadable records"] == 1
+    assert statistics.zip_compression[keys_results_file_path]["files"] == 2
+
+def test_perform_deferred_extraction_keeps_scoped_definitions_apart(monkeypatch, tmp_path):
+    import gzip
+    member = gzip.compress(make_warc_record("http://a.com/1", b"X-Key: secret"))
+    (tmp_path / "source.warc.gz").write_bytes(member)
+    recorder = MatchLocationRecorder()
+    recorder.start_worker(str(tmp_path))
+    recorder.add_record(WarcMember(str(tmp_path / "source.warc.gz"), 0, len(member)), [str(tmp_path / "keys.headers_results.txt")])
+    recorder.finish_worker()
+
+    class FakeConfig:
+        settings = {
+            "DECODE_HTTP_PAYLOADS": False, "STREAMING_SEARCH_THRESHOLD_KB": None, "MAX_CONCURRENT_SEARCH_PROCESSES": 2, 
+            "ZIP_COMPRESSION": "deflate", "ZIP_COMPRESSION_BY_DEFINITION": {"keys.headers": "stored"}, "ZIP_STORE_COMPRESSED_FORMATS": False
+        }
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("results.results_output_subdirectory", str(tmp_path))
+    for log_function in ("search.log_info", "results.log_info"):
+        monkeypatch.setattr(log_function, lambda msg: None)
+
+    search.perform_deferred_extraction(str(tmp_path / "match_locations.tsv"))
+
+    assert sorted(file_name for file_name in os.listdir(tmp_path) if file_name.endswith(".zip")) == ["keys.headers_results.zip"]
+    with zipfile.ZipFile(tmp_path / "keys.headers_results.zip") as zip_archive:
+        assert [(zip_info.filename, zip_info.compress_type) for zip_info in zip_archive.infolist()] == [("a.com1", zipfile.ZIP_STORED)]
+
+def test_search_streamed_warc_record_adds_contents_to_blob_store(monkeypatch, tmp_path):
+    import io
+    class DummyConfig:
+        settings = {"SEARCH_BINARY_FILES": False, "DETECT_CONTENTS_CHARSET": False, "DECODE_HTTP_PAYLOADS": False, "STREAMING_CHUNK_SIZE_KB": 1, "STREAMING_OVERLAP_KB": 1}
+    monkeypatch.setattr("search.config", DummyConfig)
+    monkeypatch.setattr("search.DEFINITION_SCOPES", {})
+    monkeypatch.setattr("search.SEARCH_STATISTICS", SearchStatistics())
+    monkeypatch.setattr("search.write_record_info_to_result_output_buffer", lambda *args, **kwargs: None)
+    record_extraction = BlobStoreExtraction(BlobStore(str(tmp_path / "blobs")))
+    record_extraction.start_worker(["result.txt"], str(tmp_path), 0, search.SEARCH_STATISTICS)
+
+    contents = b"a" * 1020 + b" secret=12345 " + b"b" * 3000
+    warc_record = StreamedWarcRecord("parent.gz", "http://a.com/big", io.BytesIO(contents))
+    search.search_warc_record(warc_record, {"result.txt": re.compile(r"secret=\d+")}, {"result.txt": "result.txt"}, record_extraction)
+    record_extraction.finish_worker()
+
+    assert list(read_blob_manifest(str(tmp_path / "result.manifest.tsv"))) == [("a.combig", hashlib.sha256(contents).hexdigest(), len(contents))]
+    assert search.SEARCH_STATISTICS.blob_store["blobs written"] == 1
+    # Only the blob's subdirectory remains, without the copy of the contents or the blob's temporary file
+    assert len(os.listdir(tmp_path / "blobs")) == 1
+
+def test_iterate_warc_gz_records_streams_records_above_threshold(monkeypatch):
+    class DummyStream:
+        def __init__(self, *a): pass
+        def __enter__(self): return self
+        def __exit__(self, exc_type, exc_val, exc_tb): pass
+    class DummyRecord:
+        http_headers = None
+        def __init__(self, uri, content):
+            self.headers = {'WARC-Target-URI': uri}
+            self.content_length = len(content)
+            self.reader = type("R", (), {"read": staticmethod(lambda *a: content)})
+    class FakeConfig:
+        settings = {"STREAMING_SEARCH_THRESHOLD_KB": 1}
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.FileStream", DummyStream)
+    monkeypatch.setattr("search.GZipStream", DummyStream)
+    monkeypatch.setattr("search.ArchiveIterator", lambda *a, **k: iter([DummyRecord("small", b"1" * 1024), DummyRecord("big", b"2" * 1025)]))
+
+    records = list(search.iterate_warc_gz_records("file.gz"))
+
+    assert isinstance(records[0], WarcRecord)
+    assert isinstance(records[1], StreamedWarcRecord)
+    assert records[1].name == "big"
+
+def test_iterate_warc_gz_records_reads_revisit_records_with_payload_digest_cache(monkeypatch):
+    from fastwarc.warc import WarcRecordType
+    class DummyStream:
+        def __init__(self, *a): pass
+        def __enter__(self): return self
+        def __exit__(self, exc_type, exc_val, exc_tb): pass
+    class DummyRecord:
+        http_headers = None
+        def __init__(self, uri, content, record_type):
+            self.headers = {'WARC-Target-URI': uri, 'WARC-Payload-Digest': "sha1:ABC", 'WARC-Record-ID': f"<urn:uuid:{uri}>"}
+            self.content_length = len(content)
+            self.record_type = record_type
+            self.reader = type("R", (), {"read": staticmethod(lambda *a: content)})
+    class FakeConfig:
+        settings = {"STREAMING_SEARCH_THRESHOLD_KB": 0}
+    record_types = []
+    def archive_iterator(*a, **k):
+        record_types.append(k["record_types"])
+        return iter([DummyRecord("original", b"1", WarcRecordType.response), DummyRecord("revisit", b"2", WarcRecordType.revisit)])
+    monkeypatch.setattr("search.config", FakeConfig)
+    monkeypatch.setattr("search.FileStream", DummyStream)
+    monkeypatch.setattr("search.GZipStream", DummyStream)
+    monkeypatch.setattr("search.ArchiveIterator", archive_iterator)
+    monkeypatch.setattr("search.PAYLOAD_DIGEST_CACHE", PayloadDigestCache(10))
+
+    records = list(search.iterate_warc_gz_records("file.gz"))
+
+    assert record_types == [WarcRecordType.response | WarcRecordType.revisit]
+    assert isinstance(records[0], StreamedWarcRecord)
+    # Revisit records are never streamed
+    assert isinstance(records[1], WarcRecord)
+    assert records[1].payload_identity == PayloadIdentity("sha1:ABC", "<urn:uuid:revisit>", None, True)
+
+def test_read_warc_gz_records_spools_streamed_records(monkeypatch, tmp_path):
+    import io
+    class FakeConfig:
+        settings = {"STREAMING_CHUNK_SIZE_KB": 1}
+    monkeypatch.setattr("search.config", FakeConfig)
+    streamed_warc_record = StreamedWarcRecord("file.gz", "big", io.BytesIO(b"x" * 3000), "utf-8")
+    monkeypatch.setattr("search.iterate_warc_gz_records", lambda path, records_to_skip=0: iter([streamed_warc_record]))
+    monkeypatch.setattr("search.get_spool_directory", lambda: str(tmp_path / "spool"))
+    monkeypatch.setattr(search.PAUSE_READ_THREADS_EVENT, "wait", lambda: None)
+    queued = []
+    monkeypatch.setattr("search.enqueue_warc_record", lambda warc_record: queued.append(warc_record))
+
+    search.read_warc_gz_records("file.gz")
+
+    assert len(queued) == 1
+    assert isinstance(queued[0], SpooledWarcRecord)
+    assert (queued[0].name, queued[0].charset) == ("big", "utf-8")
+    with open(queued[0].spool_file_path, "rb") as spool_file:
+        assert spool_file.read() == b"x" * 3000
+
+def test_search_streamed_warc_record(monkeypatch, tmp_path):
+    # Plan:
+    # - The contents are searched in chunks, finding matches that span chunk boundaries
+    # - The record is not rewindable, so its contents are copied while read and then streamed into the zip archive
+    import io
+    class DummyConfig:
+        settings = {"SEARCH_BINARY_FILES": False, "DETECT_CONTENTS_CHARSET": False, "DECODE_HTTP_PAYLOADS": False, "STREAMING_CHUNK_SIZE_KB": 1, "STREAMING_OVERLAP_KB": 1}
+    monkeypatch.setattr("search.config", DummyConfig)
+    monkeypatch.setattr("search.DEFINITION_SCOPES", {})
+    written = {}
+    monkeypatch.setattr("search.write_record_info_to_result_output_buffer",
+                        lambda buf, name_matches, contents_matches, parent, name, contents_match_type: written.setdefault(buf, contents_matches))
+
+    contents = b"a" * 1020 + b" secret=12345 " + b"b" * 3000
+    zip_archive_path = str(tmp_path / "result.zip")
+    record_extraction = ZipArchiveExtraction(None)
+    record_extraction.start_worker(["result.txt"], str(tmp_path), 0, SearchStatistics())
+    warc_record = StreamedWarcRecord("parent.gz", "http://a.com/big", io.BytesIO(contents))
+
+    search.search_warc_record(warc_record, {"result.txt": re.compile(r"secret=\d+")}, {"result.txt": "result.txt"}, record_extraction)
+    record_extraction.finish_worker()
+
+    assert written == {"result.txt": ["secret=12345"]}
+    with zipfile.ZipFile(zip_archive_path) as zip_archive:
+        assert zip_archive.read("a.combig") == contents
+    assert os.listdir(tmp_path) == ["result.zip"]
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_search_warc_record_decodes_http_payload_below_and_above_streaming_threshold(monkeypatch, tmp_path, streamed):
+    # A gzip encoded body is decoded the same whether the record is held in memory or streamed in chunks,
+    # with the match spanning a chunk boundary of the decoded contents
+    import gzip
+    import io
+    class DummyConfig:
+        settings = {"SEARCH_BINARY_FILES": False, "DETECT_CONTENTS_CHARSET": False, "DECODE_HTTP_PAYLOADS": True, "STREAMING_CHUNK_SIZE_KB": 1, "STREAMING_OVERLAP_KB": 1}
+    monkeypatch.setattr("search.config", DummyConfig)
+    monkeypatch.setattr("search.DEFINITION_SCOPES", {})
+    written = {}
+    monkeypatch.setattr("search.write_record_info_to_result_output_buffer",
+                        lambda buf, name_matches, contents_matches, parent, name, contents_match_type: written.setdefault(buf, contents_matches))
+
+    decoded_contents = b"a" * 1020 + b" secret=12345 " + b"b" * 3000
+    contents = gzip.compress(decoded_contents)
+    http_headers = b"HTTP/1.1 200 OK\r\nContent-Encoding: gzip\r\n"
+    zip_archive_path = str(tmp_path / "result.zip")
+    record_extraction = ZipArchiveExtraction(None)
+    record_extraction.start_worker(["result.txt"], str(tmp_path), 0, SearchStatistics())
+    if streamed:
+        warc_record = StreamedWarcRecord("parent.gz", "http://a.com/big", io.BytesIO(contents), http_headers=http_headers)
+    else:
+        warc_record = WarcRecord(parent_warc_gz_file="parent.gz", name="http://a.com/big", contents=contents, http_headers=http_headers)
+
+    search.search_warc_record(warc_record, {"result.txt": re.compile(r"secret=\d+")}, {"result.txt": "result.txt"}, record_extraction)
+    record_extraction.finish_worker()
+
+    assert written == {"result.txt": ["secret=12345"]}
+    with zipfile.ZipFile(zip_archive_path) as zip_archive:
+        assert zip_archive.read("a.combig") == decoded_contents
+
+def test_search_streamed_warc_record_skips_binary_contents(monkeypatch):
+    import io
+    class DummyConfig:
+        settings = {"SEARCH_BINARY_FILES": False, "DETECT_CONTENTS_CHARSET": False, "DECODE_HTTP_PAYLOADS": False, "STREAMING_CHUNK_SIZE_KB": 1, "STREAMING_OVERLAP_KB": 1}
+    monkeypatch.setattr("search.config", DummyConfig)
+    monkeypatch.setattr("search.DEFINITION_SCOPES", {})
+    monkeypatch.setattr("search.write_record_info_to_result_output_buffer", lambda *a: pytest.fail("Binary contents should not be searched"))
+
+    contents_stream = io.BytesIO(b"\x00\x01" * 1024 + b"secret=1")
+    search.search_streamed_warc_record(StreamedWarcRecord("parent.gz", "http://a.com/video", contents_stream), 
+                                       {"result.txt": re.compile(r"secret=\d+")}, {"result.txt": "result.txt"}, None)
+
+    # Without a record extraction to copy the contents for, reading stops after the first chunk
+    assert contents_stream.tell() == 1024
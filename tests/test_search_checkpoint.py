@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+import pytest
+
+from search_checkpoint import (CHECKPOINT_FILE_NAME, SearchCheckpointer, get_zip_archive_segment_generation, get_zip_archive_segment_path,
+                               load_search_checkpoint, remove_unfinished_warc_gz_segments, remove_unfinished_zip_archive_segments,
+                               restore_results_files, get_warc_gz_segment_path)
+
+
+@pytest.fixture
+def results_file_paths(tmp_path):
+    paths = [str(tmp_path / "emails_results.txt"), str(tmp_path / "urls_results.txt")]
+    for path in paths:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("header\n")
+    return paths
+
+def create_checkpointer(results_file_paths, interval_seconds=None, **kwargs):
+    return SearchCheckpointer(results_file_paths, {"emails_results.txt": "f1"}, interval_seconds, **kwargs)
+
+
+def test_reading_record_counts_records_and_member_offsets(results_file_paths):
+    checkpointer = create_checkpointer(results_file_paths)
+    with checkpointer.reading_record("a.gz"):
+        assert checkpointer.reading_threads == 1
+    with checkpointer.reading_record("a.gz", 300):
+        pass
+    checkpointer.complete_archive("b.gz")
+
+    assert checkpointer.reading_threads == 0
+    assert checkpointer.archives["a.gz"] == {"records_read": 2, "next_member_offset": 300, "completed": False}
+    assert checkpointer.archives["b.gz"]["completed"] is True
+
+def test_reading_record_counts_record_when_skipped_with_continue(results_file_paths):
+    checkpointer = create_checkpointer(results_file_paths)
+    for _ in range(2):
+        with checkpointer.reading_record("a.gz"):
+            continue
+    assert checkpointer.archives["a.gz"]["records_read"] == 2
+
+def test_pause_read_threads_waits_for_record_being_queued(results_file_paths):
+    checkpointer = create_checkpointer(results_file_paths)
+    record_queued = threading.Event()
+    release_record = threading.Event()
+
+    def read_thread():
+        with checkpointer.reading_record("a.gz"):
+            record_queued.set()
+            release_record.wait()
+
+    thread = threading.Thread(target=read_thread)
+    thread.start()
+    record_queued.wait()
+
+    pause_thread = threading.Thread(target=checkpointer.pause_read_threads)
+    pause_thread.start()
+    time.sleep(0.05)
+    assert pause_thread.is_alive()
+
+    release_record.set()
+    pause_thread.join(timeout=2)
+    thread.join(timeout=2)
+    assert not pause_thread.is_alive()
+    assert checkpointer.archives["a.gz"]["records_read"] == 1
+
+def test_reading_record_waits_while_checkpoint_is_pending(results_file_paths):
+    checkpointer = create_checkpointer(results_file_paths)
+    checkpointer.pause_read_threads()
+
+    thread = threading.Thread(target=lambda: checkpointer.reading_record("a.gz").__enter__())
+    thread.start()
+    time.sleep(0.05)
+    assert thread.is_alive()
+
+    checkpointer.resume_read_threads()
+    thread.join(timeout=2)
+    assert not thread.is_alive()
+
+def test_getstate_excludes_read_threads_condition(results_file_paths):
+    checkpointer = create_checkpointer(results_file_paths, generation=2)
+    checkpointer.create_barrier(1)
+    state = checkpointer.__getstate__()
+    assert state["condition"] is None
+    assert state["barrier"] is checkpointer.barrier
+    assert state["generation"] == 2
+    assert checkpointer.condition is not None
+
+def test_is_checkpoint_due(results_file_paths, monkeypatch):
+    assert not create_checkpointer(results_file_paths).is_checkpoint_due()
+
+    checkpointer = create_checkpointer(results_file_paths, 10.0)
+    assert not checkpointer.is_checkpoint_due()  # No barrier until the worker processes are started
+
+    checkpointer.create_barrier(2)
+    assert checkpointer.worker_processes == 2
+    assert not checkpointer.is_checkpoint_due()
+    checkpointer.last_checkpoint_time -= 10.0
+    assert checkpointer.is_checkpoint_due()
+
+def test_write_and_load_checkpoint(results_file_paths, tmp_path):
+    checkpointer = create_checkpointer(results_file_paths)
+    with checkpointer.reading_record("a.gz"):
+        pass
+    checkpointer.write_checkpoint(3)
+
+    assert checkpointer.generation == 3
+    assert checkpointer.checkpoints_taken == 1
+    checkpoint = load_search_checkpoint(str(tmp_path))
+    assert checkpoint == {
+        "generation": 3,
+        "definition_fingerprints": {"emails_results.txt": "f1"},
+        "results_file_sizes": {"emails_results.txt": 7, "urls_results.txt": 7},
+        "archives": {"a.gz": {"records_read": 1, "next_member_offset": None, "completed": False}},
+    }
+
+    checkpointer.remove_checkpoint()
+    assert load_search_checkpoint(str(tmp_path)) is None
+
+def test_load_search_checkpoint_logs_unreadable_file(tmp_path, monkeypatch):
+    errors = []
+    monkeypatch.setattr("search_checkpoint.log_error", errors.append)
+    with open(tmp_path / CHECKPOINT_FILE_NAME, "w", encoding="utf-8") as f:
+        f.write("{")
+    assert load_search_checkpoint(str(tmp_path)) is None
+    assert len(errors) == 1
+
+def test_restore_results_files_truncates_to_checkpoint(results_file_paths):
+    checkpoint = {"results_file_sizes": {"emails_results.txt": 7, "urls_results.txt": 7}}
+    with open(results_file_paths[0], "a", encoding="utf-8") as f:
+        f.write("written after the checkpoint\n")
+
+    assert restore_results_files(checkpoint, results_file_paths)
+    for path in results_file_paths:
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == "header\n"
+
+def test_restore_results_files_rejects_mismatched_files(results_file_paths, monkeypatch):
+    errors = []
+    monkeypatch.setattr("search_checkpoint.log_error", errors.append)
+    assert not restore_results_files({"results_file_sizes": {"emails_results.txt": 7}}, results_file_paths)
+    assert not restore_results_files({"results_file_sizes": {"emails_results.txt": 7, "urls_results.txt": 100}}, results_file_paths)
+    assert len(errors) == 2
+
+    # Nothing is truncated unless every results file can be restored
+    with open(results_file_paths[0], encoding="utf-8") as f:
+        assert f.read() == "header\n"
+
+@pytest.mark.parametrize("zip_archive_name, generation", [
+    ("emails_results.zip", 0),
+    ("emails_results.3.zip", 3),
+    ("v1.2_results.zip", 0),
+    ("v1.2_results.12.zip", 12),
+])
+def test_get_zip_archive_segment_generation(zip_archive_name, generation):
+    assert get_zip_archive_segment_generation(os.path.join("temp", "42", zip_archive_name)) == generation
+
+def test_get_zip_archive_segment_path():
+    zip_archive_path = os.path.join("temp", "42", "emails_results.zip")
+    assert get_zip_archive_segment_path(zip_archive_path, 0) == zip_archive_path
+    assert get_zip_archive_segment_path(zip_archive_path, 2) == os.path.join("temp", "42", "emails_results.2.zip")
+
+def test_remove_unfinished_zip_archive_segments(tmp_path):
+    for process_id in ("1", "2"):
+        (tmp_path / process_id).mkdir()
+        for segment_name in ("emails_results.zip", "emails_results.1.zip", "emails_results.2.zip", "emails_results.3.zip"):
+            (tmp_path / process_id / segment_name).write_bytes(b"")
+
+    remove_unfinished_zip_archive_segments(str(tmp_path), 2)
+    for process_id in ("1", "2"):
+        assert sorted(os.listdir(tmp_path / process_id)) == ["emails_results.1.zip", "emails_results.zip"]
+
+def test_remove_unfinished_warc_gz_segments(tmp_path):
+    assert get_warc_gz_segment_path(str(tmp_path / "1" / "emails_results.warc.gz"), 0) == str(tmp_path / "1" / "emails_results.warc.gz")
+    (tmp_path / "1").mkdir()
+    for generation in range(4):
+        open(get_warc_gz_segment_path(str(tmp_path / "1" / "emails_results.warc.gz"), generation), "wb").close()
+    (tmp_path / "1" / "emails_results.zip").write_bytes(b"")
+
+    remove_unfinished_warc_gz_segments(str(tmp_path), 2)
+    assert sorted(os.listdir(tmp_path / "1")) == ["emails_results.1.warc.gz", "emails_results.warc.gz", "emails_results.zip"]
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import re
+import zipfile
+import pytest
+
+from blob_store import BlobStore, get_blob_path, read_blob_manifest
+from deferred_extraction import MatchLocationRecorder, read_match_locations
+import search_manifest
+from search_manifest import (SearchManifest, carry_forward_previous_results, get_definition_fingerprint, get_definition_name,
+                             plan_incremental_search, record_incremental_search)
+from warc_record import WarcMember
+
+
+@pytest.fixture(autouse=True)
+def patch_settings(monkeypatch, tmp_path):
+    settings = {setting_name: None for setting_name in search_manifest.RESULT_AFFECTING_SETTINGS}
+    settings["RESULTS_OUTPUT_DIRECTORY"] = str(tmp_path)
+    settings["ZIP_FILES_WITH_MATCHES"] = False
+    monkeypatch.setattr(search_manifest.config, "settings", settings)
+    monkeypatch.setattr(search_manifest, "log_info", lambda msg: None)
+    return settings
+
+def write_file(path, contents):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(contents)
+
+def write_results_file(results_directory, definition_name, entries):
+    os.makedirs(results_directory, exist_ok=True)
+    separator = "___________________________________________________________________\n\n"
+    contents = f"[{definition_name}_results.txt]\n[Created: now]\n\n[Regex used]\nabc\n\n{separator}"
+    for archive_path, file_name in entries:
+        contents += f"[Archive: {archive_path}]\n[File: {file_name}]\n\n[Matches found in file contents: 1 (0 duplicates omitted)]\n"
+        contents += f'[Match #1 in file contents]\n\n"abc"\n\n{separator}'
+    write_file(os.path.join(results_directory, f"{definition_name}_results.txt"), contents)
+
+
+def test_get_definition_name():
+    assert get_definition_name("/results/run/emails.headers_results.txt") == "emails.headers"
+
+def test_definition_fingerprint_changes_with_pattern_flags_and_settings(patch_settings):
+    fingerprint = get_definition_fingerprint(re.compile("abc", re.IGNORECASE))
+    assert fingerprint == get_definition_fingerprint(re.compile("abc", re.IGNORECASE))
+    assert fingerprint != get_definition_fingerprint(re.compile("abd", re.IGNORECASE))
+    assert fingerprint != get_definition_fingerprint(re.compile("abc"))
+
+    patch_settings["FILTER_HTTP_STATUS_CODES"] = [(200, 200)]
+    assert fingerprint != get_definition_fingerprint(re.compile("abc", re.IGNORECASE))
+
+def test_manifest_round_trip(tmp_path):
+    archive_path = str(tmp_path / "a.warc.gz")
+    write_file(archive_path, "archive")
+    write_results_file(str(tmp_path / "run1"), "emails", [])
+
+    manifest = SearchManifest(str(tmp_path / "manifest.json"))
+    manifest.record_search(archive_path, "emails", "f1", str(tmp_path / "run1"))
+    manifest.save()
+
+    reloaded_manifest = SearchManifest(str(tmp_path / "manifest.json"))
+    assert reloaded_manifest.get_previous_results_directory(archive_path, "emails", "f1") == str(tmp_path / "run1")
+    assert reloaded_manifest.get_previous_results_directory(archive_path, "emails", "f2") is None
+    assert reloaded_manifest.get_previous_results_directory(archive_path, "urls", "f1") is None
+
+def test_changed_archive_is_searched_again(tmp_path):
+    archive_path = str(tmp_path / "a.warc.gz")
+    write_file(archive_path, "archive")
+    write_results_file(str(tmp_path / "run1"), "emails", [])
+    manifest = SearchManifest(str(tmp_path / "manifest.json"))
+    manifest.record_search(archive_path, "emails", "f1", str(tmp_path / "run1"))
+    manifest.save()
+
+    write_file(archive_path, "archive with more records")
+    assert SearchManifest(str(tmp_path / "manifest.json")).get_previous_results_directory(archive_path, "emails", "f1") is None
+
+def test_missing_previous_results_are_searched_again(tmp_path):
+    archive_path = str(tmp_path / "a.warc.gz")
+    write_file(archive_path, "archive")
+    manifest = SearchManifest(str(tmp_path / "manifest.json"))
+    manifest.record_search(archive_path, "emails", "f1", str(tmp_path / "deleted_run"))
+    assert manifest.get_previous_results_directory(archive_path, "emails", "f1") is None
+
+def test_unreadable_manifest_is_replaced(tmp_path, monkeypatch):
+    warnings = []
+    monkeypatch.setattr(search_manifest, "log_warning", warnings.append)
+    write_file(str(tmp_path / "manifest.json"), "{not json")
+    assert SearchManifest(str(tmp_path / "manifest.json")).archives == {}
+    assert len(warnings) == 1
+
+def test_plan_searches_only_new_definition(tmp_path):
+    archive_paths = [str(tmp_path / "a.warc.gz"), str(tmp_path / "b.warc.gz")]
+    for archive_path in archive_paths:
+        write_file(archive_path, "archive")
+    write_results_file(str(tmp_path / "run1"), "emails", [])
+
+    emails_regex, urls_regex = re.compile("email"), re.compile("url")
+    manifest = SearchManifest(str(tmp_path / "manifest.json"))
+    for archive_path in archive_paths:
+        manifest.record_search(archive_path, "emails", get_definition_fingerprint(emails_regex), str(tmp_path / "run1"))
+
+    results_and_regexes_dict = {
+        str(tmp_path / "run2" / "emails_results.txt"): emails_regex,
+        str(tmp_path / "run2" / "urls_results.txt"): urls_regex,
+    }
+    plan = plan_incremental_search(manifest, archive_paths, results_and_regexes_dict)
+
+    assert plan.search_groups == [(archive_paths, {str(tmp_path / "run2" / "urls_results.txt"): urls_regex})]
+    assert plan.carried_forward_results == {
+        str(tmp_path / "run2" / "emails_results.txt"): {str(tmp_path / "run1"): archive_paths},
+        str(tmp_path / "run2" / "urls_results.txt"): {},
+    }
+
+def test_plan_groups_new_archives_with_every_definition(tmp_path):
+    old_archive_path, new_archive_path = str(tmp_path / "old.warc.gz"), str(tmp_path / "new.warc.gz")
+    write_file(old_archive_path, "archive")
+    write_file(new_archive_path, "archive")
+    write_results_file(str(tmp_path / "run1"), "emails", [])
+
+    emails_regex = re.compile("email")
+    manifest = SearchManifest(str(tmp_path / "manifest.json"))
+    manifest.record_search(old_archive_path, "emails", get_definition_fingerprint(emails_regex), str(tmp_path / "run1"))
+
+    results_and_regexes_dict = {str(tmp_path / "run2" / "emails_results.txt"): emails_regex}
+    plan = plan_incremental_search(manifest, [old_archive_path, new_archive_path], results_and_regexes_dict)
+    assert plan.search_groups == [([new_archive_path], results_and_regexes_dict)]
+
+def test_carry_forward_previous_results_copies_entries_and_zipped_files(tmp_path):
+    write_results_file(str(tmp_path / "run1"), "emails", [("a.warc.gz", "http://a.com/1"), ("b.warc.gz", "http://b.com/1"), ("a.warc.gz", "http://a.com/2")])
+    with zipfile.ZipFile(tmp_path / "run1" / "emails_results.zip", "w") as zip_archive:
+        for file_name in ("a.com1", "b.com1", "a.com2"):
+            zip_archive.writestr(file_name, f"contents of {file_name}")
+
+    write_results_file(str(tmp_path / "run2"), "emails", [("c.warc.gz", "http://c.com/1")])
+    results_file_path = str(tmp_path / "run2" / "emails_results.txt")
+    carry_forward_previous_results({results_file_path: {str(tmp_path / "run1"): ["a.warc.gz"]}}, True)
+
+    with open(results_file_path, encoding="utf-8") as results_file:
+        results_contents = results_file.read()
+    assert results_contents.count("[Archive: ") == 3
+    assert "[File: http://a.com/1]" in results_contents and "[File: http://a.com/2]" in results_contents
+    assert "b.warc.gz" not in results_contents
+
+    with zipfile.ZipFile(tmp_path / "run2" / "emails_results.zip") as zip_archive:
+        assert sorted(zip_archive.namelist()) == ["a.com1", "a.com2"]
+        assert zip_archive.read("a.com2") == b"contents of a.com2"
+
+def test_carry_forward_previous_results_copies_blob_manifest_entries(tmp_path):
+    write_results_file(str(tmp_path / "run1"), "emails", [("a.warc.gz", "http://a.com/1"), ("b.warc.gz", "http://b.com/1")])
+    blob_store = BlobStore(str(tmp_path / "run1" / "blobs"))
+    blob_store.start_worker([str(tmp_path / "run1" / "emails_results.txt")], str(tmp_path / "run1"))
+    blob_store.add_file("http://a.com/1", b"contents of a", [str(tmp_path / "run1" / "emails_results.txt")])
+    blob_store.add_file("http://b.com/1", b"contents of b", [str(tmp_path / "run1" / "emails_results.txt")])
+    blob_store.finish_worker()
+
+    write_results_file(str(tmp_path / "run2"), "emails", [])
+    results_file_path = str(tmp_path / "run2" / "emails_results.txt")
+    carry_forward_previous_results({results_file_path: {str(tmp_path / "run1"): ["a.warc.gz"]}}, True, 'blob_store')
+
+    digest = hashlib.sha256(b"contents of a").hexdigest()
+    assert list(read_blob_manifest(str(tmp_path / "run2" / "emails_results.manifest.tsv"))) == [("a.com1", digest, 13)]
+    assert os.path.isfile(get_blob_path(str(tmp_path / "run2" / "blobs"), digest))
+    assert not os.path.exists(tmp_path / "run2" / "emails_results.zip")
+
+def test_carry_forward_previous_results_copies_match_locations_and_zipped_files(tmp_path):
+    write_results_file(str(tmp_path / "run1"), "emails", [("a.warc.gz", "http://a.com/1"), ("b.warc.gz", "http://b.com/1")])
+    with zipfile.ZipFile(tmp_path / "run1" / "emails_results.zip", "w") as zip_archive:
+        zip_archive.writestr("a.com1", "contents of a.com1")
+    recorder = MatchLocationRecorder()
+    recorder.start_worker(str(tmp_path / "run1"))
+    recorder.add_record(WarcMember("a.warc.gz", 0, 100), [str(tmp_path / "run1" / "emails_results.txt")])
+    recorder.add_record(WarcMember("b.warc.gz", 0, 100), [str(tmp_path / "run1" / "emails_results.txt")])
+    recorder.finish_worker()
+
+    write_results_file(str(tmp_path / "run2"), "emails", [])
+    results_file_path = str(tmp_path / "run2" / "emails_results.txt")
+    carry_forward_previous_results({results_file_path: {str(tmp_path / "run1"): ["a.warc.gz"]}}, True, 'deferred')
+
+    assert list(read_match_locations(str(tmp_path / "run2" / "match_locations.tsv"))) == [
+        (WarcMember(os.path.abspath("a.warc.gz"), 0, 100), "emails_results")
+    ]
+    with zipfile.ZipFile(tmp_path / "run2" / "emails_results.zip") as zip_archive:
+        assert zip_archive.namelist() == ["a.com1"]
+
+def test_record_incremental_search_points_every_archive_to_current_results(tmp_path):
+    archive_paths = [str(tmp_path / "a.warc.gz"), str(tmp_path / "b.warc.gz")]
+    for archive_path in archive_paths:
+        write_file(archive_path, "archive")
+    write_results_file(str(tmp_path / "run1"), "emails", [])
+
+    emails_regex, urls_regex = re.compile("email"), re.compile("url")
+    manifest = SearchManifest(str(tmp_path / "manifest.json"))
+    for archive_path in archive_paths:
+        manifest.record_search(archive_path, "emails", get_definition_fingerprint(emails_regex), str(tmp_path / "run1"))
+
+    results_and_regexes_dict = {
+        str(tmp_path / "run2" / "emails_results.txt"): emails_regex,
+        str(tmp_path / "run2" / "urls_results.txt"): urls_regex,
+    }
+    plan = plan_incremental_search(manifest, archive_paths, results_and_regexes_dict)
+    record_incremental_search(manifest, plan, str(tmp_path / "run2"))
+
+    with open(tmp_path / "manifest.json", encoding="utf-8") as manifest_file:
+        archives = json.load(manifest_file)["archives"]
+    for archive_path in archive_paths:
+        definitions = archives[archive_path]["definitions"]
+        assert definitions["emails"] == {"fingerprint": get_definition_fingerprint(emails_regex), "results_directory": str(tmp_path / "run2")}
+        assert definitions["urls"] == {"fingerprint": get_definition_fingerprint(urls_regex), "results_directory": str(tmp_path / "run2")}
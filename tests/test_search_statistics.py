@@ -0,0 +1,147 @@
+from search_statistics import SearchStatistics
+
+
+def test_count_prefilter_result():
+    statistics = SearchStatistics()
+    statistics.count_prefilter_result("a.txt", passed=False)
+    statistics.count_prefilter_result("a.txt", passed=True)
+    statistics.count_prefilter_result("a.txt", passed=True, matched=True)
+
+    assert statistics.prefilter_counters == {"a.txt": {"rejected": 1, "passed": 2, "matched": 1}}
+
+def test_merge_adds_counters():
+    first = SearchStatistics()
+    first.count_prefilter_result("a.txt", passed=False)
+    first.count_skipped_records({"URI": 2})
+    second = SearchStatistics()
+    second.count_prefilter_result("a.txt", passed=True, matched=True)
+    second.count_prefilter_result("b.txt", passed=False)
+    second.count_skipped_records({"URI": 1, "Content-Type": 4})
+
+    first.merge(second)
+
+    assert first.skipped_records == {"URI": 3, "Content-Type": 4}
+
+    assert first.prefilter_counters == {
+        "a.txt": {"rejected": 1, "passed": 1, "matched": 1},
+        "b.txt": {"rejected": 1, "passed": 0, "matched": 0},
+    }
+
+def test_log_prefilter_summary(monkeypatch):
+    logged = []
+    monkeypatch.setattr("search_statistics.log_info", lambda msg: logged.append(msg))
+    statistics = SearchStatistics()
+    for _ in range(3):
+        statistics.count_prefilter_result("dir/b_results.txt", passed=False)
+    statistics.count_prefilter_result("dir/a_results.txt", passed=True)
+
+    statistics.log_prefilter_summary()
+
+    assert logged == [
+        "Literal prefilter for a_results: 0 of 1 records rejected (0.0%), 1 searched, of which 0 matched.",
+        "Literal prefilter for b_results: 3 of 3 records rejected (100.0%), 0 searched, of which 0 matched.",
+    ]
+
+def test_log_prefilter_summary_without_counters(monkeypatch):
+    logged = []
+    monkeypatch.setattr("search_statistics.log_info", lambda msg: logged.append(msg))
+    SearchStatistics().log_prefilter_summary()
+    assert logged == []
+
+def test_log_skipped_records_summary(monkeypatch):
+    logged = []
+    monkeypatch.setattr("search_statistics.log_info", lambda msg: logged.append(msg))
+    statistics = SearchStatistics()
+    statistics.count_skipped_records({"content length": 0, "Content-Type": 5, "URI": 1})
+    statistics.log_skipped_records_summary()
+
+    SearchStatistics().log_skipped_records_summary()
+
+    assert logged == [
+        "Record filters skipped 6 records before reading their contents: 5 by Content-Type, 1 by URI.",
+        "Record filters skipped 0 records before reading their contents.",
+    ]
+
+def test_log_duplicate_payloads_summary(monkeypatch):
+    logged = []
+    monkeypatch.setattr("search_statistics.log_info", lambda msg: logged.append(msg))
+    statistics = SearchStatistics()
+    for outcome in ("searched", "reused", "reused", "resolved revisits"):
+        statistics.count_duplicate_payload(outcome)
+    other_statistics = SearchStatistics()
+    other_statistics.count_duplicate_payload("reused")
+    statistics.merge(other_statistics)
+    statistics.log_duplicate_payloads_summary()
+
+    assert logged == [
+        "Payload digest cache: 1 payloads searched, 3 duplicates reused their cached matches, "
+        "1 revisit records resolved and 0 skipped as their payload was not cached."
+    ]
+
+def test_log_match_memo_summary(monkeypatch):
+    logged = []
+    monkeypatch.setattr("search_statistics.log_info", lambda msg: logged.append(msg))
+    statistics = SearchStatistics()
+    statistics.count_match_memo_lookups(2, 1)
+    other_statistics = SearchStatistics()
+    other_statistics.count_match_memo_lookups(0, 3)
+    statistics.merge(other_statistics)
+    statistics.log_match_memo_summary()
+
+    assert logged == ["Match memo: 2 definition searches reused the stored matches, 4 were searched and stored."]
+
+def test_log_zip_compression_summary(monkeypatch):
+    logged = []
+    monkeypatch.setattr("search_statistics.log_info", lambda msg: logged.append(msg))
+    statistics = SearchStatistics()
+    statistics.count_zip_compression("/results/keys_results.txt", 3 * 1024 * 1024, 1024 * 1024, False, 0.25)
+    other_statistics = SearchStatistics()
+    other_statistics.count_zip_compression("/results/keys_results.txt", 1024 * 1024, 1024 * 1024, True, 0.01)
+    statistics.merge(other_statistics)
+    statistics.log_zip_compression_summary()
+
+    assert logged == ["Zip compression for keys_results: 2 files added, 1 of them stored without compression, 2.0 MB saved in 0.26 CPU seconds."]
+
+def test_log_blob_store_summary(monkeypatch):
+    logged = []
+    monkeypatch.setattr("search_statistics.log_info", lambda msg: logged.append(msg))
+    statistics = SearchStatistics()
+    statistics.count_blob_store(3, True, 1024 * 1024)
+    other_statistics = SearchStatistics()
+    other_statistics.count_blob_store(2, False, 1024 * 1024)
+    statistics.merge(other_statistics)
+    statistics.log_blob_store_summary()
+
+    assert logged == ["Blob store: 5 files listed in the blob manifests, 1 blobs written (1.0 MB), 4.0 MB of duplicate copies avoided."]
+
+def test_log_warc_gz_extraction_summary(monkeypatch):
+    logged = []
+    monkeypatch.setattr("search_statistics.log_info", lambda msg: logged.append(msg))
+    statistics = SearchStatistics()
+    statistics.count_warc_gz_extraction(2, 1024 * 1024)
+    other_statistics = SearchStatistics()
+    other_statistics.count_warc_gz_extraction(0, 0, located=False)
+    statistics.merge(other_statistics)
+    statistics.log_warc_gz_extraction_summary()
+
+    assert logged == [
+        "WARC.gz extraction: 2 gzip members copied to the WARC.gz files (1.0 MB), 1 records with matches not extracted as they were not read by offset."
+    ]
+
+def test_log_deferred_extraction_summaries(monkeypatch):
+    logged = []
+    monkeypatch.setattr("search_statistics.log_info", lambda msg: logged.append(msg))
+    statistics = SearchStatistics()
+    statistics.count_match_locations(3)
+    statistics.count_deferred_extraction(True)
+    other_statistics = SearchStatistics()
+    other_statistics.count_match_locations(0, located=False)
+    other_statistics.count_deferred_extraction(False)
+    statistics.merge(other_statistics)
+    statistics.log_match_locations_summary()
+    statistics.log_deferred_extraction_summary(2)
+
+    assert logged == [
+        "Deferred extraction: 3 match locations recorded, 1 records with matches not recorded as they were not read by offset.",
+        "Deferred extraction: 1 records extracted from 2 WARC.gz files, 1 could not be read from their recorded location."
+    ]
@@ -0,0 +1,217 @@
+import pickle
+import queue
+import pytest
+
+import shared_memory_ring
+from shared_memory_ring import FreeSlots, SharedMemoryRing
+from in_flight_compression import CompressedWarcRecord
+from search_checkpoint import CheckpointMarker
+from spill_queue import SpillSegment
+from streaming_search import SpooledWarcRecord
+from warc_record import PayloadIdentity, WarcMember, WarcRecord
+
+
+@pytest.fixture
+def ring():
+    ring = SharedMemoryRing(slot_count=2, slot_size=64)
+    yield ring
+    ring.close()
+
+def test_init_frees_every_slot(ring):
+    assert ring.free_slots.qsize() == 2
+    assert ring.qsize() == 0
+    assert len(ring.shared_memory.buf) >= 2 * 64
+
+def test_put_and_get_round_trip(ring):
+    ring.put(WarcRecord(parent_warc_gz_file="parent.gz", name="http://example.com", contents=b"some content"))
+    assert ring.qsize() == 1
+    assert ring.free_slots.qsize() == 1
+
+    record = ring.get()
+    assert record.parent_warc_gz_file == "parent.gz"
+    assert record.name == "http://example.com"
+    assert isinstance(record.contents, memoryview)
+    assert bytes(record.contents) == b"some content"
+
+def test_put_and_get_round_trip_keeps_charset(ring):
+    ring.put(WarcRecord(parent_warc_gz_file="p.gz", name="a", contents=b"1", charset="windows-1252"))
+    assert ring.get().charset == "windows-1252"
+
+def test_put_and_get_round_trip_keeps_http_headers(ring):
+    ring.put(WarcRecord(parent_warc_gz_file="p.gz", name="a", contents=b"1", http_headers=b"HTTP/1.1 200 OK\r\n"))
+    record = ring.get()
+    assert bytes(record.http_headers) == b"HTTP/1.1 200 OK\r\n"
+    assert bytes(record.contents) == b"1"
+
+    ring.put(WarcRecord(parent_warc_gz_file="p.gz", name="a", contents=b"1"))
+    assert ring.get().http_headers is None
+
+def test_put_and_get_round_trip_keeps_payload_identity(ring):
+    payload_identity = PayloadIdentity("sha1:ABC", "<urn:uuid:1>")
+    ring.put(WarcRecord(parent_warc_gz_file="p.gz", name="a", contents=b"1", payload_identity=payload_identity))
+    assert ring.get().payload_identity == payload_identity
+
+def test_get_releases_previously_held_slot(ring):
+    ring.put(WarcRecord(parent_warc_gz_file="p.gz", name="a", contents=b"1"))
+    ring.put(WarcRecord(parent_warc_gz_file="p.gz", name="b", contents=b"2"))
+    assert ring.free_slots.qsize() == 0
+
+    first = ring.get()
+    assert ring.free_slots.qsize() == 0
+    ring.get()
+    # The slot of the first record is returned once the next record is requested
+    assert ring.free_slots.qsize() == 1
+    with pytest.raises(ValueError):
+        bytes(first.contents)
+
+def test_oversized_record_is_spilled(ring):
+    big_record = WarcRecord(parent_warc_gz_file="p.gz", name="big", contents=b"x" * 100)
+    ring.put(big_record)
+    # No slot is consumed by a spilled record
+    assert ring.free_slots.qsize() == 2
+    record = ring.get()
+    assert (record.name, record.contents) == ("big", b"x" * 100)
+
+def test_none_is_passed_through(ring):
+    ring.put(None)
+    assert ring.get() is None
+
+def test_unicode_name_and_parent(ring):
+    ring.put(WarcRecord(parent_warc_gz_file="pärent.gz", name="http://exämple.com/ü", contents=b"data"))
+    record = ring.get()
+    assert record.parent_warc_gz_file == "pärent.gz"
+    assert record.name == "http://exämple.com/ü"
+
+def test_put_and_get_batch(ring):
+    records = [
+        WarcRecord(parent_warc_gz_file="p.gz", name="a", contents=b"first"),
+        WarcRecord(parent_warc_gz_file="p.gz", name="b", contents=b"second"),
+    ]
+    ring.put(records)
+    # A whole batch is sent as a single descriptor list
+    assert ring.qsize() == 1
+
+    batch = ring.get()
+    assert [record.name for record in batch] == ["a", "b"]
+    assert [bytes(record.contents) for record in batch] == [b"first", b"second"]
+
+def test_put_batch_sends_written_descriptors_when_out_of_slots(ring):
+    records = [WarcRecord(parent_warc_gz_file="p.gz", name=str(i), contents=b"x") for i in range(3)]
+    # Simulate a worker releasing a slot only once the first descriptors have been sent
+    original_put = ring.descriptors_queue.put
+    def put_and_release(descriptors):
+        original_put(descriptors)
+        ring.free_slots.put(descriptors[0][0])
+    ring.descriptors_queue.put = put_and_release
+
+    ring.put(records)
+
+    ring.descriptors_queue.put = original_put
+    first_batch = ring.descriptors_queue.get()
+    second_batch = ring.descriptors_queue.get()
+    assert len(first_batch) == 2
+    assert len(second_batch) == 1
+
+def test_put_batch_with_spilled_record(ring):
+    small = WarcRecord(parent_warc_gz_file="p.gz", name="small", contents=b"x")
+    big = WarcRecord(parent_warc_gz_file="p.gz", name="big", contents=b"x" * 100)
+    ring.put([small, big])
+
+    batch = ring.get()
+    assert bytes(batch[0].contents) == b"x"
+    assert (batch[1].name, batch[1].contents) == ("big", b"x" * 100)
+
+def test_put_batch_passes_spooled_record_through(ring):
+    small = WarcRecord(parent_warc_gz_file="p.gz", name="small", contents=b"x")
+    spooled = SpooledWarcRecord("p.gz", "big", "spool/big.record")
+    ring.put([small, spooled])
+    ring.put(spooled)
+
+    batch = ring.get()
+    assert bytes(batch[0].contents) == b"x"
+    assert batch[1] == spooled
+    # Only the small record took a slot, released once the next item is retrieved
+    assert ring.get() == spooled
+    assert ring.free_slots.qsize() == 2
+
+def test_put_passes_spill_segment_through(ring):
+    spill_segment = SpillSegment("spill/a.segment", 3)
+    ring.put(spill_segment)
+    assert ring.get() == spill_segment
+    assert ring.free_slots.qsize() == ring.slot_count
+
+def test_put_passes_checkpoint_marker_through(ring):
+    ring.put(CheckpointMarker(2))
+    assert ring.get() == CheckpointMarker(2)
+    assert ring.free_slots.qsize() == ring.slot_count
+
+def test_put_passes_compressed_record_through(ring):
+    compressed_warc_record = CompressedWarcRecord("p.gz", "a", b"compressed", "zlib")
+    ring.put([compressed_warc_record])
+    assert ring.get() == [compressed_warc_record]
+    assert ring.free_slots.qsize() == ring.slot_count
+
+def test_put_passes_warc_member_through(ring):
+    warc_member = WarcMember("p.gz", 100, 50)
+    small = WarcRecord(parent_warc_gz_file="p.gz", name="small", contents=b"x")
+    ring.put(warc_member)
+    ring.put([small, warc_member])
+
+    assert ring.get() == warc_member
+    batch = ring.get()
+    assert bytes(batch[0].contents) == b"x"
+    assert batch[1] == warc_member
+
+def test_getstate_excludes_process_local_state(ring):
+    ring.put(WarcRecord(parent_warc_gz_file="p.gz", name="a", contents=b"1"))
+    ring.get()
+    state = ring.__getstate__()
+    assert state["shared_memory"] is None
+    assert state["held_slots"] == []
+    assert state["held_views"] == []
+    assert state["shared_memory_name"] == ring.shared_memory_name
+
+def test_attach_shared_memory_by_name(ring):
+    ring.put(WarcRecord(parent_warc_gz_file="p.gz", name="a", contents=b"shared"))
+
+    # Simulate the copy of the ring received by a worker process
+    worker_ring = SharedMemoryRing.__new__(SharedMemoryRing)
+    worker_ring.__dict__.update(ring.__getstate__())
+
+    record = worker_ring.get()
+    assert bytes(record.contents) == b"shared"
+    worker_ring.release_held_slots()
+    worker_ring.shared_memory.close()
+
+def test_free_slots_are_returned_in_order():
+    free_slots = FreeSlots(3)
+    assert [free_slots.get() for _ in range(3)] == [0, 1, 2]
+    assert free_slots.qsize() == 0
+
+    free_slots.put(2)
+    free_slots.put(0)
+    assert free_slots.qsize() == 2
+    assert free_slots.get() == 2
+    free_slots.put(1)
+    assert [free_slots.get(), free_slots.get()] == [0, 1]
+
+def test_free_slots_get_without_blocking_raises_empty():
+    free_slots = FreeSlots(1)
+    free_slots.get(block=False)
+    with pytest.raises(queue.Empty):
+        free_slots.get(block=False)
+
+    free_slots.put(0)
+    assert free_slots.get(block=False) == 0
+
+def test_attach_to_shared_memory_falls_back_without_track(monkeypatch):
+    calls = []
+    class FakeSharedMemory:
+        def __init__(self, **kwargs):
+            calls.append(kwargs)
+            if "track" in kwargs:
+                raise TypeError("unexpected keyword argument 'track'")
+    monkeypatch.setattr(shared_memory_ring, "SharedMemory", FakeSharedMemory)
+
+    shared_memory_ring.attach_to_shared_memory("name")
+    assert calls == [{"name": "name", "track": False}, {"name": "name"}]
@@ -0,0 +1,73 @@
+import os
+import pytest
+
+from spill_queue import SpillSegment, SpillWriter, read_spill_segment
+from warc_record import WarcRecord
+
+
+class FakeQueue:
+    def __init__(self):
+        self.items = []
+    def put(self, item):
+        self.items.append(item)
+
+
+def test_spill_writer_creates_spill_directory(tmp_path):
+    spill_writer = SpillWriter(FakeQueue(), str(tmp_path / "scratch"), 1024)
+    assert os.path.isdir(spill_writer.spill_directory)
+    assert os.path.dirname(spill_writer.spill_directory) == str(tmp_path / "scratch")
+
+    spill_writer.remove_spill_directory()
+    assert not os.path.exists(spill_writer.spill_directory)
+
+def test_spill_and_read_segment(tmp_path):
+    fake_queue = FakeQueue()
+    spill_writer = SpillWriter(fake_queue, str(tmp_path), 1024 * 1024)
+    spill_writer.spill(WarcRecord("parent.gz", "http://a.com", b"first", "utf-8", b"HTTP/1.1 200 OK\r\n"))
+    spill_writer.spill(["batched", "items"])
+    assert fake_queue.items == []
+
+    spill_writer.flush()
+    spill_segment = fake_queue.items[0]
+    assert spill_segment.item_count == 2
+
+    spilled_record, spilled_batch = list(read_spill_segment(spill_segment))
+    assert (spilled_record.name, spilled_record.contents, spilled_record.charset) == ("http://a.com", b"first", "utf-8")
+    assert spilled_record.http_headers == b"HTTP/1.1 200 OK\r\n"
+    assert spilled_batch == ["batched", "items"]
+    assert not os.path.exists(spill_segment.segment_file_path)
+
+def test_spill_writer_queues_full_segments(tmp_path):
+    fake_queue = FakeQueue()
+    spill_writer = SpillWriter(fake_queue, str(tmp_path), 100)
+    for index in range(5):
+        spill_writer.spill(WarcRecord("parent.gz", f"http://{index}.com", b"x" * 60))
+
+    # Every record fills a segment on its own, so each one is queued as soon as it is spilled
+    assert [segment.item_count for segment in fake_queue.items] == [1, 1, 1, 1, 1]
+    assert len({segment.segment_file_path for segment in fake_queue.items}) == 5
+    assert spill_writer.segments_written == 5
+    assert spill_writer.spilled_items == 5
+
+def test_flush_without_open_segment(tmp_path):
+    fake_queue = FakeQueue()
+    SpillWriter(fake_queue, str(tmp_path), 1024).flush()
+    assert fake_queue.items == []
+
+def test_read_spill_segment_missing_file(tmp_path):
+    with pytest.raises(OSError):
+        list(read_spill_segment(SpillSegment(str(tmp_path / "missing.segment"), 1)))
+
+def test_log_summary(monkeypatch, tmp_path):
+    messages = []
+    monkeypatch.setattr("spill_queue.log_info", lambda msg: messages.append(msg))
+    spill_writer = SpillWriter(FakeQueue(), str(tmp_path), 1024)
+
+    spill_writer.log_summary()
+    assert messages == []
+
+    spill_writer.spill(WarcRecord("parent.gz", "http://a.com", b"x"))
+    spill_writer.flush()
+    spill_writer.log_summary()
+    assert "Spilled 1 records" in messages[0]
+    assert "to 1 segment files" in messages[0]
@@ -0,0 +1,86 @@
+import io
+import os
+import random
+import re
+import pytest
+
+from streaming_search import (ChunkedMatchFinder, SpooledWarcRecord, StreamedWarcRecord, open_spooled_warc_record,
+                              spool_streamed_warc_record)
+
+
+def find_matches_in_chunks(regexes_dict: dict, contents: bytes, chunk_size: int, overlap_size: int, encoding: str = "utf-8") -> dict:
+    match_finder = ChunkedMatchFinder(regexes_dict, overlap_size, encoding)
+    for position in range(0, len(contents), chunk_size):
+        match_finder.add_chunk(contents[position:position + chunk_size])
+    return match_finder.finish()
+
+
+def test_chunked_match_finder_finds_matches_across_chunk_boundaries():
+    regexes_dict = {"email.txt": re.compile(r"\w+@example\.com")}
+    contents = b"x" * 10 + b" alice@example.com " + b"y" * 20 + b" bob@example.com"
+    assert find_matches_in_chunks(regexes_dict, contents, 8, 20) == {"email.txt": ["alice@example.com", "bob@example.com"]}
+
+def test_chunked_match_finder_keeps_context_before_chunk():
+    regexes_dict = {"word.txt": re.compile(r"\bkey\b"), "lookbehind.txt": re.compile(r"(?<=api_)key")}
+    # The first two are part of longer words, which is only visible with the text before the chunk boundary
+    contents = b"monkey api_key key"
+    assert find_matches_in_chunks(regexes_dict, contents, 3, 4) == {"word.txt": ["key"], "lookbehind.txt": ["key"]}
+
+def test_chunked_match_finder_does_not_split_multibyte_characters():
+    regexes_dict = {"cafe.txt": re.compile("café")}
+    assert find_matches_in_chunks(regexes_dict, "un café, deux café".encode(), 1, 8) == {"cafe.txt": ["café", "café"]}
+
+def test_chunked_match_finder_with_encoding():
+    regexes_dict = {"cafe.txt": re.compile("café")}
+    assert find_matches_in_chunks(regexes_dict, "café".encode("cp1252"), 2, 4, "cp1252") == {"cafe.txt": ["café"]}
+
+def test_chunked_match_finder_finds_same_matches_as_whole_text():
+    random.seed(0)
+    # None of the regexes can match more than the overlap window
+    regexes_dict = {
+        "letters.txt": re.compile(r"ab{1,6}c"),
+        "digits.txt": re.compile(r"\d{2,6}"),
+        "lines.txt": re.compile(r"^q\w{0,7}", re.MULTILINE),
+        "empty.txt": re.compile(r"x{0,8}"),
+    }
+    for _ in range(200):
+        text = "".join(random.choice("abcxq 12\n") for _ in range(random.randint(0, 300)))
+        matches_dict = find_matches_in_chunks(regexes_dict, text.encode(), random.randint(1, 30), 8)
+        for results_file_path, regex in regexes_dict.items():
+            assert matches_dict[results_file_path] == [match.group() for match in regex.finditer(text)]
+
+def test_chunked_match_finder_cuts_matches_longer_than_overlap():
+    regexes_dict = {"word.txt": re.compile(r"a+")}
+    matches_dict = find_matches_in_chunks(regexes_dict, b"a" * 20, 4, 2)
+    assert "".join(matches_dict["word.txt"]) == "a" * 20
+    assert len(matches_dict["word.txt"]) > 1
+
+def test_chunked_match_finder_without_chunks():
+    assert ChunkedMatchFinder({"a.txt": re.compile("a")}, 4, "utf-8").finish() == {"a.txt": []}
+
+def test_streamed_warc_record_reads_chunks():
+    warc_record = StreamedWarcRecord("parent.gz", "http://a.com", io.BytesIO(b"abcdefg"))
+    assert list(warc_record.read_chunks(3)) == [b"abc", b"def", b"g"]
+    assert not warc_record.is_rewindable
+    warc_record.close()
+
+def test_spool_and_open_streamed_warc_record(tmp_path):
+    warc_record = StreamedWarcRecord("parent.gz", "http://a.com", io.BytesIO(b"spooled contents"), "utf-8", b"HTTP/1.1 200 OK\r\n")
+    spooled_warc_record = spool_streamed_warc_record(warc_record, str(tmp_path / "spool"), 4)
+
+    assert isinstance(spooled_warc_record, SpooledWarcRecord)
+    assert os.path.dirname(spooled_warc_record.spool_file_path) == str(tmp_path / "spool")
+    assert (spooled_warc_record.name, spooled_warc_record.charset) == ("http://a.com", "utf-8")
+
+    opened_warc_record = open_spooled_warc_record(spooled_warc_record)
+    assert opened_warc_record.is_rewindable
+    assert opened_warc_record.http_headers == b"HTTP/1.1 200 OK\r\n"
+    assert b"".join(opened_warc_record.read_chunks(5)) == b"spooled contents"
+
+    opened_warc_record.close()
+    assert opened_warc_record.opened_file is None
+    assert not os.path.exists(spooled_warc_record.spool_file_path)
+
+def test_open_spooled_warc_record_missing_file(tmp_path):
+    with pytest.raises(OSError):
+        open_spooled_warc_record(SpooledWarcRecord("parent.gz", "http://a.com", str(tmp_path / "missing.record")))
@@ -0,0 +1,215 @@
+import gzip
+import io
+import os
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+import trigram_index
+from streaming_search import StreamedWarcRecord
+from trigram_index import (HEADERS_TRIGRAM_OFFSET, TrigramIndex, build_trigram_index, create_ngram_query, find_candidate_warc_members,
+                           get_contents_ngrams, get_haystack_ngrams, get_index_settings_fingerprint, get_ngram_keys, get_record_trigrams,
+                           get_streamed_contents_trigrams, get_trigram_index_file_path)
+from warc_members import WarcMemberReader
+from warc_record import WarcRecord
+from warc_test_records import make_warc_record
+
+
+def write_per_record_warc_gz(path, records):
+    with open(path, "wb") as warc_gz_file:
+        for uri, body in records:
+            warc_gz_file.write(gzip.compress(make_warc_record(uri, body)))
+
+def get_trigram_set(text: str) -> set[int]:
+    return get_ngram_keys(get_haystack_ngrams(text))
+
+@pytest.fixture(autouse=True)
+def patch_settings(monkeypatch, tmp_path):
+    for setting_name in trigram_index.INDEX_AFFECTING_SETTINGS:
+        monkeypatch.setitem(trigram_index.config.settings, setting_name, None)
+    monkeypatch.setitem(trigram_index.config.settings, "SEARCH_BINARY_FILES", False)
+    monkeypatch.setitem(trigram_index.config.settings, "DETECT_CONTENTS_CHARSET", False)
+    monkeypatch.setitem(trigram_index.config.settings, "DECODE_HTTP_PAYLOADS", False)
+    monkeypatch.setitem(trigram_index.config.settings, "STREAMING_CHUNK_SIZE_KB", 4096)
+    monkeypatch.setitem(trigram_index.config.settings, "MAX_CONCURRENT_SEARCH_PROCESSES", 2)
+    monkeypatch.setitem(trigram_index.config.settings, "WARC_GZ_ARCHIVES_DIRECTORY", str(tmp_path / "warcs"))
+    monkeypatch.setitem(trigram_index.config.settings, "TRIGRAM_INDEX_DIRECTORY", str(tmp_path / "index"))
+    monkeypatch.setattr(trigram_index, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(trigram_index, "log_info", lambda msg: None)
+    os.makedirs(tmp_path / "warcs")
+
+@pytest.fixture
+def warcs_directory(tmp_path):
+    write_per_record_warc_gz(tmp_path / "warcs" / "a.warc.gz", [
+        ("http://a.com/1", b"nothing to see"),
+        ("http://a.com/2", b"the API_KEY = 123"),
+        ("http://a.com/3", b"mail admin@example.com"),
+    ])
+    write_per_record_warc_gz(tmp_path / "warcs" / "b.warc.gz", [
+        ("http://b.com/api_key", b"uri only"),
+        ("http://b.com/2", b"nothing either"),
+    ])
+    return tmp_path / "warcs"
+
+def read_candidate_uris(candidate_warc_members: list) -> list[str]:
+    warc_member_reader = WarcMemberReader()
+    uris = [warc_member_reader.read_record(warc_member).name for warc_member in candidate_warc_members]
+    warc_member_reader.close()
+    return uris
+
+
+def test_get_haystack_ngrams_keeps_only_ascii_ngrams():
+    assert get_haystack_ngrams(b"abcd") == {b"abc", b"bcd"}
+    assert get_haystack_ngrams("abcé") == {b"abc"}
+    assert get_haystack_ngrams("ab") == set()
+    assert get_haystack_ngrams(b"abcde", 4) == {b"abcd", b"bcde"}
+
+def test_get_contents_ngrams_decodes_and_lowercases():
+    # Invalid bytes are dropped when the contents are decoded, joining the text around them
+    assert get_contents_ngrams(b"AB\xffC", None) == {b"abc"}
+
+def test_get_streamed_contents_trigrams_spans_chunks(monkeypatch):
+    monkeypatch.setitem(trigram_index.config.settings, "STREAMING_CHUNK_SIZE_KB", 1)
+    contents = b"x" * 1023 + b"YZ" + "é".encode() * 600 + b"w"
+    warc_record = StreamedWarcRecord("a.gz", "http://a.com/big", io.BytesIO(contents))
+    assert get_streamed_contents_trigrams(warc_record) == get_contents_ngrams(contents, None)
+
+def test_get_streamed_contents_trigrams_skips_binary_contents(monkeypatch):
+    monkeypatch.setitem(trigram_index.config.settings, "STREAMING_CHUNK_SIZE_KB", 1)
+    warc_record = StreamedWarcRecord("a.gz", "http://a.com/big", io.BytesIO(b"\x00\x01" + b"text" * 1000))
+    assert get_streamed_contents_trigrams(warc_record) == set()
+
+def test_get_record_trigrams_keeps_headers_apart():
+    warc_record = WarcRecord("a.gz", "http://a.com/x", b"body text", http_headers=b"Server: Apache\r\n")
+    trigrams = get_record_trigrams(warc_record)
+    assert get_trigram_set("body") <= trigrams
+    assert get_trigram_set("a.com") <= trigrams
+    assert get_ngram_keys(get_haystack_ngrams("apache"), HEADERS_TRIGRAM_OFFSET) <= trigrams
+    assert not get_trigram_set("apache") & trigrams
+
+def test_get_record_trigrams_skips_binary_contents(monkeypatch):
+    warc_record = WarcRecord("a.gz", "http://a.com/x", b"\x00\x01binary")
+    assert not get_trigram_set("binary") & get_record_trigrams(warc_record)
+
+    monkeypatch.setitem(trigram_index.config.settings, "SEARCH_BINARY_FILES", True)
+    assert get_trigram_set("binary") <= get_record_trigrams(warc_record)
+
+@pytest.mark.parametrize("pattern, expected_literals", [
+    (r"api_key\s*=\s*\w+", [["api_key"]]),
+    (r"(?:secret|token)_\w+", [["secret", "token"]]),
+    (r"ab\d+cde", [["cde"]]),
+    (r"abc\d+|xy", []),
+    (r"\d+", []),
+])
+def test_create_ngram_query(pattern, expected_literals):
+    trigram_query = create_ngram_query(re.compile(pattern))
+    assert trigram_query.requirements == [[sorted(get_trigram_set(literal)) for literal in literals] for literals in expected_literals]
+    assert trigram_query.is_unconstrained == (not expected_literals)
+
+def test_create_ngram_query_for_headers_definition():
+    trigram_query = create_ngram_query(re.compile("Apache"), "headers")
+    assert trigram_query.get_ngrams() == get_ngram_keys(get_haystack_ngrams("apache"), HEADERS_TRIGRAM_OFFSET)
+
+def test_find_candidates_requires_every_requirement_and_any_alternative():
+    trigram_query = create_ngram_query(re.compile(r"(?:secret|token)=\d+end"))
+    postings = {}
+    for record_number, text in enumerate(["secret=1end", "token=2end", "secret only", "no", "tok=en end"]):
+        for trigram in get_trigram_set(text):
+            postings.setdefault(trigram, set()).add(record_number)
+    assert trigram_query.find_candidates(postings) == {0, 1}
+
+def test_trigram_query_never_rejects_a_match():
+    # Plan:
+    # - Index random contents, including invalid UTF-8 and characters that case-insensitively match ASCII letters
+    # - Whenever a regex finds a match in the decoded contents, its trigram query must find the contents as a candidate
+    patterns = [r"api_?key\s*=\s*\w+", r"\w+@\w+\.com", r"alpha|alph", r"kEy\d", r"İxe", r"(?-i:Abe)", r"six|(?:tix|isx)", r"sec"]
+    pieces = [b"a", b"b", b"e", b"i", b"s", b"x", b"k", b"K", b"y", b" ", b"=", b"_", b"@", b".com", "ſ".encode(), "ı".encode(),
+              "İ".encode(), "K".encode(), b"\xff", b"\xc3", b"p", b"l", b"h", b"t", b"1", b"I", b"S", b"c"]
+    random_generator = random.Random(7)
+    for flags in (re.IGNORECASE, 0):
+        regexes = [re.compile(pattern, flags) for pattern in patterns]
+        trigram_queries = [create_ngram_query(regex) for regex in regexes]
+        for _ in range(2000):
+            contents = b"".join(random_generator.choice(pieces) for _ in range(random_generator.randint(0, 25)))
+            postings = {trigram: {0} for trigram in get_ngram_keys(get_contents_ngrams(contents, None))}
+            decoded_contents = str(contents, "utf-8", "ignore")
+            for regex, trigram_query in zip(regexes, trigram_queries):
+                if regex.search(decoded_contents) and not trigram_query.is_unconstrained:
+                    assert trigram_query.find_candidates(postings) == {0}, (regex.pattern, contents)
+
+def test_build_and_search_trigram_index(warcs_directory):
+    build_trigram_index()
+
+    a_path, b_path = str(warcs_directory / "a.warc.gz"), str(warcs_directory / "b.warc.gz")
+    candidate_warc_members_dict = find_candidate_warc_members(
+        [a_path, b_path],
+        {"/results/apikey_results.txt": re.compile(r"api_key\s*=\s*\w+", re.IGNORECASE)}
+    )
+
+    assert read_candidate_uris(candidate_warc_members_dict[a_path]) == ["http://a.com/2"]
+    assert read_candidate_uris(candidate_warc_members_dict[b_path]) == ["http://b.com/api_key"]
+
+def test_unconstrained_definition_does_not_use_index(warcs_directory):
+    build_trigram_index()
+    results_and_regexes_dict = {
+        "/results/apikey_results.txt": re.compile(r"api_key"),
+        "/results/digits_results.txt": re.compile(r"\d+"),
+    }
+    assert find_candidate_warc_members([str(warcs_directory / "a.warc.gz")], results_and_regexes_dict) == {}
+
+def test_changed_archive_and_settings_are_read_in_full(warcs_directory, monkeypatch):
+    warnings = []
+    monkeypatch.setattr(trigram_index, "log_warning", warnings.append)
+    build_trigram_index()
+
+    a_path, b_path = str(warcs_directory / "a.warc.gz"), str(warcs_directory / "b.warc.gz")
+    write_per_record_warc_gz(b_path, [("http://b.com/changed", b"api_key=1")])
+    results_and_regexes_dict = {"/results/apikey_results.txt": re.compile(r"api_key")}
+    assert set(find_candidate_warc_members([a_path, b_path], results_and_regexes_dict)) == {a_path}
+    assert "1 WARC.gz files are not in the trigram index" in warnings[-1]
+
+    monkeypatch.setitem(trigram_index.config.settings, "DECODE_HTTP_PAYLOADS", True)
+    assert find_candidate_warc_members([a_path, b_path], results_and_regexes_dict) == {}
+
+def test_build_trigram_index_updates_only_changed_archives(warcs_directory, monkeypatch):
+    build_trigram_index()
+    indexed_paths = []
+    index_warc_gz_file = trigram_index.index_warc_gz_file
+    monkeypatch.setattr(trigram_index, "index_warc_gz_file", lambda path: indexed_paths.append(path) or index_warc_gz_file(path))
+
+    write_per_record_warc_gz(warcs_directory / "b.warc.gz", [("http://b.com/changed", b"api_key=1")])
+    os.remove(warcs_directory / "a.warc.gz")
+    build_trigram_index()
+
+    assert indexed_paths == [str(warcs_directory / "b.warc.gz")]
+    trigram_index_database = TrigramIndex(get_trigram_index_file_path())
+    assert trigram_index_database.get_indexed_archive(str(warcs_directory / "b.warc.gz"), get_index_settings_fingerprint()) is not None
+    assert [path for (path,) in trigram_index_database.connection.execute("SELECT path FROM archives")] == [
+        os.path.abspath(warcs_directory / "b.warc.gz")
+    ]
+    trigram_index_database.close()
+
+def test_build_trigram_index_skips_single_member_files(tmp_path, monkeypatch):
+    warnings = []
+    monkeypatch.setattr(trigram_index, "log_warning", warnings.append)
+    records = make_warc_record("http://a.com/1", b"first") + make_warc_record("http://a.com/2", b"second")
+    (tmp_path / "warcs" / "single.warc.gz").write_bytes(gzip.compress(records))
+
+    build_trigram_index()
+
+    assert "not compressed per record" in warnings[0]
+
+def test_build_trigram_index_requires_directory(monkeypatch):
+    errors = []
+    monkeypatch.setitem(trigram_index.config.settings, "TRIGRAM_INDEX_DIRECTORY", None)
+    monkeypatch.setattr(trigram_index, "log_error", errors.append)
+    with pytest.raises(SystemExit):
+        build_trigram_index()
+    assert len(errors) == 1
+
+def test_find_candidate_warc_members_without_index(monkeypatch):
+    warnings = []
+    monkeypatch.setattr(trigram_index, "log_warning", warnings.append)
+    assert find_candidate_warc_members(["a.warc.gz"], {"/results/apikey_results.txt": re.compile("api_key")}) == {}
+    assert "build-index" in warnings[0]
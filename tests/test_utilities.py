@@ -3,6 +3,7 @@ import sys
 from utilities import *
 import io
 import zipfile
+import pytest
 
 def test_find_regex_matches_multiple():
     pattern = re.compile(r'\d+')
@@ -107,6 +108,11 @@ def test_is_file_binary_with_long_binary():
     long_binary = b"\x00\xff" * 1024
     assert is_file_binary(long_binary) is True
 
+def test_is_file_binary_with_memoryview():
+    # Contents read from shared memory are passed as a memoryview
+    assert is_file_binary(memoryview(b"plain text")) is False
+    assert is_file_binary(memoryview(b"\x00\x01\x02")) is True
+
 def test_get_total_ram_used_percent_is_int(monkeypatch):
     class DummyVMem:
         percent = 42.7
@@ -228,6 +234,51 @@ def create_zip_with_files_helper(zip_path, files_dict):
         for name, data in files_dict.items():
             zf.writestr(name, data)
 
+def test_add_stream_to_zip_archive_copies_stream_from_start():
+    file_stream = io.BytesIO(b"streamed data")
+    file_stream.read()
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED) as zf:
+        add_stream_to_zip_archive("http://www.example.com/video", file_stream, zf)
+        add_stream_to_zip_archive("http://www.example.com/video", io.BytesIO(b"other data"), zf)
+        assert zf.namelist() == ["example.comvideo"]
+        assert zf.read("example.comvideo") == b"streamed data"
+
+def test_add_file_and_stream_to_zip_archive_use_given_compression():
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED) as zf:
+        assert add_file_to_zip_archive("image.png", b"png data", zf, zipfile.ZIP_STORED)
+        assert not add_file_to_zip_archive("image.png", b"png data", zf, zipfile.ZIP_STORED)
+        assert add_stream_to_zip_archive("video.mp4", io.BytesIO(b"mp4 data"), zf, zipfile.ZIP_LZMA)
+        assert add_stream_to_zip_archive("page.html", io.BytesIO(b"<html>"), zf)
+        assert [zip_info.compress_type for zip_info in zf.infolist()] == [zipfile.ZIP_STORED, zipfile.ZIP_LZMA, zipfile.ZIP_DEFLATED]
+        assert zf.read("video.mp4") == b"mp4 data"
+
+def test_is_file_in_zip_archive_finds_entries_without_listing_names(monkeypatch):
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w") as zf:
+        zf.writestr("existing.txt", b"data")
+
+    monkeypatch.setattr(zipfile.ZipFile, "namelist", lambda self: pytest.fail("namelist() should not be called"))
+    with zipfile.ZipFile(zip_buffer, "a") as zf:
+        assert is_file_in_zip_archive("existing.txt", zf)
+        assert not is_file_in_zip_archive("new.txt", zf)
+        assert add_file_to_zip_archive("new.txt", b"data", zf)
+        assert not add_file_to_zip_archive("existing.txt", b"data", zf)
+
+def test_copy_zip_archive_entries_copies_named_files(tmp_path):
+    source_zip_path = tmp_path / "source.zip"
+    target_zip_path = tmp_path / "target.zip"
+    create_zip_with_files_helper(source_zip_path, {"example.compage": b"page", "example.comother": b"other"})
+    create_zip_with_files_helper(target_zip_path, {"example.compage": b"already present"})
+
+    copy_zip_archive_entries(str(source_zip_path), str(target_zip_path), ["http://www.example.com/page", "https://example.com/other", "missing"])
+
+    with zipfile.ZipFile(target_zip_path, "r") as zf:
+        assert sorted(zf.namelist()) == ["example.comother", "example.compage"]
+        assert zf.read("example.compage") == b"already present"
+        assert zf.read("example.comother") == b"other"
+
 def test_merge_zip_archives_merges_files(tmp_path):
     parent_dir = tmp_path / "parent"
     output_dir = tmp_path / "output"
@@ -0,0 +1,103 @@
+import errno
+import gzip
+import os
+
+import pytest
+
+import warc_gz_extraction
+from warc_gz_extraction import (WarcGzExtractor, copy_file_range, copy_warc_gz_records, get_warc_gz_file_path, merge_warc_gz_files,
+                                open_file_for_copying, scan_warc_gz_response_members)
+from warc_members import scan_warc_gz_members
+from warc_test_records import make_warc_record
+
+RESULTS_FILE_PATHS = ["/results/keys_results.txt", "/results/tokens_results.txt"]
+
+
+@pytest.fixture
+def per_record_warc_gz(tmp_path):
+    path = tmp_path / "source.warc.gz"
+    with open(path, "wb") as warc_gz_file:
+        warc_gz_file.write(gzip.compress(make_warc_record("http://a.com/1", b"first")))
+        warc_gz_file.write(gzip.compress(make_warc_record("http://a.com/meta", b"", record_type=b"metadata")))
+        warc_gz_file.write(gzip.compress(make_warc_record("http://a.com/2", b"second " * 1000)))
+    return str(path)
+
+def read_member_bytes(warc_member):
+    with open(warc_member.parent_warc_gz_file, "rb") as warc_gz_file:
+        warc_gz_file.seek(warc_member.offset)
+        return warc_gz_file.read(warc_member.length)
+
+
+@pytest.mark.parametrize("unsupported_functions", [(), ("copy_file_range",), ("copy_file_range", "sendfile")])
+def test_copy_file_range_falls_back_when_unsupported(tmp_path, monkeypatch, unsupported_functions):
+    def raise_unsupported(*args):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+    for function_name in unsupported_functions:
+        if hasattr(os, function_name):
+            monkeypatch.setattr(os, function_name, raise_unsupported)
+    source_path = tmp_path / "source.bin"
+    source_path.write_bytes(os.urandom(3 * 1024 * 1024))
+
+    with open(source_path, "rb") as source_file, open_file_for_copying(str(tmp_path / "output.bin")) as output_file:
+        output_file.write(b"start")
+        copy_file_range(source_file, output_file, 1000, 2 * 1024 * 1024)
+
+    assert (tmp_path / "output.bin").read_bytes() == b"start" + source_path.read_bytes()[1000:1000 + 2 * 1024 * 1024]
+
+def test_copy_file_range_raises_past_the_end_of_the_source(tmp_path):
+    (tmp_path / "source.bin").write_bytes(b"short")
+    with open(tmp_path / "source.bin", "rb") as source_file, open_file_for_copying(str(tmp_path / "output.bin")) as output_file:
+        with pytest.raises(EOFError):
+            copy_file_range(source_file, output_file, 0, 100)
+
+def test_extractor_copies_each_member_once_per_definition(tmp_path, per_record_warc_gz):
+    first_member, second_member = scan_warc_gz_members(per_record_warc_gz)
+    extractor = WarcGzExtractor()
+    extractor.start_worker(RESULTS_FILE_PATHS, str(tmp_path), 0)
+
+    assert extractor.add_member(first_member, RESULTS_FILE_PATHS) == 2
+    assert extractor.add_member(first_member, RESULTS_FILE_PATHS[:1]) == 0
+    extractor.start_segments(1)
+    assert extractor.add_member(second_member, RESULTS_FILE_PATHS[:1]) == 1
+    extractor.finish_worker()
+
+    keys_warc_gz_file_path = get_warc_gz_file_path(str(tmp_path), RESULTS_FILE_PATHS[0])
+    assert open(keys_warc_gz_file_path, "rb").read() == read_member_bytes(first_member)
+    assert open(str(tmp_path / "keys_results.1.warc.gz"), "rb").read() == read_member_bytes(second_member)
+    assert open(get_warc_gz_file_path(str(tmp_path), RESULTS_FILE_PATHS[1]), "rb").read() == read_member_bytes(first_member)
+
+def test_extractor_removes_a_member_cut_short(tmp_path, per_record_warc_gz, monkeypatch):
+    first_member, second_member = scan_warc_gz_members(per_record_warc_gz)
+    extractor = WarcGzExtractor()
+    extractor.start_worker(RESULTS_FILE_PATHS[:1], str(tmp_path), 0)
+    extractor.add_member(first_member, RESULTS_FILE_PATHS[:1])
+
+    def copy_half(source_file, output_file, offset, length):
+        output_file.write(read_member_bytes(second_member)[:length // 2])
+        raise OSError(errno.EIO, "Input/output error")
+    monkeypatch.setattr(warc_gz_extraction, "copy_file_range", copy_half)
+    with pytest.raises(OSError):
+        extractor.add_member(second_member, RESULTS_FILE_PATHS[:1])
+    extractor.finish_worker()
+
+    assert open(get_warc_gz_file_path(str(tmp_path), RESULTS_FILE_PATHS[0]), "rb").read() == read_member_bytes(first_member)
+
+def test_merge_warc_gz_files_concatenates_members(tmp_path, per_record_warc_gz):
+    first_member, second_member = scan_warc_gz_members(per_record_warc_gz)
+    for process_id, warc_member in (("1", first_member), ("2", second_member)):
+        (tmp_path / "temp" / process_id).mkdir(parents=True)
+        (tmp_path / "temp" / process_id / "keys_results.warc.gz").write_bytes(read_member_bytes(warc_member))
+
+    merge_warc_gz_files(str(tmp_path / "temp"), str(tmp_path), "keys_results")
+
+    merged_warc_gz_file_path = str(tmp_path / "keys_results.warc.gz")
+    assert [target_uri for target_uri, _ in scan_warc_gz_response_members(merged_warc_gz_file_path)] == ["http://a.com/1", "http://a.com/2"]
+    assert b"second " * 1000 in gzip.decompress(open(merged_warc_gz_file_path, "rb").read())
+    assert not os.path.exists(f"{merged_warc_gz_file_path}.merging")
+
+def test_copy_warc_gz_records_copies_members_of_named_records(tmp_path, per_record_warc_gz):
+    target_warc_gz_file_path = str(tmp_path / "target.warc.gz")
+    copy_warc_gz_records(per_record_warc_gz, target_warc_gz_file_path, ["http://a.com/2", "http://missing.com/"])
+
+    second_member = list(scan_warc_gz_members(per_record_warc_gz))[1]
+    assert open(target_warc_gz_file_path, "rb").read() == read_member_bytes(second_member)
@@ -0,0 +1,182 @@
+import gzip
+import pytest
+
+import warc_members
+from record_filters import RecordFilter
+from streaming_search import StreamedWarcRecord
+from warc_members import (WarcMember, WarcMemberReader, inflate_warc_gz_member, is_warc_gz_compressed_per_record,
+                          open_streamed_warc_gz_member, parse_warc_gz_member, scan_warc_gz_members)
+from warc_test_records import make_warc_record
+
+
+@pytest.fixture
+def per_record_warc_gz(tmp_path):
+    path = tmp_path / "per_record.warc.gz"
+    with open(path, "wb") as warc_gz_file:
+        warc_gz_file.write(gzip.compress(make_warc_record("http://a.com/1", b"first")))
+        warc_gz_file.write(gzip.compress(make_warc_record("http://a.com/meta", b"", record_type=b"metadata")))
+        warc_gz_file.write(gzip.compress(make_warc_record("http://a.com/2", b"second " * 1000)))
+        warc_gz_file.write(gzip.compress(make_warc_record("http://a.com/3", b"third")))
+    return str(path)
+
+@pytest.fixture
+def single_member_warc_gz(tmp_path):
+    path = tmp_path / "single_member.warc.gz"
+    records = make_warc_record("http://a.com/1", b"first") + make_warc_record("http://a.com/2", b"second")
+    path.write_bytes(gzip.compress(records))
+    return str(path)
+
+def test_is_warc_gz_compressed_per_record(per_record_warc_gz, single_member_warc_gz):
+    assert is_warc_gz_compressed_per_record(per_record_warc_gz) is True
+    # A file holding every record in one member ends after its first member, but that member holds more than one record
+    assert is_warc_gz_compressed_per_record(single_member_warc_gz) is False
+
+def test_is_warc_gz_compressed_per_record_rejects_invalid_files(tmp_path):
+    not_gzip = tmp_path / "not_gzip.warc.gz"
+    not_gzip.write_bytes(b"WARC/1.0\r\n")
+    truncated = tmp_path / "truncated.warc.gz"
+    truncated.write_bytes(gzip.compress(make_warc_record("http://a.com/1", b"first"))[:-20])
+    trailing_garbage = tmp_path / "trailing_garbage.warc.gz"
+    trailing_garbage.write_bytes(gzip.compress(make_warc_record("http://a.com/1", b"first")) + b"garbage")
+
+    assert is_warc_gz_compressed_per_record(str(not_gzip)) is False
+    assert is_warc_gz_compressed_per_record(str(truncated)) is False
+    assert is_warc_gz_compressed_per_record(str(trailing_garbage)) is False
+
+def test_scan_warc_gz_members_covers_response_records(per_record_warc_gz):
+    members = list(scan_warc_gz_members(per_record_warc_gz))
+
+    assert len(members) == 3
+    assert all(member.parent_warc_gz_file == per_record_warc_gz for member in members)
+    assert members[0].offset == 0
+    # The last member runs to the end of the file
+    with open(per_record_warc_gz, "rb") as warc_gz_file:
+        assert members[-1].offset + members[-1].length == len(warc_gz_file.read())
+
+def test_warc_member_reader_reads_every_record(per_record_warc_gz):
+    reader = WarcMemberReader()
+    records = [reader.read_record(member) for member in scan_warc_gz_members(per_record_warc_gz)]
+    reader.close()
+
+    assert [record.name for record in records] == ["http://a.com/1", "http://a.com/2", "http://a.com/3"]
+    assert records[0].contents == b"first"
+    assert records[1].contents == b"second " * 1000
+    assert all(record.parent_warc_gz_file == per_record_warc_gz for record in records)
+    assert [record.warc_member for record in records] == list(scan_warc_gz_members(per_record_warc_gz))
+    assert reader.open_files == {}
+
+def test_warc_member_reader_streams_records_above_threshold(per_record_warc_gz):
+    reader = WarcMemberReader(streaming_threshold=1000)
+    records = [reader.read_record(member) for member in scan_warc_gz_members(per_record_warc_gz)]
+
+    assert [type(record) for record in records] == [warc_members.WarcRecord, StreamedWarcRecord, warc_members.WarcRecord]
+    assert [record.warc_member for record in records] == list(scan_warc_gz_members(per_record_warc_gz))
+    assert b"".join(records[1].read_chunks(100)) == b"second " * 1000
+    assert records[1].name == "http://a.com/2"
+    records[1].close()
+    assert records[1].opened_file is None
+    reader.close()
+
+def test_warc_member_reader_streams_members_above_threshold(per_record_warc_gz):
+    reader = WarcMemberReader(streaming_threshold=10)
+    warc_member = next(scan_warc_gz_members(per_record_warc_gz))
+    streamed_warc_record = reader.read_record(warc_member)
+
+    assert isinstance(streamed_warc_record, StreamedWarcRecord)
+    assert b"".join(streamed_warc_record.read_chunks(2)) == b"first"
+    assert reader.open_files == {}
+    streamed_warc_record.close()
+
+def test_inflate_warc_gz_member():
+    member_bytes = gzip.compress(b"x" * 100)
+    assert inflate_warc_gz_member(member_bytes, 100) == b"x" * 100
+    assert inflate_warc_gz_member(member_bytes, 99) is None
+
+def test_open_streamed_warc_gz_member_without_response_record(tmp_path):
+    path = tmp_path / "meta.warc.gz"
+    path.write_bytes(gzip.compress(make_warc_record("http://a.com/meta", b"", record_type=b"metadata")))
+    assert open_streamed_warc_gz_member(WarcMember(str(path), 0, path.stat().st_size)) is None
+
+def test_scan_warc_gz_members_with_record_filter(tmp_path):
+    path = tmp_path / "filtered.warc.gz"
+    with open(path, "wb") as warc_gz_file:
+        warc_gz_file.write(gzip.compress(make_warc_record("http://a.com/1", b"first")))
+        warc_gz_file.write(gzip.compress(make_warc_record("http://a.com/2.png", b"\x89PNG", content_type=b"image/png")))
+        warc_gz_file.write(gzip.compress(make_warc_record("http://a.com/3", b"third")))
+    record_filter = RecordFilter(denied_content_types=["image/*"])
+
+    members = list(scan_warc_gz_members(str(path), record_filter))
+
+    # The skipped record's member is not part of the member before it
+    reader = WarcMemberReader()
+    assert [reader.read_record(member).name for member in members] == ["http://a.com/1", "http://a.com/3"]
+    assert members[0].length < members[1].offset
+    reader.close()
+    assert record_filter.skipped_records["Content-Type"] == 1
+
+def test_scan_warc_gz_members_from_start_offset(tmp_path):
+    path = tmp_path / "resumed.warc.gz"
+    first_member = gzip.compress(make_warc_record("http://a.com/1", b"first"))
+    with open(path, "wb") as warc_gz_file:
+        warc_gz_file.write(first_member)
+        warc_gz_file.write(gzip.compress(make_warc_record("http://a.com/2", b"second")))
+
+    members = list(scan_warc_gz_members(str(path), start_offset=len(first_member)))
+
+    reader = WarcMemberReader()
+    assert [reader.read_record(member).name for member in members] == ["http://a.com/2"]
+    assert members[0].offset == len(first_member)
+    reader.close()
+
+def test_parse_warc_gz_member_reads_http_charset():
+    member_bytes = gzip.compress(make_warc_record("http://a.com/1", b"body", content_type=b"text/html; charset=ISO-8859-1"))
+    record = parse_warc_gz_member("a.gz", member_bytes)
+    assert record.contents == b"body"
+    assert record.charset == "ISO-8859-1"
+
+    assert parse_warc_gz_member("a.gz", gzip.compress(make_warc_record("http://a.com/1", b"body"))).charset is None
+
+def test_parse_warc_gz_member_reads_http_headers():
+    member_bytes = gzip.compress(make_warc_record("http://a.com/1", b"body"))
+    assert parse_warc_gz_member("a.gz", member_bytes).http_headers is None
+
+    record = parse_warc_gz_member("a.gz", member_bytes, read_http_headers=True)
+    assert record.http_headers == b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n"
+    assert record.contents == b"body"
+
+def test_parse_warc_gz_member_without_response_record():
+    member_bytes = gzip.compress(make_warc_record("http://a.com/meta", b"", record_type=b"metadata"))
+    assert parse_warc_gz_member("a.gz", member_bytes) is None
+
+def test_warc_member_reader_closes_least_recently_used_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(WarcMemberReader, "MAX_OPEN_FILES", 2)
+    paths = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / f"{name}.warc.gz"
+        path.write_bytes(gzip.compress(make_warc_record(f"http://{name}.com", b"body")))
+        paths.append(str(path))
+
+    reader = WarcMemberReader()
+    first_file = reader.get_open_file(paths[0])
+    reader.get_open_file(paths[1])
+    reader.get_open_file(paths[0])
+    second_file = reader.open_files[paths[1]]
+    reader.get_open_file(paths[2])
+
+    assert list(reader.open_files) == [paths[0], paths[2]]
+    assert second_file.closed
+    assert not first_file.closed
+    reader.close()
+
+def test_read_file_range_without_pread(tmp_path, monkeypatch):
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"0123456789")
+    monkeypatch.delattr(warc_members.os, "pread", raising=False)
+
+    with open(path, "rb") as data_file:
+        assert warc_members.read_file_range(data_file, 3, 4) == b"3456"
+
+def test_warc_member_is_named_tuple():
+    member = WarcMember("a.gz", 10, 20)
+    assert member == ("a.gz", 10, 20)
+    assert (member.parent_warc_gz_file, member.offset, member.length) == ("a.gz", 10, 20)
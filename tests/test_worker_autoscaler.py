@@ -0,0 +1,170 @@
+import threading
+import time
+
+from worker_autoscaler import SearchWorkerAutoscaler
+
+
+def make_autoscaler(min_workers: int = 1, max_workers: int = 4, active_workers: int = 2) -> SearchWorkerAutoscaler:
+    worker_autoscaler = SearchWorkerAutoscaler(min_workers, max_workers)
+    worker_autoscaler.set_active_workers(active_workers)
+    return worker_autoscaler
+
+
+def test_starts_with_every_worker_active():
+    worker_autoscaler = SearchWorkerAutoscaler(1, 3)
+    assert all(worker_autoscaler.is_active(worker_index) for worker_index in range(3))
+
+def test_min_workers_capped_at_max_workers():
+    assert SearchWorkerAutoscaler(8, 3).min_workers == 3
+
+def test_grows_when_queue_backs_up_and_workers_are_busy():
+    worker_autoscaler = make_autoscaler()
+    assert worker_autoscaler.decide_active_workers(2, 10, 0.95, 100) == 3
+
+def test_does_not_grow_while_backlog_shrinks_or_workers_idle():
+    worker_autoscaler = make_autoscaler()
+    worker_autoscaler.last_queue_depth = 20
+    assert worker_autoscaler.decide_active_workers(2, 10, 0.95, 100) == 2
+
+    worker_autoscaler.last_queue_depth = 0
+    assert worker_autoscaler.decide_active_workers(2, 10, 0.5, 100) == 2
+
+def test_shrinks_when_queue_is_empty_and_workers_idle():
+    worker_autoscaler = make_autoscaler()
+    assert worker_autoscaler.decide_active_workers(2, 0, 0.2, 100) == 1
+    # Never below the minimum, and not while nothing is being read
+    assert worker_autoscaler.decide_active_workers(1, 0, 0.2, 100) == 1
+    assert worker_autoscaler.decide_active_workers(2, 0, 0.2, 0) == 2
+
+def test_never_grows_past_max_workers():
+    worker_autoscaler = make_autoscaler(active_workers=4)
+    assert worker_autoscaler.decide_active_workers(4, 100, 1.0, 100) == 4
+
+def test_adjust_waits_for_interval(monkeypatch):
+    worker_autoscaler = make_autoscaler()
+    worker_autoscaler.busy_seconds[0] = 100.0
+    worker_autoscaler.adjust(50, 10)
+    assert worker_autoscaler.active_workers.value == 2
+
+def test_adjust_uses_busy_time_since_last_adjustment(monkeypatch):
+    worker_autoscaler = make_autoscaler()
+    now = worker_autoscaler.last_adjust_time
+    monkeypatch.setattr("worker_autoscaler.time.monotonic", lambda: now + 2)
+
+    # Both active workers were busy for the whole 2 seconds
+    worker_autoscaler.busy_seconds[0] = 2.0
+    worker_autoscaler.busy_seconds[1] = 2.0
+    worker_autoscaler.adjust(10, 100)
+    assert worker_autoscaler.active_workers.value == 3
+    assert worker_autoscaler.scale_ups == 1
+
+    # Nothing was searched since, while records were read into an empty queue
+    monkeypatch.setattr("worker_autoscaler.time.monotonic", lambda: now + 4)
+    worker_autoscaler.adjust(0, 200)
+    assert worker_autoscaler.active_workers.value == 2
+    assert worker_autoscaler.scale_downs == 1
+    assert worker_autoscaler.fewest_active_workers == 2
+
+def test_parked_worker_waits_until_activated():
+    worker_autoscaler = make_autoscaler(active_workers=1)
+    assert not worker_autoscaler.is_active(1)
+    activated = threading.Event()
+
+    def wait_in_thread():
+        worker_autoscaler.wait_until_active(1)
+        activated.set()
+
+    wait_thread = threading.Thread(target=wait_in_thread)
+    wait_thread.start()
+    assert not activated.wait(0.2)
+
+    worker_autoscaler.activate_all_workers()
+    assert activated.wait(5)
+    wait_thread.join()
+
+def test_read_threads_follow_parked_workers():
+    worker_autoscaler = SearchWorkerAutoscaler(2, 6, read_threads=4)
+    assert worker_autoscaler.max_read_threads == 8
+    assert worker_autoscaler.active_read_threads == 4
+
+    worker_autoscaler.set_active_workers(3)
+    assert worker_autoscaler.active_read_threads == 7
+
+def read_in_threads(worker_autoscaler: SearchWorkerAutoscaler, read_threads: int, seconds: float) -> int:
+    """Returns how many records the read threads read in the given time, each record taking 10 ms to read, as when waiting on the disk."""
+    records_read = []
+    stop_time = time.monotonic() + seconds
+
+    def read_records():
+        while time.monotonic() < stop_time:
+            time.sleep(0.01)
+            yield 1
+
+    def read_thread():
+        for record in worker_autoscaler.iterate_as_read_thread(read_records()):
+            records_read.append(record)
+
+    threads = [threading.Thread(target=read_thread) for _ in range(read_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(records_read)
+
+def test_parking_workers_speeds_up_reading():
+    worker_autoscaler = SearchWorkerAutoscaler(1, 4, read_threads=1)
+    records_read_with_every_worker_active = read_in_threads(worker_autoscaler, 4, 0.3)
+
+    # Each of the 3 parked worker processes lets one more read thread read at a time
+    worker_autoscaler.set_active_workers(1)
+    records_read_with_workers_parked = read_in_threads(worker_autoscaler, 4, 0.3)
+
+    assert records_read_with_workers_parked >= 2 * records_read_with_every_worker_active
+    assert worker_autoscaler.reading_threads == 0
+
+def test_waiting_read_thread_reads_once_worker_is_parked():
+    worker_autoscaler = SearchWorkerAutoscaler(1, 2, read_threads=1)
+    first_record_read = threading.Event()
+    release_first_record = threading.Event()
+
+    def read_first_record():
+        first_record_read.set()
+        release_first_record.wait()
+        yield 1
+
+    first_thread = threading.Thread(target=lambda: list(worker_autoscaler.iterate_as_read_thread(read_first_record())))
+    first_thread.start()
+    first_record_read.wait()
+
+    second_records = []
+    second_thread = threading.Thread(target=lambda: second_records.extend(worker_autoscaler.iterate_as_read_thread(iter([2]))))
+    second_thread.start()
+    second_thread.join(0.2)
+    assert second_records == []
+
+    worker_autoscaler.set_active_workers(1)
+    second_thread.join(5)
+    assert second_records == [2]
+
+    release_first_record.set()
+    first_thread.join(5)
+
+def test_getstate_excludes_read_threads_condition():
+    worker_autoscaler = make_autoscaler()
+    state = worker_autoscaler.__getstate__()
+    assert state["read_threads_condition"] is None
+    assert state["active_workers"] is worker_autoscaler.active_workers
+    assert worker_autoscaler.read_threads_condition is not None
+
+def test_log_summary(monkeypatch):
+    messages = []
+    monkeypatch.setattr("worker_autoscaler.log_info", lambda msg: messages.append(msg))
+    worker_autoscaler = make_autoscaler()
+    worker_autoscaler.scale_ups = 2
+    worker_autoscaler.scale_downs = 3
+    worker_autoscaler.fewest_active_workers = 1
+
+    worker_autoscaler.log_summary()
+    assert "2 times and parked one 3 times" in messages[0]
+    assert "At least 1 of 4 worker processes" in messages[0]
+    assert "up to 7 read threads" in messages[0]
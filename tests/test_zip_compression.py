@@ -0,0 +1,55 @@
+import gzip
+import zipfile
+
+import pytest
+
+from zip_compression import ZipCompressionPolicy, get_content_type, is_compressed_format, parse_zip_compression
+
+PNG_HEADERS = b"HTTP/1.1 200 OK\r\nContent-Type: image/png\r\n\r\n"
+HTML_HEADERS = b"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n\r\n"
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("deflate", (zipfile.ZIP_DEFLATED, None)),
+    (" Deflate:9 ", (zipfile.ZIP_DEFLATED, 9)),
+    ("bzip2:1", (zipfile.ZIP_BZIP2, 1)),
+    ("lzma", (zipfile.ZIP_LZMA, None)),
+    ("stored", (zipfile.ZIP_STORED, None)),
+])
+def test_parse_zip_compression(value, expected):
+    assert parse_zip_compression(value) == expected
+
+@pytest.mark.parametrize("value", ["zstd", "", "deflate:10", "bzip2:0", "lzma:5", "stored:1", "deflate:high"])
+def test_parse_zip_compression_rejects_invalid_values(value):
+    with pytest.raises(ValueError):
+        parse_zip_compression(value)
+
+def test_get_content_type():
+    assert get_content_type(HTML_HEADERS) == "text/html"
+    assert get_content_type(b"HTTP/1.1 200 OK\r\n\r\n") == ""
+    assert get_content_type(None) == ""
+
+@pytest.mark.parametrize("contents_start, http_headers, expected", [
+    (b"<html>", PNG_HEADERS, True),
+    (b"<svg>", b"HTTP/1.1 200 OK\r\nContent-Type: image/svg+xml\r\n\r\n", False),
+    (b"PK\x03\x04", b"HTTP/1.1 200 OK\r\nContent-Type: application/vnd.openxmlformats-officedocument.wordprocessingml.document\r\n\r\n", True),
+    (b"<html>", HTML_HEADERS, False),
+    (gzip.compress(b"<html>")[:16], HTML_HEADERS, True),
+    (b"\xff\xd8\xff\xe0\x00\x10JFIF", None, True),
+    (b"\x00\x00\x00\x18ftypmp42", None, True),
+    (b"plain text", None, False),
+])
+def test_is_compressed_format(contents_start, http_headers, expected):
+    assert is_compressed_format(contents_start, http_headers) == expected
+
+def test_policy_stores_compressed_formats_and_uses_definition_compression():
+    policy = ZipCompressionPolicy("deflate:6", {"secrets": "lzma", "pages": "bzip2:9"}, True)
+
+    assert policy.get_compression("/results/Secrets_results.txt", b"<html>", HTML_HEADERS) == (zipfile.ZIP_LZMA, None)
+    assert policy.get_compression("/results/pages_results.txt", b"<html>", None) == (zipfile.ZIP_BZIP2, 9)
+    assert policy.get_compression("/results/other_results.txt", b"<html>", None) == (zipfile.ZIP_DEFLATED, 6)
+    assert policy.get_compression("/results/secrets_results.txt", b"\x89PNG\r\n\x1a\n", None) == (zipfile.ZIP_STORED, None)
+
+def test_policy_compresses_every_format_unless_enabled():
+    policy = ZipCompressionPolicy("deflate", None, False)
+    assert policy.get_compression("/results/images_results.txt", b"\x89PNG\r\n\x1a\n", PNG_HEADERS) == (zipfile.ZIP_DEFLATED, None)
@@ -0,0 +1,100 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from zip_merge import RawZipArchiveWriter, get_entry_data_offset, merge_zip_archives_without_recompression
+
+
+def create_zip_archive(zip_archive_path, files_dict, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(zip_archive_path, "w", compression) as zip_archive:
+        for name, data in files_dict.items():
+            zip_archive.writestr(name, data)
+
+def read_compressed_data(zip_archive_path, name):
+    with zipfile.ZipFile(zip_archive_path) as zip_archive, open(zip_archive_path, "rb") as zip_archive_file:
+        zip_info = zip_archive.getinfo(name)
+        zip_archive_file.seek(get_entry_data_offset(zip_archive_file, zip_info))
+        return zip_archive_file.read(zip_info.compress_size)
+
+
+def test_merge_copies_compressed_data_without_recompression(tmp_path):
+    first_path, second_path, output_path = (str(tmp_path / name) for name in ("first.zip", "second.zip", "output.zip"))
+    create_zip_archive(first_path, {"a.txt": b"a" * 10000, "b.txt": b"first b"})
+    create_zip_archive(second_path, {"b.txt": b"second b", "c.bin": os.urandom(1000)}, zipfile.ZIP_STORED)
+
+    merge_zip_archives_without_recompression([first_path, second_path], output_path)
+
+    with zipfile.ZipFile(output_path) as zip_archive:
+        assert zip_archive.testzip() is None
+        assert zip_archive.namelist() == ["a.txt", "b.txt", "c.bin"]
+        assert zip_archive.read("b.txt") == b"first b"
+        assert zip_archive.getinfo("a.txt").compress_type == zipfile.ZIP_DEFLATED
+        assert zip_archive.getinfo("c.bin").compress_type == zipfile.ZIP_STORED
+    assert read_compressed_data(output_path, "a.txt") == read_compressed_data(first_path, "a.txt")
+    assert not os.path.exists(f"{output_path}.merging")
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_BZIP2, zipfile.ZIP_LZMA])
+def test_merge_keeps_other_compression_methods(tmp_path, compression):
+    source_path, output_path = str(tmp_path / "source.zip"), str(tmp_path / "output.zip")
+    create_zip_archive(source_path, {"page.html": b"<html>" * 100}, compression)
+
+    merge_zip_archives_without_recompression([source_path], output_path)
+
+    with zipfile.ZipFile(output_path) as zip_archive:
+        assert zip_archive.getinfo("page.html").compress_type == compression
+        assert zip_archive.read("page.html") == b"<html>" * 100
+
+def test_merge_copies_entries_with_data_descriptors_and_utf8_names(tmp_path):
+    # An archive written to an unseekable stream puts each entry's CRC and sizes in a data descriptor after its data
+    class UnseekableStream(io.RawIOBase):
+        def __init__(self):
+            self.buffer = io.BytesIO()
+        def writable(self):
+            return True
+        def write(self, data):
+            return self.buffer.write(data)
+    stream = UnseekableStream()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as zip_archive:
+        zip_archive.writestr("café.txt", b"streamed " * 50)
+    source_path, output_path = tmp_path / "source.zip", str(tmp_path / "output.zip")
+    source_path.write_bytes(stream.buffer.getvalue())
+
+    merge_zip_archives_without_recompression([str(source_path)], output_path)
+
+    with zipfile.ZipFile(output_path) as zip_archive:
+        assert zip_archive.read("café.txt") == b"streamed " * 50
+        assert not zip_archive.getinfo("café.txt").flag_bits & 0x08
+
+def test_merge_keeps_existing_output_entries_first(tmp_path):
+    source_path, output_path = str(tmp_path / "source.zip"), str(tmp_path / "output.zip")
+    create_zip_archive(output_path, {"kept.txt": b"previous", "shared.txt": b"previous"})
+    create_zip_archive(source_path, {"shared.txt": b"new", "new.txt": b"new"})
+
+    merge_zip_archives_without_recompression([source_path], output_path)
+
+    with zipfile.ZipFile(output_path) as zip_archive:
+        assert zip_archive.namelist() == ["kept.txt", "shared.txt", "new.txt"]
+        assert zip_archive.read("shared.txt") == b"previous"
+
+def test_writer_writes_zip64_end_records_when_needed(tmp_path, monkeypatch):
+    source_path, output_path = str(tmp_path / "source.zip"), str(tmp_path / "output.zip")
+    create_zip_archive(source_path, {f"{number}.txt": str(number).encode() for number in range(5)})
+    monkeypatch.setattr(zipfile, "ZIP_FILECOUNT_LIMIT", 3)
+
+    with RawZipArchiveWriter(output_path) as raw_zip_archive_writer:
+        raw_zip_archive_writer.copy_entries(source_path)
+
+    with open(output_path, "rb") as output_file:
+        assert zipfile.stringEndArchive64 in output_file.read()
+    with zipfile.ZipFile(output_path) as zip_archive:
+        assert [zip_archive.read(f"{number}.txt") for number in range(5)] == [str(number).encode() for number in range(5)]
+
+def test_writer_of_no_entries_writes_an_empty_archive(tmp_path):
+    output_path = str(tmp_path / "output.zip")
+    with RawZipArchiveWriter(output_path):
+        pass
+
+    with zipfile.ZipFile(output_path) as zip_archive:
+        assert zip_archive.namelist() == []
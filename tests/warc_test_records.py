@@ -0,0 +1,12 @@
+def make_warc_record(uri: str, body: bytes, record_type: bytes = b"response", content_type: bytes = b"text/html") -> bytes:
+    payload = b"HTTP/1.1 200 OK\r\nContent-Type: " + content_type + b"\r\n\r\n" + body
+    headers = (
+        b"WARC/1.0\r\n"
+        b"WARC-Type: " + record_type + b"\r\n"
+        b"WARC-Target-URI: " + uri.encode() + b"\r\n"
+        b"WARC-Date: 2024-01-02T03:04:05Z\r\n"
+        b"WARC-Record-ID: <urn:uuid:" + uri.encode() + b">\r\n"
+        b"Content-Type: application/http; msgtype=response\r\n"
+        b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n"
+    )
+    return headers + payload + b"\r\n\r\n"